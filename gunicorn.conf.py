@@ -0,0 +1,22 @@
+# Gunicorn settings: gunicorn -c gunicorn.conf.py
+# The app is created and warmed up once in the master (models, indexes and tables loaded, see
+# src.app.warm_up), then forked: workers start in milliseconds and share that memory copy-on-write
+# instead of each loading its own copy.
+import os
+
+wsgi_app = "src.app:create_app()"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+threads = int(os.environ.get("GUNICORN_THREADS", 8)) # Handlers mostly wait on upstream I/O; ADMISSION_MAX_IN_FLIGHT follows it
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+preload_app = True # Required for sharing: the app is imported before the fork
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    from src.app import warm_up
+    warm_up(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} forked from the warmed-up master")
@@ -0,0 +1,126 @@
+# Micro-benchmark: compiled intent engine vs. the original keyword `in`-chain.
+# Usage: python scripts/benchmark_intent.py [--iterations 20000] [--extra-synonyms 0,100,1000]
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.core.intent_engine import IntentEngine, load_lexicon # noqa: E402
+
+SAMPLE_UTTERANCES = [
+    "गेहूं में पानी कब देना है?",
+    "मुझे लोन चाहिए",
+    "गेहूं का कौन सा बीज अच्छा है?",
+    "आज मंडी का भाव क्या है?",
+    "पत्तियों पर सफेद धब्बे हैं",
+    "When should I apply urea to wheat?",
+    "माझ्या गहू पिकाला पाणी कधी द्यायचे?",
+    "कल मौसम कैसा रहेगा, बारिश होगी क्या?",
+    "मुझे अपना धान बेचना है, कोई खरीदार है?",
+    "hello",
+]
+
+
+def legacy_understand_intent(text):
+    """Copy of the original language.understand_intent keyword chain (without logging)."""
+    text_lower = text.lower()
+    intent = "UNKNOWN"
+    entities = {}
+    if "पानी" in text or "water" in text_lower or "सिंचाई" in text:
+        intent = "CROP_ADVISORY_WATER"
+        if "गेहूं" in text or "wheat" in text_lower: entities["crop"] = "गेहूं"
+        elif "धान" in text or "paddy" in text_lower: entities["crop"] = "धान"
+    elif "खाद" in text or "fertilizer" in text_lower or "यूरिया" in text:
+        intent = "CROP_ADVISORY_FERTILIZER"
+        if "गेहूं" in text: entities["crop"] = "गेहूं"
+    elif "रोग" in text or "बीमारी" in text or "disease" in text_lower or "धब्बे" in text or "spots" in text_lower:
+        intent = "DISEASE_QUERY_SYMPTOMS"
+        if "गेहूं" in text: entities["crop"] = "गेहूं"
+        entities["symptoms"] = text
+    elif "लोन" in text or "loan" in text_lower or "ऋण" in text:
+        intent = "FINANCE_LOAN_REQUEST"
+    elif "बीमा" in text or "insurance" in text_lower:
+        intent = "FINANCE_INSURANCE_QUERY"
+    elif "भाव" in text or "price" in text_lower or "मंडी" in text or "mandi" in text_lower:
+        intent = "MARKET_PRICE_QUERY"
+        if "गेहूं" in text: entities["crop"] = "गेहूं"
+        elif "बाजरा" in text: entities["crop"] = "बाजरा"
+    elif "बेचना" in text or "sell" in text_lower:
+        intent = "MARKET_LINKAGE_REQUEST"
+        if "गेहूं" in text: entities["crop"] = "गेहूं"
+    elif "मौसम" in text or "weather" in text_lower or "बारिश" in text:
+        intent = "WEATHER_QUERY"
+    elif "बीज" in text or "seed" in text_lower:
+        intent = "GENERAL_QNA"
+        entities["query_text"] = text
+        entities["topic"] = "seed"
+    else:
+        common_q = ["क्या", "कब", "कैसे", "क्यों", "what", "when", "how", "why"]
+        if any(q in text_lower for q in common_q):
+            intent = "GENERAL_QNA"
+            entities["query_text"] = text
+    return {"intent": intent, "entities": entities}
+
+
+def naive_scan(keywords, text):
+    """Baseline that scales like the `in`-chain: one substring search per keyword."""
+    text_lower = text.casefold()
+    return [kw for kw in keywords if kw in text_lower]
+
+
+def with_extra_synonyms(lexicon, count):
+    """Pads every intent with `count` synthetic synonyms to show how matching cost scales."""
+    padded = {**lexicon, "intents": []}
+    for intent in lexicon["intents"]:
+        keywords = {lang: list(words) for lang, words in intent["keywords"].items()}
+        keywords.setdefault("en-IN", []).extend(f"zz{intent['name'].lower()}{i}" for i in range(count))
+        padded["intents"].append({**intent, "keywords": keywords})
+    return padded
+
+
+def all_keywords(lexicon):
+    return [kw for intent in lexicon["intents"] for words in intent["keywords"].values() for kw in words]
+
+
+def bench(func, iterations):
+    seconds = timeit.timeit(lambda: [func(u) for u in SAMPLE_UTTERANCES], number=iterations)
+    return seconds / (iterations * len(SAMPLE_UTTERANCES)) * 1e6 # microseconds per utterance
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the compiled intent engine against the legacy keyword chain.")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--extra-synonyms", default="0,100,1000",
+                        help="Comma separated synthetic synonyms per intent for the scaling table")
+    args = parser.parse_args()
+
+    lexicon = load_lexicon()
+    engine = IntentEngine(lexicon)
+
+    print("Intent / entity agreement with the legacy chain:")
+    for utterance in SAMPLE_UTTERANCES:
+        old = legacy_understand_intent(utterance)["intent"]
+        new = engine.analyze(utterance)["intent"]
+        marker = "  " if old == new else "!="
+        print(f"  {marker} {old:26} {new:26} {utterance}")
+
+    print(f"\nPer-utterance latency ({args.iterations} iterations x {len(SAMPLE_UTTERANCES)} utterances):")
+    print(f"  legacy if/elif chain : {bench(legacy_understand_intent, args.iterations):8.2f} us")
+    print(f"  compiled engine      : {bench(engine.analyze, args.iterations):8.2f} us")
+
+    print("\nScaling with lexicon size (us per utterance):")
+    print(f"  {'synonyms/intent':>16} {'keywords':>9} {'naive scan':>11} {'engine':>9} {'states':>8}")
+    for count in (int(c) for c in args.extra_synonyms.split(",")):
+        padded = with_extra_synonyms(lexicon, count)
+        keywords = all_keywords(padded)
+        padded_engine = IntentEngine(padded)
+        iterations = max(1, args.iterations // 10)
+        naive_us = bench(lambda text: naive_scan(keywords, text), iterations)
+        engine_us = bench(padded_engine.analyze, iterations)
+        print(f"  {count:>16} {len(keywords):>9} {naive_us:>11.2f} {engine_us:>9.2f} {len(padded_engine.automaton):>8}")
+
+
+if __name__ == "__main__":
+    main()
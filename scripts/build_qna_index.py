@@ -0,0 +1,44 @@
+# Builds the knowledge-base QnA index (src/core/qna.py) from FAQ/bulletin files and writes it under
+# config.QNA_INDEX_DIR as memory-mappable arrays. Running workers switch to the new build automatically.
+# Sources: .json ({"entries": [...]}), .jsonl (one entry per line) or .txt (split into passages).
+# Usage: python scripts/build_qna_index.py [SOURCE ...] [--output DIR] [--no-vectors] [--query "गेहूं में पीला रतुआ"]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.config import config # noqa: E402
+from src.core.qna import QnAIndex, load_documents, tokenize # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the knowledge-base QnA index.")
+    parser.add_argument("sources", nargs="*", default=[config.QNA_KNOWLEDGE_BASE_PATH], help="Knowledge base files")
+    parser.add_argument("--output", default=config.QNA_INDEX_DIR, help="Index directory")
+    parser.add_argument("--no-vectors", action="store_true", help="BM25 only, skip the trigram vectors")
+    parser.add_argument("--query", help="Run one query against the new index and print the top matches")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    documents = load_documents(args.sources)
+    loaded = time.perf_counter()
+    index = QnAIndex.build(documents, vectors=not args.no_vectors)
+    built = time.perf_counter()
+    build_dir = index.save(args.output)
+
+    print(f"Read {len(documents)} documents from {len(args.sources)} sources in {loaded - started:.2f}s")
+    print(f"Indexed {len(index.vocabulary)} terms, {len(index.posting_docs)} postings in {built - loaded:.2f}s -> {build_dir}")
+
+    if args.query:
+        query_started = time.perf_counter()
+        hits = index.search(tokenize(args.query), top_k=3, dense_weight=config.QNA_DENSE_WEIGHT)
+        print(f"Query took {(time.perf_counter() - query_started) * 1000:.2f} ms")
+        for hit in hits:
+            print(f"  {hit.combined:.3f} (bm25 {hit.score:.2f}, coverage {hit.coverage:.2f}, similarity {hit.similarity:.2f})"
+                  f" {hit.document['id']}: {hit.document['answer'][:80]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Nightly job: fits price forecasts for every crop x mandi series and writes the lookup table
+# served by market.get_price_forecast (hot-reloaded by running workers, no restart needed).
+# History comes from the mandi price store (scripts/ingest_market_prices.py), so forecasts start from
+# the same reports market.get_market_prices quotes; the history CSV is read only while the store is
+# empty, or when given with --history.
+# Usage: python scripts/fit_price_forecasts.py [--store DIR] [--days 365] [--history CSV] [--output PATH] [--horizon 30]
+# Cron example (after the price ingestion): 30 2 * * *  cd /srv/krishi-saathi && python scripts/fit_price_forecasts.py
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.config import config # noqa: E402
+from src.core.price_forecast import METHODS, build_forecast_table, load_price_history, load_store_history # noqa: E402
+from src.core.price_store import PriceStore # noqa: E402
+
+
+def load_history(args):
+    """(PriceHistory, source description): the price store's recent history, else the history CSV."""
+    if args.history is None:
+        try:
+            store = PriceStore.load(args.store)
+            since = datetime.date.today() - datetime.timedelta(days=args.days)
+            return load_store_history(store, since), f"price store {args.store}"
+        except (OSError, ValueError) as e:
+            print(f"Price store {args.store} has no history ({e}), fitting from {config.PRICE_HISTORY_PATH}")
+    path = args.history or config.PRICE_HISTORY_PATH
+    return load_price_history(path), path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit mandi price forecasts and write the lookup table.")
+    parser.add_argument("--store", default=config.PRICE_STORE_DIR, help="Mandi price store to fit from")
+    parser.add_argument("--days", type=int, default=config.PRICE_FORECAST_HISTORY_DAYS, help="Days of store history to fit on")
+    parser.add_argument("--history", default=None, help="Price history CSV to fit from instead of the store "
+                                                        "(default: config.PRICE_HISTORY_PATH while the store is empty)")
+    parser.add_argument("--output", default=config.PRICE_MODEL_PATH, help="Forecast table (.npz)")
+    parser.add_argument("--horizon", type=int, default=config.PRICE_FORECAST_HORIZON_DAYS, help="Days ahead to precompute")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    history, source = load_history(args)
+    loaded = time.perf_counter()
+    table = build_forecast_table(history, args.horizon)
+    fitted = time.perf_counter()
+
+    # Write next to the target and rename, so workers never load a half-written file
+    temporary_path = args.output + ".tmp"
+    table.save(temporary_path)
+    os.replace(temporary_path, args.output)
+
+    series = len(history.series)
+    method_counts = {name: int((table.methods[:series] == code).sum()) for code, name in enumerate(METHODS)}
+    print(f"History: {series} series x {history.values.shape[1]} days "
+          f"({history.start_date} .. {history.end_date}) from {source}, loaded in {loaded - started:.2f}s")
+    print(f"Fitted in {fitted - loaded:.2f}s, methods: {method_counts}")
+    print(f"Wrote {len(table)} rows x {table.horizon} horizons to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
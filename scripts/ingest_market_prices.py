@@ -0,0 +1,61 @@
+# Daily job: appends mandi arrival/price reports to the local price store (src/core/price_store.py)
+# read by market.get_market_prices. Running workers pick up the new manifest automatically.
+# Sources: Agmarknet/data.gov.in CSV or JSON dumps, eNAM JSON, or the price history CSV; with --fetch
+# the day's report is also pulled from config.AGMARKNET_API_ENDPOINT.
+# Usage: python scripts/ingest_market_prices.py [SOURCE ...] [--fetch [--date YYYY-MM-DD]] [--store DIR]
+# Cron example: 0 21 * * *  cd /srv/krishi-saathi && python scripts/ingest_market_prices.py --fetch
+# Sample data: python scripts/ingest_market_prices.py data/mandi_prices_sample.csv data/agmarknet_report_sample.csv data/enam_trades_sample.json
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.config import config # noqa: E402
+from src.core.price_store import PriceStore, append_reports, load_name_normalizer, read_reports # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append mandi price reports to the local price store.")
+    parser.add_argument("sources", nargs="*", help="Report files (.csv, .json, .jsonl)")
+    parser.add_argument("--fetch", action="store_true", help="Also fetch the day's report from the market data API")
+    parser.add_argument("--date", type=datetime.date.fromisoformat, help="Report date for --fetch (default: today)")
+    parser.add_argument("--store", default=config.PRICE_STORE_DIR, help="Price store directory")
+    args = parser.parse_args()
+    if not args.sources and not args.fetch:
+        parser.error("give report files and/or --fetch")
+
+    started = time.perf_counter()
+    records = []
+    for path in args.sources:
+        records.extend(read_reports(path))
+    if args.fetch:
+        from src.app import create_app
+        from src.integrations.external_apis import get_market_data_api
+        with create_app().app_context():
+            fetched = get_market_data_api(args.date)
+        if fetched is None:
+            print("Market data API unavailable")
+            if not records:
+                sys.exit(1)
+        else:
+            records.extend(fetched)
+    read = time.perf_counter()
+
+    stats = append_reports(records, args.store, load_name_normalizer())
+    appended = time.perf_counter()
+
+    print(f"Read {len(records)} records from {len(args.sources)} files{' + API' if args.fetch else ''} in {read - started:.2f}s")
+    print(f"Added {stats['added']} rows ({stats['duplicates']} duplicates, {stats['invalid']} invalid, "
+          f"{stats['new_series']} new series), rewrote months {', '.join(stats['months']) or '-'} in {appended - read:.2f}s")
+    for crop, mandi in sorted(stats["unmatched"]):
+        print(f"  Unmatched name (add it to {config.MARKET_NAME_ALIASES_PATH}): {crop} / {mandi}")
+    if stats["months"]:
+        store = PriceStore.load(args.store)
+        print(f"Store: {len(store)} series over {len(store.partitions)} months")
+
+
+if __name__ == "__main__":
+    main()
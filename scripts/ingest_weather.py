@@ -0,0 +1,59 @@
+# Scheduled job: fetches daily forecasts for a grid of points around every service district and writes
+# the gridded store served by weather.get_weather_forecast (hot-reloaded by running workers).
+# If too many points fail (upstream down), the previous grid is kept and the job exits with status 1.
+# Usage: python scripts/ingest_weather.py [--spacing 0.25] [--radius-cells 1] [--days 7] [--workers 8] [--output PATH]
+# Cron example: 15 */3 * * *  cd /srv/krishi-saathi && python scripts/ingest_weather.py
+# Against the local stub:
+#   python scripts/stub_upstream_server.py --port 8089 &
+#   OPENWEATHERMAP_BASE_URL=http://127.0.0.1:8089 OPENWEATHERMAP_API_KEY=stub python scripts/ingest_weather.py
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.app import create_app # noqa: E402
+from src.config import config # noqa: E402
+from src.core.geo_index import get_market_directory # noqa: E402
+from src.core.weather_grid import grid_points, ingest # noqa: E402
+from src.integrations.external_apis import get_openweathermap_forecast_api # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch gridded weather forecasts for the service districts.")
+    parser.add_argument("--spacing", type=float, default=config.WEATHER_GRID_DEGREES, help="Grid spacing in degrees")
+    parser.add_argument("--radius-cells", type=int, default=1, help="Grid cells around each district centroid")
+    parser.add_argument("--days", type=int, default=7, help="Forecast days to keep")
+    parser.add_argument("--workers", type=int, default=config.WEATHER_INGEST_WORKERS, help="Concurrent requests")
+    parser.add_argument("--output", default=config.WEATHER_GRID_PATH, help="Grid store (.npz)")
+    args = parser.parse_args()
+
+    app = create_app()
+    districts = get_market_directory().districts
+    points = grid_points([(lat, lon) for _, lat, lon in districts], args.spacing, args.radius_cells)
+
+    def fetch(lat, lon):
+        with app.app_context(): # Worker threads need their own app context
+            return get_openweathermap_forecast_api(lat, lon)
+
+    started = time.perf_counter()
+    grid, failures = ingest(points, fetch, days=args.days, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"Fetched {len(points) - failures}/{len(points)} grid points for {len(districts)} districts "
+          f"in {elapsed:.2f}s ({len(points) / elapsed:.1f} points/s)")
+
+    if not points or failures / len(points) > config.WEATHER_INGEST_MAX_FAILURE_RATIO:
+        print(f"Too many failed points ({failures}), keeping the previous grid")
+        sys.exit(1)
+
+    # Write next to the target and rename, so workers never load a half-written file
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    temporary_path = args.output + ".tmp.npz" # np.savez appends .npz to other names
+    grid.save(temporary_path)
+    os.replace(temporary_path, args.output)
+    print(f"Wrote {len(grid)} points x {grid.days} days from {grid.start_date} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
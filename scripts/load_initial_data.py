@@ -0,0 +1,83 @@
+# Bulk farmer onboarding: imports FPO / government rosters into the farmer context store
+# (src/database/farmer_roster.py). Rows are streamed, normalized and upserted in batches, so a roster
+# of several hundred thousand farmers loads in minutes; existing profiles are merged, not replaced.
+# Safe to run while the app is serving: workers pick up changed profiles within CONTEXT_CACHE_TTL_SECONDS.
+# Usage: python scripts/load_initial_data.py ROSTER [ROSTER ...] [--batch-size 5000] [--source NAME]
+#                                            [--rejects rejected.csv] [--dry-run]
+# Sample data: python scripts/load_initial_data.py data/farmer_roster_sample.csv --dry-run
+import argparse
+import csv
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.config import config # noqa: E402
+from src.core.geo_index import get_market_directory # noqa: E402
+from src.core.price_store import load_name_normalizer # noqa: E402
+from src.database.context_store import get_context_store # noqa: E402
+from src.database.farmer_roster import RosterNormalizer, import_roster, iter_roster # noqa: E402
+
+
+class _DryRunStore:
+    def upsert_many(self, items):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import farmer rosters (CSV/JSON/JSONL) into the farmer context store.")
+    parser.add_argument("rosters", nargs="+", help="Roster files (.csv, .json, .jsonl)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Farmers per transaction")
+    parser.add_argument("--source", help="Stored as roster_source on each farmer (default: the file name)")
+    parser.add_argument("--rejects", help="Write rejected rows with the reason to this CSV")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and report without writing")
+    args = parser.parse_args()
+
+    store = _DryRunStore() if args.dry_run else get_context_store()
+    directory = get_market_directory()
+    names = load_name_normalizer()
+    rejects_file = open(args.rejects, "w", newline="", encoding="utf-8") if args.rejects else None
+    rejects = csv.writer(rejects_file) if rejects_file else None
+    if rejects:
+        rejects.writerow(["roster", "reason", "row"])
+    started = time.perf_counter()
+    farmers = 0
+
+    for path in args.rosters:
+        normalizer = RosterNormalizer(place_name=directory.find_place, crop_name=names.crop,
+                                      source=args.source or os.path.basename(path))
+
+        def on_reject(row, reason):
+            if rejects:
+                rejects.writerow([path, reason, dict(row) if isinstance(row, dict) else row])
+
+        def on_batch(stats):
+            if stats["batches"] % 20 == 0:
+                print(f"  {stats['rows']} rows, {stats['rows'] / max(stats['seconds'], 1e-9):,.0f} rows/s", flush=True)
+
+        stats = import_roster(iter_roster(path), store, normalizer, batch_size=args.batch_size,
+                              on_reject=on_reject, on_batch=on_batch)
+        farmers += stats["farmers"]
+        rejected = sum(stats["rejected"].values())
+        print(f"{path}: {stats['rows']} rows -> {stats['farmers']} farmers ({stats['duplicates']} duplicate numbers, "
+              f"{rejected} rejected) in {stats['seconds']:.2f}s, {stats['rows'] / max(stats['seconds'], 1e-9):,.0f} rows/s"
+              f"{' [dry run]' if args.dry_run else ''}")
+        for reason, count in sorted(stats["rejected"].items()):
+            print(f"  Rejected ({reason}): {count}")
+        for field, count in sorted(normalizer.dropped.items()):
+            print(f"  Invalid {field} dropped: {count}")
+        for field, values in normalizer.unmatched.items():
+            if values:
+                print(f"  Unknown {field} kept as given ({len(values)}): {', '.join(sorted(values)[:10])}"
+                      f"{' ...' if len(values) > 10 else ''}")
+
+    if rejects_file:
+        rejects_file.close()
+        print(f"Rejected rows written to {args.rejects}")
+    print(f"Imported {farmers} farmers in {time.perf_counter() - started:.2f}s"
+          f"{'' if args.dry_run else f'; store holds {store.backend.count()} ({config.DATABASE_URL})'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,542 @@
+# Load test: replays synthetic IVR / WhatsApp traffic against the API and reports latency per endpoint.
+# - Traffic mix: IVR welcome + handle-query calls across intents and languages (hi/en/mr), WhatsApp
+#   text and image messages; callers drawn from a skewed pool (a few frequent callers, a long tail)
+# - Modes: `client` (Flask test client, in process), `server` (app on a threaded WSGI server in
+#   process, real HTTP), or `--url` (an already running Gunicorn/Uvicorn deployment)
+# - Reports p50/p95/p99/max latency, throughput and errors per endpoint, plus memory over time
+#   (RSS, tracemalloc, context-store cache entries) to catch unbounded growth
+# - Results are written as JSON; `--compare` diffs against an earlier run and fails on regressions
+#
+# Usage:
+#   python scripts/load_test.py --mode client --requests 5000 --concurrency 16
+#   python scripts/load_test.py --mode server --duration 60 --concurrency 64 --output benchmark_results/run.json
+#   python scripts/load_test.py --url http://127.0.0.1:5000 --duration 60 --concurrency 64
+#   python scripts/load_test.py --mode client --compare benchmark_results/baseline.json --max-regression 0.15
+#
+# `server` mode shares one process (and the GIL) with the load generator, so its absolute throughput
+# is pessimistic; compare it with runs in the same mode. For deployment numbers use --url.
+# In-process modes use a throwaway SQLite database / outbound queue / image cache (temp directory)
+# and serve WhatsApp images from scripts/stub_upstream_server.py.
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# (weight, intent label, utterances by language); labels are for reporting only, the API decides the intent
+IVR_QUERIES = [
+    (18, "MARKET_PRICE_QUERY", {
+        "hi-IN": ["आज गेहूं का मंडी भाव क्या है?", "चना का भाव बताइए", "धान का मंडी में क्या भाव चल रहा है?"],
+        "en-IN": ["what is the mandi price of wheat today", "price of gram in my mandi"],
+        "mr-IN": ["गहू बाजारभाव काय आहे?"],
+    }),
+    (16, "CROP_ADVISORY_WATER", {
+        "hi-IN": ["गेहूं में पानी कब देना है?", "धान में पानी कितना देना चाहिए?"],
+        "en-IN": ["when should I give water to wheat"],
+        "mr-IN": ["माझ्या गहू पिकाला पाणी कधी द्यायचे?"],
+    }),
+    (10, "CROP_ADVISORY_FERTILIZER", {
+        "hi-IN": ["गेहूं में खाद कब डालें?", "बाजरा में यूरिया कितना डालना है?"],
+        "en-IN": ["When should I apply urea to wheat?"],
+        "mr-IN": ["गहू पिकाला खत कधी द्यायचे?"],
+    }),
+    (12, "WEATHER_QUERY", {
+        "hi-IN": ["कल मौसम कैसा रहेगा, बारिश होगी क्या?", "इस हफ्ते बारिश होगी?"],
+        "en-IN": ["what is the weather tomorrow"],
+        "mr-IN": ["उद्या हवामान कसे असेल, पाऊस येईल का?"],
+    }),
+    (10, "DISEASE_QUERY_SYMPTOMS", {
+        "hi-IN": ["पत्तियों पर सफेद धब्बे हैं", "गेहूं में रोग लग गया है"],
+        "en-IN": ["there are brown spots on wheat leaves"],
+        "mr-IN": ["पानांवर डाग पडले आहेत"],
+    }),
+    (8, "MARKET_LINKAGE_SELL", {
+        "hi-IN": ["मुझे अपना धान बेचना है, कोई खरीदार है?", "गेहूं बेचना है"],
+        "en-IN": ["I want to sell my wheat, is there a buyer"],
+        "mr-IN": ["मला गहू विकायचे आहे"],
+    }),
+    (6, "FINANCE_LOAN_QUERY", {
+        "hi-IN": ["मुझे लोन चाहिए"],
+        "en-IN": ["I need a loan for my farm"],
+        "mr-IN": ["मला कर्ज पाहिजे"],
+    }),
+    (4, "FINANCE_INSURANCE_QUERY", {
+        "hi-IN": ["फसल बीमा कैसे करवाएं?"],
+        "en-IN": ["how do I get crop insurance"],
+        "mr-IN": ["पीक विमा कसा काढायचा?"],
+    }),
+    (6, "GENERAL_QNA", {
+        "hi-IN": ["गेहूं का कौन सा बीज अच्छा है?"],
+        "en-IN": ["which seed is best for wheat"],
+        "mr-IN": ["गहू बियाणे कोणते चांगले आहे?"],
+    }),
+    (4, "GENERAL_ADVISORY", {
+        "hi-IN": ["गेहूं के लिए कोई सलाह दीजिए"],
+        "en-IN": ["any advice for my wheat crop"],
+        "mr-IN": ["गहू पिकासाठी सल्ला द्या"],
+    }),
+    (3, "UNKNOWN", {
+        "hi-IN": ["हेलो", "नमस्ते"],
+        "en-IN": ["hello"],
+        "mr-IN": ["नमस्कार"],
+    }),
+]
+
+WHATSAPP_TEXTS = [
+    "गेहूं का मंडी भाव बताओ", "पत्तियों पर पीले धब्बे हैं", "कल बारिश होगी क्या?",
+    "brown spots on leaves", "मला गहू विकायचे आहे", "धान में खाद कब डालें?",
+]
+
+LANGUAGE_WEIGHTS = (("hi-IN", 70), ("en-IN", 15), ("mr-IN", 15))
+
+# Share of each request kind in the generated traffic
+KIND_WEIGHTS = (("ivr_welcome", 20), ("ivr_query", 60), ("whatsapp_text", 10), ("whatsapp_image", 10))
+
+ENDPOINT_PATHS = {
+    "ivr_welcome": "/api/ivr/welcome",
+    "ivr_query": "/api/ivr/handle-query",
+    "whatsapp_text": "/api/whatsapp/message",
+    "whatsapp_image": "/api/whatsapp/message",
+}
+
+SEED_CROPS = ["गेहूं", "धान", "बाजरा", "चना"]
+
+
+def _weighted(rng, pairs):
+    total = sum(weight for _, weight in pairs)
+    pick = rng.uniform(0, total)
+    for value, weight in pairs:
+        pick -= weight
+        if pick <= 0:
+            return value
+    return pairs[-1][0]
+
+
+class TrafficGenerator:
+    """Deterministic (seeded) stream of (kind, label, path, json body) requests."""
+
+    def __init__(self, seed=7, callers=2000, images=200, media_base_url=None):
+        self.rng = random.Random(seed)
+        self.callers = [f"+9198{index:08d}" for index in range(callers)]
+        self.images = images
+        self.media_base_url = media_base_url
+        self._query_pairs = [((label, utterances), weight) for weight, label, utterances in IVR_QUERIES]
+        self._lock = threading.Lock()
+
+    def _caller(self):
+        # Zipf-like skew: a handful of callers call often, most call rarely
+        index = int(self.rng.paretovariate(0.6)) - 1
+        return self.callers[index % len(self.callers)]
+
+    def next(self):
+        with self._lock:
+            rng = self.rng
+            kind = _weighted(rng, KIND_WEIGHTS)
+            if kind == "whatsapp_image" and not self.media_base_url:
+                kind = "whatsapp_text"
+            caller_id = self._caller()
+            if kind == "ivr_welcome":
+                return kind, "WELCOME", {"caller_id": caller_id}
+            if kind == "ivr_query":
+                label, utterances = _weighted(rng, self._query_pairs)
+                language = _weighted(rng, LANGUAGE_WEIGHTS)
+                text = rng.choice(utterances.get(language) or utterances["hi-IN"])
+                return kind, label, {"caller_id": caller_id, "spoken_text": text, "call_sid": f"CA{uuid.uuid4().hex}"}
+            body = {"sender_id": f"whatsapp:{caller_id}", "message_sid": f"SM{uuid.uuid4().hex}"}
+            if kind == "whatsapp_image":
+                # A bounded pool of photos: repeats exercise the diagnosis cache like forwarded images do
+                body["media_url"] = f"{self.media_base_url}/media/leaf-{rng.randrange(self.images)}.jpg"
+                body["media_type"] = "image/jpeg"
+                return kind, "DISEASE_IMAGE", body
+            body["message_body"] = rng.choice(WHATSAPP_TEXTS)
+            return kind, "TEXT", body
+
+
+# --- Transports ---
+
+class ClientTransport:
+    """Flask test client: measures the app itself, without HTTP parsing or sockets."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def post(self, path, body):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post(path, json=body)
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class HttpTransport:
+    """Real HTTP via requests (one keep-alive session per worker thread)."""
+
+    def __init__(self, base_url, timeout=30.0):
+        import requests
+        self._requests = requests
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def post(self, path, body):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.post(self.base_url + path, json=body, timeout=self.timeout)
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class ServerTransport(HttpTransport):
+    """The app on werkzeug's threaded WSGI server in this process (real sockets, one process)."""
+
+    def __init__(self, app, timeout=30.0):
+        from werkzeug.serving import make_server
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        super().__init__(f"http://127.0.0.1:{self.server.server_port}", timeout)
+
+    def close(self):
+        self.server.shutdown()
+
+
+# --- Measurement ---
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3 # Peak, in KB on Linux
+
+
+class MemorySampler(threading.Thread):
+    """Samples process memory (in-process modes) every `interval` seconds."""
+
+    def __init__(self, interval, progress, context_store=None, trace_allocations=False):
+        super().__init__(name="memory-sampler", daemon=True)
+        self.interval = interval
+        self.progress = progress
+        self.context_store = context_store
+        self.trace_allocations = trace_allocations
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._t0 = time.monotonic()
+
+    def sample(self):
+        entry = {"t": round(time.monotonic() - self._t0, 2), "requests": self.progress(), "rss_mb": round(_rss_mb(), 2)}
+        if self.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            entry["traced_mb"] = round(current / 1e6, 3)
+            entry["traced_peak_mb"] = round(peak / 1e6, 3)
+        if self.context_store is not None:
+            entry["context_cache_entries"] = self.context_store.cache_size()
+        self.samples.append(entry)
+
+    def run(self):
+        self.sample()
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.sample()
+
+    def summary(self):
+        if len(self.samples) < 2:
+            return {"samples": self.samples}
+        first, last = self.samples[0], self.samples[-1]
+        requests_done = max(1, last["requests"] - first["requests"])
+        summary = {"rss_growth_mb": round(last["rss_mb"] - first["rss_mb"], 2),
+                   "rss_growth_mb_per_10k_requests": round((last["rss_mb"] - first["rss_mb"]) * 10000 / requests_done, 3)}
+        if "traced_mb" in last:
+            summary["traced_growth_mb"] = round(last["traced_mb"] - first["traced_mb"], 3)
+            summary["traced_peak_mb"] = last["traced_peak_mb"]
+        if "context_cache_entries" in last:
+            summary["context_cache_entries"] = last["context_cache_entries"]
+        summary["samples"] = self.samples
+        return summary
+
+
+def run_load(transport, generator, concurrency, total_requests=None, duration=None, warmup=0):
+    """Drives `concurrency` workers until `total_requests` are sent or `duration` elapses."""
+    lock = threading.Lock()
+    state = {"issued": 0, "done": 0}
+    records = [] # (kind, label, status, seconds); list.append is atomic
+    deadline = time.monotonic() + duration if duration else None
+
+    for _ in range(warmup):
+        kind, label, body = generator.next()
+        transport.post(ENDPOINT_PATHS[kind], body)
+
+    def worker():
+        while True:
+            with lock:
+                if total_requests is not None and state["issued"] >= total_requests:
+                    return
+                state["issued"] += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            kind, label, body = generator.next()
+            started = time.perf_counter()
+            try:
+                status = transport.post(ENDPOINT_PATHS[kind], body)
+            except Exception as e:
+                status = f"error:{type(e).__name__}"
+            records.append((kind, label, status, time.perf_counter() - started))
+            with lock:
+                state["done"] += 1
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, name=f"load-{index}", daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    return threads, records, started, lambda: state["done"]
+
+
+def summarize(records, elapsed):
+    groups = {}
+    for kind, label, status, seconds in records:
+        for key in (f"endpoint:{kind}", f"intent:{label}" if kind == "ivr_query" else None, "all"):
+            if key is None:
+                continue
+            group = groups.setdefault(key, {"latencies": [], "errors": 0, "statuses": {}})
+            group["latencies"].append(seconds)
+            group["statuses"][str(status)] = group["statuses"].get(str(status), 0) + 1
+            if not (isinstance(status, int) and status < 500):
+                group["errors"] += 1
+    summary = {}
+    for key, group in sorted(groups.items()):
+        latencies = sorted(group["latencies"])
+        summary[key] = {
+            "count": len(latencies),
+            "errors": group["errors"],
+            "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+            "statuses": group["statuses"],
+        }
+    return summary
+
+
+def print_summary(summary, memory=None):
+    print(f"{'group':<40} {'count':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for key, row in summary.items():
+        print(f"{key:<40} {row['count']:>7} {row['errors']:>5} {row['rps']:>8.1f} {row['p50_ms']:>9.2f} "
+              f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['max_ms']:>9.2f}")
+    if memory and "rss_growth_mb" in memory:
+        extra = ""
+        if "traced_growth_mb" in memory:
+            extra += f", traced allocations {memory['traced_growth_mb']:+.2f} MB (peak {memory['traced_peak_mb']:.2f} MB)"
+        if "context_cache_entries" in memory:
+            extra += f", context cache {memory['context_cache_entries']} entries"
+        print(f"memory: RSS {memory['rss_growth_mb']:+.2f} MB ({memory['rss_growth_mb_per_10k_requests']:+.3f} MB per 10k requests){extra}")
+
+
+def compare(summary, baseline, max_regression):
+    """Prints deltas against a baseline run; returns the list of regressions beyond `max_regression`."""
+    regressions = []
+    print(f"\n{'group':<40} {'p50 Δ':>9} {'p95 Δ':>9} {'p99 Δ':>9} {'rps Δ':>9}")
+    for key, row in summary.items():
+        before = baseline.get(key)
+        if not before:
+            continue
+
+        def delta(field):
+            return (row[field] - before[field]) / before[field] if before[field] else 0.0
+        print(f"{key:<40} {delta('p50_ms'):>+9.1%} {delta('p95_ms'):>+9.1%} {delta('p99_ms'):>+9.1%} {delta('rps'):>+9.1%}")
+        if key.startswith("intent:"):
+            continue # Per-intent groups are too small for a stable gate; endpoints and 'all' decide
+        if delta('p95_ms') > max_regression:
+            regressions.append(f"{key}: p95 {before['p95_ms']:.2f} -> {row['p95_ms']:.2f} ms")
+        if -delta('rps') > max_regression:
+            regressions.append(f"{key}: rps {before['rps']:.1f} -> {row['rps']:.1f}")
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _isolate_environment(workdir):
+    """Points every on-disk store at a temp directory, unless explicitly configured."""
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(workdir, 'contexts.db')}")
+    os.environ.setdefault("OUTBOUND_QUEUE_PATH", os.path.join(workdir, "outbound_queue.db"))
+    os.environ.setdefault("DISEASE_IMAGE_CACHE_PATH", os.path.join(workdir, "image_cache.db"))
+    os.environ.setdefault("CACHE_DISK_PATH", "")
+    os.environ.setdefault("WEBHOOK_DEDUP_DB_PATH", os.path.join(workdir, "webhook_dedup.db"))
+    os.environ.setdefault("ADMISSION_DB_PATH", os.path.join(workdir, "admission.db"))
+    os.environ.setdefault("DIALOG_SESSION_DB_PATH", os.path.join(workdir, "dialog_sessions.db"))
+    os.environ.setdefault("ADMISSION_CONTROL_ENABLED", "false") # Synthetic callers redial far faster than farmers; measure serving, not shedding
+    os.environ.setdefault("TRACE_SAMPLE_RATE", "0") # Don't let trace logging dominate the measurement
+
+
+def _seed_contexts(store, generator, seed):
+    """Gives the simulated callers real districts, crops and sowing dates (first-time callers otherwise have 'Unknown')."""
+    from src.config import config
+    try:
+        with open(config.MARKET_DIRECTORY_PATH, encoding="utf-8") as f:
+            districts = [district["name"] for district in json.load(f).get("districts", [])]
+    except (OSError, ValueError):
+        districts = []
+    districts = districts or ["Jhansi"]
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    for caller_id in generator.callers:
+        store.get_or_create(caller_id, lambda cid: {
+            "id": cid,
+            "language": _weighted(rng, LANGUAGE_WEIGHTS),
+            "location": rng.choice(districts),
+            "current_crop": rng.choice(SEED_CROPS),
+            "land_size_acres": round(rng.uniform(0.5, 10.0), 1),
+            "sowing_date": (today - datetime.timedelta(days=rng.randint(5, 120))).isoformat(),
+            "last_interaction_time": datetime.datetime.now(),
+            "last_query": None,
+        })
+    store.flush()
+    store.invalidate() # Start the run with a cold cache, like a freshly started worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic IVR/WhatsApp traffic and report latency per endpoint.")
+    parser.add_argument("--mode", choices=("client", "server"), default="client",
+                        help="client: Flask test client; server: threaded WSGI server in this process (ignored with --url)")
+    parser.add_argument("--url", help="Base URL of a running deployment (e.g. Gunicorn/Uvicorn) instead of an in-process app")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000, help="Total requests (ignored if --duration is set)")
+    parser.add_argument("--duration", type=float, help="Run for this many seconds instead of a fixed request count")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured requests sent first")
+    parser.add_argument("--callers", type=int, default=2000, help="Size of the simulated caller pool")
+    parser.add_argument("--images", type=int, default=200, help="Distinct leaf photos in WhatsApp image traffic")
+    parser.add_argument("--media-url", help="Base URL serving /media/<name>.jpg (default: an in-process stub; none with --url)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--no-seed-contexts", action="store_true", help="Don't pre-create caller contexts (in-process modes)")
+    parser.add_argument("--sample-seconds", type=float, default=1.0, help="Memory sampling interval")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also track Python allocations (slows the run)")
+    parser.add_argument("--output", help="Write results JSON here (default: benchmark_results/load_<mode>_<timestamp>.json)")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="With --compare: exit 1 if a p95 rises or throughput drops by more than this fraction")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's INFO logging")
+    args = parser.parse_args()
+
+    in_process = not args.url
+    mode = args.mode if in_process else "url"
+    workdir = tempfile.mkdtemp(prefix="krishi-load-")
+    stub = None
+    store = None
+    if in_process:
+        _isolate_environment(workdir)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+    if not args.verbose:
+        logging.getLogger("werkzeug").setLevel(logging.ERROR) # Access log line per request
+
+    media_url = args.media_url
+    if media_url is None and in_process:
+        from scripts.stub_upstream_server import serve
+        stub = serve(port=0)
+        media_url = f"http://127.0.0.1:{stub.server_port}"
+    generator = TrafficGenerator(seed=args.seed, callers=args.callers, images=args.images, media_base_url=media_url)
+
+    if in_process:
+        from src.app import create_app
+        from src.database.context_store import get_context_store
+        app = create_app()
+        if not args.verbose:
+            app.logger.setLevel(logging.CRITICAL) # Simulated SMS/WhatsApp sends log every message
+        store = get_context_store()
+        if not args.no_seed_contexts:
+            _seed_contexts(store, generator, args.seed)
+        transport = ClientTransport(app) if args.mode == "client" else ServerTransport(app)
+    else:
+        transport = HttpTransport(args.url)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    total_requests = None if args.duration else args.requests
+    print(f"Load test ({mode}): concurrency={args.concurrency} "
+          f"{f'duration={args.duration}s' if args.duration else f'requests={total_requests}'} callers={args.callers}")
+
+    threads, records, started, progress = run_load(transport, generator, args.concurrency,
+                                                    total_requests=total_requests, duration=args.duration, warmup=args.warmup)
+    sampler = MemorySampler(args.sample_seconds, progress, store, args.tracemalloc) if in_process else None
+    if sampler:
+        sampler.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    if sampler:
+        sampler.stop()
+    transport.close()
+    if stub is not None:
+        stub.shutdown()
+
+    summary = summarize(records, elapsed)
+    memory = sampler.summary() if sampler else None
+    print_summary(summary, memory)
+
+    result = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "mode": mode,
+        "settings": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+        "elapsed_seconds": round(elapsed, 3),
+        "summary": summary,
+        "memory": memory,
+    }
+    output = args.output or os.path.join("benchmark_results", f"load_{mode}_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=1)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("mode") != mode or baseline.get("settings", {}).get("concurrency") != args.concurrency:
+            print(f"Note: baseline was run with mode={baseline.get('mode')} concurrency={baseline.get('settings', {}).get('concurrency')}")
+        regressions = compare(summary, baseline.get("summary", {}), args.max_regression)
+        if regressions:
+            print(f"\nRegressions beyond {args.max_regression:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.max_regression:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
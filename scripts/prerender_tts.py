@@ -0,0 +1,67 @@
+# Deploy step: synthesizes every fixed IVR prompt and all crop-calendar advice for each supported
+# language into the TTS asset cache (src/core/tts_cache.py), so calls never wait on TTS for them.
+# Already rendered segments are skipped; re-run after editing prompts/calendars or bumping TTS_VOICE_VERSION.
+# Usage: python scripts/prerender_tts.py [--languages hi-IN,en-IN,mr-IN] [--workers 8] [--dry-run]
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.app import create_app # noqa: E402
+from src.config import config # noqa: E402
+from src.core import advisory, language, prompts # noqa: E402
+from src.core.tts_cache import get_tts_cache, segment_text # noqa: E402
+
+
+def static_texts(lang):
+    """Every fixed text the IVR has in `lang` (untranslated prompts and Hindi advice are rendered under hi-IN only)."""
+    texts = prompts.all_prompts(lang)
+    if lang == "hi-IN": # Crop-calendar advice is Hindi only (advisory.compose_advice)
+        texts += advisory.static_advice_texts()
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render TTS audio for static prompts and crop-calendar advice.")
+    parser.add_argument("--languages", default=",".join(config.SUPPORTED_LANGUAGES), help="Comma-separated language codes")
+    parser.add_argument("--voice-gender", default="FEMALE")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent TTS requests")
+    parser.add_argument("--dry-run", action="store_true", help="Only count segments that would be synthesized")
+    args = parser.parse_args()
+
+    app = create_app()
+    cache = get_tts_cache()
+    started = time.perf_counter()
+
+    with app.app_context():
+        jobs = []
+        for lang in [code.strip() for code in args.languages.split(",") if code.strip()]:
+            segments = dict.fromkeys(segment for text in static_texts(lang) for segment in segment_text(text))
+            missing = [segment for segment in segments if cache.lookup(segment, lang, args.voice_gender) is None]
+            print(f"{lang}: {len(segments)} segments, {len(missing)} to synthesize")
+            jobs.extend((segment, lang) for segment in missing)
+
+        if args.dry_run or not jobs:
+            return
+
+        def render(job):
+            segment, lang = job
+            with app.app_context():
+                # Goes through the cache, so segments another process rendered meanwhile are skipped
+                return language.text_to_speech(segment, language_code=lang, voice_gender=args.voice_gender) is not None
+
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+            results = list(executor.map(render, jobs))
+
+    failed = results.count(False)
+    print(f"Synthesized {len(results) - failed} segments in {time.perf_counter() - started:.1f}s into {cache.directory}"
+          + (f", {failed} failed" if failed else ""))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# Startup profile: where worker cold-start time and memory go.
+# Runs create_app() (and optionally warm_up()) in a fresh interpreter with `python -X importtime`,
+# then reports the slowest imports (cumulative and self time), import time per top-level package,
+# the time of each startup step and the process's peak RSS.
+# Usage: python scripts/profile_startup.py [--top 20] [--warm-up] [--output report.json]
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Runs in the child interpreter; prints one JSON line with step timings and RSS
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+from src.app import create_app, warm_up
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+steps = {"import src.app": imported - started, "create_app()": created - imported}
+rss = {"after create_app": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+if "--warm-up" in sys.argv:
+    timings = warm_up(app)
+    steps["warm_up()"] = time.perf_counter() - created
+    steps.update({"  " + name: seconds for name, seconds in timings.items()})
+    rss["after warm_up"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"steps": steps, "max_rss_kb": rss}))
+"""
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from `-X importtime` output, in import order."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue # Header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile app startup: import times, startup steps, RSS.")
+    parser.add_argument("--top", type=int, default=20, help="Imports to list")
+    parser.add_argument("--warm-up", action="store_true", help="Also run warm_up() (what the Gunicorn master does)")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    command = [sys.executable, "-X", "importtime", "-c", CHILD] + (["--warm-up"] if args.warm_up else [])
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    report_line = next((line for line in reversed(result.stdout.splitlines()) if line.startswith("{")), None)
+    if result.returncode != 0 or report_line is None:
+        print(result.stderr[-2000:])
+        sys.exit(result.returncode or 1)
+    report = json.loads(report_line)
+    imports = parse_importtime(result.stderr)
+
+    packages = {}
+    for name, self_us, _, _ in imports:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    total_us = sum(self_us for _, self_us, _, _ in imports)
+
+    print(f"{len(imports)} modules imported in {total_us / 1000:.1f} ms (self time total)")
+    print("\nStartup steps:")
+    for step, seconds in report["steps"].items():
+        print(f"  {seconds * 1000:9.1f} ms  {step}")
+    print("\nPeak RSS:")
+    for stage, kb in report["max_rss_kb"].items():
+        print(f"  {kb / 1024:9.1f} MB  {stage}")
+    print(f"\nSlowest imports (cumulative, top {args.top}):")
+    for name, _, cumulative_us, depth in sorted(imports, key=lambda item: -item[2])[:args.top]:
+        print(f"  {cumulative_us / 1000:9.1f} ms  {'  ' * min(depth, 6)}{name}")
+    print(f"\nSlowest imports (self, top {args.top}):")
+    for name, self_us, _, _ in sorted(imports, key=lambda item: -item[1])[:args.top]:
+        print(f"  {self_us / 1000:9.1f} ms  {name}")
+    print("\nImport time per package:")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {self_us / 1000:9.1f} ms  {package}")
+    src_modules = [name for name, _, _, _ in imports if name.startswith("src.")]
+    print(f"\nApplication modules imported: {len(src_modules)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({**report, "imports": [{"module": name, "self_us": self_us, "cumulative_us": cumulative_us}
+                                             for name, self_us, cumulative_us, _ in imports],
+                       "packages_us": packages}, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
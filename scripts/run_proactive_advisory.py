@@ -0,0 +1,50 @@
+# Morning job: computes today's crop advice for every registered farmer group, queues the SMS/WhatsApp/IVR
+# pushes and writes the daily advisory table that get_crop_advice serves inbound calls from
+# (hot-reloaded by running workers). The pushes are delivered by the web workers' outbound dispatchers.
+# Re-running on the same day re-writes the table but queues nothing twice (per-day idempotency keys).
+# Usage: python scripts/run_proactive_advisory.py [--output PATH] [--dry-run]
+# Cron example: 0 6 * * *  cd /srv/krishi-saathi && python scripts/run_proactive_advisory.py
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.app import create_app # noqa: E402
+from src.config import config # noqa: E402
+from src.core.proactive_advisory import run_batch # noqa: E402
+from src.database.context_store import get_context_store # noqa: E402
+from src.integrations import message_queue # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute today's advice per farmer group and queue proactive pushes.")
+    parser.add_argument("--output", default=config.ADVISORY_TABLE_PATH, help="Daily advisory table (.json)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Farmers read from the context store per query")
+    parser.add_argument("--dry-run", action="store_true", help="Compute groups and print stats, queue and write nothing")
+    args = parser.parse_args()
+
+    app = create_app()
+    started = time.perf_counter()
+    with app.app_context():
+        store = get_context_store()
+        store.flush() # Include context updates still buffered by this process
+        table, stats = run_batch(store, enqueue=None if args.dry_run else message_queue.enqueue_many,
+                                 batch_size=args.batch_size)
+    elapsed = time.perf_counter() - started
+
+    print(f"{stats['farmers']} farmers in {stats['groups']} groups ({stats['calendars']} calendars, "
+          f"{stats['locations']} locations) in {elapsed:.2f}s; skipped: {stats['skipped']}")
+    if args.dry_run:
+        return
+
+    # Write next to the target and rename, so workers never load a half-written file
+    temporary_path = args.output + ".tmp"
+    table.save(temporary_path)
+    os.replace(temporary_path, args.output)
+    print(f"Queued {stats['queued']} pushes, wrote {len(table)} groups to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
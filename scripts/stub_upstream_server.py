@@ -0,0 +1,169 @@
+# Local stub for upstream HTTP APIs (OpenWeatherMap One Call, IVR recordings, WhatsApp media).
+# Used to exercise src/integrations/http_client.py (timeouts, retries, circuit breaker) without
+# real credentials or network access.
+#
+# Usage:
+#   python scripts/stub_upstream_server.py --port 8089 [--latency-ms 50] [--fail-rate 0.2] [--hang-rate 0.0]
+#   OPENWEATHERMAP_BASE_URL=http://127.0.0.1:8089 OPENWEATHERMAP_API_KEY=stub python src/app.py
+#
+# Endpoints:
+#   GET /data/2.5/onecall?lat=..&lon=..   -> One Call style JSON with 7 daily entries
+#   GET /audio/<name>                      -> fake audio bytes (size via ?bytes=N; ?rate=B sends B bytes/s, like a live recording)
+#   GET /media/<name>                      -> fake image bytes (size via ?bytes=N)
+#   GET /media/<name>.jpg                  -> a real JPEG (deterministic per name; needs Pillow)
+#   GET /stats                             -> request counters of this stub
+import argparse
+import io
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+
+_stats = {"requests": 0, "failures": 0, "hangs": 0}
+_stats_lock = threading.Lock()
+_jpegs = {}
+
+
+def _count(field):
+    with _stats_lock:
+        _stats[field] += 1
+
+
+def onecall_payload(lat, lon, days=7):
+    """Deterministic per location so repeated calls are comparable."""
+    rng = random.Random(f"{lat:.2f},{lon:.2f},{time.strftime('%Y-%m-%d')}")
+    start = int(time.time()) // 86400 * 86400
+    daily = []
+    for i in range(days):
+        t_min = rng.uniform(14, 26)
+        pop = rng.choice([0.0, 0.1, 0.2, 0.4, 0.6, 0.8])
+        daily.append({
+            "dt": start + i * 86400,
+            "temp": {"min": round(t_min, 1), "max": round(t_min + rng.uniform(5, 12), 1)},
+            "humidity": rng.randint(30, 95),
+            "wind_speed": round(rng.uniform(0.5, 8.0), 1),
+            "pop": pop,
+            "rain": round(pop * rng.uniform(0, 30), 1) if pop >= 0.4 else 0,
+            "weather": [{"main": "Rain" if pop >= 0.4 else "Clouds" if pop > 0 else "Clear"}],
+        })
+    return {"lat": lat, "lon": lon, "timezone": "Asia/Kolkata", "daily": daily}
+
+
+def leaf_photo_jpeg(name, size=(800, 600)):
+    """A phone-photo-sized JPEG: green background with random spots, the same for the same name."""
+    if name not in _jpegs:
+        rng = random.Random(name)
+        image = Image.new("RGB", size, (rng.randint(30, 80), rng.randint(110, 170), rng.randint(30, 70)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(rng.randint(20, 60)):
+            x, y, r = rng.randrange(size[0]), rng.randrange(size[1]), rng.randint(3, 25)
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=(rng.randint(150, 240), rng.randint(120, 200), rng.randint(20, 90)))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=82)
+        _jpegs[name] = buffer.getvalue()
+    return _jpegs[name]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so connection reuse by the client is visible
+    disable_nagle_algorithm = True # Headers and body are separate writes; avoid delayed-ACK stalls
+    options = None
+
+    def log_message(self, format, *args):
+        if self.options.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass # Client gave up (e.g., read timeout while we were "hanging")
+
+    def _send_paced(self, body, content_type, bytes_per_second, piece=4000):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            for offset in range(0, len(body), piece):
+                self.wfile.write(body[offset:offset + piece])
+                self.wfile.flush()
+                time.sleep(piece / bytes_per_second)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/stats":
+            with _stats_lock:
+                return self._send(200, json.dumps(_stats).encode())
+
+        _count("requests")
+        if self.options.latency_ms:
+            time.sleep(self.options.latency_ms / 1000.0)
+        if random.random() < self.options.hang_rate:
+            _count("hangs")
+            time.sleep(self.options.hang_seconds) # Simulates a hung upstream (client read timeout)
+        if random.random() < self.options.fail_rate:
+            _count("failures")
+            return self._send(503, b'{"error": "stub failure"}')
+
+        if url.path == "/data/2.5/onecall":
+            lat = float(query.get("lat", ["25.45"])[0])
+            lon = float(query.get("lon", ["78.57"])[0])
+            return self._send(200, json.dumps(onecall_payload(lat, lon)).encode())
+        if url.path.startswith("/media/") and url.path.endswith(".jpg") and Image is not None:
+            return self._send(200, leaf_photo_jpeg(url.path), "image/jpeg")
+        if url.path.startswith("/audio/") or url.path.startswith("/media/"):
+            size = int(query.get("bytes", ["32000"])[0])
+            content_type = "audio/wav" if url.path.startswith("/audio/") else "image/jpeg"
+            rate = float(query.get("rate", ["0"])[0])
+            if rate > 0:
+                return self._send_paced(os.urandom(min(size, 5_000_000)), content_type, rate)
+            return self._send(200, os.urandom(min(size, 5_000_000)), content_type)
+        self._send(404, b'{"error": "not found"}')
+
+
+def serve(port=8089, latency_ms=0, fail_rate=0.0, hang_rate=0.0, hang_seconds=30.0, verbose=False):
+    """Starts the stub in a background thread and returns the server (call .shutdown() to stop)."""
+    options = argparse.Namespace(latency_ms=latency_ms, fail_rate=fail_rate, hang_rate=hang_rate,
+                                 hang_seconds=hang_seconds, verbose=verbose)
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"options": options})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub for upstream HTTP APIs.")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that hang")
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    server = serve(args.port, args.latency_ms, args.fail_rate, args.hang_rate, args.hang_seconds, args.verbose)
+    print(f"Stub upstream listening on http://127.0.0.1:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
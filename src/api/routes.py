@@ -1,53 +1,224 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, abort, g, request, jsonify, current_app, send_from_directory
 import datetime
 import requests # Needed for fetching media in WhatsApp simulation
 from src.config import config # Use Flask's current_app.config instead? Usually better.
-from src.core import language, advisory, disease_detection, finance, market, weather
-from src.integrations import telephony
+from src.core import language, dialog, finance
+from src.core.prompts import get_prompt
+from src.core.tts_cache import ASSET_NAME_PATTERN, get_tts_cache
+from src.integrations import http_client, message_queue
+from src.database.context_store import get_context_store
+from src.database.farmer_roster import normalize_phone
+from src.utils.cache import get_response_cache
+from src.utils import helpers
+from src.utils.fanout import FanOut, prefetch
+from src.utils import tracing
+from src.utils.admission import RETRY_AFTER_SECONDS, get_admission_controller, queue_seconds
+from src.utils.lazy import lazy_module
+from src.utils.webhook_dedup import deduplicated_webhook, get_webhook_deduplicator, ivr_call_key, ivr_request_key, whatsapp_request_key
+
+# NumPy-backed subsystems (indexes, models, gridded stores) are imported on first use so that
+# workers start fast; src.app.warm_up() loads them before Gunicorn forks (gunicorn.conf.py)
+advisory = lazy_module("src.core.advisory")
+disease_detection = lazy_module("src.core.disease_detection")
+image_cache = lazy_module("src.core.image_cache")
+market = lazy_module("src.core.market")
+weather = lazy_module("src.core.weather")
 
 api_bp = Blueprint('api', __name__)
 
-# --- !! TEMPORARY IN-MEMORY DATABASE FOR CONTEXT !! ---
-# --- !! REPLACE THIS WITH A REAL DATABASE (PostgreSQL/MySQL) !! ---
-farmer_context_db = {}
-# Example structure:
-# farmer_context_db = {
-#    "+15551234567": { "id": "+15551234567", "language": "hi-IN", "location": "Bundelkhand", ... },
-#    "whatsapp:+15559876543": { "id": "whatsapp:+15559876543", "language": "en-IN", ... }
-# }
+# --- Farmer Context ---
+# Contexts live in a persistent store (SQLite via config.DATABASE_URL) behind an
+# in-process LRU cache. See src/database/context_store.py.
+# Example structure of a stored context:
+#    { "id": "+919876543210", "language": "hi-IN", "location": "Bundelkhand", ... }
+# Indian mobile numbers are stored as "+91XXXXXXXXXX", the format of imported rosters
+# (src/database/farmer_roster.py), whichever way the IVR or WhatsApp webhook writes them.
+
+def _farmer_id(caller_id):
+    """Context key for a caller id as sent ('09876543210', 'whatsapp:+919876543210', ...)."""
+    return normalize_phone(caller_id) or caller_id
+
+def _new_farmer_context(caller_id):
+    """Initial context for a first-time caller."""
+    # Derive initial context (e.g., default language, maybe guess location later)
+    return {
+        "id": caller_id,
+        "language": config.DEFAULT_LANGUAGE, # Use config directly or app.config
+        "location": "Unknown", # Should be derived (e.g., from area code) or asked
+        "current_crop": "गेहूं", # Example default, should be dynamic or asked
+        "land_size_acres": 2.0, # Example default
+        "sowing_date": None, # Important for advisory! Needs to be set.
+        "last_interaction_time": datetime.datetime.now(),
+        "last_query": None,
+    }
 
 def get_farmer_context(caller_id):
     """Retrieves or creates context for a farmer."""
     # Use Flask logger
     logger = current_app.logger
-    if caller_id not in farmer_context_db:
-        logger.info(f"Creating new context for caller: {caller_id}")
-        # Derive initial context (e.g., default language, maybe guess location later)
-        farmer_context_db[caller_id] = {
-            "id": caller_id,
-            "language": config.DEFAULT_LANGUAGE, # Use config directly or app.config
-            "location": "Unknown", # Should be derived (e.g., from area code) or asked
-            "current_crop": "गेहूं", # Example default, should be dynamic or asked
-            "land_size_acres": 2.0, # Example default
-            "sowing_date": None, # Important for advisory! Needs to be set.
-            "last_interaction_time": datetime.datetime.now(),
-            "last_query": None,
-        }
-    else:
-         # Update interaction time on access
-         farmer_context_db[caller_id]["last_interaction_time"] = datetime.datetime.now()
-
-    return farmer_context_db[caller_id]
+    store = get_context_store()
+    farmer_id = _farmer_id(caller_id)
+
+    def new_context(farmer_id):
+        # Contexts created before caller ids were normalized are still keyed by the id as sent:
+        # the first call under the new key takes that context over instead of starting afresh
+        legacy = store.get(caller_id) if caller_id != farmer_id else None
+        if legacy is not None:
+            logger.info(f"Moving context of {caller_id} to {farmer_id}")
+            return {**legacy, "id": farmer_id}
+        logger.info(f"Creating new context for caller: {farmer_id}")
+        return _new_farmer_context(farmer_id)
+
+    farmer_context, created = store.get_or_create(farmer_id, new_context)
+    if not created:
+        # Update interaction time on access (buffered, written in batches)
+        store.update(farmer_id, {"last_interaction_time": datetime.datetime.now()})
+
+    return farmer_context
 
 def update_farmer_context(caller_id, updates):
     """Updates farmer context."""
     logger = current_app.logger
-    if caller_id in farmer_context_db:
+    caller_id = _farmer_id(caller_id)
+    if get_context_store().update(caller_id, updates):
         logger.debug(f"Updating context for {caller_id}: {updates}")
-        farmer_context_db[caller_id].update(updates)
     else:
         logger.warning(f"Attempted to update context for non-existent caller: {caller_id}")
 
+# --- Speech Output ---
+
+def _audio_url(asset_name):
+    base_url = config.TTS_AUDIO_BASE_URL or request.host_url.rstrip('/') + '/api/tts'
+    return f"{base_url.rstrip('/')}/{asset_name}"
+
+def _query_callback_url():
+    """
+    URL the IVR posts the caller's next answer to. Numbers the turns of a call so that a repeated
+    answer in a later turn is not mistaken for a retry of this one (src/utils/webhook_dedup.py).
+    """
+    turn = request.args.get('turn', 0, type=int) + 1
+    return f"{request.host_url.rstrip('/')}/api/ivr/handle-query?turn={turn}"
+
+def _speech_payload(text, lang, **extra):
+    """
+    IVR payload for speaking `text`: the text itself plus, if the TTS asset cache is enabled and
+    every segment is already synthesized, `audio_urls` (segments to play in order). Missing
+    segments are synthesized in the background, not while the caller waits; until then, and for
+    IVRs that can't play audio lists, the provider speaks `text_to_speak` with its own TTS.
+    """
+    payload = {"text_to_speak": text, "language": lang, **extra}
+    if config.TTS_CACHE_ENABLED:
+        assets = language.text_to_speech(text, language_code=lang, wait=False)
+        if assets:
+            payload["audio_urls"] = [_audio_url(name) for name in assets]
+    return payload
+
+# --- Early Lookups ---
+
+def _prefetch_for_intent(intent_data, farmer_context):
+    """
+    Called when partial transcripts settle on an intent while the caller is still speaking:
+    starts the (cached) lookup that intent will need, so the handler finds it ready.
+    """
+    entities = intent_data.get("entities", {})
+    crop = entities.get("crop", farmer_context.get("current_crop", "गेहूं"))
+    location = farmer_context.get("location", "Bundelkhand")
+    intent = intent_data.get("intent")
+    if intent == "MARKET_PRICE_QUERY":
+        prefetch(market.get_market_prices, crop, location)
+    elif intent == "WEATHER_QUERY":
+        prefetch(weather.get_weather_forecast, location)
+    elif intent == "FINANCE_INSURANCE_QUERY":
+        prefetch(finance.get_insurance_info, crop, location)
+
+# --- Tracing / Metrics ---
+
+@api_bp.before_request
+def _start_trace():
+    if request.endpoint != 'api.metrics':
+        tracing.start_trace(request.endpoint or request.path)
+
+@api_bp.after_request
+def _finish_trace(response):
+    tracing.finish_trace(response.status_code)
+    return response
+
+def _collect_subsystem_metrics():
+    """Scrape-time metrics from the response cache, upstream clients, outbound queue, context store, TTS cache, webhook dedup and admission control."""
+    cache_sources = get_response_cache().stats()["sources"]
+    for field in ("hits", "disk_hits", "misses", "coalesced", "errors"):
+        yield (f"krishi_cache_{field}_total", "counter", f"Response cache {field.replace('_', ' ')} by source.",
+               [({"source": source}, counts[field]) for source, counts in cache_sources.items()])
+    upstreams = http_client.upstream_stats()
+    for field in ("requests", "failures", "retries", "short_circuited"):
+        yield (f"krishi_upstream_{field}_total", "counter", f"Upstream HTTP {field.replace('_', ' ')} by host.",
+               [({"upstream": host}, stats[field]) for host, stats in upstreams.items()])
+    yield ("krishi_upstream_circuit_open", "gauge", "1 while the upstream's circuit breaker is not closed.",
+           [({"upstream": host}, int(stats["circuit"] != "closed")) for host, stats in upstreams.items()])
+    yield ("krishi_outbound_messages", "gauge", "Outbound messages in the spool by channel and status.",
+           [({"channel": channel, "status": status}, count)
+            for channel, statuses in message_queue.queue_stats().items() for status, count in statuses.items()])
+    tts_stats = get_tts_cache().stats()
+    yield ("krishi_tts_segments_total", "counter", "Spoken segments served from the TTS asset cache (hit) or synthesized (miss/failure).",
+           [({"result": field}, tts_stats[field]) for field in ("hits", "misses", "failures")])
+    yield ("krishi_context_cache_entries", "gauge", "Farmer contexts cached in this worker.",
+           [({}, get_context_store().cache_size())])
+    yield ("krishi_dialog_sessions", "gauge", "Calls waiting for an answer to a follow-up question (all workers on the host if shared).",
+           [({}, len(dialog.get_dialog_manager().sessions))])
+    admission = get_admission_controller().stats()
+    yield ("krishi_admission_shed_total", "counter", "Webhook requests turned away by admission control, by reason.",
+           [({"reason": reason}, count) for reason, count in admission["shed"].items()])
+    yield ("krishi_admission_in_flight", "gauge", "Admitted webhook requests in progress in this worker.",
+           [({}, admission["in_flight"])])
+    webhooks = get_webhook_deduplicator().stats()["webhooks"]
+    yield ("krishi_webhook_requests_total", "counter", "Keyed webhook requests processed (computed) or answered with an earlier response (replayed/coalesced).",
+           [({"endpoint": name, "result": outcome}, count) for name, counts in webhooks.items() for outcome, count in counts.items()])
+
+tracing.register_collector(_collect_subsystem_metrics)
+
+# --- Admission Control ---
+# Webhooks are rate limited per caller and per district and shed when this worker is saturated
+# (src/utils/admission.py). Registered after _start_trace, so turned-away requests are traced too.
+
+ADMISSION_ENDPOINTS = {'api.ivr_welcome': 'ivr', 'api.handle_query': 'ivr', 'api.handle_whatsapp_message': 'whatsapp'}
+
+def _request_caller_id():
+    # The key the handlers keep the farmer's context under, so IVR and WhatsApp share one limit
+    fields = (request.get_json(silent=True) or {}) if request.is_json else request.form
+    caller_id = fields.get('caller_id') or fields.get('sender_id') or fields.get('From')
+    return _farmer_id(caller_id) if caller_id else None
+
+def _call_back_later_payload(lang):
+    # Pre-rendered prompt (scripts/prerender_tts.py): shedding only looks up its audio, and never
+    # waits for synthesis if the prompt has not been rendered yet
+    return {"action": "SPEAK_AND_HANGUP", "payload": _speech_payload(get_prompt("call_back_later", lang), lang)}
+
+@api_bp.before_request
+def _admit_request():
+    kind = ADMISSION_ENDPOINTS.get(request.endpoint)
+    if kind is None or not config.ADMISSION_CONTROL_ENABLED:
+        return None
+    caller_id = _request_caller_id()
+    farmer_context = get_context_store().get(caller_id) if caller_id else None # Loaded for the handler anyway
+    district = (farmer_context or {}).get('location')
+    reason = get_admission_controller().admit(
+        caller_id, district if district != "Unknown" else None, queue_seconds(request.headers.get('X-Request-Start')))
+    if reason is None:
+        g.admitted = True
+        return None
+    tracing.annotate(intent="SHED")
+    current_app.logger.info(f"Turned away {request.endpoint} from {caller_id} ({district}): {reason}")
+    if kind == 'ivr':
+        lang = (farmer_context or {}).get('language', config.DEFAULT_LANGUAGE)
+        return jsonify(_call_back_later_payload(lang))
+    status = 429 if reason.endswith('_rate') else 503
+    return jsonify({"status": "busy", "reason": reason}), status, {"Retry-After": str(RETRY_AFTER_SECONDS[reason])}
+
+@api_bp.teardown_request
+def _release_admission(exc):
+    if g.pop('admitted', False):
+        get_admission_controller().release()
+
 # --- API Endpoints ---
 
 @api_bp.route('/health', methods=['GET'])
@@ -55,7 +226,43 @@ def health_check():
     """Basic health check endpoint."""
     return jsonify({"status": "ok", "timestamp": datetime.datetime.utcnow().isoformat()}), 200
 
+@api_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters of the shared response cache, the disease image and TTS asset caches and the webhook dedup store, for monitoring."""
+    return jsonify({**get_response_cache().stats(), "disease_images": image_cache.get_image_cache().stats(),
+                    "tts_assets": get_tts_cache().stats(), "webhooks": get_webhook_deduplicator().stats()}), 200
+
+@api_bp.route('/upstream/stats', methods=['GET'])
+def upstream_stats():
+    """Per-upstream latency, error and circuit breaker state, for monitoring."""
+    return jsonify(http_client.upstream_stats()), 200
+
+@api_bp.route('/outbound/stats', methods=['GET'])
+def outbound_stats():
+    """Outbound SMS/WhatsApp queue depth by channel and status (pending/sending/sent/dead)."""
+    return jsonify(message_queue.queue_stats()), 200
+
+@api_bp.route('/admission/stats', methods=['GET'])
+def admission_stats():
+    """Admitted and turned-away webhook requests (by reason) and in-flight requests of this worker."""
+    return jsonify(get_admission_controller().stats()), 200
+
+@api_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Latency histograms and counters in Prometheus text format (per worker process)."""
+    return Response(tracing.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@api_bp.route('/tts/<name>', methods=['GET'])
+def tts_audio(name):
+    """Serves a cached TTS asset. Names are content hashes, so responses are cacheable forever."""
+    if not ASSET_NAME_PATTERN.match(name):
+        abort(404)
+    response = send_from_directory(get_tts_cache().directory, f"{name[:2]}/{name}", max_age=31536000)
+    response.cache_control.immutable = True
+    return response
+
 @api_bp.route('/ivr/welcome', methods=['POST'])
+@deduplicated_webhook('ivr_welcome', ivr_call_key)
 def ivr_welcome():
     """
     Endpoint for IVR systems (Twilio/Exotel) when a farmer calls.
@@ -83,21 +290,20 @@ def ivr_welcome():
         lang = farmer_context.get('language', config.DEFAULT_LANGUAGE)
 
         # --- Prepare Welcome Message ---
-        # TODO: Select message based on language (lang)
-        welcome_message = "कृषि साथी में आपका स्वागत है। आप क्या जानना चाहते हैं? फसल सलाह, मंडी भाव, या कुछ और?"
+        welcome_message = get_prompt("welcome", lang)
 
         # --- Generate IVR Response ---
         # This needs to be formatted EXACTLY as your IVR provider expects.
         # Example Simulation (Generic JSON describing action):
         ivr_response = {
             "action": "SPEAK_AND_LISTEN", # Tell IVR to say something and wait for speech
-            "payload": {
-                "text_to_speak": welcome_message,
-                "language": lang, # e.g., 'hi-IN', 'en-IN'
+            "payload": _speech_payload(
+                welcome_message,
+                lang, # e.g., 'hi-IN', 'en-IN'
                  # URL on *this* server that the IVR should call back with the speech result
-                "callback_url": request.host_url.rstrip('/') + '/api/ivr/handle-query',
-                "speech_timeout": 5 # seconds to wait for speech
-            }
+                callback_url=_query_callback_url(),
+                speech_timeout=5 # seconds to wait for speech
+            )
         }
         # For Twilio, you'd generate TwiML instead using the twilio library:
         # from twilio.twiml.voice_response import VoiceResponse, Gather
@@ -116,12 +322,13 @@ def ivr_welcome():
         # Generic error response for IVR
         error_response = {
             "action": "SPEAK_AND_HANGUP",
-            "payload": {"text_to_speak": "क्षमा करें, एक तकनीकी समस्या हुई है। कृपया बाद में कॉल करें।", "language": config.DEFAULT_LANGUAGE}
+            "payload": _speech_payload(get_prompt("technical_error", config.DEFAULT_LANGUAGE), config.DEFAULT_LANGUAGE)
         }
         return jsonify(error_response), 500
 
 
 @api_bp.route('/ivr/handle-query', methods=['POST'])
+@deduplicated_webhook('handle_query', ivr_request_key)
 def handle_query():
     """
     Endpoint called by IVR after capturing farmer's speech input.
@@ -138,55 +345,72 @@ def handle_query():
             caller_id = request.json.get('caller_id')
             spoken_text = request.json.get('spoken_text') # Assume STT happened externally or passed for simulation
             audio_url = request.json.get('audio_url') # URL if STT needs to happen here
+            call_sid = request.json.get('call_sid')
         else:
             # Try form data
             caller_id = request.form.get('From', request.form.get('caller_id'))
             spoken_text = request.form.get('SpeechResult', request.form.get('spoken_text'))
             audio_url = request.form.get('RecordingUrl', request.form.get('audio_url'))
+            call_sid = request.form.get('CallSid', request.form.get('call_sid'))
 
         if not caller_id:
             logger.error("IVR Handle Query: Missing caller_id.")
             return jsonify({"error": "Missing caller_id"}), 400
 
-        logger.info(f"IVR Query received from: {caller_id}")
-        farmer_context = get_farmer_context(caller_id)
+        # Per-step details are in the request trace (see src/utils/tracing.py), not logged every time
+        with tracing.span("context.get_farmer_context"):
+            farmer_context = get_farmer_context(caller_id)
         lang = farmer_context.get('language', config.DEFAULT_LANGUAGE)
 
         # --- Perform Speech-to-Text (if needed) ---
+        # The recording is streamed into STT chunk by chunk and NLU runs on the partial transcripts,
+        # so by the time the recording ends the intent is known and its lookups may already be running
+        prefetch_lookups = (lambda result: _prefetch_for_intent(result, farmer_context)) if config.STT_PREFETCH_ENABLED else None
+        understanding = language.IncrementalUnderstanding(lang, on_stable_intent=prefetch_lookups)
         if not spoken_text and audio_url:
-            logger.info(f"Performing STT for audio URL: {audio_url}")
-            # !! REPLACE WITH ACTUAL STT CALL !!
-            # audio_data = download_audio(audio_url) # Helper function needed
-            spoken_text = language.speech_to_text(f"simulated_audio_from_{audio_url}", language_code=lang)
-            logger.info(f"STT Result for {caller_id}: '{spoken_text}'")
+            try:
+                spoken_text = language.speech_to_text_stream(helpers.stream_audio(audio_url), language_code=lang,
+                                                             reference=audio_url, on_partial=understanding.update)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Failed to stream recording {audio_url} for {caller_id}: {e}")
+                spoken_text = None
 
         if not spoken_text:
             logger.warning(f"No speech input received or STT failed for {caller_id}.")
-            response_text = "मुझे आपकी बात समझ नहीं आई। कृपया फिर से कहें।" # TODO: Localize
-            ivr_response = {"action": "SPEAK_AND_LISTEN", "payload": {"text_to_speak": response_text, "language": lang, "callback_url": request.host_url.rstrip('/') + '/api/ivr/handle-query'}}
+            response_text = get_prompt("not_understood", lang)
+            ivr_response = {"action": "SPEAK_AND_LISTEN", "payload": _speech_payload(response_text, lang, callback_url=_query_callback_url())}
             return jsonify(ivr_response)
 
         update_farmer_context(caller_id, {"last_query": spoken_text})
-        logger.info(f"Farmer {caller_id} asked: '{spoken_text}'")
 
         # --- Understand Intent and Entities ---
         # !! REPLACE WITH ACTUAL NLU CALL !!
-        intent_data = language.understand_intent(spoken_text, language_code=lang)
-        intent = intent_data.get("intent", "UNKNOWN")
-        entities = intent_data.get("entities", {})
-        logger.info(f"NLU Result for '{spoken_text}': Intent={intent}, Entities={entities}")
+        intent_data = understanding.final(spoken_text)
+
+        # --- Multi-turn Slot Filling ---
+        # Missing details (location, sowing date, quantity) are asked for within the same call;
+        # an answer to such a question resumes the stored flow (src/core/dialog.py)
+        step = dialog.get_dialog_manager().advance(call_sid, spoken_text, intent_data, farmer_context, lang)
+        if step.prompt:
+            tracing.annotate(intent=f"ASK_{step.slot.upper()}")
+            callback_url = _query_callback_url()
+            return jsonify({"action": "SPEAK_AND_LISTEN", "payload": _speech_payload(step.prompt, lang, callback_url=callback_url)})
+        if step.context_updates:
+            update_farmer_context(caller_id, step.context_updates)
+            farmer_context = {**farmer_context, **step.context_updates}
+        intent = step.intent
+        entities = step.entities
+        tracing.annotate(intent=intent)
 
         # --- Get Context Variables ---
         # Try to get crop from entities, fallback to context, fallback to default
         crop = entities.get("crop", farmer_context.get("current_crop", "गेहूं"))
-        # Ensure location is set, prompt if unknown (more advanced IVR flow needed)
-        location = farmer_context.get("location", "Bundelkhand") # Default if unknown
+        location = step.values.get("location") or farmer_context.get("location", "Bundelkhand")
         if location == "Unknown":
              logger.warning(f"Location unknown for farmer {caller_id}. Using default.")
-             # TODO: Add logic to ask for location if unknown in a real system
 
         # --- Route to Core Logic Based on Intent ---
-        response_text = "माफ़ कीजिए, मैं अभी इस बारे में सहायता नहीं कर सकता।" # Default response (TODO: Localize)
+        response_text = get_prompt("cannot_help", lang) # Default response
 
         try:
             if intent in ["CROP_ADVISORY_WATER", "CROP_ADVISORY_FERTILIZER", "CROP_ADVISORY_GENERAL"]:
@@ -197,7 +421,7 @@ def handle_query():
                 symptom_text = entities.get("symptoms", spoken_text) # Extract specific symptoms if possible
                 diagnosis_result = disease_detection.diagnose_from_symptoms(symptom_text, crop, location)
                 response_text = diagnosis_result.get("diagnosis", response_text) + " " + diagnosis_result.get("advice", "")
-                response_text += " सटीक निदान के लिए, आप व्हाट्सएप पर फसल की फोटो भेज सकते हैं।" # TODO: Localize
+                response_text += " " + get_prompt("photo_hint", lang)
             elif intent == "FINANCE_LOAN_REQUEST":
                 eligibility_result = finance.check_loan_eligibility(farmer_context) # Pass farmer data
                 response_text = eligibility_result.get("message", response_text) # Expecting dict
@@ -205,19 +429,26 @@ def handle_query():
                  insurance_info = finance.get_insurance_info(crop, location)
                  response_text = insurance_info.get("info", response_text)
             elif intent == "MARKET_PRICE_QUERY":
-                prices_result = market.get_market_prices(crop, location)
-                forecast_result = market.get_price_forecast(crop, location)
-                response_text = prices_result.get("prices_text", "भाव उपलब्ध नहीं।") + " " + forecast_result.get("forecast_text", "")
+                # Prices and forecast are independent: fetch both concurrently within the IVR's time budget.
+                # If one misses its deadline the farmer still hears the other.
+                lookups = (FanOut()
+                           .add("prices", market.get_market_prices, crop, location, fallback={})
+                           .add("forecast", market.get_price_forecast, crop, location, fallback={})
+                           .run())
+                response_text = lookups["prices"].get("prices_text", "भाव उपलब्ध नहीं।") + " " + lookups["forecast"].get("forecast_text", "")
             elif intent == "MARKET_LINKAGE_REQUEST":
-                # Assume quantity from context or ask in a multi-turn convo
-                quantity = farmer_context.get('typical_yield_quintals', 10) # Example default
+                # Quantity asked in the dialog flow; falls back to the farmer's typical yield
+                quantity = step.values.get("quantity") or farmer_context.get('typical_yield_quintals', 10)
+                quantity = int(quantity) if float(quantity).is_integer() else quantity
                 buyer_result = market.find_buyers(crop, location, quantity)
                 response_text = buyer_result.get("message", response_text)
                 if buyer_result.get("contact"):
-                    # !! REPLACE WITH ACTUAL SMS SENDING !!
                     sms_text = f"कृषि साथी: {crop} खरीदार - {buyer_result.get('name')}, संपर्क: {buyer_result.get('contact')}"
-                    telephony.send_sms(farmer_context['id'], sms_text) # Send contact via SMS
-                    response_text += " खरीदार का संपर्क विवरण आपके मोबाइल पर SMS कर दिया गया है।" # TODO: Localize
+                    # Queued for background delivery; the CallSid-based key prevents duplicate SMS on webhook retries
+                    sms_scope = f"{call_sid}:buyer_contact" if call_sid else None
+                    sms_key = message_queue.make_idempotency_key("sms", farmer_context['id'], sms_text, scope=sms_scope)
+                    message_queue.enqueue_sms(farmer_context['id'], sms_text, idempotency_key=sms_key) # Send contact via SMS
+                    response_text += " " + get_prompt("buyer_sms_sent", lang)
             elif intent == "WEATHER_QUERY":
                  weather_info = weather.get_weather_forecast(location)
                  response_text = weather_info.get("forecast", response_text)
@@ -227,26 +458,21 @@ def handle_query():
                 response_text = answer.get("answer", response_text)
             else: # Fallback / Unknown Intent
                 logger.warning(f"Unhandled intent '{intent}' for query: '{spoken_text}'")
-                response_text = "आपकी बात पूरी तरह समझ नहीं आई। क्या आप फसल सलाह, मंडी भाव, लोन या मौसम के बारे में पूछ रहे हैं?" # TODO: Localize
+                response_text = get_prompt("unhandled_intent", lang)
 
         except Exception as core_logic_error:
              logger.exception(f"Error during core logic execution for intent {intent}: {core_logic_error}")
-             response_text = "जानकारी प्राप्त करने में एक समस्या हुई है। कृपया बाद में प्रयास करें।" # TODO: Localize
+             response_text = get_prompt("lookup_error", lang)
 
         # --- Generate IVR Response ---
-        # Decide if the conversation ends here or continues
-        # For simplicity, most intents end the call here. Loan/Linkage might need more turns.
-        logger.info(f"Response for {caller_id}: '{response_text}'")
+        # Follow-up questions were asked above (dialog flow); once answered, the call ends here
         ivr_response = {
-            "action": "SPEAK_AND_HANGUP", # Or SPEAK_AND_LISTEN for multi-turn
-            "payload": {
-                "text_to_speak": response_text,
-                "language": lang
-            }
+            "action": "SPEAK_AND_HANGUP",
+            "payload": _speech_payload(response_text, lang)
         }
         # For Twilio TwiML:
         # response = VoiceResponse()
-        # response.say(response_text, language=lang)
+        # response.say(response_text, language=lang) # or response.play(url) for each of payload['audio_urls']
         # response.hangup()
         # return Response(str(response), mimetype='text/xml')
 
@@ -256,12 +482,13 @@ def handle_query():
         logger.exception(f"Error in /ivr/handle-query: {e}")
         error_response = {
             "action": "SPEAK_AND_HANGUP",
-            "payload": {"text_to_speak": "क्षमा करें, आपकी पूछताछ संसाधित करने में कोई त्रुटि हुई।", "language": config.DEFAULT_LANGUAGE}
+            "payload": _speech_payload(get_prompt("query_error", config.DEFAULT_LANGUAGE), config.DEFAULT_LANGUAGE)
         }
         return jsonify(error_response), 500
 
 
 @api_bp.route('/whatsapp/message', methods=['POST'])
+@deduplicated_webhook('handle_whatsapp_message', whatsapp_request_key)
 def handle_whatsapp_message():
     """
     Endpoint to handle incoming WhatsApp messages (e.g., via Twilio WhatsApp API).
@@ -284,6 +511,7 @@ def handle_whatsapp_message():
              return jsonify({"error": "Request must be JSON"}), 400
 
         sender_id = request.json.get('sender_id') # e.g., "whatsapp:+1555..."
+        message_sid = request.json.get('message_sid') # Provider message ID (Twilio: 'MessageSid')
         message_body = request.json.get('message_body')
         media_url = request.json.get('media_url') # URL of the image/video
         media_type = request.json.get('media_type', 'image/jpeg' if media_url else None) # MIME type
@@ -292,8 +520,8 @@ def handle_whatsapp_message():
              logger.error("WhatsApp handler: Missing sender_id.")
              return jsonify({"error": "Missing sender_id"}), 400
 
-        logger.info(f"WhatsApp message received from: {sender_id}")
-        farmer_context = get_farmer_context(sender_id) # Use whatsapp number as ID
+        with tracing.span("context.get_farmer_context"):
+            farmer_context = get_farmer_context(sender_id) # Use whatsapp number as ID
         lang = farmer_context.get('language', config.DEFAULT_LANGUAGE)
         location = farmer_context.get("location", "Unknown")
         crop = farmer_context.get("current_crop", "गेहूं")
@@ -302,16 +530,17 @@ def handle_whatsapp_message():
 
         # --- Handle Image Input ---
         if media_url and media_type and media_type.startswith('image/'):
-            logger.info(f"Received image from {sender_id}: {media_url} ({media_type})")
+            tracing.annotate(intent="DISEASE_IMAGE")
             try:
-                # !! REPLACE WITH ACTUAL IMAGE DOWNLOAD AND PROCESSING !!
-                # response = requests.get(media_url, stream=True, auth=(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)) # Auth might be needed for Twilio media
-                # response.raise_for_status()
-                # image_data = response.content # Read image bytes
-                image_data_placeholder = f"simulated_image_bytes_from_{media_url}"
-
-                # Call disease detection logic
-                diagnosis_result = disease_detection.detect_disease_from_image(image_data_placeholder)
+                if disease_detection.inference_available():
+                    # Download via the pooled upstream client (Twilio media URLs need account auth)
+                    with tracing.span("helpers.download_media"):
+                        image_data = helpers.download_media(media_url)
+                else:
+                    image_data = f"simulated_image_bytes_from_{media_url}" # No model configured: simulation
+
+                # Call disease detection logic (micro-batched with other concurrent images)
+                diagnosis_result = disease_detection.detect_disease_from_image(image_data)
                 response_text = f"{diagnosis_result.get('diagnosis', 'विश्लेषण विफल')}\nसलाह: {diagnosis_result.get('advice', 'कोई सलाह उपलब्ध नहीं।')}" # TODO: Localize
 
             except requests.exceptions.RequestException as req_err:
@@ -323,7 +552,7 @@ def handle_whatsapp_message():
 
         # --- Handle Text Input ---
         elif message_body:
-            logger.info(f"Received text from {sender_id}: '{message_body}'")
+            tracing.annotate(intent="TEXT")
             update_farmer_context(sender_id, {"last_query": message_body})
             # Optional: Handle text queries via WhatsApp too (reuse NLU/intent logic)
             # intent_data = language.understand_intent(message_body, language_code=lang)
@@ -337,9 +566,9 @@ def handle_whatsapp_message():
             # Keep default welcome/instruction message
 
         # --- Send Reply via WhatsApp ---
-        # !! REPLACE WITH ACTUAL WHATSAPP SENDING !!
-        logger.info(f"Sending WhatsApp reply to {sender_id}: '{response_text}'")
-        telephony.send_whatsapp_message(sender_id, response_text)
+        # Queued for background delivery so provider latency isn't added to this webhook
+        reply_key = message_queue.make_idempotency_key("whatsapp", sender_id, response_text, scope=message_sid)
+        message_queue.enqueue_whatsapp(sender_id, response_text, idempotency_key=reply_key)
 
         # Return acknowledgment to the webhook provider (usually an empty 200 OK or specific format)
         return jsonify({"status": "received", "reply_simulated": response_text}), 200
@@ -1,3 +1,6 @@
+import gc
+import importlib
+import time
 from flask import Flask
 from src.api.routes import api_bp
 from src.config import config
@@ -29,10 +32,56 @@ def create_app():
     app.logger.info("Flask app created.")
     app.logger.info(f"Default Language: {app.config.get('DEFAULT_LANGUAGE')}")
     app.logger.info(f"Supported Languages: {app.config.get('SUPPORTED_LANGUAGES')}")
+    missing = config.missing_settings()
+    if missing:
+        app.logger.warning(f"Not configured: {', '.join(missing)} (related features are simulated)")
     # Use app.logger for logging within Flask context after app creation
 
     return app
 
+# Read-only data loaded by warm_up(): (module, accessor). Nothing here may start threads, open
+# sockets or database connections — those must be created in each worker after the fork.
+WARM_UP_LOADERS = (
+    ("src.core.intent_engine", "get_intent_engine"),
+    ("src.core.crop_calendar", "get_crop_calendars"),
+    ("src.core.geo_index", "get_market_directory"),
+    ("src.core.symptom_engine", "get_symptom_engine"),
+    ("src.core.qna", "get_qna_index"),
+    ("src.core.price_forecast", "get_forecast_table"),
+    ("src.core.price_store", "get_price_store"),
+    ("src.core.weather_grid", "get_weather_grid"),
+    ("src.core.advisory", "get_advisory_table"),
+)
+WARM_UP_MODULES = ("src.core.advisory", "src.core.disease_detection", "src.core.image_cache", "src.core.market",
+                   "src.core.weather", "src.integrations.telephony", "src.integrations.external_apis")
+
+
+def warm_up(app):
+    """
+    Imports the lazily loaded subsystems and loads their read-only data (models, indexes, tables).
+    Gunicorn calls it in the master before forking workers (gunicorn.conf.py), so the workers
+    share those pages copy-on-write instead of each loading its own copy. Returns seconds per step.
+    """
+    timings = {}
+    with app.app_context():
+        for name in WARM_UP_MODULES:
+            started = time.perf_counter()
+            importlib.import_module(name)
+            timings[name] = time.perf_counter() - started
+        for module_name, accessor in WARM_UP_LOADERS:
+            started = time.perf_counter()
+            try:
+                getattr(importlib.import_module(module_name), accessor)()
+            except Exception as e: # A missing data file must not keep the server from starting
+                app.logger.warning(f"Warm-up: {module_name}.{accessor} failed: {e}")
+            timings[f"{module_name}.{accessor}"] = time.perf_counter() - started
+    # Move everything loaded so far out of the collector's generations: its bookkeeping writes
+    # would otherwise touch (and copy) the shared pages in every worker
+    gc.collect()
+    gc.freeze()
+    app.logger.info(f"Warm-up done in {sum(timings.values()):.2f}s")
+    return timings
+
 # This allows running the app directly using 'flask run' or 'python src/app.py'
 if __name__ == '__main__':
     app = create_app()
@@ -0,0 +1,67 @@
+# ASGI entry point (alternative to the WSGI `create_app()` + Gunicorn sync workers)
+# Run with: uvicorn src.asgi:app --host 0.0.0.0 --port 5000 --workers 2
+#
+# The event loop owns the sockets (keep-alive, slow IVR/WhatsApp clients, request bodies), and
+# Flask handlers run on a pool of ASGI_THREADS threads. Handlers mostly wait on upstream I/O and
+# fan out their lookups concurrently (src/utils/fanout.py), so one worker process serves many
+# concurrent calls instead of one per sync worker.
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from src.app import create_app
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+    # asgiref's default (thread_sensitive=True) runs every WSGI call on one shared thread, i.e. one
+    # request at a time; run each on the loop's executor instead. This unwraps the sync body of
+    # asgiref's decorated run_wsgi_app, which isn't public API: requirements.txt caps asgiref at the
+    # versions this was checked against
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__["run_wsgi_app"].func, thread_sensitive=False)
+
+
+class _ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await _ThreadedWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+class FlaskASGIApp:
+    """WSGI-to-ASGI adapter with a sized handler thread pool and ASGI lifespan support."""
+
+    def __init__(self, flask_app, threads=None):
+        self.flask_app = flask_app
+        self.threads = threads or config.ASGI_THREADS
+        self._asgi = _ThreadedWsgiToAsgi(flask_app)
+        self._executor = None
+
+    def _ensure_executor(self):
+        # asgiref runs WSGI calls on the loop's default executor; size it for I/O-bound handlers
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="asgi-handler")
+            asyncio.get_running_loop().set_default_executor(self._executor)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._ensure_executor()
+                self.flask_app.logger.info(f"ASGI worker started ({self.threads} handler threads)")
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        self._ensure_executor() # Servers without lifespan support
+        await self._asgi(scope, receive, send)
+
+
+app = FlaskASGIApp(create_app())
@@ -1,12 +1,15 @@
+import logging
 import os
-from dotenv import load_dotenv
 
-# Load environment variables from a .env file in the project root
+logger = logging.getLogger(__name__)
+
+# Load environment variables from a .env file in the project root (python-dotenv is only imported if there is one)
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 if os.path.exists(dotenv_path):
+    from dotenv import load_dotenv
     load_dotenv(dotenv_path)
 else:
-    print("Warning: .env file not found. Relying on system environment variables.")
+    logger.debug(".env file not found. Relying on system environment variables.")
 
 class Config:
     """Application configuration variables."""
@@ -22,6 +25,7 @@ class Config:
     BHASHINI_API_ENDPOINT = os.environ.get('BHASHINI_API_ENDPOINT') # Placeholder
 
     OPENWEATHERMAP_API_KEY = os.environ.get('OPENWEATHERMAP_API_KEY') # Example weather API
+    OPENWEATHERMAP_BASE_URL = os.environ.get('OPENWEATHERMAP_BASE_URL', 'https://api.openweathermap.org') # Override to point at a local stub
 
     AGMARKNET_API_KEY = os.environ.get('AGMARKNET_API_KEY') # Placeholder for market data API
     AGMARKNET_API_ENDPOINT = os.environ.get('AGMARKNET_API_ENDPOINT') # Placeholder
@@ -29,19 +33,158 @@ class Config:
     # --- Model Paths ---
     # Ensure paths are relative to the project root or absolute
     DISEASE_MODEL_PATH = os.environ.get('DISEASE_MODEL_PATH', os.path.join(os.path.dirname(__file__), 'models', 'disease_model.pkl'))
-    PRICE_MODEL_PATH = os.environ.get('PRICE_MODEL_PATH', os.path.join(os.path.dirname(__file__), 'models', 'price_forecast_model.joblib'))
+    DISEASE_LABELS_PATH = os.environ.get('DISEASE_LABELS_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'disease_labels.json')) # Model output classes
+    DISEASE_MODEL_INPUT_SIZE = int(os.environ.get('DISEASE_MODEL_INPUT_SIZE', 224)) # Square input (pixels)
+    DISEASE_INFERENCE_PROCESSES = int(os.environ.get('DISEASE_INFERENCE_PROCESSES', 1)) # Process pool size (0 = run in the web process)
+    DISEASE_BATCH_MAX_SIZE = int(os.environ.get('DISEASE_BATCH_MAX_SIZE', 16)) # Images per forward pass
+    DISEASE_BATCH_MAX_WAIT_MS = float(os.environ.get('DISEASE_BATCH_MAX_WAIT_MS', 20)) # Max wait to fill a batch
+    DISEASE_INFERENCE_TIMEOUT_SECONDS = float(os.environ.get('DISEASE_INFERENCE_TIMEOUT_SECONDS', 20))
+    DISEASE_IMAGE_CACHE_PATH = os.environ.get('DISEASE_IMAGE_CACHE_PATH', './disease_image_cache.db') # Diagnoses of seen images ('' = memory only)
+    DISEASE_IMAGE_CACHE_MAX_ENTRIES = int(os.environ.get('DISEASE_IMAGE_CACHE_MAX_ENTRIES', 20000))
+    DISEASE_IMAGE_CACHE_MAX_DISTANCE = int(os.environ.get('DISEASE_IMAGE_CACHE_MAX_DISTANCE', 4)) # Hamming distance (of 64 bits) for near-duplicates
+    PRICE_MODEL_PATH = os.environ.get('PRICE_MODEL_PATH', os.path.join(os.path.dirname(__file__), 'models', 'price_forecasts.npz')) # Written nightly by scripts/fit_price_forecasts.py
+    PRICE_FORECAST_HORIZON_DAYS = int(os.environ.get('PRICE_FORECAST_HORIZON_DAYS', 30)) # Horizons precomputed per series
+    PRICE_FORECAST_HISTORY_DAYS = int(os.environ.get('PRICE_FORECAST_HISTORY_DAYS', 365)) # Days of price store history the nightly fit reads
+    PRICE_FORECAST_RELOAD_SECONDS = float(os.environ.get('PRICE_FORECAST_RELOAD_SECONDS', 60)) # How often to check the file for changes
+    PRICE_STORE_DIR = os.environ.get('PRICE_STORE_DIR', os.path.join(os.path.dirname(__file__), 'models', 'price_store')) # Monthly columnar mandi price partitions (scripts/ingest_market_prices.py)
+    PRICE_STORE_RELOAD_SECONDS = float(os.environ.get('PRICE_STORE_RELOAD_SECONDS', 60)) # How often to check for a new manifest
+    MARKET_PRICE_MAX_AGE_DAYS = int(os.environ.get('MARKET_PRICE_MAX_AGE_DAYS', 30)) # Older mandi reports are not quoted as current prices
+    QNA_INDEX_DIR = os.environ.get('QNA_INDEX_DIR', os.path.join(os.path.dirname(__file__), 'models', 'qna_index')) # Memory-mapped knowledge base index (scripts/build_qna_index.py)
+    QNA_INDEX_RELOAD_SECONDS = float(os.environ.get('QNA_INDEX_RELOAD_SECONDS', 60)) # How often to check for a new build
+    QNA_DENSE_WEIGHT = float(os.environ.get('QNA_DENSE_WEIGHT', 0.3)) # Share of character-trigram similarity in the ranking (0 = BM25 only)
+    QNA_MIN_SCORE = float(os.environ.get('QNA_MIN_SCORE', 2.0)) # A match needs at least this BM25 score...
+    QNA_MIN_TERM_COVERAGE = float(os.environ.get('QNA_MIN_TERM_COVERAGE', 0.6)) # ...and this share of the question's terms...
+    QNA_MIN_SIMILARITY = float(os.environ.get('QNA_MIN_SIMILARITY', 0.6)) # ...unless the trigram similarity reaches this
+
+    # --- Data Files ---
+    DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(__file__), '..', 'data'))
+    INTENT_LEXICON_PATH = os.environ.get('INTENT_LEXICON_PATH', os.path.join(DATA_DIR, 'intent_lexicon.json'))
+    CROP_CALENDAR_PATH = os.environ.get('CROP_CALENDAR_PATH', os.path.join(DATA_DIR, 'crop_calendar_sample.json'))
+    CROP_CALENDAR_RELOAD_SECONDS = float(os.environ.get('CROP_CALENDAR_RELOAD_SECONDS', 30)) # How often to check the file for changes
+    MARKET_DIRECTORY_PATH = os.environ.get('MARKET_DIRECTORY_PATH', os.path.join(DATA_DIR, 'market_directory_sample.json')) # Districts, mandis and buyers with coordinates
+    MARKET_DIRECTORY_RELOAD_SECONDS = float(os.environ.get('MARKET_DIRECTORY_RELOAD_SECONDS', 60))
+    GEO_GRID_CELL_DEGREES = float(os.environ.get('GEO_GRID_CELL_DEGREES', 0.5)) # Spatial index cell size (~55 km)
+    GEO_MAX_DISTANCE_KM = float(os.environ.get('GEO_MAX_DISTANCE_KM', 150)) # Ignore mandis/buyers farther than this
+    GEO_CACHE_SIZE = int(os.environ.get('GEO_CACHE_SIZE', 4096)) # Cached nearest-neighbour results per worker
+    SYMPTOM_CATALOG_PATH = os.environ.get('SYMPTOM_CATALOG_PATH', os.path.join(DATA_DIR, 'symptom_catalog_sample.json')) # Symptom phrases and crop x disease symptom weights
+    SYMPTOM_CATALOG_RELOAD_SECONDS = float(os.environ.get('SYMPTOM_CATALOG_RELOAD_SECONDS', 30)) # How often to check the file for changes
+    SYMPTOM_MIN_CONFIDENCE = float(os.environ.get('SYMPTOM_MIN_CONFIDENCE', 0.4)) # Below this no disease is named
+    QNA_KNOWLEDGE_BASE_PATH = os.environ.get('QNA_KNOWLEDGE_BASE_PATH', os.path.join(DATA_DIR, 'qna_knowledge_base_sample.json')) # Indexed in memory until scripts/build_qna_index.py has run
+    PRICE_HISTORY_PATH = os.environ.get('PRICE_HISTORY_PATH', os.path.join(DATA_DIR, 'mandi_prices_sample.csv')) # Input of the nightly forecast fit while the price store is empty
+    MARKET_NAME_ALIASES_PATH = os.environ.get('MARKET_NAME_ALIASES_PATH', os.path.join(DATA_DIR, 'market_name_aliases.json')) # Report spellings of crops and mandis
 
     # --- Database ---
     DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///./krishi_saathi.db') # Default to SQLite in project root
 
+    # --- Farmer Context Store ---
+    CONTEXT_STORE_BACKEND = os.environ.get('CONTEXT_STORE_BACKEND', 'sqlite') # 'sqlite' (uses DATABASE_URL) or 'memory'
+    CONTEXT_CACHE_SIZE = int(os.environ.get('CONTEXT_CACHE_SIZE', 10000)) # Max farmer contexts cached per worker
+    CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get('CONTEXT_CACHE_TTL_SECONDS', 300)) # Reload from DB after this
+    CONTEXT_FLUSH_INTERVAL_SECONDS = float(os.environ.get('CONTEXT_FLUSH_INTERVAL_SECONDS', 2.0)) # Write-behind batch interval
+
+    # --- Response Cache (weather, market prices, insurance info) ---
+    CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'true').lower() == 'true'
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 5000)) # In-process LRU size per worker
+    CACHE_DISK_PATH = os.environ.get('CACHE_DISK_PATH', '') # Optional SQLite file shared by workers, e.g. './response_cache.db'
+    CACHE_COALESCE_TIMEOUT_SECONDS = float(os.environ.get('CACHE_COALESCE_TIMEOUT_SECONDS', 10)) # Max wait on an in-flight lookup
+    CACHE_TTL_WEATHER_SECONDS = int(os.environ.get('CACHE_TTL_WEATHER_SECONDS', 3600))
+    CACHE_TTL_MARKET_SECONDS = int(os.environ.get('CACHE_TTL_MARKET_SECONDS', 1800))
+    CACHE_TTL_INSURANCE_SECONDS = int(os.environ.get('CACHE_TTL_INSURANCE_SECONDS', 86400))
+    CACHE_TTL_QNA_SECONDS = int(os.environ.get('CACHE_TTL_QNA_SECONDS', 86400)) # Knowledge-base answers
+
+    # --- Upstream HTTP Client (src/integrations/http_client.py) ---
+    HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('HTTP_CONNECT_TIMEOUT_SECONDS', 3.05))
+    HTTP_READ_TIMEOUT_SECONDS = float(os.environ.get('HTTP_READ_TIMEOUT_SECONDS', 10))
+    HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 2)) # Retries for idempotent requests
+    HTTP_BACKOFF_BASE_SECONDS = float(os.environ.get('HTTP_BACKOFF_BASE_SECONDS', 0.2))
+    HTTP_BACKOFF_MAX_SECONDS = float(os.environ.get('HTTP_BACKOFF_MAX_SECONDS', 2.0))
+    HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 20)) # Keep-alive connections per upstream host
+    HTTP_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('HTTP_CIRCUIT_FAILURE_THRESHOLD', 5)) # Consecutive failures before failing fast
+    HTTP_CIRCUIT_RESET_SECONDS = float(os.environ.get('HTTP_CIRCUIT_RESET_SECONDS', 30)) # Time before probing the upstream again
+
+    # --- Request Fan-out / Async Serving ---
+    FANOUT_BUDGET_SECONDS = float(os.environ.get('FANOUT_BUDGET_SECONDS', 4.0)) # Max time a handler waits on its concurrent lookups (keep below the IVR webhook timeout)
+    FANOUT_MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', 32)) # Shared lookup threads per process
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 64)) # Handler threads per ASGI worker (src/asgi.py)
+
+    # --- Tracing / Metrics ---
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01)) # Fraction of requests whose trace summary is logged
+    TRACE_SLOW_SECONDS = float(os.environ.get('TRACE_SLOW_SECONDS', 3.0)) # Requests slower than this are always logged
+
+    # --- Streaming Speech-to-Text (IVR recordings) ---
+    STT_STREAM_CHUNK_BYTES = int(os.environ.get('STT_STREAM_CHUNK_BYTES', 8000)) # ~0.5 s of 8 kHz 16-bit audio per STT chunk
+    STT_STREAM_BUFFER_CHUNKS = int(os.environ.get('STT_STREAM_BUFFER_CHUNKS', 8)) # Chunks downloaded ahead of STT per call
+    STT_MAX_RECORDING_BYTES = int(os.environ.get('STT_MAX_RECORDING_BYTES', 5 * 1024 * 1024)) # Longer recordings are rejected
+    STT_PREFETCH_ENABLED = os.environ.get('STT_PREFETCH_ENABLED', 'true').lower() == 'true' # Start lookups once partial transcripts agree on the intent
+
+    # --- Multi-turn Dialogs (src/core/dialog.py) ---
+    DIALOG_SESSION_TTL_SECONDS = int(os.environ.get('DIALOG_SESSION_TTL_SECONDS', 600)) # Unfinished flows are forgotten after this
+    DIALOG_SESSION_DB_PATH = os.environ.get('DIALOG_SESSION_DB_PATH', './dialog_sessions.db') # Shared by the workers on a host ('' = per worker)
+    DIALOG_MAX_SESSIONS = int(os.environ.get('DIALOG_MAX_SESSIONS', 50000)) # Per-worker sessions (no shared table); oldest evicted first
+    DIALOG_MAX_ATTEMPTS = int(os.environ.get('DIALOG_MAX_ATTEMPTS', 2)) # Re-asks of a slot before using its default
+
+    # --- TTS Asset Cache (src/core/tts_cache.py) ---
+    TTS_CACHE_ENABLED = os.environ.get('TTS_CACHE_ENABLED', 'true').lower() == 'true' # Send audio URLs with IVR responses
+    TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR', './tts_cache') # Content-addressed audio files (shared by workers)
+    TTS_AUDIO_FORMAT = os.environ.get('TTS_AUDIO_FORMAT', 'wav') # Extension of synthesized files
+    TTS_AUDIO_BASE_URL = os.environ.get('TTS_AUDIO_BASE_URL', '') # e.g. a CDN in front of TTS_CACHE_DIR ('' = served by /api/tts/)
+    TTS_VOICE_VERSION = os.environ.get('TTS_VOICE_VERSION', 'sim-v1') # Part of every asset name: bump when changing voice/provider
+    TTS_BACKGROUND_WORKERS = int(os.environ.get('TTS_BACKGROUND_WORKERS', 2)) # Threads per worker synthesizing segments missing from live responses
+
+    # --- Weather Grid (scripts/ingest_weather.py, src/core/weather_grid.py) ---
+    WEATHER_GRID_PATH = os.environ.get('WEATHER_GRID_PATH', os.path.join(os.path.dirname(__file__), 'models', 'weather_grid.npz')) # Written by the ingestion job
+    WEATHER_GRID_DEGREES = float(os.environ.get('WEATHER_GRID_DEGREES', 0.25)) # Grid spacing (~28 km)
+    WEATHER_GRID_RELOAD_SECONDS = float(os.environ.get('WEATHER_GRID_RELOAD_SECONDS', 60)) # How often to check the file for changes
+    WEATHER_GRID_MAX_AGE_HOURS = float(os.environ.get('WEATHER_GRID_MAX_AGE_HOURS', 12)) # Older grids are ignored (simulation fallback)
+    WEATHER_GRID_MAX_DISTANCE_KM = float(os.environ.get('WEATHER_GRID_MAX_DISTANCE_KM', 50)) # Locations farther from every grid point are not covered
+    WEATHER_INGEST_WORKERS = int(os.environ.get('WEATHER_INGEST_WORKERS', 8)) # Concurrent forecast requests (keep <= HTTP_POOL_SIZE)
+    WEATHER_INGEST_MAX_FAILURE_RATIO = float(os.environ.get('WEATHER_INGEST_MAX_FAILURE_RATIO', 0.2)) # Above this the previous grid is kept
+
+    # --- Proactive Advisory (scripts/run_proactive_advisory.py) ---
+    ADVISORY_TABLE_PATH = os.environ.get('ADVISORY_TABLE_PATH', './daily_advisory.json') # Today's advice per farmer group, written each morning
+    ADVISORY_TABLE_RELOAD_SECONDS = float(os.environ.get('ADVISORY_TABLE_RELOAD_SECONDS', 60)) # How often to check the file for changes
+    PROACTIVE_ADVISORY_CHANNEL = os.environ.get('PROACTIVE_ADVISORY_CHANNEL', 'sms') # Default push channel: sms, whatsapp or ivr (a farmer's 'advisory_channel' overrides)
+
+    # --- Outbound Message Queue (SMS / WhatsApp) ---
+    OUTBOUND_QUEUE_PATH = os.environ.get('OUTBOUND_QUEUE_PATH', './outbound_queue.db') # Local SQLite spool
+    OUTBOUND_QUEUE_WORKERS = int(os.environ.get('OUTBOUND_QUEUE_WORKERS', 2)) # Sender threads per process (0 = spool only)
+    OUTBOUND_BATCH_SIZE = int(os.environ.get('OUTBOUND_BATCH_SIZE', 20)) # Messages claimed per provider per batch
+    OUTBOUND_POLL_INTERVAL_SECONDS = float(os.environ.get('OUTBOUND_POLL_INTERVAL_SECONDS', 1.0))
+    OUTBOUND_MAX_ATTEMPTS = int(os.environ.get('OUTBOUND_MAX_ATTEMPTS', 5)) # Then dead-lettered
+    OUTBOUND_SMS_RATE_PER_SECOND = float(os.environ.get('OUTBOUND_SMS_RATE_PER_SECOND', 10)) # Provider quota, shared by all processes sending from the spool (0 = no limit)
+    OUTBOUND_WHATSAPP_RATE_PER_SECOND = float(os.environ.get('OUTBOUND_WHATSAPP_RATE_PER_SECOND', 20))
+    OUTBOUND_IVR_CALL_RATE_PER_SECOND = float(os.environ.get('OUTBOUND_IVR_CALL_RATE_PER_SECOND', 2)) # Outbound voice calls started
+    OUTBOUND_DEDUP_WINDOW_SECONDS = int(os.environ.get('OUTBOUND_DEDUP_WINDOW_SECONDS', 300)) # Used when no provider SID is available
+
+    # --- Webhook Deduplication (src/utils/webhook_dedup.py) ---
+    WEBHOOK_DEDUP_ENABLED = os.environ.get('WEBHOOK_DEDUP_ENABLED', 'true').lower() == 'true' # Answer provider retries from the first response
+    WEBHOOK_DEDUP_WINDOW_SECONDS = int(os.environ.get('WEBHOOK_DEDUP_WINDOW_SECONDS', 600)) # How long a response is replayed
+    WEBHOOK_DEDUP_MAX_ENTRIES = int(os.environ.get('WEBHOOK_DEDUP_MAX_ENTRIES', 20000)) # Responses kept per worker (LRU)
+    WEBHOOK_DEDUP_DB_PATH = os.environ.get('WEBHOOK_DEDUP_DB_PATH', './webhook_dedup.db') # Shared by the workers on a host ('' = per worker only)
+    WEBHOOK_DEDUP_WAIT_SECONDS = float(os.environ.get('WEBHOOK_DEDUP_WAIT_SECONDS', 20)) # Max wait for an in-flight duplicate
+
+    # --- Admission Control (src/utils/admission.py) ---
+    ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true'
+    ADMISSION_CALLER_RATE_PER_MINUTE = float(os.environ.get('ADMISSION_CALLER_RATE_PER_MINUTE', 20)) # Webhook requests per caller (0 = no limit)
+    ADMISSION_CALLER_BURST = float(os.environ.get('ADMISSION_CALLER_BURST', 10))
+    ADMISSION_DISTRICT_RATE_PER_SECOND = float(os.environ.get('ADMISSION_DISTRICT_RATE_PER_SECOND', 30)) # Per farmer location, all workers (0 = no limit)
+    ADMISSION_DISTRICT_BURST = float(os.environ.get('ADMISSION_DISTRICT_BURST', 150))
+    # Webhooks in progress per worker before more are shed (0 = no limit). Must stay below the worker's
+    # handler threads (GUNICORN_THREADS, or ASGI_THREADS under src/asgi.py) to ever apply: the default
+    # leaves 2 threads for /api/tts audio fetches and health checks while webhooks are shed
+    ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', max(1, int(os.environ.get('GUNICORN_THREADS', 8)) - 2)))
+    ADMISSION_MAX_QUEUE_MS = float(os.environ.get('ADMISSION_MAX_QUEUE_MS', 3000)) # Shed requests that waited longer in the proxy (X-Request-Start; 0 = off)
+    ADMISSION_DB_PATH = os.environ.get('ADMISSION_DB_PATH', './admission.db') # Buckets shared by the workers on a host ('' = per worker)
+    ADMISSION_MAX_KEYS = int(os.environ.get('ADMISSION_MAX_KEYS', 100000)) # Bucket limit of the per-worker fallback
+
     # --- Other Settings ---
     DEFAULT_LANGUAGE = os.environ.get('DEFAULT_LANGUAGE', 'hi-IN') # Hindi-India
     SUPPORTED_LANGUAGES = os.environ.get('SUPPORTED_LANGUAGES', 'hi-IN,en-IN,mr-IN').split(',')
 
-# Create a config object for easy import
-config = Config()
+    def missing_settings(self):
+        """Names of essential settings that are not configured (logged once by create_app, not at import)."""
+        # Add other critical keys here
+        return [name for name in ('TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN') if not getattr(self, name)]
 
-# Print a warning if essential keys are missing (optional but helpful)
-if not config.TWILIO_ACCOUNT_SID or not config.TWILIO_AUTH_TOKEN:
-    print("Warning: Twilio credentials not found in environment variables.")
-# Add similar checks for other critical keys
\ No newline at end of file
+# Create a config object for easy import
+config = Config()
\ No newline at end of file
@@ -1,42 +1,175 @@
 import datetime
+import json
+import logging
+import os
 import random
+import threading
+import time
 from flask import current_app
-# Import weather module if needed for real implementation
-# from . import weather
-
-# --- Sample Data (Replace with Database/API/File loading) ---
-# Consider loading from JSON or DB
-CROP_CALENDAR = {
-    "गेहूं": {
-        "sowing_months": [10, 11], # Oct, Nov
-        "stages": [
-            {"name": "germination", "duration_days": 15, "advice_hi": "अंकुरण का समय। हल्की सिंचाई करें यदि मिट्टी सूखी हो।"},
-            {"name": "tillering", "duration_days": 30, "advice_hi": "कल्ले निकलने का समय। पहली नाइट्रोजन (यूरिया) डालें। सिंचाई आवश्यकतानुसार।"},
-            {"name": "jointing", "duration_days": 25, "advice_hi": "पौधे की बढ़वार। सिंचाई का ध्यान रखें। खरपतवार नियंत्रण करें।"},
-            {"name": "heading", "duration_days": 20, "advice_hi": "बालियाँ निकल रही हैं। पोटाश दे सकते हैं। पानी की कमी न होने दें।"},
-            {"name": "maturity", "duration_days": 30, "advice_hi": "दाना पक रहा है। सिंचाई बंद करें। कटाई की तैयारी करें।"},
-        ]
-    },
-    "बाजरा": {
-        "sowing_months": [6, 7], # June, July (Kharif example)
-         "stages": [
-            {"name": "seedling", "duration_days": 20, "advice_hi": "नर्सरी या सीधी बुवाई के बाद। हल्की सिंचाई।"},
-            {"name": "vegetative", "duration_days": 35, "advice_hi": "बढ़वार का समय। नाइट्रोजन खाद दें। निराई-गुड़ाई करें।"},
-            {"name": "flowering", "duration_days": 25, "advice_hi": "फूल आने का समय। सिंचाई महत्वपूर्ण है।"},
-            {"name": "grain_filling", "duration_days": 30, "advice_hi": "दाना भरने का समय। नमी बनाए रखें। पक्षियों से बचाव करें।"},
-        ]
-    },
-     "धान": { # Paddy/Rice example
-        "sowing_months": [6, 7],
-        "stages": [
-             {"name": "nursery", "duration_days": 25, "advice_hi": "नर्सरी तैयार करें या सीधी बुवाई करें।"},
-             {"name": "transplanting/tillering", "duration_days": 40, "advice_hi": "रोपाई के बाद कल्ले निकलने का समय। पानी का स्तर बनाए रखें। नाइट्रोजन दें।"},
-             {"name": "panicle_initiation", "duration_days": 30, "advice_hi": "बालियाँ बनने की शुरुआत। पानी महत्वपूर्ण। पोटाश दें।"},
-             {"name": "flowering_maturity", "duration_days": 35, "advice_hi": "फूल आने से पकने तक। खेत को धीरे-धीरे सुखाएं (कटाई से 10-15 दिन पहले)।"},
-         ]
-     }
-}
+from src.config import config
+from src.core import qna, weather
+from src.core.crop_calendar import HARVEST_STAGE, get_crop_calendars, get_sowing_date
+from src.utils.tracing import traced
 
+# Crop calendars are loaded from data/crop_calendar_sample.json (config.CROP_CALENDAR_PATH)
+# by src/core/crop_calendar.py and hot-reloaded when the file changes.
+# Each morning scripts/run_proactive_advisory.py computes today's advice for every registered
+# farmer group (src/core/proactive_advisory.py) and writes it to config.ADVISORY_TABLE_PATH;
+# get_crop_advice answers from that table when it is current.
+
+logger = logging.getLogger(__name__)
+
+WEATHER_ADVICE_RAIN_SOON = "अगले 2-3 दिनों में बारिश की संभावना है, इसलिए सिंचाई अभी टाल सकते हैं।"
+WEATHER_ADVICE_DRY_SPELL = "मौसम शुष्क रहने की संभावना है, सिंचाई का विशेष ध्यान दें।"
+
+WEATHER_BUCKETS = ("normal", "rain_soon", "dry_spell")
+RAIN_SOON_PERCENT = 50 # Any forecast day at or above this chance of rain
+DRY_SPELL_PERCENT = 10 # Every forecast day at or below this chance of rain
+
+
+def _harvest_text(crop_name):
+    return f"{crop_name} की फसल संभवतः कटाई के लिए तैयार है या कट चुकी है।"
+
+
+def _format_advice(crop_name, stage_name, advice_text, weather_advice=""):
+    return f"({crop_name} - अवस्था: {stage_name}) {advice_text}{weather_advice}"
+
+
+def weather_bucket(location):
+    """Reduces the (cached) forecast for `location` to one of WEATHER_BUCKETS."""
+    detailed = weather.get_weather_forecast(location).get("detailed") or []
+    chances = [day.get("precipitation_probability_percent", 0) for day in detailed]
+    if any(chance >= RAIN_SOON_PERCENT for chance in chances):
+        return "rain_soon"
+    if chances and max(chances) <= DRY_SPELL_PERCENT:
+        return "dry_spell"
+    return "normal"
+
+
+def calendar_key(calendar):
+    return f"{calendar.crop}|{calendar.variety or ''}|{calendar.zone or ''}"
+
+
+def compose_advice(calendar, stage_index, bucket):
+    """
+    Returns (stage name, advice text) for a stage of `calendar` (len(stages) = past the last
+    stage) under a weather bucket. Used both per call and per farmer group by the morning batch.
+    """
+    if stage_index >= len(calendar.stage_names):
+        stage_name, advice_text = HARVEST_STAGE, _harvest_text(calendar.crop)
+    else:
+        stage_name = calendar.stage_names[stage_index]
+        advice = calendar.advice[stage_index]
+        advice_text = advice.get("hi") or next(iter(advice.values()), "")
+
+    weather_advice = ""
+    if bucket == "rain_soon" and "सिंचाई" in advice_text:
+        weather_advice = " " + WEATHER_ADVICE_RAIN_SOON
+    elif bucket == "dry_spell" and "सिंचाई" in advice_text:
+        weather_advice = " " + WEATHER_ADVICE_DRY_SPELL
+    return stage_name, _format_advice(calendar.crop, stage_name, advice_text, weather_advice)
+
+
+def static_advice_texts():
+    """
+    Every fixed advice text get_crop_advice can produce (one per calendar stage, plus harvest and
+    weather notes), for pre-rendering TTS audio (scripts/prerender_tts.py).
+    """
+    texts = [WEATHER_ADVICE_RAIN_SOON, WEATHER_ADVICE_DRY_SPELL]
+    for calendar in get_crop_calendars():
+        for index in range(len(calendar.stage_names) + 1):
+            texts.append(compose_advice(calendar, index, "normal")[1])
+    return list(dict.fromkeys(texts))
+
+
+# --- Precomputed daily advisory table ---
+
+class AdvisoryTable:
+    """
+    Today's advice per farmer group and weather bucket per location, as written by the morning
+    batch: {"date": ..., "weather": {location: bucket}, "advice": {"<calendar>|<stage>|<bucket>": [stage, text]}}.
+    """
+
+    def __init__(self, date, weather_buckets, advice):
+        self.date = date
+        self.weather = weather_buckets
+        self.advice = advice
+
+    @staticmethod
+    def group_key(calendar, stage_index, bucket):
+        return f"{calendar_key(calendar)}|{stage_index}|{bucket}"
+
+    def is_current(self):
+        return self.date == datetime.date.today().isoformat()
+
+    def lookup(self, calendar, stage_index, bucket):
+        entry = self.advice.get(self.group_key(calendar, stage_index, bucket))
+        return tuple(entry) if entry else None
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"date": self.date, "weather": self.weather, "advice": self.advice}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["date"], data.get("weather", {}), data.get("advice", {}))
+
+    def __len__(self):
+        return len(self.advice)
+
+
+class _ReloadingAdvisoryTable:
+    """Holds the current table and reloads it when the file's mtime changes (checked at most every few seconds)."""
+
+    def __init__(self, path, check_interval):
+        self.path = path
+        self.check_interval = check_interval
+        self._table = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_interval
+                    self._reload_if_changed()
+        return self._table
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return # Batch has not run yet: advice is computed per call
+        if mtime == self._mtime:
+            return
+        try:
+            self._table = AdvisoryTable.load(self.path)
+            self._mtime = mtime
+            logger.info(f"Loaded advisory table for {self._table.date} ({len(self._table)} groups) from {self.path}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Invalid advisory table {self.path}, keeping previous version: {e}")
+
+
+_tables = None
+_tables_lock = threading.Lock()
+
+
+def get_advisory_table():
+    """Returns today's AdvisoryTable (hot-reloaded from config.ADVISORY_TABLE_PATH), or None if there is none for today."""
+    global _tables
+    if _tables is None:
+        with _tables_lock:
+            if _tables is None:
+                _tables = _ReloadingAdvisoryTable(config.ADVISORY_TABLE_PATH, config.ADVISORY_TABLE_RELOAD_SECONDS)
+    table = _tables.get()
+    return table if table is not None and table.is_current() else None
+
+@traced()
 def get_crop_advice(crop_name, location, farmer_context):
     """
     Provides simulated crop advice based on stage and basic weather context.
@@ -48,84 +181,57 @@ def get_crop_advice(crop_name, location, farmer_context):
     advice_text = f"{crop_name} के लिए अभी कोई विशेष सलाह उपलब्ध नहीं है।" # Default
     current_stage_name = "Unknown"
 
-    if crop_name not in CROP_CALENDAR:
+    # Most specific calendar for the farmer's variety and zone (location), falling back to the crop default
+    calendar = get_crop_calendars().lookup(crop_name, farmer_context.get("crop_variety"), location)
+    if calendar is None:
         logger.warning(f"Crop calendar not found for: {crop_name}")
         return {"advice": advice_text, "stage": current_stage_name}
 
-    calendar = CROP_CALENDAR[crop_name]
-
-    # --- !! Simulation of Current Stage !! ---
-    # Needs farmer's actual sowing date from farmer_context
-    sowing_date_str = farmer_context.get("sowing_date")
-    days_since_sowing = None
-    if sowing_date_str:
-        try:
-            sowing_date = datetime.datetime.strptime(sowing_date_str, "%Y-%m-%d").date()
-            days_since_sowing = (datetime.date.today() - sowing_date).days
-        except ValueError:
-            logger.warning(f"Invalid sowing date format '{sowing_date_str}' for farmer {farmer_context.get('id')}")
+    # --- Current Stage ---
+    # Uses farmer's sowing date from farmer_context (parsed once, cached in the context)
+    sowing_date = get_sowing_date(farmer_context)
+    days_since_sowing = (datetime.date.today() - sowing_date).days if sowing_date else None
 
     if days_since_sowing is None:
         # Guess stage based on typical sowing month if sowing date unknown (highly inaccurate)
         current_month = datetime.date.today().month
-        if current_month in calendar["sowing_months"]:
+        if current_month in calendar.sowing_months:
              days_since_sowing = random.randint(5, 25) # Early stage guess
         else:
              # Crude guess based on cycle - needs improvement
              days_since_sowing = random.randint(30, 90)
         logger.info(f"Sowing date unknown/invalid. Simulating days since sowing: {days_since_sowing}")
 
+    stage_index = calendar.stage_index(days_since_sowing)
+    if stage_index is None: # Sowing date in the future
+        return {"advice": advice_text, "stage": current_stage_name}
 
-    if days_since_sowing is not None and days_since_sowing >= 0:
-        elapsed_days = 0
-        stage_found = False
-        for stage in calendar['stages']:
-            stage_end_day = elapsed_days + stage['duration_days']
-            if days_since_sowing <= stage_end_day:
-                advice_text = stage['advice_hi']
-                current_stage_name = stage['name']
-                stage_found = True
-                break
-            elapsed_days = stage_end_day
-        if not stage_found: # If past last stage
-             advice_text = f"{crop_name} की फसल संभवतः कटाई के लिए तैयार है या कट चुकी है।"
-             current_stage_name = "Harvest/Post-Harvest"
-
-    # --- Add Simulated Weather Context ---
-    # In real implementation, call weather.get_weather_forecast(location)
-    simulated_weather_condition = random.choice(["rain_soon", "dry_spell", "normal"])
-    weather_advice = ""
-    if simulated_weather_condition == "rain_soon" and "सिंचाई" in advice_text:
-        weather_advice = " अगले 2-3 दिनों में बारिश की संभावना है, इसलिए सिंचाई अभी टाल सकते हैं।"
-    elif simulated_weather_condition == "dry_spell" and "सिंचाई" in advice_text:
-        weather_advice = " मौसम शुष्क रहने की संभावना है, सिंचाई का विशेष ध्यान दें।"
-
-    final_advice = f"({crop_name} - अवस्था: {current_stage_name}) {advice_text}{weather_advice}"
-    logger.info(f"Generated advice: {final_advice}")
+    # --- Weather Context and Advice ---
+    # Served from the morning batch's table when this farmer's group was precomputed
+    table = get_advisory_table()
+    bucket = table.weather.get(location) if table is not None else None
+    if bucket is None:
+        bucket = weather_bucket(location)
+    precomputed = table.lookup(calendar, stage_index, bucket) if table is not None else None
+    current_stage_name, final_advice = precomputed or compose_advice(calendar, stage_index, bucket)
+    logger.debug("Generated advice: %s", final_advice)
 
     return {"advice": final_advice, "stage": current_stage_name}
 
 
+@traced()
 def get_general_qna_answer(query_text, crop=None, location=None):
     """
-    Placeholder for answering general farming questions.
-    !! REPLACE with Knowledge Base lookup, RAG, or LLM call !!
+    Answers general farming questions from the local knowledge base (src/core/qna.py), restricted
+    to entries that apply to the farmer's crop and location.
     """
     logger = current_app.logger
     logger.info(f"Answering QnA: '{query_text}' (Crop: {crop}, Loc: {location})")
-    query_lower = query_text.lower()
-    answer = "इस प्रश्न का उत्तर देने के लिए मेरे पास अभी पर्याप्त जानकारी नहीं है। आप कृषि विशेषज्ञ से संपर्क कर सकते हैं।" # Default
-
-    # --- Simple Rule-Based Simulation ---
-    if "बीज" in query_text or "seed" in query_lower:
-        crop_str = f"{crop} के " if crop else ""
-        answer = f"{crop_str}उन्नत किस्मों के बीज के लिए अपने नजदीकी कृषि विज्ञान केंद्र (KVK) या प्रमाणित बीज विक्रेता से संपर्क करें।"
-    elif "दवा" in query_text or "pesticide" in query_lower or "खरपतवार" in query_text or "weed" in query_lower:
-        answer = "किसी भी कीटनाशक या खरपतवारनाशक का प्रयोग करने से पहले कृषि विशेषज्ञ से सलाह अवश्य लें। सही दवा और मात्रा का प्रयोग महत्वपूर्ण है।"
-    elif "मौसम" in query_text or "weather" in query_lower:
-         answer = "मौसम की विस्तृत जानकारी के लिए आप मौसम संबंधी प्रश्न पूछ सकते हैं।" # Redirect to weather intent
-    elif "मिट्टी जांच" in query_text or "soil test" in query_lower:
-         answer = "मिट्टी की जांच कराना बहुत फायदेमंद है। इससे पोषक तत्वों की सही जानकारी मिलती है। आप अपने ब्लॉक के कृषि विभाग या KVK में संपर्क कर सकते हैं।"
-
-    logger.info(f"Generated QnA answer: {answer}")
-    return {"answer": answer}
\ No newline at end of file
+    result = qna.answer_question(query_text, crop, location)
+    if result is None:
+        answer = "इस प्रश्न का उत्तर देने के लिए मेरे पास अभी पर्याप्त जानकारी नहीं है। आप कृषि विशेषज्ञ से संपर्क कर सकते हैं।" # Default
+        logger.debug("No knowledge base match for: %s", query_text)
+        return {"answer": answer}
+
+    logger.debug("QnA answer from %s (%s, score %s): %s", result["id"], result["source"], result["score"], result["answer"])
+    return {"answer": result["answer"], "source": result["source"]}
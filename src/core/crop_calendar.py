@@ -0,0 +1,171 @@
+# Crop calendar loader: compiles JSON calendars (crop x variety x agro-climatic zone) into
+# compact lookup tables with cumulative stage boundaries, so finding the current stage is a
+# bisect instead of a walk over the stage list. The JSON file is hot-reloaded when it changes.
+import bisect
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+HARVEST_STAGE = "Harvest/Post-Harvest"
+
+
+def _key_part(value):
+    """Normalizes variety/zone names for lookup ('' means 'any')."""
+    return str(value).strip().casefold() if value else ""
+
+
+class CompiledCalendar:
+    """One crop/variety/zone calendar with precomputed cumulative stage end days."""
+    __slots__ = ("crop", "variety", "zone", "sowing_months", "stage_names", "stage_ends", "advice")
+
+    def __init__(self, entry):
+        self.crop = entry["crop"]
+        self.variety = entry.get("variety")
+        self.zone = entry.get("zone")
+        self.sowing_months = frozenset(entry.get("sowing_months", ()))
+        stages = entry["stages"]
+        self.stage_names = tuple(stage["name"] for stage in stages)
+        ends = []
+        elapsed = 0
+        for stage in stages:
+            elapsed += int(stage["duration_days"])
+            ends.append(elapsed)
+        self.stage_ends = tuple(ends) # stage i covers days (stage_ends[i-1], stage_ends[i]]
+        # advice[i] maps a language suffix ('hi', 'en', ...) to that stage's text
+        self.advice = tuple(
+            {key[len("advice_"):]: text for key, text in stage.items() if key.startswith("advice_")}
+            for stage in stages
+        )
+
+    @property
+    def total_days(self):
+        return self.stage_ends[-1] if self.stage_ends else 0
+
+    def stage_index(self, days_since_sowing):
+        """Index of the stage for a day count, len(stages) if past the last stage, None if negative."""
+        if days_since_sowing is None or days_since_sowing < 0:
+            return None
+        return bisect.bisect_left(self.stage_ends, days_since_sowing)
+
+    def stage_at(self, days_since_sowing, lang="hi"):
+        """Returns (stage_name, advice_text); advice is None past the last stage."""
+        index = self.stage_index(days_since_sowing)
+        if index is None:
+            return None, None
+        if index >= len(self.stage_names):
+            return HARVEST_STAGE, None
+        advice = self.advice[index]
+        return self.stage_names[index], advice.get(lang) or advice.get("hi")
+
+
+class CropCalendarIndex:
+    """All calendars, keyed by (crop, variety, zone) with fallback to less specific entries."""
+
+    def __init__(self, entries):
+        self._calendars = {}
+        for entry in entries:
+            calendar = CompiledCalendar(entry)
+            key = (calendar.crop, _key_part(calendar.variety), _key_part(calendar.zone))
+            self._calendars[key] = calendar
+
+    def lookup(self, crop, variety=None, zone=None):
+        variety, zone = _key_part(variety), _key_part(zone)
+        for key in ((crop, variety, zone), (crop, "", zone), (crop, variety, ""), (crop, "", "")):
+            calendar = self._calendars.get(key)
+            if calendar is not None:
+                return calendar
+        return None
+
+    def __iter__(self):
+        return iter(self._calendars.values())
+
+    def __len__(self):
+        return len(self._calendars)
+
+    def crops(self):
+        return sorted({crop for crop, _, _ in self._calendars})
+
+
+def load_crop_calendars(path=None):
+    """Reads a calendar JSON file into a CropCalendarIndex."""
+    with open(path or config.CROP_CALENDAR_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    return CropCalendarIndex(data.get("calendars", []))
+
+
+class _ReloadingCalendar:
+    """Holds the current index and reloads it when the file's mtime changes (checked at most every few seconds)."""
+
+    def __init__(self, path, check_interval):
+        self.path = path
+        self.check_interval = check_interval
+        self._index = CropCalendarIndex([])
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_interval
+                    self._reload_if_changed()
+        return self._index
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logger.warning(f"Crop calendar file not available at {self.path}: {e}")
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self._index = load_crop_calendars(self.path)
+            self._mtime = mtime
+            logger.info(f"Loaded {len(self._index)} crop calendars from {self.path}")
+        except (ValueError, KeyError, TypeError) as e:
+            # Keep serving the previous calendars if an edit left the file invalid
+            logger.error(f"Invalid crop calendar file {self.path}, keeping previous version: {e}")
+
+
+_calendars = None
+_calendars_lock = threading.Lock()
+
+
+def get_crop_calendars():
+    """Returns the current CropCalendarIndex (hot-reloaded from config.CROP_CALENDAR_PATH)."""
+    global _calendars
+    if _calendars is None:
+        with _calendars_lock:
+            if _calendars is None:
+                _calendars = _ReloadingCalendar(config.CROP_CALENDAR_PATH, config.CROP_CALENDAR_RELOAD_SECONDS)
+    return _calendars.get()
+
+
+def get_sowing_date(farmer_context):
+    """
+    Parses farmer_context['sowing_date'] ('YYYY-MM-DD') once and caches the result in the
+    context under '_sowing_date_cache' (underscore keys are not persisted by the context store).
+    Returns a date, or None if missing/invalid.
+    """
+    raw = farmer_context.get("sowing_date")
+    if not raw:
+        return None
+    cached = farmer_context.get("_sowing_date_cache")
+    if cached is not None and cached[0] == raw:
+        return cached[1]
+    try:
+        parsed = datetime.date.fromisoformat(raw)
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid sowing date format '{raw}' for farmer {farmer_context.get('id')}")
+        parsed = None
+    farmer_context["_sowing_date_cache"] = (raw, parsed)
+    return parsed
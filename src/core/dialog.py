@@ -0,0 +1,403 @@
+# Multi-turn IVR dialogs: declarative slot filling per intent
+# - FLOWS lists, per intent, the slots the answer needs (location, sowing date, quantity). A slot is
+#   filled from the utterance's entities, from the utterance text itself, or from the farmer's stored
+#   context; only if all of those are empty is the caller asked for it (SPEAK_AND_LISTEN)
+# - While a slot is pending, the call's state lives in a compact DialogSession (__slots__) keyed by
+#   the provider's CallSid, with an expiry; the next webhook for that call resumes the flow where
+#   it stopped instead of starting the STT/NLU pipeline and the lookups over
+# - Answers that can't be parsed are re-asked up to DIALOG_MAX_ATTEMPTS times, then the slot's
+#   default applies; a clearly different question abandons the flow
+# - Slots marked `remember` are written back to the farmer's context, so they are not asked again
+# - Sessions live in a SQLite table shared by the workers on a host (DIALOG_SESSION_DB_PATH), so the
+#   answer may land on any worker; without a table they are per worker and the IVR webhook would
+#   have to be routed by CallSid (sticky), otherwise an answer on another worker is a new query
+import datetime
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from src.config import config
+from src.core.crop_calendar import get_sowing_date
+from src.core.geo_index import get_market_directory
+from src.core.prompts import get_prompt
+
+logger = logging.getLogger(__name__)
+
+PURGE_INTERVAL_SECONDS = 60
+
+# --- Slot value parsers (utterance text -> value or None) ---
+
+_DEVANAGARI_DIGITS = str.maketrans("०१२३४५६७८९", "0123456789")
+_NUMBER_WORDS = {
+    "एक": 1, "दो": 2, "तीन": 3, "चार": 4, "पांच": 5, "पाँच": 5, "छह": 6, "सात": 7, "आठ": 8, "नौ": 9, "दस": 10,
+    "बीस": 20, "तीस": 30, "चालीस": 40, "पचास": 50, "सौ": 100,
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "hundred": 100,
+    "दोन": 2, "पाच": 5, "सहा": 6, "नऊ": 9, "वीस": 20, "पन्नास": 50, "शंभर": 100,
+}
+# Number words only as whole words ('दो' not in 'दोबारा', 'सौ' not in 'सौदा', 'ten' not in 'often'):
+# letters, digits and Devanagari vowel signs/virama/nukta (U+0900-U+097F) continue a word
+_WORD_CHAR = r"[\w\u0900-\u097F]"
+_NUMBER = (r"(\d+(?:\.\d+)?|(?<!" + _WORD_CHAR + r")(?:"
+           + "|".join(sorted(map(re.escape, _NUMBER_WORDS), key=len, reverse=True)) + r")(?!" + _WORD_CHAR + r"))")
+_QUANTITY_UNITS = (
+    (re.compile(r"^\s*(टन|ton|tonne)"), 10.0), # quintals per unit
+    (re.compile(r"^\s*(किलो|kg|kilo)"), 0.01),
+)
+_AGO_PATTERNS = (
+    (re.compile(_NUMBER + r"\s*(दिन|days?|दिवस)"), 1),
+    (re.compile(_NUMBER + r"\s*(हफ्ते|हफ़्ते|सप्ताह|weeks?|आठवड)"), 7),
+    (re.compile(_NUMBER + r"\s*(महीने|महीना|months?|महिन)"), 30),
+)
+_DATE_PATTERN = re.compile(r"\b(\d{1,2})[/.-](\d{1,2})(?:[/.-](\d{2,4}))?\b")
+
+
+def _number(token):
+    return float(token) if token[0].isdigit() else float(_NUMBER_WORDS[token])
+
+
+def parse_quantity(text):
+    """Quantity in quintals ('20 क्विंटल', '2 टन', 'पचास') or None."""
+    normalized = text.translate(_DEVANAGARI_DIGITS).casefold()
+    match = re.search(_NUMBER, normalized)
+    if not match:
+        return None
+    quantity = _number(match.group(1))
+    rest = normalized[match.end():]
+    for pattern, factor in _QUANTITY_UNITS:
+        if pattern.match(rest):
+            quantity *= factor
+            break
+    return quantity if quantity > 0 else None
+
+
+def parse_sowing_date(text, today=None):
+    """Sowing date as 'YYYY-MM-DD' from '20 दिन पहले', '3 weeks ago', '15/11' (day/month) etc., or None."""
+    today = today or datetime.date.today()
+    normalized = text.translate(_DEVANAGARI_DIGITS).casefold()
+    for pattern, days_per_unit in _AGO_PATTERNS:
+        match = pattern.search(normalized)
+        if match:
+            return (today - datetime.timedelta(days=int(_number(match.group(1)) * days_per_unit))).isoformat()
+    match = _DATE_PATTERN.search(normalized)
+    if match:
+        day, month = int(match.group(1)), int(match.group(2))
+        year = int(match.group(3)) if match.group(3) else today.year
+        if year < 100:
+            year += 2000
+        try:
+            sown = datetime.date(year, month, day)
+        except ValueError:
+            return None
+        if sown > today and not match.group(3):
+            sown = sown.replace(year=year - 1) # '15/11' said in March means last November
+        return sown.isoformat() if sown <= today else None
+    return None
+
+
+def parse_location(text):
+    return get_market_directory().find_place(text)
+
+
+def _known_location(farmer_context):
+    location = farmer_context.get("location")
+    return location if location and location != "Unknown" else None
+
+
+def _known_sowing_date(farmer_context):
+    return farmer_context.get("sowing_date") if get_sowing_date(farmer_context) else None
+
+
+class Slot:
+    """
+    One piece of information a flow needs. `parse(text)` reads it from an utterance,
+    `from_context(farmer_context)` from what is already known; `remember` writes an answered
+    value back to the farmer's context under `context_key`.
+    """
+    __slots__ = ("name", "prompt", "parse", "from_context", "entity", "in_question", "remember", "context_key", "default")
+
+    def __init__(self, name, prompt, parse, from_context=None, entity=None, in_question=True, remember=False,
+                 context_key=None, default=None):
+        self.name = name
+        self.prompt = prompt
+        self.parse = parse
+        self.from_context = from_context
+        self.entity = entity
+        self.in_question = in_question # Also look for the value in the question itself
+        self.remember = remember
+        self.context_key = context_key or name
+        self.default = default
+
+
+LOCATION = Slot("location", "ask_location", parse_location, from_context=_known_location, remember=True)
+# Not read from the question: "2 दिन बाद पानी दूँ?" is not a sowing date
+SOWING_DATE = Slot("sowing_date", "ask_sowing_date", parse_sowing_date, from_context=_known_sowing_date, in_question=False, remember=True)
+QUANTITY = Slot("quantity", "ask_quantity", parse_quantity, entity="quantity", default=10.0)
+
+# Intent -> slots to fill, in asking order
+FLOWS = {
+    "CROP_ADVISORY_WATER": (LOCATION, SOWING_DATE),
+    "CROP_ADVISORY_FERTILIZER": (LOCATION, SOWING_DATE),
+    "CROP_ADVISORY_GENERAL": (LOCATION, SOWING_DATE),
+    "MARKET_PRICE_QUERY": (LOCATION,),
+    "MARKET_LINKAGE_REQUEST": (LOCATION, QUANTITY),
+    "WEATHER_QUERY": (LOCATION,),
+    "FINANCE_INSURANCE_QUERY": (LOCATION,),
+}
+
+
+# --- Sessions ---
+
+class DialogSession:
+    """State of one call's unfinished flow."""
+    __slots__ = ("intent", "entities", "values", "answered", "pending", "attempts", "expires_at")
+
+    def __init__(self, intent, entities, expires_at):
+        self.intent = intent
+        self.entities = entities
+        self.values = {}
+        self.answered = () # Slots the caller answered when asked (only these are remembered)
+        self.pending = None # Name of the slot the caller was just asked for
+        self.attempts = 0
+        self.expires_at = expires_at
+
+    def to_json(self):
+        return json.dumps({"intent": self.intent, "entities": self.entities, "values": self.values,
+                           "answered": self.answered, "pending": self.pending, "attempts": self.attempts},
+                          ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, text, expires_at):
+        state = json.loads(text)
+        session = cls(state["intent"], state["entities"], expires_at)
+        session.values = state["values"]
+        session.answered = tuple(state["answered"])
+        session.pending = state["pending"]
+        session.attempts = state["attempts"]
+        return session
+
+
+class _LocalSessions:
+    """Per-worker sessions, at most `max_sessions` of them (oldest evicted first)."""
+
+    def __init__(self, max_sessions):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, call_sid, now):
+        with self._lock:
+            session = self._sessions.get(call_sid)
+            if session is not None and session.expires_at <= now:
+                del self._sessions[call_sid]
+                session = None
+            return session
+
+    def put(self, call_sid, session, now):
+        with self._lock:
+            self._sessions[call_sid] = session
+            self._sessions.move_to_end(call_sid)
+            # Oldest first: drop expired ones, and the oldest live ones beyond the bound
+            while self._sessions:
+                oldest = next(iter(self._sessions.values()))
+                if oldest.expires_at > now and len(self._sessions) <= self.max_sessions:
+                    break
+                self._sessions.popitem(last=False)
+
+    def discard(self, call_sid):
+        with self._lock:
+            self._sessions.pop(call_sid, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class _SharedSessions:
+    """Sessions in a SQLite table shared by the workers on a host; expired rows are purged periodically."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._purged = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS dialog_sessions (call_sid TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, call_sid, now):
+        row = self._conn().execute(
+            "SELECT state, expires_at FROM dialog_sessions WHERE call_sid = ? AND expires_at > ?", (call_sid, now)
+        ).fetchone()
+        return DialogSession.from_json(row[0], row[1]) if row else None
+
+    def put(self, call_sid, session, now):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO dialog_sessions (call_sid, state, expires_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(call_sid) DO UPDATE SET state = excluded.state, expires_at = excluded.expires_at",
+            (call_sid, session.to_json(), session.expires_at),
+        )
+        if now - self._purged > PURGE_INTERVAL_SECONDS:
+            self._purged = now
+            conn.execute("DELETE FROM dialog_sessions WHERE expires_at <= ?", (now,))
+
+    def discard(self, call_sid):
+        self._conn().execute("DELETE FROM dialog_sessions WHERE call_sid = ?", (call_sid,))
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM dialog_sessions WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+
+
+class SessionStore:
+    """
+    CallSid -> DialogSession, expiring after `ttl_seconds`. With `shared_path` the sessions are in a
+    SQLite table all workers on the host read, so an answer may land on any worker; without it (or
+    while the table fails) each worker keeps its own, bounded by `max_sessions`.
+    """
+
+    def __init__(self, ttl_seconds=600, max_sessions=50000, shared_path=None):
+        self.ttl_seconds = ttl_seconds
+        self._local_sessions = _LocalSessions(max_sessions)
+        self._sessions = self._local_sessions
+        if shared_path:
+            try:
+                self._sessions = _SharedSessions(shared_path)
+            except sqlite3.Error as e:
+                logger.error(f"Shared dialog session table unavailable at {shared_path}, keeping sessions per worker: {e}")
+
+    def _call(self, method, *args):
+        try:
+            return getattr(self._sessions, method)(*args)
+        except sqlite3.Error as e: # e.g. locked for longer than the timeout: don't fail the call over it
+            logger.warning(f"Shared dialog session table {method} failed, using this worker's sessions: {e}")
+            return getattr(self._local_sessions, method)(*args)
+
+    def get(self, call_sid):
+        return self._call("get", call_sid, time.time())
+
+    def put(self, call_sid, session):
+        now = time.time()
+        session.expires_at = now + self.ttl_seconds
+        self._call("put", call_sid, session, now)
+
+    def discard(self, call_sid):
+        self._call("discard", call_sid)
+        if self._sessions is not self._local_sessions:
+            self._local_sessions.discard(call_sid) # Possibly stored there while the table failed
+
+    def __len__(self):
+        return self._call("__len__")
+
+
+class DialogStep:
+    """
+    Outcome of a turn: either `prompt` (ask the caller and keep listening), or the intent and
+    entities to answer with, the filled slot `values` and the `context_updates` to persist.
+    """
+    __slots__ = ("prompt", "slot", "intent", "entities", "values", "context_updates")
+
+    def __init__(self, prompt=None, slot=None, intent=None, entities=None, values=None, context_updates=None):
+        self.prompt = prompt
+        self.slot = slot
+        self.intent = intent
+        self.entities = entities or {}
+        self.values = values or {}
+        self.context_updates = context_updates or {}
+
+
+class DialogManager:
+    def __init__(self, flows=FLOWS, sessions=None, max_attempts=2):
+        self.flows = flows
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.max_attempts = max_attempts
+
+    def _slot(self, intent, name):
+        return next(slot for slot in self.flows[intent] if slot.name == name)
+
+    def advance(self, call_sid, text, intent_data, farmer_context, lang):
+        """
+        Processes one caller turn. `intent_data` is the NLU result for `text`. Without a
+        call_sid there is no way to resume, so missing slots fall back to defaults right away.
+        """
+        session = self.sessions.get(call_sid) if call_sid else None
+
+        if session is not None and session.pending is not None:
+            slot = self._slot(session.intent, session.pending)
+            value = slot.parse(text)
+            new_intent = intent_data.get("intent", "UNKNOWN")
+            if value is None and new_intent not in ("UNKNOWN", session.intent):
+                # Not an answer but a different question: drop the flow and handle the new one
+                self.sessions.discard(call_sid)
+                session = None
+            elif value is None:
+                session.attempts += 1
+                if session.attempts <= self.max_attempts:
+                    self.sessions.put(call_sid, session)
+                    return DialogStep(prompt=f"{get_prompt('reprompt', lang)} {get_prompt(slot.prompt, lang)}", slot=slot.name)
+                value = slot.default
+            if session is not None:
+                session.values[slot.name] = value
+                if value is not slot.default:
+                    session.answered += (slot.name,)
+                session.pending = None
+                session.attempts = 0
+
+        if session is None:
+            session = DialogSession(intent_data.get("intent", "UNKNOWN"), dict(intent_data.get("entities", {})), 0.0)
+
+        for slot in self.flows.get(session.intent, ()):
+            if slot.name in session.values:
+                continue
+            value = session.entities.get(slot.entity) if slot.entity else None
+            if value is None and slot.in_question:
+                value = slot.parse(text)
+            if value is None and slot.from_context is not None:
+                value = slot.from_context(farmer_context)
+            if value is not None:
+                session.values[slot.name] = value
+                continue
+            if call_sid:
+                session.pending = slot.name
+                self.sessions.put(call_sid, session)
+                return DialogStep(prompt=get_prompt(slot.prompt, lang), slot=slot.name)
+            session.values[slot.name] = slot.default
+
+        if call_sid:
+            self.sessions.discard(call_sid)
+        updates = {}
+        for slot in self.flows.get(session.intent, ()):
+            value = session.values.get(slot.name)
+            if slot.remember and slot.name in session.answered and value != farmer_context.get(slot.context_key):
+                updates[slot.context_key] = value
+        return DialogStep(intent=session.intent, entities=session.entities, values=session.values, context_updates=updates)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_dialog_manager():
+    """Returns the process-wide dialog manager, creating it from config on first use."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = DialogManager(
+                    sessions=SessionStore(config.DIALOG_SESSION_TTL_SECONDS, config.DIALOG_MAX_SESSIONS,
+                                          shared_path=config.DIALOG_SESSION_DB_PATH or None),
+                    max_attempts=config.DIALOG_MAX_ATTEMPTS,
+                )
+    return _manager
@@ -1,119 +1,105 @@
 import random
-import os
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from flask import current_app
 from src.config import config # To get model path
+from src.core.disease_inference import ImageDecodeError, get_inference_engine, inference_available
+from src.core.image_cache import get_image_cache
+from src.core.symptom_engine import get_symptom_engine
+from src.utils.tracing import traced
 
-# --- Placeholder for loading a real ML model ---
-# !! Uncomment and adapt when you have a trained model !!
-disease_model = None
-# try:
-#     model_path = config.DISEASE_MODEL_PATH
-#     if os.path.exists(model_path):
-#         # Example using joblib (for scikit-learn models)
-#         from joblib import load
-#         disease_model = load(model_path)
-#         current_app.logger.info(f"Disease detection model loaded successfully from {model_path}")
-#         # Or using TensorFlow/Keras:
-#         # import tensorflow as tf
-#         # disease_model = tf.keras.models.load_model(model_path)
-#         # current_app.logger.info(f"Disease detection model loaded successfully from {model_path}")
-#     else:
-#         current_app.logger.warning(f"Disease model file not found at: {model_path}")
-# except ImportError as ie:
-#      current_app.logger.error(f"Model loading library not installed: {ie}. Cannot load disease model.")
-# except Exception as e:
-#     current_app.logger.error(f"Error loading disease model from {config.DISEASE_MODEL_PATH}: {e}")
-#     disease_model = None
-# --- End Placeholder ---
+# --- Disease model ---
+# The model is loaded lazily by src/core/disease_inference.py (once per inference process)
+# from config.DISEASE_MODEL_PATH. Without a model file (or without NumPy/Pillow installed)
+# image detection falls back to the simulation below.
 
+SYMPTOM_CLOSE_MARGIN = 0.1 # Runners-up within this confidence of the best match are named as well
 
+
+def _format_image_result(diagnosis, advice, confidence):
+    return {
+        "diagnosis": f"{diagnosis} ({confidence*100:.1f}% संभावना)" if confidence > 0 else diagnosis,
+        "advice": advice
+    }
+
+
+@traced()
 def detect_disease_from_image(image_data_or_ref):
     """
-    Placeholder: Analyzes an image to detect crop disease.
-    !! REPLACE with actual model inference !!
+    Analyzes an image (raw bytes) to detect crop disease. Duplicates of already diagnosed
+    images are answered from src/core/image_cache.py without running the model.
+    Images are micro-batched with other concurrent requests and run through the model in a
+    process pool; this call waits for its own result (up to DISEASE_INFERENCE_TIMEOUT_SECONDS).
     """
     logger = current_app.logger
-    logger.info(f"[SIMULATE] Disease Detection: Analyzing image reference '{image_data_or_ref}'")
 
-    diagnosis = "विश्लेषण संभव नहीं हुआ।"
-    advice = "कृपया सुनिश्चित करें कि फोटो साफ हो और प्रभावित हिस्से पर केंद्रित हो।"
-    confidence = 0.0
-
-    global disease_model # Access the potentially loaded model
-    if disease_model:
+    engine = get_inference_engine() if isinstance(image_data_or_ref, (bytes, bytearray)) else None
+    if engine is not None:
+        logger.info(f"Disease Detection: Analyzing image ({len(image_data_or_ref)} bytes)")
+        # Forwarded photos repeat a lot: reuse the diagnosis of an identical or near-identical image
+        image_cache = get_image_cache()
+        fingerprint = image_cache.fingerprint(image_data_or_ref)
+        cached = image_cache.lookup(fingerprint)
+        if cached is not None:
+            logger.debug("Disease Detection Result (cached): %s", cached)
+            return dict(cached)
         try:
-            # --- !! Add real image preprocessing and model prediction here !! ---
-            # 1. Decode/Load image_data_or_ref into suitable format (e.g., NumPy array)
-            #    Requires Pillow or OpenCV: from PIL import Image; import io; img = Image.open(io.BytesIO(image_data))
-            # 2. Preprocess image (resize, normalize) according to model requirements.
-            # 3. Predict: prediction = disease_model.predict(processed_image_batch)
-            # 4. Decode prediction: Map output probabilities/classes to disease names & confidence.
-            # --- End Real Implementation Block ---
-
-            # --- Simulation if model is loaded but prediction fails/not implemented ---
-            logger.warning("Disease model is loaded, but prediction logic is not implemented. Using simulation.")
-            possible_diseases = [
-                {"name": "गेहूं का रतुआ (Rust)", "advice": "फफूंदनाशक जैसे Mancozeb या Propiconazole का प्रयोग विशेषज्ञ की सलाह से करें।"},
-                {"name": "धान का ब्लास्ट (Blast)", "advice": "संक्रमित पौधों को हटाएं। Tricyclazole या Isoprothiolane आधारित फफूंदनाशक उपयोगी हो सकते हैं।"},
-                {"name": "स्वस्थ फसल", "advice": "आपकी फसल स्वस्थ प्रतीत होती है। निगरानी जारी रखें।" },
-                {"name": "पाउडरी मिल्ड्यू (Powdery Mildew)", "advice": "सल्फर आधारित या Hexaconazole फफूंदनाशक का छिड़काव करें।" }
-            ]
-            chosen = random.choice(possible_diseases)
-            diagnosis = chosen["name"]
-            advice = chosen["advice"]
-            confidence = random.uniform(0.6, 0.95) if diagnosis != "स्वस्थ फसल" else 1.0
-
+            label, confidence = engine.submit(image_data_or_ref).result(timeout=config.DISEASE_INFERENCE_TIMEOUT_SECONDS)
+            if label.get("healthy"):
+                confidence = 1.0
+            result = _format_image_result(label["name"], label.get("advice", "विशेषज्ञ से सलाह लें।"), confidence)
+            image_cache.store(fingerprint, result) # Only model results are cached, never errors
+        except ImageDecodeError as e:
+            logger.warning(f"Disease Detection: {e}")
+            result = _format_image_result("विश्लेषण संभव नहीं हुआ।", "कृपया सुनिश्चित करें कि फोटो साफ हो और प्रभावित हिस्से पर केंद्रित हो।", 0.0)
+        except FutureTimeoutError:
+            logger.error("Disease Detection: inference timed out")
+            result = _format_image_result("विश्लेषण में अधिक समय लग रहा है।", "कृपया थोड़ी देर बाद फोटो दोबारा भेजें।", 0.0)
         except Exception as e:
-            logger.error(f"Error during simulated disease prediction: {e}")
-            diagnosis = "मॉडल द्वारा विश्लेषण के दौरान त्रुटि हुई।"
-            advice = "कृपया बाद में पुन: प्रयास करें।"
-    else:
-        # --- Simulation if model is *not* loaded ---
-        logger.warning("Disease model not loaded. Using simulation.")
-        possible_diseases = [
-            {"name": "गेहूं का पीला रतुआ (Yellow Rust)", "advice": "विशेषज्ञ से संपर्क करें। Propiconazole का प्रयोग उपयोगी हो सकता है।"},
-            {"name": "स्वस्थ फसल", "advice": "फसल ठीक दिख रही है।"},
-            {"name": "पोषक तत्व की कमी (Nutrient Deficiency)", "advice": "पत्तियों के रंग और पैटर्न के आधार पर विशेषज्ञ से सलाह लें। मिट्टी जांच कराएं।" }
-        ]
-        chosen = random.choice(possible_diseases)
-        diagnosis = chosen["name"]
-        advice = chosen["advice"]
-        confidence = random.uniform(0.5, 0.8) if diagnosis != "स्वस्थ फसल" else 1.0
+            logger.error(f"Error during disease prediction: {e}")
+            result = _format_image_result("मॉडल द्वारा विश्लेषण के दौरान त्रुटि हुई।", "कृपया बाद में पुन: प्रयास करें।", 0.0)
+        logger.debug("Disease Detection Result: %s", result)
+        return result
 
+    # --- Simulation if model is *not* available ---
+    logger.info(f"[SIMULATE] Disease Detection: Analyzing image reference '{str(image_data_or_ref)[:80]}'")
+    logger.warning("Disease model not loaded. Using simulation.")
+    possible_diseases = [
+        {"name": "गेहूं का पीला रतुआ (Yellow Rust)", "advice": "विशेषज्ञ से संपर्क करें। Propiconazole का प्रयोग उपयोगी हो सकता है।"},
+        {"name": "स्वस्थ फसल", "advice": "फसल ठीक दिख रही है।"},
+        {"name": "पोषक तत्व की कमी (Nutrient Deficiency)", "advice": "पत्तियों के रंग और पैटर्न के आधार पर विशेषज्ञ से सलाह लें। मिट्टी जांच कराएं।" }
+    ]
+    chosen = random.choice(possible_diseases)
+    diagnosis = chosen["name"]
+    advice = chosen["advice"]
+    confidence = random.uniform(0.5, 0.8) if diagnosis != "स्वस्थ फसल" else 1.0
 
-    result = {
-        "diagnosis": f"{diagnosis} ({confidence*100:.1f}% संभावना)" if confidence > 0 else diagnosis,
-        "advice": advice
-    }
-    logger.info(f"[SIMULATE] Disease Detection Result: {result}")
+    result = _format_image_result(diagnosis, advice, confidence)
+    logger.debug("[SIMULATE] Disease Detection Result: %s", result)
     return result
 
+@traced()
 def diagnose_from_symptoms(symptoms_description, crop, location):
     """
-    Placeholder: Diagnoses disease based on voice description of symptoms.
-    !! REPLACE with NLP symptom matching, rule engine, or expert system !!
+    Diagnoses disease from a (voice) description of symptoms by ranking the crop's diseases in
+    the symptom catalog (src/core/symptom_engine.py). Close runners-up are mentioned too.
     """
     logger = current_app.logger
-    logger.info(f"[SIMULATE] Disease Diagnosis from symptoms: '{symptoms_description}' (Crop: {crop})")
+    logger.info(f"Disease Diagnosis from symptoms: '{symptoms_description}' (Crop: {crop})")
 
     diagnosis = "लक्षणों के आधार पर सटीक रोग बताना मुश्किल है।"
     advice = "कृपया नजदीकी कृषि विशेषज्ञ से संपर्क करें या अधिक स्पष्ट लक्षण बताएं या फसल की साफ फोटो भेजें।"
 
-    # --- Simple Keyword Matching Simulation ---
-    desc_lower = symptoms_description.lower()
-    if "पीलापन" in symptoms_description or "yellowing" in desc_lower or "पीली पत्तियां" in symptoms_description:
-        diagnosis = "संभावित पोषक तत्व की कमी या पानी की समस्या"
-        advice = "मिट्टी की जांच कराने और सिंचाई का प्रबंधन करने की सलाह दी जाती है।"
-    elif ("सफेद धब्बे" in symptoms_description or "white spots" in desc_lower or "पाउडर" in desc_lower):
-        diagnosis = "संभावित पाउडरी मिल्ड्यू (Powdery Mildew) फफूंद संक्रमण"
-        advice = "विशेषज्ञ की सलाह पर उचित फफूंदनाशक का प्रयोग करें।"
-    elif "रतुआ" in symptoms_description or "rust" in desc_lower or "नारंगी पाउडर" in symptoms_description:
-        diagnosis = "संभावित रतुआ रोग (Rust)"
-        advice = "यह गंभीर हो सकता है। तुरंत कृषि विशेषज्ञ से संपर्क करें और अनुशंसित फफूंदनाशक का प्रयोग करें।"
-    elif "कीड़े" in symptoms_description or "insect" in desc_lower or "छेद" in symptoms_description or "hole" in desc_lower:
-         diagnosis = "संभावित कीट प्रकोप"
-         advice = "कीट की पहचान के लिए फोटो भेजें या विशेषज्ञ को दिखाएं। सही कीटनाशक का प्रयोग करें।"
+    matches = get_symptom_engine().rank(symptoms_description, crop)
+    if matches and matches[0].confidence >= config.SYMPTOM_MIN_CONFIDENCE:
+        best = matches[0]
+        diagnosis = f"संभावित {best.disease.name}"
+        alternatives = [m.disease.name for m in matches[1:] if m.confidence >= best.confidence - SYMPTOM_CLOSE_MARGIN]
+        if alternatives:
+            diagnosis += " या " + ", ".join(alternatives)
+        result = _format_image_result(diagnosis, best.disease.advice, best.confidence)
+        result["candidates"] = [{"id": m.disease.id, "confidence": round(m.confidence, 3)} for m in matches]
+    else:
+        result = {"diagnosis": diagnosis, "advice": advice, "candidates": []}
 
-    result = {"diagnosis": diagnosis, "advice": advice}
-    logger.info(f"[SIMULATE] Symptom Diagnosis Result: {result}")
-    return result
\ No newline at end of file
+    logger.debug("Symptom Diagnosis Result: %s", result)
+    return result
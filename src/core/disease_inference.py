@@ -0,0 +1,248 @@
+# Disease image inference engine
+# - Model is loaded lazily, once per inference process, from config.DISEASE_MODEL_PATH
+# - CPU-only preprocessing: Pillow decodes (JPEG draft mode decodes at reduced scale) and
+#   resizes to the model input; images travel to the model as one stacked uint8 batch
+#   (4x smaller than float32) and are normalized in place inside the inference process
+# - Micro-batching: concurrent images arriving within a few milliseconds share one forward pass
+# - Forward passes run in a process pool, off the Flask workers' GIL
+import io
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from src.config import config
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError: # Optional dependencies: without them detection falls back to simulation
+    np = None
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class ImageDecodeError(ValueError):
+    """The uploaded bytes are not a decodable image."""
+
+
+def inference_available():
+    """True if NumPy/Pillow are installed and a model file exists."""
+    return np is not None and Image is not None and os.path.exists(config.DISEASE_MODEL_PATH)
+
+
+def load_labels(path=None):
+    with open(path or config.DISEASE_LABELS_PATH, encoding="utf-8") as f:
+        return json.load(f)["labels"]
+
+
+# --- Preprocessing ---
+
+def decode_and_resize(image_bytes, size):
+    """
+    Decodes image bytes to a (size, size, 3) uint8 array. For JPEGs, `draft` lets libjpeg
+    decode directly at 1/2, 1/4 or 1/8 scale, which skips most of the decode work for phone photos.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.draft("RGB", (size, size))
+        image = image.convert("RGB").resize((size, size), Image.BILINEAR)
+    except Exception as e:
+        raise ImageDecodeError(f"Could not decode image: {e}") from e
+    return np.asarray(image, dtype=np.uint8) # Small (size x size) array; the full-size image is never materialized
+
+
+def normalize_batch(batch_uint8, mean=IMAGENET_MEAN, std=IMAGENET_STD):
+    """uint8 (N, H, W, 3) -> float32 normalized. One dtype conversion, everything else in place."""
+    batch = batch_uint8.astype(np.float32)
+    batch *= 1.0 / 255.0
+    batch -= np.asarray(mean, dtype=np.float32)
+    batch /= np.asarray(std, dtype=np.float32)
+    return batch
+
+
+# --- Model (inside inference processes) ---
+
+_model = None
+
+
+def _load_model(model_path):
+    """Loads joblib/pickle (scikit-learn style) or Keras models. Called once per process."""
+    if model_path.endswith((".h5", ".keras")):
+        import tensorflow as tf
+        return tf.keras.models.load_model(model_path)
+    try:
+        from joblib import load
+        return load(model_path)
+    except ImportError:
+        with open(model_path, "rb") as f:
+            return pickle.load(f)
+
+
+def _init_worker(model_path):
+    global _model
+    _model = _load_model(model_path)
+
+
+def predict_batch(batch_uint8, model_path=None):
+    """
+    Runs one forward pass. Returns (N, num_classes) probabilities as float32.
+    Models exposing `predict_proba` (scikit-learn) get flattened features; others
+    (Keras/TF style) get the 4-D tensor.
+    """
+    global _model
+    if _model is None:
+        _model = _load_model(model_path or config.DISEASE_MODEL_PATH)
+    batch = normalize_batch(batch_uint8)
+    if hasattr(_model, "predict_proba"):
+        probabilities = _model.predict_proba(batch.reshape(len(batch), -1))
+    else:
+        probabilities = _model.predict(batch)
+    return np.asarray(probabilities, dtype=np.float32)
+
+
+# --- Micro-batching scheduler ---
+
+class MicroBatcher:
+    """
+    Groups requests into batches: a batch is dispatched when it reaches `max_batch` items or
+    `max_wait` seconds after its first item arrived, whichever comes first. Up to
+    `max_in_flight` batches run concurrently (one per inference process).
+    """
+
+    def __init__(self, run_batch, max_batch=16, max_wait=0.02, max_in_flight=1):
+        self.run_batch = run_batch # callable(list of items) -> Future of list of results
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._thread = threading.Thread(target=self._loop, name="disease-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._slots.acquire() # Backpressure: wait for a free inference process
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        futures = [future for _, future in batch]
+        try:
+            batch_future = self.run_batch([item for item, _ in batch])
+        except Exception as e:
+            self._slots.release()
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        def _done(done_future):
+            self._slots.release()
+            error = done_future.exception()
+            for index, future in enumerate(futures):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(done_future.result()[index])
+
+        batch_future.add_done_callback(_done)
+
+
+class DiseaseInferenceEngine:
+    """Accepts image bytes, returns futures of (label dict, confidence)."""
+
+    def __init__(self, model_path=None, processes=None, input_size=None, max_batch=None, max_wait_ms=None):
+        self.model_path = model_path or config.DISEASE_MODEL_PATH
+        self.input_size = input_size or config.DISEASE_MODEL_INPUT_SIZE
+        self.labels = load_labels()
+        processes = config.DISEASE_INFERENCE_PROCESSES if processes is None else processes
+        if processes > 0:
+            # 'spawn': the Flask process is multi-threaded, forking it could copy held locks
+            self._executor = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.model_path,),
+            )
+        else:
+            self._executor = None # In-process inference (development / single-core hosts)
+        self._batcher = MicroBatcher(
+            self._run_batch,
+            max_batch=max_batch or config.DISEASE_BATCH_MAX_SIZE,
+            max_wait=(max_wait_ms if max_wait_ms is not None else config.DISEASE_BATCH_MAX_WAIT_MS) / 1000.0,
+            max_in_flight=max(1, processes),
+        )
+
+    def _run_batch(self, images):
+        batch = np.stack(images) # (N, H, W, 3) uint8, the only copy made while batching
+        if self._executor is not None:
+            return self._executor.submit(predict_batch, batch, self.model_path)
+        future = Future()
+        try:
+            future.set_result(predict_batch(batch, self.model_path))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def submit(self, image_bytes):
+        """Decodes on the calling thread, then queues for batched inference. Returns a Future."""
+        image = decode_and_resize(image_bytes, self.input_size)
+        result = Future()
+
+        def _to_label(probabilities_future):
+            error = probabilities_future.exception()
+            if error is not None:
+                result.set_exception(error)
+                return
+            probabilities = probabilities_future.result()
+            index = int(np.argmax(probabilities))
+            label = self.labels[index] if index < len(self.labels) else {"label": str(index), "name": str(index)}
+            result.set_result((label, float(probabilities[index])))
+
+        self._batcher.submit(image).add_done_callback(_to_label)
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_engine = None
+_engine_pid = None
+_engine_lock = threading.Lock()
+
+
+def get_inference_engine():
+    """Returns this process's engine (created on first image), or None if inference is unavailable."""
+    global _engine, _engine_pid
+    if _engine is not None and _engine_pid == os.getpid():
+        return _engine
+    if not inference_available():
+        return None
+    with _engine_lock:
+        if _engine is None or _engine_pid != os.getpid():
+            _engine = DiseaseInferenceEngine()
+            _engine_pid = os.getpid()
+            logger.info(f"Disease inference engine started (model: {config.DISEASE_MODEL_PATH})")
+    return _engine
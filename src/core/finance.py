@@ -1,6 +1,10 @@
 import random
 from flask import current_app
+from src.config import config
+from src.utils.cache import cached_response
+from src.utils.tracing import traced
 
+@traced()
 def check_loan_eligibility(farmer_context):
     """
     Placeholder: Checks loan eligibility based on farmer data.
@@ -41,10 +45,14 @@ def check_loan_eligibility(farmer_context):
         "message": message,
         "potential_lenders": potential_lenders
     }
-    logger.info(f"[SIMULATE] Loan Eligibility Result for {farmer_id}: {result}")
+    logger.debug("[SIMULATE] Loan Eligibility Result for %s: %s", farmer_id, result)
     return result
 
 
+# Scheme information only varies with crop and location and changes seasonally, not per farmer:
+# cached for a day (CACHE_TTL_INSURANCE_SECONDS)
+@traced()
+@cached_response("insurance", ttl_seconds=lambda: config.CACHE_TTL_INSURANCE_SECONDS)
 def get_insurance_info(crop, location):
     """
     Placeholder: Provides information about relevant crop insurance schemes (like PMFBY).
@@ -63,5 +71,5 @@ def get_insurance_info(crop, location):
     # Add specific deadline if known (e.g., "रबी फसलों के लिए अंतिम तिथि आमतौर पर दिसंबर में होती है।")
 
     result = {"scheme_name": scheme_name, "info": info}
-    logger.info(f"[SIMULATE] Insurance Info Result: {result}")
+    logger.debug("[SIMULATE] Insurance Info Result: %s", result)
     return result
\ No newline at end of file
@@ -0,0 +1,270 @@
+# Location -> nearest mandis / buyers
+# - A farmer's `location` (district name or alias in any script, or "lat,lon") is resolved to coordinates
+# - Mandis and buyers are bucketed into a fixed lat/lon grid; k-nearest searches scan rings of
+#   cells outward from the farmer's cell and stop as soon as no unscanned cell can hold a closer
+#   point, so a lookup touches a handful of cells instead of every mandi/buyer in the country
+# - Results are cached per (location, crop, k, ...) in a bounded LRU; the directory file is
+#   hot-reloaded when it changes (the cache is dropped with the old index)
+import json
+import logging
+import math
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.195
+
+
+def _key(value):
+    return " ".join(str(value).split()).casefold() if value else ""
+
+
+def _is_word_char(text, index):
+    # Letters, digits and combining marks (Devanagari matras/virama) continue a word
+    return 0 <= index < len(text) and unicodedata.category(text[index])[0] in "LMN"
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def parse_lat_lon(text):
+    """'25.45, 78.57' -> (25.45, 78.57); None if `text` is not a coordinate pair."""
+    parts = str(text).replace(";", ",").split(",")
+    if len(parts) != 2:
+        return None
+    try:
+        lat, lon = float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+    return (lat, lon) if -90 <= lat <= 90 and -180 <= lon <= 180 else None
+
+
+class GridIndex:
+    """Points bucketed into `cell_degrees` x `cell_degrees` cells, with ring-expanding k-nearest search."""
+
+    def __init__(self, items, cell_degrees=0.5):
+        self.items = list(items) # dicts with 'lat' and 'lon'
+        self.cell_degrees = cell_degrees
+        self._cells = {}
+        for position, item in enumerate(self.items):
+            self._cells.setdefault(self._cell(item["lat"], item["lon"]), []).append(position)
+        if self._cells:
+            rows = [cell[0] for cell in self._cells]
+            cols = [cell[1] for cell in self._cells]
+            self._bounds = (min(rows), max(rows), min(cols), max(cols))
+            self._max_abs_lat = max(abs(item["lat"]) for item in self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def _ring(self, row, col, radius):
+        if radius == 0:
+            yield (row, col)
+            return
+        for c in range(col - radius, col + radius + 1):
+            yield (row - radius, c)
+            yield (row + radius, c)
+        for r in range(row - radius + 1, row + radius):
+            yield (r, col - radius)
+            yield (r, col + radius)
+
+    def nearest(self, lat, lon, k=3, max_km=None, predicate=None):
+        """Up to `k` (distance_km, item) pairs, nearest first, optionally within `max_km` and matching `predicate`."""
+        if not self._cells or k <= 0:
+            return []
+        row, col = self._cell(lat, lon)
+        min_row, max_row, min_col, max_col = self._bounds
+        max_radius = max(abs(row - min_row), abs(row - max_row), abs(col - min_col), abs(col - max_col))
+        # Narrowest cell width (km) between the query and any indexed point: longitude cells shrink towards the poles
+        widest_lat = min(89.9, max(abs(lat), self._max_abs_lat) + self.cell_degrees)
+        cell_km = KM_PER_DEGREE_LAT * self.cell_degrees * max(0.01, math.cos(math.radians(widest_lat)))
+        found = [] # sorted (distance, position)
+        for radius in range(max_radius + 1):
+            for cell in self._ring(row, col, radius):
+                for position in self._cells.get(cell, ()):
+                    item = self.items[position]
+                    if predicate is not None and not predicate(item):
+                        continue
+                    distance = haversine_km(lat, lon, item["lat"], item["lon"])
+                    if max_km is not None and distance > max_km:
+                        continue
+                    found.append((distance, position))
+            found.sort()
+            del found[k:]
+            # Anything in ring radius+1 or beyond is at least `radius` whole cells away
+            unscanned_min_km = radius * cell_km
+            if (len(found) == k and found[-1][0] <= unscanned_min_km) or (max_km is not None and unscanned_min_km > max_km):
+                break
+        return [(round(distance, 1), self.items[position]) for distance, position in found]
+
+
+class MarketDirectory:
+    """Districts (for resolving names), mandis and buyers, with cached nearest-neighbour lookups."""
+
+    def __init__(self, districts, mandis, buyers, cell_degrees=0.5, cache_size=4096):
+        self._places = {}
+        self._place_names = {} # key -> canonical district/mandi name
+        self.districts = [(district["name"], district["lat"], district["lon"]) for district in districts]
+        for district in districts:
+            coordinates = (district["lat"], district["lon"])
+            for name in [district["name"]] + list(district.get("aliases", [])):
+                self._places[_key(name)] = coordinates
+                self._place_names[_key(name)] = district["name"]
+        for item in list(mandis) + list(buyers):
+            item["crops_set"] = frozenset(_key(crop) for crop in item.get("crops", []))
+        for mandi in mandis:
+            self._places.setdefault(_key(mandi["name"]), (mandi["lat"], mandi["lon"]))
+            self._place_names.setdefault(_key(mandi["name"]), mandi["name"])
+        self._place_matcher = None # Built on first find_place()
+        self.mandis = GridIndex(mandis, cell_degrees)
+        self.buyers = GridIndex(buyers, cell_degrees)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def resolve(self, location):
+        """(lat, lon) for a district/mandi name, alias or 'lat,lon' string; None if unknown."""
+        if isinstance(location, (tuple, list)) and len(location) == 2:
+            return float(location[0]), float(location[1])
+        if not location:
+            return None
+        return self._places.get(_key(location)) or parse_lat_lon(location)
+
+    def find_place(self, text):
+        """
+        Canonical name of the district/mandi mentioned in free text (e.g. a caller's answer
+        "मैं झांसी से बोल रहा हूँ" -> "Jhansi"), longest whole-word match; None if none is mentioned.
+        """
+        if self._place_matcher is None:
+            from src.core.intent_engine import KeywordAutomaton
+            matcher = KeywordAutomaton()
+            for key, name in self._place_names.items():
+                matcher.add(key, name)
+            matcher.build()
+            self._place_matcher = matcher
+        normalized = _key(text)
+        best = None
+        for start, end, name in self._place_matcher.iter_matches(normalized):
+            if _is_word_char(normalized, start - 1) or _is_word_char(normalized, end):
+                continue # Part of a longer word
+            if best is None or end - start > best[0]:
+                best = (end - start, name)
+        return best[1] if best else None
+
+    def _cached(self, key, compute):
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        value = compute()
+        with self._cache_lock:
+            self._cache[key] = value
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return value
+
+    def nearest_mandis(self, location, crop=None, k=3, max_km=None):
+        """[(distance_km, mandi), ...] trading `crop`, nearest first. Empty if the location is unknown."""
+        max_km = config.GEO_MAX_DISTANCE_KM if max_km is None else max_km
+        crop_key = _key(crop)
+
+        def compute():
+            coordinates = self.resolve(location)
+            if coordinates is None:
+                return []
+            predicate = (lambda mandi: crop_key in mandi["crops_set"]) if crop_key else None
+            return self.mandis.nearest(coordinates[0], coordinates[1], k, max_km, predicate)
+
+        return self._cached(("mandis", _key(location), crop_key, k, max_km), compute)
+
+    def nearest_buyers(self, location, crop=None, quantity=None, k=3, max_km=None):
+        """[(distance_km, buyer), ...] buying `crop` with capacity for `quantity` quintals, nearest first."""
+        max_km = config.GEO_MAX_DISTANCE_KM if max_km is None else max_km
+        crop_key = _key(crop)
+        quantity = float(quantity) if quantity else 0.0
+
+        def predicate(buyer):
+            if crop_key and crop_key not in buyer["crops_set"]:
+                return False
+            capacity = buyer.get("capacity_quintals")
+            return capacity is None or capacity >= quantity
+
+        def compute():
+            coordinates = self.resolve(location)
+            if coordinates is None:
+                return []
+            return self.buyers.nearest(coordinates[0], coordinates[1], k, max_km, predicate)
+
+        return self._cached(("buyers", _key(location), crop_key, quantity, k, max_km), compute)
+
+
+def load_market_directory(path=None):
+    with open(path or config.MARKET_DIRECTORY_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    return MarketDirectory(
+        data.get("districts", []), data.get("mandis", []), data.get("buyers", []),
+        cell_degrees=config.GEO_GRID_CELL_DEGREES, cache_size=config.GEO_CACHE_SIZE,
+    )
+
+
+class _ReloadingDirectory:
+    """Holds the current directory and reloads it when the file's mtime changes (checked at most every few seconds)."""
+
+    def __init__(self, path, check_interval):
+        self.path = path
+        self.check_interval = check_interval
+        self._directory = MarketDirectory([], [], [])
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_interval
+                    self._reload_if_changed()
+        return self._directory
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logger.warning(f"Market directory file not available at {self.path}: {e}")
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self._directory = load_market_directory(self.path)
+            self._mtime = mtime
+            logger.info(f"Loaded {len(self._directory.mandis)} mandis and {len(self._directory.buyers)} buyers from {self.path}")
+        except (ValueError, KeyError, TypeError) as e:
+            # Keep serving the previous directory if an edit left the file invalid
+            logger.error(f"Invalid market directory file {self.path}, keeping previous version: {e}")
+
+
+_directory = None
+_directory_lock = threading.Lock()
+
+
+def get_market_directory():
+    """Returns the current MarketDirectory (hot-reloaded from config.MARKET_DIRECTORY_PATH)."""
+    global _directory
+    if _directory is None:
+        with _directory_lock:
+            if _directory is None:
+                _directory = _ReloadingDirectory(config.MARKET_DIRECTORY_PATH, config.MARKET_DIRECTORY_RELOAD_SECONDS)
+    return _directory.get()
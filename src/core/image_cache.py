@@ -0,0 +1,308 @@
+# Diagnosis cache for crop-disease images
+# - Exact duplicates (the same forwarded file) are found by SHA-256 of the bytes
+# - Near duplicates (re-compressed/resized copies circulating in WhatsApp groups) are found by a
+#   64-bit difference hash (dHash) within a small Hamming distance, using a multi-index:
+#   the hash is split into (max_distance + 1) bands, and by the pigeonhole principle any hash
+#   within max_distance bits shares at least one band exactly, so only those buckets are checked
+# - Bounded LRU in memory, persisted to SQLite so it survives restarts and is shared by workers
+# - Entries are tagged with the model file's version: replacing the model drops old diagnoses
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from src.config import config
+
+try:
+    from PIL import Image
+except ImportError: # Without Pillow only exact duplicates are detected
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+TRIM_EVERY_PUTS = 200 # Disk table is trimmed back to max_entries this often
+
+
+def exact_hash(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def difference_hash(image_bytes):
+    """
+    64-bit dHash: grayscale 9x8 thumbnail, one bit per horizontally adjacent pixel pair
+    (left brighter than right). Robust to re-compression, resizing and small brightness changes.
+    Returns None if Pillow is missing or the bytes are not an image.
+    """
+    if Image is None:
+        return None
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.draft("L", (64, 64)) # JPEG: decode at reduced scale, the thumbnail is tiny anyway
+        pixels = image.convert("L").resize((9, 8), Image.BILINEAR).tobytes() # One byte per pixel
+    except Exception:
+        return None
+    value = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def model_version(model_path=None):
+    """Identifies the model file so diagnoses made by a previous model are not reused."""
+    path = model_path or config.DISEASE_MODEL_PATH
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "none"
+    return f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def _to_signed(value):
+    # SQLite INTEGER is signed 64-bit
+    return value - (1 << HASH_BITS) if value >= (1 << (HASH_BITS - 1)) else value
+
+
+def _to_unsigned(value):
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+class _Entry:
+    __slots__ = ("sha256", "phash", "result")
+
+    def __init__(self, sha256, phash, result):
+        self.sha256 = sha256
+        self.phash = phash
+        self.result = result
+
+
+class _BandIndex:
+    """Multi-index hashing over `bands` disjoint bit ranges of a 64-bit hash."""
+
+    def __init__(self, max_distance):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        width, extra = divmod(HASH_BITS, bands)
+        self._ranges = []
+        shift = 0
+        for band in range(bands):
+            bits = width + (1 if band < extra else 0)
+            self._ranges.append((shift, (1 << bits) - 1))
+            shift += bits
+        self._buckets = [{} for _ in self._ranges] # band value -> set of sha256
+
+    def _keys(self, phash):
+        return [(phash >> shift) & mask for shift, mask in self._ranges]
+
+    def add(self, phash, sha256):
+        for buckets, key in zip(self._buckets, self._keys(phash)):
+            buckets.setdefault(key, set()).add(sha256)
+
+    def remove(self, phash, sha256):
+        for buckets, key in zip(self._buckets, self._keys(phash)):
+            members = buckets.get(key)
+            if members is not None:
+                members.discard(sha256)
+                if not members:
+                    del buckets[key]
+
+    def candidates(self, phash):
+        found = set()
+        for buckets, key in zip(self._buckets, self._keys(phash)):
+            found.update(buckets.get(key, ()))
+        return found
+
+
+class _SQLiteStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS image_diagnoses ("
+            " sha256 TEXT PRIMARY KEY, phash INTEGER, model_version TEXT NOT NULL,"
+            " result TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS idx_image_diagnoses_last_used ON image_diagnoses (last_used)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load_recent(self, version, limit):
+        """Most recently used entries first. Entries of other model versions are deleted."""
+        self._conn().execute("DELETE FROM image_diagnoses WHERE model_version != ?", (version,))
+        rows = self._conn().execute(
+            "SELECT sha256, phash, result FROM image_diagnoses ORDER BY last_used DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [(sha, _to_unsigned(phash) if phash is not None else None, json.loads(result)) for sha, phash, result in rows]
+
+    def get(self, sha256, version):
+        row = self._conn().execute(
+            "SELECT phash, result FROM image_diagnoses WHERE sha256 = ? AND model_version = ?", (sha256, version)
+        ).fetchone()
+        if row is None:
+            return None
+        return _to_unsigned(row[0]) if row[0] is not None else None, json.loads(row[1])
+
+    def put(self, sha256, phash, version, result):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO image_diagnoses (sha256, phash, model_version, result, last_used) VALUES (?, ?, ?, ?, ?)",
+            (sha256, _to_signed(phash) if phash is not None else None, version,
+             json.dumps(result, ensure_ascii=False), time.time()),
+        )
+
+    def touch(self, sha256):
+        self._conn().execute("UPDATE image_diagnoses SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+
+    def trim(self, max_entries):
+        """Evicts least recently used rows beyond `max_entries`."""
+        self._conn().execute(
+            "DELETE FROM image_diagnoses WHERE sha256 IN ("
+            " SELECT sha256 FROM image_diagnoses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (max_entries,),
+        )
+
+
+class ImageDiagnosisCache:
+    """Maps images (exact or near-duplicate) to a stored diagnosis result."""
+
+    def __init__(self, path=None, max_entries=20000, max_distance=4, version=None):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.version = version or model_version()
+        self._entries = OrderedDict() # sha256 -> _Entry, least recently used first
+        self._index = _BandIndex(max_distance)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._stats = {"exact_hits": 0, "near_hits": 0, "misses": 0}
+        self._disk = None
+        if path:
+            try:
+                self._disk = _SQLiteStore(path)
+                for sha256, phash, result in reversed(self._disk.load_recent(self.version, max_entries)):
+                    self._memory_put(sha256, phash, result)
+            except sqlite3.Error as e:
+                logger.error(f"Image diagnosis cache disk store unavailable at {path}: {e}")
+                self._disk = None
+
+    def _memory_put(self, sha256, phash, result):
+        # Called with self._lock held (or during __init__)
+        old = self._entries.pop(sha256, None)
+        if old is not None and old.phash is not None:
+            self._index.remove(old.phash, sha256)
+        self._entries[sha256] = _Entry(sha256, phash, result)
+        if phash is not None:
+            self._index.add(phash, sha256)
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            if evicted.phash is not None:
+                self._index.remove(evicted.phash, evicted.sha256)
+
+    def _nearest(self, phash):
+        # Called with self._lock held
+        best, best_distance = None, self.max_distance + 1
+        for sha256 in self._index.candidates(phash):
+            distance = (self._entries[sha256].phash ^ phash).bit_count()
+            if distance < best_distance:
+                best, best_distance = sha256, distance
+        return best
+
+    def fingerprint(self, image_bytes):
+        """(sha256, phash) of an image; compute once and pass to both lookup and store."""
+        return exact_hash(image_bytes), difference_hash(image_bytes)
+
+    def lookup(self, fingerprint):
+        """Returns the stored result for an exact or near-duplicate image, or None."""
+        sha256, phash = fingerprint
+        with self._lock:
+            entry = self._entries.get(sha256)
+            kind = "exact_hits" if entry is not None else None
+            if entry is None and phash is not None:
+                nearest = self._nearest(phash)
+                if nearest is not None:
+                    entry, kind = self._entries[nearest], "near_hits"
+            if entry is not None:
+                self._entries.move_to_end(entry.sha256)
+                self._stats[kind] += 1
+                result = entry.result
+
+        if entry is None and self._disk is not None:
+            # Another worker may have diagnosed this exact file since we loaded
+            try:
+                found = self._disk.get(sha256, self.version)
+            except sqlite3.Error as e:
+                logger.warning(f"Image diagnosis cache read failed: {e}")
+                found = None
+            if found is not None:
+                with self._lock:
+                    self._memory_put(sha256, found[0], found[1])
+                    self._stats["exact_hits"] += 1
+                return found[1]
+
+        if entry is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        self._disk_write(lambda disk: disk.touch(entry.sha256))
+        return result
+
+    def store(self, fingerprint, result):
+        sha256, phash = fingerprint
+        with self._lock:
+            self._memory_put(sha256, phash, result)
+            self._puts += 1
+            trim = self._puts % TRIM_EVERY_PUTS == 0
+        self._disk_write(lambda disk: disk.put(sha256, phash, self.version, result))
+        if trim:
+            self._disk_write(lambda disk: disk.trim(self.max_entries))
+
+    def _disk_write(self, operation):
+        if self._disk is None:
+            return
+        try:
+            operation(self._disk)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Image diagnosis cache write failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["near_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 3) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["model_version"] = self.version
+        return stats
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """Returns this process's image diagnosis cache, created from config on first use."""
+    global _cache, _cache_pid
+    if _cache is not None and _cache_pid == os.getpid():
+        return _cache
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = ImageDiagnosisCache(
+                path=config.DISEASE_IMAGE_CACHE_PATH or None,
+                max_entries=config.DISEASE_IMAGE_CACHE_MAX_ENTRIES,
+                max_distance=config.DISEASE_IMAGE_CACHE_MAX_DISTANCE,
+            )
+            _cache_pid = os.getpid()
+    return _cache
@@ -0,0 +1,223 @@
+# Compiled keyword intent engine used by language.understand_intent
+# All intent keywords, entity lexicons and question words (for every supported language)
+# are compiled into one Aho-Corasick automaton, so matching is a single O(len(text)) pass
+# no matter how many intents or synonyms are added to data/intent_lexicon.json.
+# - Keywords match whole words ('rate' not in 'accurate', 'बीमा' not in 'बीमारी'); a keyword ending
+#   in '*' is a stem and matches at the start of a word ('irrigat*' covers 'irrigation')
+# - Every match is tagged with the language of its keyword: an utterance is analyzed with the table
+#   of its call's language plus the English and other Latin-script keywords, which callers mix into
+#   every language ("मुझे loan चाहिए"); those count CROSS_LANGUAGE_WEIGHT of a keyword in the caller's
+#   language. Keywords of other Indian languages are not used. All tables count fully if the
+#   language is not known
+import json
+import threading
+import unicodedata
+from src.config import config
+
+INTENT = "intent"
+QUESTION = "question"
+FALLBACK_QNA_INTENT = "GENERAL_QNA"
+STEM_MARKER = "*"
+MIXED_LANGUAGE = "en-IN" # Matched in every call besides the caller's own language
+CROSS_LANGUAGE_WEIGHT = 0.5
+
+
+def normalize_text(text):
+    """NFC + casefold, applied once to both keywords and utterances (handles nukta/case variants)."""
+    return unicodedata.normalize("NFC", text).casefold()
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton: reports every occurrence of every keyword in one pass over the text."""
+
+    def __init__(self):
+        self._goto = [{}] # state -> {char: next_state}
+        self._fail = [0]
+        self._out = [[]] # state -> [(keyword_length, payload), ...]
+        self._built = False
+
+    def add(self, keyword, payload):
+        """Registers a keyword. A keyword may be added several times with different payloads."""
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((len(keyword), payload))
+        self._built = False
+
+    def build(self):
+        """Computes failure links (BFS) and merges outputs along them."""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+        self._built = True
+
+    def iter_matches(self, text):
+        """Yields (start, end, payload) for every keyword occurrence in `text`."""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                end = index + 1
+                for length, payload in out[state]:
+                    yield end - length, end, payload
+
+    def __len__(self):
+        return len(self._goto)
+
+
+def _is_word_char(text, index):
+    # Letters, digits and combining marks (Devanagari matras/virama) continue a word
+    return 0 <= index < len(text) and unicodedata.category(text[index])[0] in "LMN"
+
+
+def drop_shadowed(matches):
+    """Drops matches fully contained in a longer match (e.g. 'बीमा' inside 'बीमारी')."""
+    kept = []
+    cover_start = cover_end = -1
+    for match in sorted(matches, key=lambda m: (m[0], m[0] - m[1])):
+        start, end, _ = match
+        if end <= cover_end and (start, end) != (cover_start, cover_end):
+            continue
+        kept.append(match)
+        if end > cover_end:
+            cover_start, cover_end = start, end
+    return kept
+
+
+class IntentEngine:
+    """Scores every intent and extracts entities from a single automaton pass."""
+
+    def __init__(self, lexicon, languages=None):
+        self.languages = list(languages or config.SUPPORTED_LANGUAGES)
+        self.automaton = KeywordAutomaton()
+        self.priority = {}
+        for rank, intent in enumerate(lexicon.get("intents", [])):
+            self.priority[intent["name"]] = rank
+            for lang in self.languages:
+                for keyword in intent.get("keywords", {}).get(lang, []):
+                    self._add(keyword, INTENT, intent["name"], intent.get("weight", 1.0), lang)
+        for entity_type, values in lexicon.get("entities", {}).items():
+            for canonical, synonyms in values.items():
+                for lang in self.languages:
+                    for keyword in synonyms.get(lang, []):
+                        self._add(keyword, entity_type, canonical, 0.0, lang)
+        for lang in self.languages:
+            for keyword in lexicon.get("question_words", {}).get(lang, []):
+                self._add(keyword, QUESTION, None, 0.0, lang)
+        self.automaton.build()
+
+    def _add(self, keyword, kind, label, weight, language):
+        stem = keyword.endswith(STEM_MARKER)
+        keyword = normalize_text(keyword.rstrip(STEM_MARKER).strip())
+        mixed = language == MIXED_LANGUAGE or keyword.isascii() # Usable in a call of any language
+        self.automaton.add(keyword, (kind, label, weight, language, stem, mixed))
+
+    def _matches(self, normalized, language_code):
+        """
+        (start, end, kind, label, weight) of the keyword matches on word boundaries that count for
+        a call in `language_code` (see the module comment), weights scaled for cross-language hits.
+        """
+        if language_code not in self.languages:
+            language_code = None
+        for start, end, (kind, label, weight, language, stem, mixed) in self.automaton.iter_matches(normalized):
+            if language_code is None or language == language_code:
+                factor = 1.0
+            elif mixed:
+                factor = CROSS_LANGUAGE_WEIGHT
+            else:
+                continue
+            if _is_word_char(normalized, start - 1) or (not stem and _is_word_char(normalized, end)):
+                continue # Inside a longer word
+            yield start, end, (kind, label, weight * factor)
+
+    def analyze(self, text, language_code=None):
+        """
+        Returns {"intent", "entities", "intents"}; "intents" lists every matched intent with a
+        normalized score, best first. Ties are broken by lexicon order.
+        Keywords are used as the module comment describes for `language_code`; None (or a language
+        without keywords) uses all of them at full weight.
+        """
+        normalized = normalize_text(text)
+        keyword_weights = {}
+        entities = {}
+        is_question = False
+        for start, end, (kind, label, weight) in drop_shadowed(self._matches(normalized, language_code)):
+            if kind == INTENT:
+                # Repeating a word doesn't add score; a keyword listed in several languages counts once, at its best
+                keyword_key = (label, normalized[start:end])
+                keyword_weights[keyword_key] = max(weight, keyword_weights.get(keyword_key, 0.0))
+            elif kind == QUESTION:
+                is_question = True
+            else:
+                entities.setdefault(kind, label) # First mention wins
+
+        scores = {}
+        for (label, _), weight in keyword_weights.items():
+            scores[label] = scores.get(label, 0.0) + weight
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.priority[item[0]]))
+        if ranked:
+            intent = ranked[0][0]
+        elif is_question:
+            intent = FALLBACK_QNA_INTENT # Question-like utterance without a specific topic
+        else:
+            intent = "UNKNOWN"
+
+        if intent == "DISEASE_QUERY_SYMPTOMS":
+            entities["symptoms"] = text # Pass full text as symptoms for now
+        elif intent == FALLBACK_QNA_INTENT:
+            entities["query_text"] = text
+
+        total = sum(scores.values()) or 1.0
+        return {
+            "intent": intent,
+            "entities": entities,
+            "intents": [{"intent": name, "score": round(score / total, 3)} for name, score in ranked],
+        }
+
+
+def load_lexicon(path=None):
+    with open(path or config.INTENT_LEXICON_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_intent_engine():
+    """Returns the process-wide engine, compiling the lexicon on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = IntentEngine(load_lexicon())
+    return _engine
+
+
+def reload_intent_engine(path=None):
+    """Recompiles the engine (e.g., after editing the lexicon file)."""
+    global _engine
+    engine = IntentEngine(load_lexicon(path))
+    with _engine_lock:
+        _engine = engine
+    return engine
@@ -1,8 +1,14 @@
 # Placeholder for language processing functions
 # !! REPLACE THESE WITH ACTUAL API CALLS to Bhashini, Google Cloud AI, Azure, etc. !!
+import io
 import random
+import wave
 from flask import current_app
+from src.core.intent_engine import get_intent_engine
+from src.core.tts_cache import get_tts_cache
+from src.utils.tracing import traced
 
+@traced()
 def speech_to_text(audio_data_or_ref, language_code='hi-IN'):
     """
     Placeholder: Converts speech audio data/reference to text.
@@ -14,86 +20,169 @@ def speech_to_text(audio_data_or_ref, language_code='hi-IN'):
     # --- Simulation Logic ---
     # In a real scenario, download audio if needed, send to API, get text back.
     # Simulate based on reference string for testing
-    simulated_text = "फसल में क्या समस्या है?" # Default
+    simulated_text = _simulated_transcript(audio_data_or_ref)
+
+    logger.debug("[SIMULATE] STT Result: '%s'", simulated_text)
+    return simulated_text
+
+def _simulated_transcript(audio_data_or_ref):
     ref_str = str(audio_data_or_ref).lower()
     if "pani" in ref_str or "water" in ref_str:
-         simulated_text = "गेहूं में पानी कब देना है?"
+         return "गेहूं में पानी कब देना है?"
     elif "loan" in ref_str or "लोन" in ref_str:
-        simulated_text = "मुझे लोन चाहिए"
+        return "मुझे लोन चाहिए"
     elif "beej" in ref_str or "seed" in ref_str:
-        simulated_text = "गेहूं का कौन सा बीज अच्छा है?"
+        return "गेहूं का कौन सा बीज अच्छा है?"
     elif "mandi" in ref_str or "भाव" in ref_str:
-        simulated_text = "आज मंडी का भाव क्या है?"
+        return "आज मंडी का भाव क्या है?"
     elif "rog" in ref_str or "बीमारी" in ref_str or "spots" in ref_str:
-         simulated_text = "पत्तियों पर सफेद धब्बे हैं"
+         return "पत्तियों पर सफेद धब्बे हैं"
+    return "फसल में क्या समस्या है?" # Default
 
-    logger.info(f"[SIMULATE] STT Result: '{simulated_text}'")
-    return simulated_text
 
-def text_to_speech(text, language_code='hi-IN', voice_gender='FEMALE'):
+class _SimulatedStreamingRecognizer:
     """
-    Placeholder: Converts text to speech audio data or URL.
-    Requires actual integration with a TTS service (e.g., Google Text-to-Speech, Azure TTS, Bhashini TTS).
+    Placeholder for a streaming STT session (e.g., Google streaming_recognize, Azure continuous
+    recognition, Bhashini streaming ASR): audio chunks go in, growing partial transcripts come out.
+    !! REPLACE with the provider's streaming client !!
+    Keeps only a byte count, never the audio itself.
+    """
+    BYTES_PER_WORD = 4000 # ~0.25 s of 8 kHz 16-bit speech per word
+
+    def __init__(self, reference, language_code):
+        self.language_code = language_code
+        self._words = _simulated_transcript(reference).split()
+        self._received = 0
+        self._revealed = 0
+
+    def feed(self, chunk):
+        """Returns the new partial transcript, or None if it did not change."""
+        self._received += len(chunk)
+        revealed = min(len(self._words), self._received // self.BYTES_PER_WORD)
+        if revealed == self._revealed:
+            return None
+        self._revealed = revealed
+        return " ".join(self._words[:revealed])
+
+    def finish(self):
+        return " ".join(self._words)
+
+
+@traced()
+def speech_to_text_stream(chunks, language_code='hi-IN', reference=None, on_partial=None):
+    """
+    Transcribes audio as it arrives: `chunks` is an iterable of audio bytes (e.g.
+    helpers.stream_audio(url)); `on_partial(text)` is called with each new partial transcript
+    so NLU can run before the recording ends. Returns the final transcript.
+    Raises whatever the chunk iterable raises (e.g., download errors).
     """
     logger = current_app.logger
-    logger.info(f"[SIMULATE] TTS: Generating speech for: '{text}' in {language_code}")
+    recognizer = _SimulatedStreamingRecognizer(reference, language_code)
+    for chunk in chunks:
+        partial = recognizer.feed(chunk)
+        if partial and on_partial is not None:
+            on_partial(partial)
+    final_text = recognizer.finish()
+    logger.debug("[SIMULATE] Streaming STT Result: '%s'", final_text)
+    return final_text
+
+
+class IncrementalUnderstanding:
+    """
+    Runs NLU on partial transcripts while the caller is still speaking. Once two consecutive
+    partials agree on an intent, `on_stable_intent(result)` is called (once) so the handler can
+    start that intent's lookups early; if the final transcript equals the last partial its
+    analysis is reused instead of running NLU again.
+    """
 
+    def __init__(self, language_code='hi-IN', on_stable_intent=None):
+        self.language_code = language_code
+        self.on_stable_intent = on_stable_intent
+        self._text = None
+        self._result = None
+        self._stable_fired = False
+
+    def update(self, partial_text):
+        if partial_text == self._text:
+            return
+        previous_intent = self._result.get("intent") if self._result else None
+        self._text, self._result = partial_text, get_intent_engine().analyze(partial_text, self.language_code)
+        intent = self._result.get("intent")
+        if (not self._stable_fired and self.on_stable_intent is not None
+                and intent not in (None, "UNKNOWN") and intent == previous_intent):
+            self._stable_fired = True
+            try:
+                self.on_stable_intent(self._result)
+            except Exception as e:
+                current_app.logger.warning(f"NLU: early lookup for intent {intent} failed to start: {e}")
+
+    def final(self, text):
+        """NLU result for the final transcript."""
+        if text == self._text and self._result is not None:
+            return self._result
+        return understand_intent(text, language_code=self.language_code)
+
+@traced()
+def synthesize_speech(text, language_code='hi-IN', voice_gender='FEMALE'):
+    """
+    Placeholder: Synthesizes one text segment and returns the audio bytes (WAV).
+    Requires actual integration with a TTS service (e.g., Google Text-to-Speech, Azure TTS, Bhashini TTS).
+    Called only for segments not yet in the TTS asset cache (see text_to_speech).
+    """
     # --- Simulation Logic ---
-    # In a real scenario, send text to API, get audio file back (or URL to it).
-    # Simulate returning a dummy reference or path
-    dummy_audio_ref = f"simulated_audio_{language_code}_{hash(text)}.mp3"
-    logger.info(f"[SIMULATE] TTS Result: Reference '{dummy_audio_ref}'")
-    return dummy_audio_ref # In reality, might return bytes or a URL
+    # In a real scenario, send text to API and return the audio it sends back.
+    # Simulate with silence lasting roughly as long as the text would take to speak (~70 ms/char)
+    sample_rate = 8000 # Telephony narrowband
+    frames = int(sample_rate * min(30.0, 0.3 + 0.07 * len(text)))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"\x00\x00" * frames)
+    return buffer.getvalue()
 
-def understand_intent(text, language_code='hi-IN'):
+@traced()
+def text_to_speech(text, language_code='hi-IN', voice_gender='FEMALE', wait=True):
     """
-    Placeholder: Understands intent and extracts entities from text.
-    Requires actual integration with an NLU service (e.g., Dialogflow, Rasa, Azure LUIS, Bhashini NLU).
+    Converts text to speech through the TTS asset cache (src/core/tts_cache.py).
+    Returns the names of the audio files, one per segment in speaking order (the IVR plays them
+    back to back), or None if synthesis failed and the IVR should use its own TTS for the text.
+    Segments already synthesized (fixed prompts, calendar advice, repeated fragments) are not sent to TTS again.
+    With wait=False (live responses) nothing is synthesized on the caller's time: None unless every
+    segment is ready, and the missing ones are synthesized in the background for the next response.
     """
     logger = current_app.logger
-    logger.info(f"[SIMULATE] NLU: Analyzing text: '{text}' in {language_code}")
-    text_lower = text.lower()
-    intent = "UNKNOWN"
-    entities = {}
-
-    # --- Simulation Logic (Basic Keyword Matching) ---
-    # More sophisticated NLU needed for real use.
-    if "पानी" in text or "water" in text_lower or "सिंचाई" in text:
-        intent = "CROP_ADVISORY_WATER"
-        if "गेहूं" in text or "wheat" in text_lower: entities["crop"] = "गेहूं"
-        elif "धान" in text or "paddy" in text_lower: entities["crop"] = "धान"
-    elif "खाद" in text or "fertilizer" in text_lower or "यूरिया" in text:
-        intent = "CROP_ADVISORY_FERTILIZER"
-        if "गेहूं" in text: entities["crop"] = "गेहूं"
-    elif "रोग" in text or "बीमारी" in text or "disease" in text_lower or "धब्बे" in text or "spots" in text_lower:
-        intent = "DISEASE_QUERY_SYMPTOMS"
-        if "गेहूं" in text: entities["crop"] = "गेहूं"
-        entities["symptoms"] = text # Pass full text as symptoms for now
-    elif "लोन" in text or "loan" in text_lower or "ऋण" in text:
-        intent = "FINANCE_LOAN_REQUEST"
-    elif "बीमा" in text or "insurance" in text_lower:
-        intent = "FINANCE_INSURANCE_QUERY"
-    elif "भाव" in text or "price" in text_lower or "मंडी" in text or "mandi" in text_lower:
-         intent = "MARKET_PRICE_QUERY"
-         if "गेहूं" in text: entities["crop"] = "गेहूं"
-         elif "बाजरा" in text: entities["crop"] = "बाजरा"
-    elif "बेचना" in text or "sell" in text_lower:
-         intent = "MARKET_LINKAGE_REQUEST"
-         if "गेहूं" in text: entities["crop"] = "गेहूं"
-    elif "मौसम" in text or "weather" in text_lower or "बारिश" in text:
-         intent = "WEATHER_QUERY"
-    elif "बीज" in text or "seed" in text_lower:
-        intent = "GENERAL_QNA"
-        entities["query_text"] = text
-        entities["topic"] = "seed"
-    else: # Fallback to general QnA if keywords match common questions
-        common_q = ["क्या", "कब", "कैसे", "क्यों", "what", "when", "how", "why"]
-        if any(q in text_lower for q in common_q):
-             intent = "GENERAL_QNA"
-             entities["query_text"] = text
+    try:
+        if wait:
+            assets = get_tts_cache().render(text, language_code, voice_gender, synthesize_speech)
         else:
-             intent = "UNKNOWN" # Or maybe a CHITCHAT intent
+            app = current_app._get_current_object()
+
+            def synthesize_in_app(*args):
+                with app.app_context():
+                    return synthesize_speech(*args)
+
+            assets = get_tts_cache().render_ready(text, language_code, voice_gender, synthesize_in_app)
+    except Exception as e:
+        logger.error(f"TTS failed for '{text[:40]}' in {language_code}: {e}")
+        return None
+    logger.debug("TTS Result: %s", assets)
+    return assets
+
+@traced()
+def understand_intent(text, language_code='hi-IN'):
+    """
+    Understands intent and extracts entities from text.
+    Uses the compiled keyword engine (src/core/intent_engine.py, lexicon in data/intent_lexicon.json):
+    one linear pass over the text covers every intent and entity of the caller's language and of English.
+    !! Can be replaced by an NLU service (e.g., Dialogflow, Rasa, Azure LUIS, Bhashini NLU) !!
+    """
+    logger = current_app.logger
+    logger.info(f"NLU: Analyzing text: '{text}' in {language_code}")
+
+    # Returns {"intent": ..., "entities": {...}, "intents": [{"intent": ..., "score": ...}, ...]}
+    result = get_intent_engine().analyze(text, language_code)
 
-    result = {"intent": intent, "entities": entities}
-    logger.info(f"[SIMULATE] NLU Result: {result}")
-    return result
\ No newline at end of file
+    logger.debug("NLU Result: %s", result)
+    return result
@@ -1,24 +1,76 @@
 import random
 import datetime
 from flask import current_app
-# Optional: Import API calling functions if defined separately
-# from src.integrations.external_apis import get_agmarknet_prices_api
-
+from src.config import config
+from src.utils.cache import cached_response
+from src.core.geo_index import get_market_directory
+from src.core.price_forecast import get_forecast_table
+from src.core.price_store import get_price_store
+from src.utils.tracing import traced
+
+
+def _reported_prices(crop, nearby):
+    """Latest ingested reports for crop at the `nearby` mandis (or the freshest anywhere), skipping stale ones."""
+    store = get_price_store()
+    if store is None:
+        return []
+    if nearby:
+        rows = [(distance, store.latest(crop, mandi["name"])) for distance, mandi in nearby]
+    else:
+        rows = [(None, row) for row in store.latest_for_crop(crop, k=3)]
+    oldest = datetime.date.today() - datetime.timedelta(days=config.MARKET_PRICE_MAX_AGE_DAYS)
+    prices = []
+    for distance, row in rows:
+        if row is None or row["date"] < oldest:
+            continue
+        entry = {"mandi_name": row["mandi"], "price_per_quintal": int(round(row["modal_price"])),
+                 "min_price": int(round(row["min_price"])), "max_price": int(round(row["max_price"])),
+                 "date": row["date"].isoformat()}
+        if distance is not None:
+            entry["distance_km"] = distance
+        prices.append(entry)
+    return prices
+
+
+# Same answer for every caller asking about one crop near one location; mandi reports arrive once a
+# day, so it is cached for CACHE_TTL_MARKET_SECONDS and bursts for a district are computed once
+@traced()
+@cached_response("market_prices", ttl_seconds=lambda: config.CACHE_TTL_MARKET_SECONDS)
 def get_market_prices(crop, location):
     """
-    Placeholder: Fetches current market prices for a crop near a location.
-    !! REPLACE with actual API calls to Agmarknet, eNAM, or other market data providers !!
+    Current market prices for a crop near a location: the latest Agmarknet/eNAM reports of the
+    nearest mandis, read from the local price store (filled by scripts/ingest_market_prices.py),
+    so no upstream API is called during a live call. Falls back to simulated prices if nothing
+    recent has been ingested for them.
     """
     logger = current_app.logger
+
+    # Nearest mandis trading this crop (spatial index over the market directory)
+    nearby = get_market_directory().nearest_mandis(location, crop, k=3)
+
+    reported = _reported_prices(crop, nearby)
+    if reported:
+        price_strings = [f"{p['mandi_name']} में ₹{p['price_per_quintal']}/क्विंटल "
+                         f"({datetime.date.fromisoformat(p['date']).strftime('%d %b')})" for p in reported]
+        result = {"prices_text": f"{crop} का ताज़ा मंडी भाव: " + ", ".join(price_strings) + ".", "price_data": reported}
+        logger.info(f"Market: Prices for {crop} near {location} from {len(reported)} mandi reports")
+        return result
+
     logger.info(f"[SIMULATE] Market: Fetching prices for {crop} near {location}")
 
     prices_text = "अभी मंडी भाव उपलब्ध नहीं हैं।"
     simulated_prices = []
 
-    # --- Simulation Logic ---
-    # Assume location gives us nearby mandis. A real system needs a location-to-mandi mapping.
-    mandis = ["कानपुर मंडी", "लखनऊ मंडी", "झाँसी मंडी", "बांदा मंडी"] # Example mandis for Bundelkhand/UP
-    relevant_mandis = random.sample(mandis, k=random.randint(1, 3))
+    if nearby:
+        relevant_mandis = [mandi["name"] for _, mandi in nearby]
+        distances = {mandi["name"]: distance for distance, mandi in nearby}
+    else:
+        # Location not resolvable (e.g., 'Unknown'): example mandis for Bundelkhand/UP
+        mandis = ["कानपुर मंडी", "लखनऊ मंडी", "झाँसी मंडी", "बांदा मंडी"]
+        relevant_mandis = random.sample(mandis, k=random.randint(1, 3))
+        distances = {}
+
+    # --- Simulation Logic (prices) ---
 
     # Simulate base price based on crop
     base_price = {"गेहूं": 2100, "बाजरा": 1900, "धान": 1850, "चना": 4500}.get(crop, 2000)
@@ -28,31 +80,51 @@ def get_market_prices(crop, location):
         price = base_price + random.randint(-price_variation, price_variation)
         # Ensure price is reasonable
         price = max(500, price)
-        simulated_prices.append({"mandi_name": mandi, "price_per_quintal": price})
+        entry = {"mandi_name": mandi, "price_per_quintal": price}
+        if mandi in distances:
+            entry["distance_km"] = distances[mandi]
+        simulated_prices.append(entry)
 
     if simulated_prices:
         price_strings = [f"{p['mandi_name']} में ~₹{p['price_per_quintal']}/क्विंटल" for p in simulated_prices]
         prices_text = f"{crop} का वर्तमान भाव: " + ", ".join(price_strings) + "."
 
     result = {"prices_text": prices_text, "price_data": simulated_prices}
-    logger.info(f"[SIMULATE] Market Prices Result: {result}")
+    logger.debug("[SIMULATE] Market Prices Result: %s", result)
     return result
 
 
+def _forecast_text(days_ahead, current_price, predicted_price):
+    change = (predicted_price - current_price) / current_price if current_price else 0.0
+    if change > 0.005:
+        return f"पूर्वानुमान: अगले {days_ahead} दिनों में भाव थोड़ा बढ़कर ₹{predicted_price}/क्विंटल के आसपास जा सकता है।"
+    if change < -0.005:
+        return f"पूर्वानुमान: अगले {days_ahead} दिनों में भाव थोड़ा गिरकर ₹{predicted_price}/क्विंटल के आसपास रह सकता है।"
+    return f"पूर्वानुमान: अगले {days_ahead} दिनों में भाव लगभग स्थिर (₹{predicted_price}/क्विंटल) रहने की संभावना है।"
+
+
+@traced()
 def get_price_forecast(crop, location, days_ahead=7):
     """
-    Placeholder: Predicts future market prices.
-    !! REPLACE with a trained time-series forecasting model or detailed analysis !!
+    Predicts market prices `days_ahead` days out. Forecasts for every crop x mandi are
+    precomputed nightly (scripts/fit_price_forecasts.py); this is a table lookup.
+    Falls back to a simulated trend if no forecast table has been fitted yet.
     """
     logger = current_app.logger
-    logger.info(f"[SIMULATE] Market: Forecasting prices for {crop} near {location} ({days_ahead} days)")
 
     forecast_text = "मूल्य पूर्वानुमान अभी उपलब्ध नहीं है।"
 
-    # --- Simulation Logic ---
-    # Requires a trained model (e.g., ARIMA, Prophet, LSTM) using historical price, weather, demand data.
-    # Or complex rule-based analysis.
+    table = get_forecast_table()
+    forecast = table.lookup(crop, location, days_ahead) if table is not None else None
+    if forecast is not None:
+        predicted_price = max(500, int(round(forecast["predicted_price"])))
+        forecast_text = _forecast_text(days_ahead, forecast["current_price"], predicted_price)
+        result = {"forecast_text": forecast_text, "predicted_price": predicted_price,
+                  "current_price": int(round(forecast["current_price"])), "scope": forecast["scope"]}
+        logger.info(f"Market: Price forecast for {crop} near {location} ({days_ahead} days, {forecast['scope']}/{forecast['method']}): {predicted_price}")
+        return result
 
+    logger.info(f"[SIMULATE] Market: Forecasting prices for {crop} near {location} ({days_ahead} days)")
     # Simple simulation based on random trend:
     try:
         # Use current price simulation as base
@@ -65,13 +137,7 @@ def get_price_forecast(crop, location, days_ahead=7):
         trend = random.choice([-0.03, -0.01, 0, 0.01, 0.04]) # Simulate % change per week
         predicted_price = int(base_price * (1 + (trend * (days_ahead / 7.0))))
         predicted_price = max(500, predicted_price) # Ensure reasonable price
-
-        if trend > 0.005:
-            forecast_text = f"पूर्वानुमान: अगले {days_ahead} दिनों में भाव थोड़ा बढ़कर ₹{predicted_price}/क्विंटल के आसपास जा सकता है।"
-        elif trend < -0.005:
-            forecast_text = f"पूर्वानुमान: अगले {days_ahead} दिनों में भाव थोड़ा गिरकर ₹{predicted_price}/क्विंटल के आसपास रह सकता है।"
-        else:
-            forecast_text = f"पूर्वानुमान: अगले {days_ahead} दिनों में भाव लगभग स्थिर (₹{predicted_price}/क्विंटल) रहने की संभावना है।"
+        forecast_text = _forecast_text(days_ahead, base_price, predicted_price)
 
     except Exception as e:
         logger.error(f"Error during simulated price forecast: {e}")
@@ -79,37 +145,34 @@ def get_price_forecast(crop, location, days_ahead=7):
 
 
     result = {"forecast_text": forecast_text}
-    logger.info(f"[SIMULATE] Price Forecast Result: {result}")
+    logger.debug("[SIMULATE] Price Forecast Result: %s", result)
     return result
 
 
+@traced()
 def find_buyers(crop, location, quantity):
     """
-    Placeholder: Finds potential buyers (FPOs, traders) near the farmer.
-    !! REPLACE with database query or API call to a buyer platform !!
+    Finds the nearest registered buyers (FPOs, traders, processors, procurement centres) that
+    handle the crop and can take the quantity (quintals), via the market directory's spatial index.
     """
     logger = current_app.logger
-    logger.info(f"[SIMULATE] Market Linkage: Finding buyers for {quantity} quintals of {crop} near {location}")
+    logger.info(f"Market Linkage: Finding buyers for {quantity} quintals of {crop} near {location}")
 
     message = "अभी आपके क्षेत्र में खरीदार की जानकारी उपलब्ध नहीं है।"
     buyer_name = None
     buyer_contact = None
 
-    # --- Simulation Logic ---
-    # Needs a database of registered buyers with location, crops handled, contact info.
-    buyers_db = [
-        {"name": "प्रगति किसान उत्पादक संगठन (FPO)", "contact": "98xxxxxx01", "type": "FPO", "location": "Nearby"},
-        {"name": "अग्रवाल अनाज भंडार", "contact": "99xxxxxx02", "type": "Local Trader", "location": "Nearby"},
-        {"name": "सरकारी खरीद केंद्र (MSPC)", "contact": "स्थानीय केंद्र पर संपर्क करें", "type": "Government", "location": "Nearby"},
-        {"name": "विकास फूड प्रोसेसिंग यूनिट", "contact": "97xxxxxx03", "type": "Processor", "location": "District"},
-    ]
-
-    potential_buyers = buyers_db # Simple simulation - assume all are potential
-    if potential_buyers:
-        found_buyer = random.choice(potential_buyers)
+    try:
+        quantity_quintals = float(quantity)
+    except (TypeError, ValueError):
+        quantity_quintals = None # Unknown quantity: don't filter on capacity
+    nearby = get_market_directory().nearest_buyers(location, crop, quantity_quintals, k=3)
+
+    if nearby:
+        distance_km, found_buyer = nearby[0] # Nearest first
         buyer_name = found_buyer["name"]
         buyer_contact = found_buyer["contact"]
-        message = f"{quantity} क्विंटल {crop} के लिए एक संभावित खरीदार: {buyer_name} ({found_buyer['type']})।"
+        message = f"{quantity} क्विंटल {crop} के लिए एक संभावित खरीदार: {buyer_name} ({found_buyer['type']}, लगभग {distance_km:.0f} किमी दूर)।"
         if buyer_contact and "संपर्क करें" not in buyer_contact:
              message += f" संपर्क विवरण SMS द्वारा भेजा जाएगा।"
              # Note: Actual SMS sending happens in the API route after calling this function.
@@ -118,5 +181,5 @@ def find_buyers(crop, location, quantity):
 
 
     result = {"message": message, "name": buyer_name, "contact": buyer_contact}
-    logger.info(f"[SIMULATE] Buyer Linkage Result: {result}")
-    return result
\ No newline at end of file
+    logger.debug("Buyer Linkage Result: %s", result)
+    return result
@@ -0,0 +1,316 @@
+# Mandi price forecasting
+# - Historical prices are loaded into one (series x day) NumPy array, one row per crop x mandi: from the
+#   mandi price store the live prices are served from, or from a history CSV while the store is empty
+# - Models are fitted for all series at once (vectorized over series, looping only over days):
+#   damped Holt exponential smoothing over a small grid of smoothing factors, and a weekly
+#   seasonal naive; each series keeps whichever had the lower error on the last few weeks
+# - Forecasts for every horizon (1..PRICE_FORECAST_HORIZON_DAYS) are precomputed nightly by
+#   scripts/fit_price_forecasts.py and saved to config.PRICE_MODEL_PATH (.npz)
+# - Requests only look up a row and a column of that table (hot-reloaded when the file changes)
+import csv
+import datetime
+import logging
+import os
+import threading
+import time
+from src.config import config
+
+try:
+    import numpy as np
+except ImportError: # Optional dependency: without it get_price_forecast falls back to simulation
+    np = None
+
+logger = logging.getLogger(__name__)
+
+SEASON_DAYS = 7 # Weekly pattern (market days, weekend arrivals)
+BACKTEST_DAYS = 28 # Window used to choose between models per series
+HOLT_ALPHAS = (0.2, 0.4, 0.6, 0.8) # Level smoothing grid, fitted in parallel
+HOLT_BETA = 0.1 # Trend smoothing
+HOLT_PHI = 0.9 # Trend damping: long horizons don't extrapolate a short-term trend forever
+METHODS = ("holt_damped", "seasonal_naive", "last_value")
+
+
+def _key(value):
+    return " ".join(str(value).split()).casefold() if value else ""
+
+
+class PriceHistory:
+    """Daily prices as a dense (series x day) float array, NaN where no price was reported."""
+
+    def __init__(self, series, start_date, values):
+        self.series = series # list of (crop, mandi, district)
+        self.start_date = start_date
+        self.values = values
+
+    @property
+    def end_date(self):
+        return self.start_date + datetime.timedelta(days=self.values.shape[1] - 1)
+
+
+def load_price_history(path):
+    """
+    Reads an Agmarknet-style CSV (arrival_date, crop, mandi, district, modal_price).
+    Rows are parsed into flat columns first, then scattered into the array in one step.
+    """
+    series_ids = {}
+    series = []
+    rows, days, prices = [], [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for record in csv.DictReader(f):
+            try:
+                date = datetime.date.fromisoformat(record["arrival_date"].strip())
+                price = float(record["modal_price"])
+            except (KeyError, TypeError, ValueError):
+                continue # Skip malformed rows
+            key = (record["crop"].strip(), record["mandi"].strip(), (record.get("district") or "").strip())
+            series_id = series_ids.get(key)
+            if series_id is None:
+                series_id = series_ids[key] = len(series)
+                series.append(key)
+            rows.append(series_id)
+            days.append(date.toordinal())
+            prices.append(price)
+    if not rows:
+        raise ValueError(f"No price records in {path}")
+
+    days = np.asarray(days, dtype=np.int64)
+    first_day = int(days.min())
+    values = np.full((len(series), int(days.max()) - first_day + 1), np.nan)
+    values[np.asarray(rows), days - first_day] = prices # Duplicate reports: last one wins
+    return PriceHistory(series, datetime.date.fromordinal(first_day), values)
+
+
+def load_store_history(store, since=None):
+    """
+    The modal prices of the mandi price store (src/core/price_store.py), from `since` on if given,
+    as a PriceHistory whose series are the store's (crop, mandi, district) with reports.
+    """
+    since_day = since.toordinal() if since else None
+    series_parts, day_parts, price_parts = [], [], []
+    for columns in store.partitions.values():
+        days = np.asarray(columns["day"])
+        keep = days >= since_day if since_day is not None else slice(None)
+        series_parts.append(np.asarray(columns["series"])[keep])
+        day_parts.append(days[keep])
+        price_parts.append(np.asarray(columns["modal_price"], dtype=np.float64)[keep])
+    days = np.concatenate(day_parts) if day_parts else np.empty(0, dtype=np.int64)
+    if not len(days):
+        raise ValueError("No price records in the price store")
+    store_series, rows = np.unique(np.concatenate(series_parts), return_inverse=True)
+    first_day = int(days.min())
+    values = np.full((len(store_series), int(days.max()) - first_day + 1), np.nan)
+    values[rows, days - first_day] = np.concatenate(price_parts) # Partitions hold one report per (series, day)
+    return PriceHistory([tuple(store.series[i]) for i in store_series.tolist()], datetime.date.fromordinal(first_day), values)
+
+
+def forward_fill(values):
+    """Carries the last observed price forward along each row; leading gaps take the first observation."""
+    observed = ~np.isnan(values)
+    index = np.where(observed, np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    rows = np.arange(values.shape[0])
+    filled = values[rows[:, None], index]
+    first = np.argmax(observed, axis=1)
+    leading = np.arange(values.shape[1]) < first[:, None]
+    return np.where(leading, values[rows, first][:, None], filled)
+
+
+def _fit_holt(values, filled, alphas, beta, phi, backtest_start):
+    """
+    Damped Holt for every (series, alpha) pair at once. Days without a report keep the
+    predicted level. Returns final level and trend (S x A) and one-step MAE over the backtest window.
+    """
+    alphas = np.asarray(alphas)[None, :]
+    level = np.repeat(filled[:, :1], len(alphas[0]), axis=1)
+    trend = np.zeros_like(level)
+    abs_error = np.zeros_like(level)
+    count = np.zeros((values.shape[0], 1))
+    for t in range(1, values.shape[1]):
+        y = values[:, t:t + 1]
+        observed = ~np.isnan(y)
+        predicted = level + phi * trend
+        new_level = np.where(observed, alphas * np.nan_to_num(y) + (1 - alphas) * predicted, predicted)
+        trend = np.where(observed, beta * (new_level - level) + (1 - beta) * phi * trend, phi * trend)
+        level = new_level
+        if t >= backtest_start:
+            abs_error += np.where(observed, np.abs(np.nan_to_num(y) - predicted), 0.0)
+            count += observed
+    return level, trend, abs_error / np.maximum(count, 1)
+
+
+def _seasonal_naive_error(values, filled, backtest_start):
+    start = max(backtest_start, SEASON_DAYS)
+    actual = values[:, start:]
+    predicted = filled[:, start - SEASON_DAYS:values.shape[1] - SEASON_DAYS]
+    observed = ~np.isnan(actual)
+    abs_error = np.where(observed, np.abs(np.nan_to_num(actual) - predicted), 0.0).sum(axis=1)
+    return abs_error / np.maximum(observed.sum(axis=1), 1)
+
+
+def fit_series_forecasts(history, horizon):
+    """
+    Returns (forecasts (S x horizon), last_prices (S,), method codes (S,)) for every series.
+    """
+    values = history.values
+    n_days = values.shape[1]
+    filled = forward_fill(values)
+    backtest_start = max(1, n_days - BACKTEST_DAYS)
+
+    level, trend, holt_mae = _fit_holt(values, filled, HOLT_ALPHAS, HOLT_BETA, HOLT_PHI, backtest_start)
+    best_alpha = np.argmin(holt_mae, axis=1)
+    rows = np.arange(values.shape[0])
+    level, trend, holt_mae = level[rows, best_alpha], trend[rows, best_alpha], holt_mae[rows, best_alpha]
+
+    damping = np.cumsum(HOLT_PHI ** np.arange(1, horizon + 1)) # sum_{i<=h} phi^i
+    holt = level[:, None] + trend[:, None] * damping[None, :]
+
+    if n_days >= 2 * SEASON_DAYS:
+        season_index = n_days - SEASON_DAYS + (np.arange(horizon) % SEASON_DAYS)
+        seasonal = filled[:, season_index]
+        naive_mae = _seasonal_naive_error(values, filled, backtest_start)
+        use_seasonal = naive_mae < holt_mae
+    else:
+        seasonal = holt
+        use_seasonal = np.zeros(values.shape[0], dtype=bool)
+
+    forecasts = np.where(use_seasonal[:, None], seasonal, holt)
+    methods = np.where(use_seasonal, 1, 0)
+    observations = (~np.isnan(values)).sum(axis=1)
+    sparse = observations < 2 * SEASON_DAYS # Too little data to fit: repeat the last price
+    forecasts[sparse] = filled[sparse, -1:]
+    methods[sparse] = 2
+    return np.maximum(forecasts, 0.0), filled[:, -1], methods
+
+
+class ForecastTable:
+    """
+    Precomputed forecasts. Rows are individual mandis plus median aggregates per
+    (crop, district) and per crop, addressed by string keys:
+        'mandi|<crop>|<mandi>', 'district|<crop>|<district>', 'crop|<crop>'
+    """
+
+    def __init__(self, keys, forecasts, last_prices, methods, origin):
+        self.keys = list(keys)
+        self.forecasts = forecasts # (rows x horizon) float32, column h-1 = h days after origin
+        self.last_prices = last_prices
+        self.methods = methods
+        self.origin = origin # Last day of the history the forecasts start from
+        self._rows = {key: row for row, key in enumerate(self.keys)}
+
+    @property
+    def horizon(self):
+        return self.forecasts.shape[1]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "wb") as f: # File object: np.savez would otherwise append '.npz' to the name
+            np.savez(f, keys=np.asarray(self.keys), forecasts=self.forecasts, last_prices=self.last_prices,
+                     methods=self.methods, origin=np.asarray(self.origin.isoformat()))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["keys"].tolist(), data["forecasts"], data["last_prices"], data["methods"],
+                       datetime.date.fromisoformat(str(data["origin"])))
+
+    def lookup(self, crop, location=None, days_ahead=7, today=None):
+        """
+        O(1): the most specific row for (crop, location) — a mandi, then a district, then the
+        crop overall — and the column for `days_ahead` from today. Returns None if the crop is unknown.
+        """
+        crop, location = _key(crop), _key(location)
+        for scope, key in (("mandi", f"mandi|{crop}|{location}"), ("district", f"district|{crop}|{location}"),
+                           ("crop", f"crop|{crop}")):
+            row = self._rows.get(key)
+            if row is not None:
+                break
+        else:
+            return None
+        # The table may be a few days old: count the horizon from its origin
+        elapsed = ((today or datetime.date.today()) - self.origin).days
+        column = min(max(elapsed + days_ahead, 1), self.horizon) - 1
+        return {
+            "scope": scope,
+            "current_price": float(self.last_prices[row]),
+            "predicted_price": float(self.forecasts[row, column]),
+            "method": METHODS[int(self.methods[row])] if self.methods[row] < len(METHODS) else "median",
+            "origin": self.origin.isoformat(),
+        }
+
+
+def build_forecast_table(history, horizon=None):
+    """Fits all series and adds median rows per (crop, district) and per crop."""
+    horizon = horizon or config.PRICE_FORECAST_HORIZON_DAYS
+    forecasts, last_prices, methods = fit_series_forecasts(history, horizon)
+
+    keys = [f"mandi|{_key(crop)}|{_key(mandi)}" for crop, mandi, _ in history.series]
+    groups = {}
+    for row, (crop, _, district) in enumerate(history.series):
+        groups.setdefault(f"crop|{_key(crop)}", []).append(row)
+        if district:
+            groups.setdefault(f"district|{_key(crop)}|{_key(district)}", []).append(row)
+    group_keys = list(groups)
+    group_forecasts = np.stack([np.median(forecasts[groups[key]], axis=0) for key in group_keys]) if groups else np.empty((0, horizon))
+    group_last = np.asarray([np.median(last_prices[groups[key]]) for key in group_keys])
+
+    return ForecastTable(
+        keys + group_keys,
+        np.vstack([forecasts, group_forecasts]).astype(np.float32),
+        np.concatenate([last_prices, group_last]).astype(np.float32),
+        np.concatenate([methods, np.full(len(group_keys), len(METHODS))]).astype(np.uint8),
+        history.end_date,
+    )
+
+
+class _ReloadingTable:
+    """Holds the current table and reloads it when the file's mtime changes (checked at most every few seconds)."""
+
+    def __init__(self, path, check_interval):
+        self.path = path
+        self.check_interval = check_interval
+        self._table = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_interval
+                    self._reload_if_changed()
+        return self._table
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return # Not fitted yet: callers fall back
+        if mtime == self._mtime:
+            return
+        try:
+            self._table = ForecastTable.load(self.path)
+            self._mtime = mtime
+            logger.info(f"Loaded price forecasts for {len(self._table)} series (origin {self._table.origin}) from {self.path}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Invalid price forecast file {self.path}, keeping previous version: {e}")
+
+
+_tables = None
+_tables_lock = threading.Lock()
+
+
+def get_forecast_table():
+    """Returns the current ForecastTable (hot-reloaded from config.PRICE_MODEL_PATH), or None if unavailable."""
+    global _tables
+    if np is None:
+        return None
+    if _tables is None:
+        with _tables_lock:
+            if _tables is None:
+                _tables = _ReloadingTable(config.PRICE_MODEL_PATH, config.PRICE_FORECAST_RELOAD_SECONDS)
+    return _tables.get()
@@ -0,0 +1,436 @@
+# Mandi price store: daily Agmarknet/eNAM arrival and price reports kept in local columnar files
+# - scripts/ingest_market_prices.py (daily cron) reads report dumps (Agmarknet/data.gov.in CSV or JSON,
+#   eNAM JSON, the price history CSV), normalizes field, crop and mandi names (config.MARKET_NAME_ALIASES_PATH
+#   plus the market directory's mandi ids/names), drops duplicate reports and appends the rest; a
+#   report for a crop, mandi and day already in the store is a duplicate, so re-running an old dump
+#   neither reverts stored rows nor rewrites their month
+# - Layout under config.PRICE_STORE_DIR: one partition per month with one .npy file per column, rows sorted
+#   by (series, day), one series per crop x mandi; manifest.json names each month's current partition,
+#   the series table and the latest-report index (one row per series)
+# - A batch rewrites only the months it adds rows to, into new directories, then replaces manifest.json
+#   atomically; workers that still map the previous partitions keep reading them until they reload
+# - Workers memory-map the partitions and hold the latest-report index in memory, so
+#   market.get_market_prices is a dict lookup plus an array read — no upstream call during a live call
+import csv
+import datetime
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+from src.config import config
+from src.core.geo_index import get_market_directory
+
+try:
+    import numpy as np
+except ImportError: # Optional dependency: without it get_market_prices falls back to simulation
+    np = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    "day": "int32", # date.toordinal()
+    "series": "int32",
+    "min_price": "float32", # Rs/quintal
+    "max_price": "float32",
+    "modal_price": "float32",
+    "arrivals_tonnes": "float32", # NaN if not reported
+}
+# Report field names (after _field()) -> normalized field
+FIELD_NAMES = {
+    "arrival_date": ("arrival_date", "price_date", "reported_date", "trade_date", "created_at", "date"),
+    "crop": ("crop", "commodity", "commodity_name"),
+    "mandi": ("mandi", "market", "market_name", "apmc", "apmc_name"),
+    "district": ("district", "district_name"),
+    "min_price": ("min_price", "minimum_price"),
+    "max_price": ("max_price", "maximum_price"),
+    "modal_price": ("modal_price", "price"),
+    "arrivals": ("arrivals_tonnes", "arrivals", "commodity_arrivals", "arrival_quantity"),
+    "unit": ("commodity_uom", "arrival_unit", "unit"),
+}
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d %b %Y", "%d-%b-%Y", "%d %B %Y")
+QUINTAL_UNITS = ("qui", "qtl", "quintal", "quintals")
+
+_FOLD = str.maketrans({"\u093c": None, "\u0901": "\u0902"}) # Nukta dropped, chandrabindu -> anusvara
+_QUALIFIER = re.compile(r"\([^)]*\)")
+_NAME_SUFFIXES = (" apmc", " mandi samiti", " mandi", " मंडी", " market")
+
+
+def name_key(value):
+    """Matching key for crop/mandi names: NFC, whitespace-collapsed, casefolded, nukta/chandrabindu folded."""
+    return " ".join(unicodedata.normalize("NFC", str(value)).translate(_FOLD).split()).casefold() if value else ""
+
+
+def _base_key(value):
+    # 'Jhansi (Grain)' / 'Mauranipur APMC' / 'झाँसी मंडी' -> 'jhansi' / 'mauranipur' / 'झांसी'
+    key = name_key(_QUALIFIER.sub(" ", str(value)))
+    for suffix in _NAME_SUFFIXES:
+        if key.endswith(suffix):
+            key = key[:-len(suffix)].strip()
+    return key
+
+
+def _field(name):
+    # 'Min_x0020_Price' / 'Arrivals (Tonnes)' / 'Commodity_Uom' -> 'min_price' / 'arrivals_tonnes' / 'commodity_uom'
+    return re.sub(r"[^0-9a-z]+", "_", str(name).replace("_x0020_", "_").casefold()).strip("_")
+
+
+def _number(value):
+    try:
+        number = float(str(value).replace(",", "").strip())
+    except (TypeError, ValueError):
+        return None
+    return number if number == number else None # NaN
+
+
+def _parse_date(value):
+    text = str(value or "").strip()
+    if len(text) > 10 and text[4:5] == "-":
+        text = text[:10] # ISO timestamp
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+class NameNormalizer:
+    """Maps crop and mandi names as spelled in reports to the names used by the market directory."""
+
+    def __init__(self, aliases=None, mandis=()):
+        aliases = aliases or {}
+        self.crops = {}
+        self.mandis = {} # key -> (name, district)
+        for canonical, names in aliases.get("crops", {}).items():
+            for name in [canonical] + list(names):
+                self.crops[name_key(name)] = canonical
+                self.crops.setdefault(_base_key(name), canonical)
+        districts = {}
+        for mandi in mandis:
+            districts[mandi["name"]] = mandi.get("district")
+            for name in (mandi["name"], mandi.get("id")):
+                if name:
+                    self.mandis[name_key(name)] = (mandi["name"], mandi.get("district"))
+                    self.mandis.setdefault(_base_key(name), (mandi["name"], mandi.get("district")))
+        for canonical, names in aliases.get("mandis", {}).items():
+            for name in [canonical] + list(names):
+                self.mandis[name_key(name)] = (canonical, districts.get(canonical))
+                self.mandis.setdefault(_base_key(name), (canonical, districts.get(canonical)))
+
+    def crop(self, name):
+        """Canonical crop name, or None if the spelling is unknown."""
+        return self.crops.get(name_key(name)) or self.crops.get(_base_key(name))
+
+    def mandi(self, name):
+        """(canonical mandi name, district or None), or None if the spelling is unknown."""
+        return self.mandis.get(name_key(name)) or self.mandis.get(_base_key(name))
+
+
+def load_name_normalizer(path=None):
+    """NameNormalizer from the alias file and the current market directory."""
+    with open(path or config.MARKET_NAME_ALIASES_PATH, encoding="utf-8") as f:
+        aliases = json.load(f)
+    return NameNormalizer(aliases, get_market_directory().mandis.items)
+
+
+def read_reports(path):
+    """Raw report records (dicts) from a dump: .csv, .jsonl, or .json (a list, or {"records"|"data": [...]})."""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            return list(csv.DictReader(f))
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("records") or data.get("data") or []
+    return list(data)
+
+
+def normalize_record(record, names):
+    """
+    One report record as a flat dict (crop, mandi, district, date, min/max/modal price, arrivals in
+    tonnes, matched) or None if it has no usable date, names or modal price.
+    """
+    fields = {}
+    for name, value in record.items():
+        fields.setdefault(_field(name), value)
+    values = {}
+    for target, candidates in FIELD_NAMES.items():
+        values[target] = next((fields[name] for name in candidates if fields.get(name) not in (None, "")), None)
+
+    date = _parse_date(values["arrival_date"])
+    modal = _number(values["modal_price"])
+    crop_name = str(values["crop"] or "").strip()
+    mandi_name = str(values["mandi"] or "").strip()
+    if date is None or not modal or modal <= 0 or not crop_name or not mandi_name:
+        return None
+    low = _number(values["min_price"])
+    high = _number(values["max_price"])
+    arrivals = _number(values["arrivals"])
+    if arrivals is not None and str(values["unit"] or "").strip().casefold() in QUINTAL_UNITS:
+        arrivals /= 10.0 # eNAM reports quintals
+
+    crop = names.crop(crop_name)
+    mandi = names.mandi(mandi_name)
+    return {
+        "crop": crop or " ".join(crop_name.split()),
+        "mandi": mandi[0] if mandi else " ".join(mandi_name.split()),
+        "district": (mandi[1] if mandi else None) or str(values["district"] or "").strip(),
+        "date": date,
+        "min_price": low if low and low <= modal else modal,
+        "max_price": high if high and high >= modal else modal,
+        "modal_price": modal,
+        "arrivals_tonnes": arrivals,
+        "matched": crop is not None and mandi is not None,
+    }
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"series": [], "partitions": {}, "index": None, "previous": []}
+
+
+def _load_columns(partition_dir, mmap_mode=None):
+    return {name: np.load(os.path.join(partition_dir, f"{name}.npy"), mmap_mode=mmap_mode) for name in COLUMNS}
+
+
+def _last_per_key(columns):
+    """Rows sorted by (series, day), keeping the last given row for each (series, day)."""
+    order = np.lexsort((np.arange(len(columns["day"])), columns["day"], columns["series"]))
+    columns = {name: column[order] for name, column in columns.items()}
+    series, day = columns["series"], columns["day"]
+    keep = np.ones(len(day), dtype=bool)
+    keep[:-1] = (series[1:] != series[:-1]) | (day[1:] != day[:-1])
+    return {name: column[keep] for name, column in columns.items()}
+
+
+def _row_keys(columns):
+    return columns["series"].astype(np.int64) << 32 | columns["day"].astype(np.int64)
+
+
+def append_reports(records, directory=None, names=None):
+    """
+    Normalizes `records` (raw report dicts), deduplicates them by (crop, mandi, day) — within the
+    batch a later report replaces an earlier one; a day already stored is kept — and appends the
+    new rows to the store, rewriting only the months that get any. Returns stats.
+    """
+    directory = directory or config.PRICE_STORE_DIR
+    names = names or load_name_normalizer()
+    os.makedirs(directory, exist_ok=True)
+    manifest = _read_manifest(directory)
+    series_ids = {(name_key(crop), name_key(mandi)): i for i, (crop, mandi, _) in enumerate(manifest["series"])}
+    stats = {"records": len(records), "invalid": 0, "duplicates": 0, "unmatched": set(), "new_series": 0, "added": 0, "months": []}
+
+    batch = {name: [] for name in COLUMNS}
+    for record in records:
+        row = normalize_record(record, names)
+        if row is None:
+            stats["invalid"] += 1
+            continue
+        if not row["matched"]:
+            stats["unmatched"].add((row["crop"], row["mandi"]))
+        key = (name_key(row["crop"]), name_key(row["mandi"]))
+        series = series_ids.get(key)
+        if series is None:
+            series = series_ids[key] = len(manifest["series"])
+            manifest["series"].append([row["crop"], row["mandi"], row["district"]])
+            stats["new_series"] += 1
+        batch["day"].append(row["date"].toordinal())
+        batch["series"].append(series)
+        for name in ("min_price", "max_price", "modal_price"):
+            batch[name].append(row[name])
+        batch["arrivals_tonnes"].append(row["arrivals_tonnes"] if row["arrivals_tonnes"] is not None else np.nan)
+    if not batch["day"]:
+        return stats
+    batch = _last_per_key({name: np.asarray(values, dtype=COLUMNS[name]) for name, values in batch.items()})
+
+    build = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    months = np.asarray([datetime.date.fromordinal(int(day)).strftime("%Y-%m") for day in batch["day"]])
+    partitions = dict(manifest["partitions"])
+    is_new = np.ones(len(batch["day"]), dtype=bool)
+    for month in sorted(set(months.tolist())):
+        in_month = months == month
+        rows = {name: column[in_month] for name, column in batch.items()}
+        if month in partitions:
+            stored = _load_columns(os.path.join(directory, partitions[month]))
+            new = ~np.isin(_row_keys(rows), _row_keys(stored))
+            is_new[np.flatnonzero(in_month)[~new]] = False
+            if not new.any():
+                continue # Only repeats of stored reports: leave the month alone
+            rows = _last_per_key({name: np.concatenate([stored[name], rows[name][new]]) for name in COLUMNS})
+        partition = f"{month}.{build}"
+        os.makedirs(os.path.join(directory, partition))
+        for name in COLUMNS:
+            np.save(os.path.join(directory, partition, f"{name}.npy"), rows[name])
+        stats["months"].append(month)
+        partitions[month] = partition
+    stats["added"] = int(is_new.sum())
+    stats["duplicates"] = stats["records"] - stats["invalid"] - stats["added"]
+    if not stats["months"]:
+        return stats
+    batch = {name: column[is_new] for name, column in batch.items()}
+
+    # Latest-report index: rows of the batch at or after a series' latest day replace it
+    size = len(manifest["series"])
+    latest = {"day": np.full(size, -1, dtype=COLUMNS["day"])}
+    latest.update({name: np.full(size, np.nan, dtype=COLUMNS[name]) for name in COLUMNS if name not in ("day", "series")})
+    if manifest["index"]:
+        with np.load(os.path.join(directory, manifest["index"])) as stored:
+            for name in latest:
+                latest[name][:len(stored[name])] = stored[name]
+    last_of_series = np.ones(len(batch["series"]), dtype=bool)
+    last_of_series[:-1] = batch["series"][1:] != batch["series"][:-1] # Rows are sorted by (series, day)
+    series = batch["series"][last_of_series]
+    newer = batch["day"][last_of_series] >= latest["day"][series]
+    for name in latest:
+        latest[name][series[newer]] = batch[name][last_of_series][newer]
+    index = f"latest.{build}.npz"
+    with open(os.path.join(directory, index), "wb") as f: # File object: np.savez would otherwise append '.npz'
+        np.savez(f, **latest)
+
+    previous = ([manifest["index"]] + list(manifest["partitions"].values())) if manifest["index"] else []
+    manifest.update({"updated_at": datetime.datetime.now().isoformat(timespec="seconds"), "partitions": partitions,
+                     "index": index, "previous": previous})
+    pointer = os.path.join(directory, "manifest.json")
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(pointer + ".tmp", pointer)
+
+    # Files of the previous manifest stay for workers that have not reloaded yet; older ones go
+    referenced = set(partitions.values()) | set(previous) | {index, "manifest.json"}
+    for name in os.listdir(directory):
+        if name not in referenced:
+            path = os.path.join(directory, name)
+            shutil.rmtree(path) if os.path.isdir(path) else os.unlink(path)
+    return stats
+
+
+class PriceStore:
+    """Read side: memory-mapped monthly partitions plus the in-memory latest-report index."""
+
+    def __init__(self, series, partitions, latest, updated_at=None):
+        self.series = series # [(crop, mandi, district), ...]
+        self.partitions = partitions # month -> column arrays
+        self.latest_columns = latest
+        self.updated_at = updated_at
+        self._series_ids = {(name_key(crop), name_key(mandi)): i for i, (crop, mandi, _) in enumerate(series)}
+        self._by_crop = {}
+        for series_id, (crop, _, _) in enumerate(series):
+            self._by_crop.setdefault(name_key(crop), []).append(series_id)
+
+    @classmethod
+    def load(cls, directory):
+        manifest = _read_manifest(directory)
+        if not manifest["index"]:
+            raise ValueError(f"No price store in {directory}")
+        partitions = {month: _load_columns(os.path.join(directory, name), mmap_mode="r")
+                      for month, name in sorted(manifest["partitions"].items())}
+        with np.load(os.path.join(directory, manifest["index"])) as data:
+            latest = {name: data[name] for name in data.files}
+        return cls([tuple(entry) for entry in manifest["series"]], partitions, latest, manifest.get("updated_at"))
+
+    def __len__(self):
+        return len(self.series)
+
+    def _row(self, series_id):
+        day = int(self.latest_columns["day"][series_id])
+        if day < 0:
+            return None
+        crop, mandi, district = self.series[series_id]
+        arrivals = float(self.latest_columns["arrivals_tonnes"][series_id])
+        return {
+            "crop": crop, "mandi": mandi, "district": district, "date": datetime.date.fromordinal(day),
+            "min_price": float(self.latest_columns["min_price"][series_id]),
+            "max_price": float(self.latest_columns["max_price"][series_id]),
+            "modal_price": float(self.latest_columns["modal_price"][series_id]),
+            "arrivals_tonnes": arrivals if arrivals == arrivals else None,
+        }
+
+    def latest(self, crop, mandi):
+        """Most recent report for crop at mandi (dict), or None."""
+        series_id = self._series_ids.get((name_key(crop), name_key(mandi)))
+        return self._row(series_id) if series_id is not None else None
+
+    def latest_for_crop(self, crop, k=3):
+        """Most recent reports for crop across all mandis, newest first."""
+        series_ids = self._by_crop.get(name_key(crop), [])
+        rows = [row for row in map(self._row, series_ids) if row is not None]
+        rows.sort(key=lambda row: row["date"], reverse=True)
+        return rows[:k]
+
+    def history(self, crop, mandi, since=None):
+        """[(date, modal price), ...] for crop at mandi, oldest first, from `since` on if given."""
+        series_id = self._series_ids.get((name_key(crop), name_key(mandi)))
+        if series_id is None:
+            return []
+        since_month = since.strftime("%Y-%m") if since else ""
+        history = []
+        for month, columns in self.partitions.items():
+            if month < since_month:
+                continue
+            # Rows are sorted by series: the series is one contiguous slice
+            start, end = np.searchsorted(columns["series"], [series_id, series_id + 1])
+            for day, price in zip(columns["day"][start:end].tolist(), columns["modal_price"][start:end].tolist()):
+                date = datetime.date.fromordinal(day)
+                if since is None or date >= since:
+                    history.append((date, price))
+        return history
+
+
+class _ReloadingStore:
+    """Holds the current store and reloads it when manifest.json changes (checked at most every few seconds)."""
+
+    def __init__(self, directory, check_interval):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._store = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_interval
+                    self._reload_if_changed()
+        return self._store
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(os.path.join(self.directory, "manifest.json")).st_mtime_ns
+        except OSError:
+            return # Nothing ingested yet: callers fall back
+        if mtime == self._mtime:
+            return
+        try:
+            self._store = PriceStore.load(self.directory)
+            self._mtime = mtime
+            logger.info(f"Loaded price store: {len(self._store)} series, {len(self._store.partitions)} months (updated {self._store.updated_at}) from {self.directory}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Invalid price store in {self.directory}, keeping previous version: {e}")
+
+
+_stores = None
+_stores_lock = threading.Lock()
+
+
+def get_price_store():
+    """Returns the current PriceStore (hot-reloaded from config.PRICE_STORE_DIR), or None if unavailable."""
+    global _stores
+    if np is None:
+        return None
+    if _stores is None:
+        with _stores_lock:
+            if _stores is None:
+                _stores = _ReloadingStore(config.PRICE_STORE_DIR, config.PRICE_STORE_RELOAD_SECONDS)
+    return _stores.get()
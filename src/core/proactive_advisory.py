@@ -0,0 +1,188 @@
+# Proactive advisory: each morning every registered farmer gets today's crop advice pushed
+# - Farmers are streamed from the context store and reduced to a group key
+#   (crop calendar, stage, weather bucket): the calendar is the most specific crop x variety x zone
+#   entry, the stage follows from days since sowing, and the weather bucket is looked up once per
+#   location. Millions of farmers collapse into a few thousand groups
+# - Stages are found for all farmers in one vectorized pass: every calendar's cumulative stage ends
+#   are laid out in one sorted array (calendar i offset by i * span), so a single np.searchsorted
+#   answers bisect_left for each farmer against their own calendar
+# - Advice text is composed once per group (advisory.compose_advice, the same code inbound calls use)
+#   and each farmer's push is spooled on the outbound queue with a per-day idempotency key, so a
+#   re-run on the same day sends nothing twice
+# - The groups and weather buckets are written to config.ADVISORY_TABLE_PATH; get_crop_advice serves
+#   inbound calls from it for the rest of the day
+# Farmers without a sowing date, with an unknown crop, or with 'proactive_advisory': false are skipped.
+import datetime
+import logging
+from array import array
+from src.config import config
+from src.core.advisory import WEATHER_BUCKETS, AdvisoryTable, compose_advice, weather_bucket
+from src.core.crop_calendar import get_crop_calendars, get_sowing_date
+from src.integrations.message_queue import CHANNELS, make_idempotency_key
+
+try:
+    import numpy as np
+except ImportError: # Optional dependency: without it stages are found one farmer at a time
+    np = None
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_PREFIX = "कृषि साथी सलाह: "
+
+
+class FarmerColumns:
+    """Farmers reduced to parallel columns (recipient, channel, calendar, days since sowing, location)."""
+
+    def __init__(self):
+        self.recipients = []
+        self.channels = []
+        self.calendar_ids = array("i")
+        self.days = array("i")
+        self.location_ids = array("i")
+        self.calendars = [] # calendar id -> CompiledCalendar
+        self.locations = [] # location id -> location name
+        self.skipped = {"opted_out": 0, "no_calendar": 0, "no_sowing_date": 0, "not_sown_yet": 0}
+
+    def __len__(self):
+        return len(self.recipients)
+
+
+def collect_farmers(store, today=None, batch_size=1000):
+    """Streams the context store into FarmerColumns; calendar lookups are memoized per (crop, variety, location)."""
+    today = today or datetime.date.today()
+    calendars = get_crop_calendars()
+    columns = FarmerColumns()
+    calendar_ids = {} # id(CompiledCalendar) -> calendar id
+    resolved = {} # (crop, variety, location) -> calendar id or None
+    location_ids = {}
+
+    for caller_id, context in store.iter_all(batch_size=batch_size):
+        if context.get("proactive_advisory") is False:
+            columns.skipped["opted_out"] += 1
+            continue
+        crop = context.get("current_crop")
+        location = context.get("location") or "Unknown"
+        lookup_key = (crop, context.get("crop_variety"), location)
+        calendar_id = resolved.get(lookup_key, -1)
+        if calendar_id == -1:
+            calendar = calendars.lookup(*lookup_key) if crop else None
+            if calendar is None:
+                calendar_id = None
+            else:
+                calendar_id = calendar_ids.setdefault(id(calendar), len(columns.calendars))
+                if calendar_id == len(columns.calendars):
+                    columns.calendars.append(calendar)
+            resolved[lookup_key] = calendar_id
+        if calendar_id is None:
+            columns.skipped["no_calendar"] += 1
+            continue
+        sowing_date = get_sowing_date(context)
+        if sowing_date is None:
+            columns.skipped["no_sowing_date"] += 1 # Stage would be a guess: no push
+            continue
+        days = (today - sowing_date).days
+        if days < 0:
+            columns.skipped["not_sown_yet"] += 1
+            continue
+
+        location_id = location_ids.setdefault(location, len(columns.locations))
+        if location_id == len(columns.locations):
+            columns.locations.append(location)
+        channel = context.get("advisory_channel")
+        columns.recipients.append(caller_id)
+        columns.channels.append(channel if channel in CHANNELS else config.PROACTIVE_ADVISORY_CHANNEL)
+        columns.calendar_ids.append(calendar_id)
+        columns.days.append(days)
+        columns.location_ids.append(location_id)
+    return columns
+
+
+def stage_indices(calendars, calendar_ids, days):
+    """
+    Stage index per farmer (len(stages) = past the last stage), i.e. calendar.stage_index(days)
+    for every (calendar id, days) pair, in one searchsorted over all calendars' stage ends.
+    """
+    totals = np.array([calendar.total_days for calendar in calendars], dtype=np.int64)
+    span = int(totals.max()) + 2 # Days are clipped to total + 1, so segments never overlap
+    offsets = np.zeros(len(calendars), dtype=np.int64) # Position of each calendar's first stage end
+    offsets[1:] = np.cumsum([len(calendar.stage_ends) for calendar in calendars])[:-1]
+    ends = np.concatenate([
+        np.asarray(calendar.stage_ends, dtype=np.int64) + index * span for index, calendar in enumerate(calendars)
+    ])
+    calendar_ids = np.asarray(calendar_ids, dtype=np.int64)
+    days = np.minimum(np.asarray(days, dtype=np.int64), totals[calendar_ids] + 1)
+    return np.searchsorted(ends, calendar_ids * span + days, side="left") - offsets[calendar_ids]
+
+
+def build_groups(columns, location_buckets):
+    """
+    Returns (groups, group per farmer): groups is a list of (calendar id, stage index, bucket id).
+    `location_buckets` holds the weather bucket id of each location id.
+    """
+    if np is None:
+        group_ids = {}
+        groups, inverse = [], []
+        for calendar_id, days, location_id in zip(columns.calendar_ids, columns.days, columns.location_ids):
+            key = (calendar_id, columns.calendars[calendar_id].stage_index(days), location_buckets[location_id])
+            group_id = group_ids.setdefault(key, len(groups))
+            if group_id == len(groups):
+                groups.append(key)
+            inverse.append(group_id)
+        return groups, inverse
+
+    calendar_ids = np.frombuffer(columns.calendar_ids, dtype=np.int32).astype(np.int64)
+    stages = stage_indices(columns.calendars, calendar_ids, np.frombuffer(columns.days, dtype=np.int32))
+    buckets = np.asarray(location_buckets, dtype=np.int64)[np.frombuffer(columns.location_ids, dtype=np.int32)]
+    stage_count = max(len(calendar.stage_ends) for calendar in columns.calendars) + 1
+    keys = (calendar_ids * stage_count + stages) * len(WEATHER_BUCKETS) + buckets
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    groups = [(int(key) // len(WEATHER_BUCKETS) // stage_count, int(key) // len(WEATHER_BUCKETS) % stage_count,
+               int(key) % len(WEATHER_BUCKETS)) for key in unique_keys]
+    return groups, inverse.tolist()
+
+
+def run_batch(store, today=None, enqueue=None, batch_size=1000, enqueue_batch_size=1000):
+    """
+    Computes today's advice for every farmer group, spools one push per farmer through
+    `enqueue(messages)` (message_queue.enqueue_many; None = dry run) and returns
+    (AdvisoryTable, stats). Needs an app context (weather lookups).
+    """
+    today = today or datetime.date.today()
+    columns = collect_farmers(store, today, batch_size=batch_size)
+
+    buckets = [weather_bucket(location) for location in columns.locations]
+    location_buckets = [WEATHER_BUCKETS.index(bucket) for bucket in buckets]
+    groups, inverse = build_groups(columns, location_buckets) if len(columns) else ([], [])
+
+    advice = {}
+    bodies = []
+    for calendar_id, stage_index, bucket_id in groups:
+        calendar, bucket = columns.calendars[calendar_id], WEATHER_BUCKETS[bucket_id]
+        stage_name, text = compose_advice(calendar, stage_index, bucket)
+        advice[AdvisoryTable.group_key(calendar, stage_index, bucket)] = [stage_name, text]
+        bodies.append(MESSAGE_PREFIX + text)
+
+    scope = f"proactive-advisory:{today.isoformat()}"
+    queued = 0
+    if enqueue is not None:
+        pending = []
+        for recipient, channel, group_id in zip(columns.recipients, columns.channels, inverse):
+            body = bodies[group_id]
+            pending.append((channel, recipient, body, make_idempotency_key(channel, recipient, body, scope=scope)))
+            if len(pending) >= enqueue_batch_size:
+                queued += enqueue(pending)
+                pending = []
+        if pending:
+            queued += enqueue(pending)
+
+    table = AdvisoryTable(today.isoformat(), dict(zip(columns.locations, buckets)), advice)
+    stats = {
+        "farmers": len(columns),
+        "groups": len(groups),
+        "calendars": len(columns.calendars),
+        "locations": len(columns.locations),
+        "queued": queued,
+        "skipped": columns.skipped,
+    }
+    logger.info(f"Proactive advisory for {today}: {stats}")
+    return table, stats
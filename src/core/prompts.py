@@ -0,0 +1,37 @@
+# Fixed IVR prompts by language. Kept in one table (instead of inline in the routes) so that
+# scripts/prerender_tts.py can synthesize every one of them at deploy time (src/core/tts_cache.py).
+# Only Hindi texts exist so far; other languages fall back to Hindi when spoken, but are only
+# pre-rendered for the texts they have of their own.
+FALLBACK_LANGUAGE = "hi-IN"
+
+PROMPTS = {
+    "welcome": {"hi-IN": "कृषि साथी में आपका स्वागत है। आप क्या जानना चाहते हैं? फसल सलाह, मंडी भाव, या कुछ और?"},
+    "technical_error": {"hi-IN": "क्षमा करें, एक तकनीकी समस्या हुई है। कृपया बाद में कॉल करें।"},
+    "not_understood": {"hi-IN": "मुझे आपकी बात समझ नहीं आई। कृपया फिर से कहें।"},
+    "cannot_help": {"hi-IN": "माफ़ कीजिए, मैं अभी इस बारे में सहायता नहीं कर सकता।"},
+    "photo_hint": {"hi-IN": "सटीक निदान के लिए, आप व्हाट्सएप पर फसल की फोटो भेज सकते हैं।"},
+    "buyer_sms_sent": {"hi-IN": "खरीदार का संपर्क विवरण आपके मोबाइल पर SMS कर दिया गया है।"},
+    "unhandled_intent": {"hi-IN": "आपकी बात पूरी तरह समझ नहीं आई। क्या आप फसल सलाह, मंडी भाव, लोन या मौसम के बारे में पूछ रहे हैं?"},
+    "lookup_error": {"hi-IN": "जानकारी प्राप्त करने में एक समस्या हुई है। कृपया बाद में प्रयास करें।"},
+    "query_error": {"hi-IN": "क्षमा करें, आपकी पूछताछ संसाधित करने में कोई त्रुटि हुई।"},
+    "call_back_later": {"hi-IN": "अभी बहुत सारे किसान कॉल कर रहे हैं। कृपया थोड़ी देर बाद फिर से कॉल करें।"}, # Load shedding (src/utils/admission.py)
+    # Follow-up questions of multi-turn flows (src/core/dialog.py)
+    "ask_location": {"hi-IN": "आप किस जिले से बोल रहे हैं? कृपया अपने जिले का नाम बताइए।"},
+    "ask_sowing_date": {"hi-IN": "आपने फसल कब बोई थी? जैसे, बीस दिन पहले।"},
+    "ask_quantity": {"hi-IN": "आप कितने क्विंटल बेचना चाहते हैं?"},
+    "reprompt": {"hi-IN": "माफ़ कीजिए, मैं समझ नहीं पाया।"},
+}
+
+
+def get_prompt(name, language=None):
+    """Prompt text in `language`, or in Hindi if it has no translation yet."""
+    texts = PROMPTS[name]
+    return texts.get(language) or texts[FALLBACK_LANGUAGE]
+
+
+def all_prompts(language):
+    """
+    Every prompt that has its own text in `language` (for pre-rendering: a Hindi fallback must not
+    be synthesized with another language's voice).
+    """
+    return [texts[language] for texts in PROMPTS.values() if language in texts]
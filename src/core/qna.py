@@ -0,0 +1,425 @@
+# Knowledge-base QnA: local retrieval over FAQs, KVK bulletins and package-of-practice notes
+# - Documents are tokenized for Hindi/English/Marathi (NFC + casefold, nukta/chandrabindu folded,
+#   stopwords dropped, light suffix stemming) into an inverted index. Postings store the final
+#   BM25 weight of (term, document), computed at build time, so a query only gathers and adds
+#   the postings of its few terms
+# - Optional dense vectors: hashed character trigrams per document (no model or external service),
+#   which catch spelling/transliteration variants BM25 misses; blended in with QNA_DENSE_WEIGHT
+# - Entries can be restricted to crops and locations; queries only score entries that apply to the
+#   farmer's crop and district (entries without restrictions apply to everyone)
+# - scripts/build_qna_index.py writes the arrays as .npy files under config.QNA_INDEX_DIR; workers
+#   memory-map them (shared page cache, near-zero load time) and pick up rebuilds automatically.
+#   Without a built index the sample knowledge base is indexed in memory on first use
+# - Answers are cached per (query terms, crop, location) in the shared response cache
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from src.config import config
+from src.core.geo_index import get_market_directory
+from src.utils.cache import cached_response
+
+try:
+    import numpy as np
+except ImportError: # Optional dependency: without it get_general_qna_answer gives the default answer
+    np = None
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_BOOST = 2 # Question and keyword terms count this many times (answers are long and wordy)
+VECTOR_DIMENSIONS = 256
+CHUNK_MAX_CHARS = 800 # Plain-text bulletins are split into paragraphs of at most this size
+
+_TOKEN = re.compile(r"[\w\u0900-\u0963\u0966-\u097F]+") # Devanagari block without the dandas (।, ॥)
+_FOLD = str.maketrans({"\u093c": None, "\u0901": "\u0902"}) # Drop nukta, chandrabindu -> anusvara
+# Question words and fillers ('कौन सा ... अच्छा है?') are dropped: they would lower a good match's term coverage.
+# Listed as tokenize() sees them, i.e. after _FOLD (no nukta)
+STOPWORDS = frozenset("""
+    है हैं था थे थी का की के को में से पर और या भी तो ही यह वह ये वो क्या कैसे कब कहाँ कहां क्यों कौन कितना कितनी कितने
+    मेरा मेरी मेरे मैं हम आप अपने अपनी कर करें करना करे रहा रही रहे हो गया गई गए जा एक कोई लिए बारे बताएं बताइए बताओ चाहिए
+    सा सी अच्छा अच्छी अच्छे बढिया सबसे कौनसा कौनसी
+    आहे आणि मी माझा माझी काय कसे कधी कुठे
+    the a an is are was were of to in on for and or what how when where why which do does my i we you it with can should about
+    good best better
+""".split())
+_HINDI_SUFFIXES = sorted((
+    "ियों", "ियां", "ियाँ", "ाओं", "ाएं", "ाएँ", "ुओं", "ुएं", "ों", "ें", "ीं", "ां", "ाँ", "ता", "ती", "ते", "ना", "ने", "नी",
+    "ा", "ी", "े", "ो", "ि", "ु", "ू",
+), key=len, reverse=True)
+_ENGLISH_SUFFIXES = ("ing", "es", "s")
+
+
+def _stem(token):
+    if len(token) <= 3:
+        return token
+    if token.isascii():
+        for suffix in _ENGLISH_SUFFIXES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+                return token[:-len(suffix)]
+        return token
+    for suffix in _HINDI_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    """Index terms of a text, in order (duplicates kept)."""
+    normalized = unicodedata.normalize("NFC", str(text)).casefold().translate(_FOLD)
+    return [_stem(token) for token in _TOKEN.findall(normalized) if token not in STOPWORDS]
+
+
+def text_vector(terms):
+    """L2-normalized signed feature hash of the character trigrams of `terms`."""
+    vector = np.zeros(VECTOR_DIMENSIONS, dtype=np.float32)
+    for term in terms:
+        padded = f" {term} "
+        for start in range(max(1, len(padded) - 2)):
+            code = zlib.crc32(padded[start:start + 3].encode("utf-8"))
+            vector[code % VECTOR_DIMENSIONS] += 1.0 if code & 0x80000000 else -1.0
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def _key(value):
+    return " ".join(str(value).split()).casefold() if value else ""
+
+
+# --- Corpus ingestion ---
+
+def _entry(raw, source):
+    return {
+        "id": str(raw.get("id") or ""),
+        "question": raw.get("question") or "",
+        "answer": raw.get("answer") or raw.get("text") or "",
+        "keywords": raw.get("keywords") or "",
+        "crops": list(raw.get("crops") or ()),
+        "locations": list(raw.get("locations") or ()),
+        "source": raw.get("source") or source,
+    }
+
+
+def chunk_text(text, max_chars=CHUNK_MAX_CHARS):
+    """Splits a bulletin into passages: paragraphs, merged while they fit in `max_chars`."""
+    passages, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        if current and len(current) + len(paragraph) + 1 > max_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current} {paragraph}".strip()
+    if current:
+        passages.append(current)
+    return passages
+
+
+def load_documents(paths):
+    """
+    Reads knowledge entries from .json ({"entries": [...]} or a list), .jsonl (one entry per line)
+    or .txt files (each passage becomes an entry without crop/location restrictions).
+    """
+    documents = []
+    for path in paths:
+        source = os.path.basename(path)
+        if path.endswith(".txt"):
+            with open(path, encoding="utf-8") as f:
+                passages = chunk_text(f.read())
+            documents.extend(_entry({"id": f"{source}#{i}", "answer": passage}, source) for i, passage in enumerate(passages))
+            continue
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                raw_entries = [json.loads(line) for line in f if line.strip()]
+            else:
+                data = json.load(f)
+                raw_entries = data.get("entries", []) if isinstance(data, dict) else data
+        documents.extend(_entry(raw, source) for raw in raw_entries)
+    documents = [doc for doc in documents if doc["answer"]]
+    for number, doc in enumerate(documents):
+        doc["id"] = doc["id"] or f"doc-{number}"
+    return documents
+
+
+# --- Index ---
+
+class QnAIndex:
+    """
+    BM25 inverted index in CSR form: the postings of term t are positions offsets[t]:offsets[t+1]
+    of `posting_docs` / `posting_weights`. `vectors` (documents x VECTOR_DIMENSIONS) may be None.
+    """
+
+    ARRAYS = ("offsets", "posting_docs", "posting_weights", "vectors")
+
+    def __init__(self, vocabulary, documents, offsets, posting_docs, posting_weights, vectors=None, built_at=None):
+        self.vocabulary = vocabulary # term -> term id
+        self.documents = documents
+        self.offsets = offsets
+        self.posting_docs = posting_docs
+        self.posting_weights = posting_weights
+        self.vectors = vectors
+        self.built_at = built_at
+        self._general_crops, self._by_crop = self._restriction_masks("crops")
+        self._general_locations, self._by_location = self._restriction_masks("locations")
+        self._crop_terms = {term for crop in self._by_crop for term in tokenize(crop)}
+        self._allowed = {}
+
+    def _restriction_masks(self, field):
+        general = np.ones(len(self.documents), dtype=bool)
+        by_value = {}
+        for number, doc in enumerate(self.documents):
+            if doc[field]:
+                general[number] = False
+                for value in doc[field]:
+                    by_value.setdefault(_key(value), np.zeros(len(self.documents), dtype=bool))[number] = True
+        return general, by_value
+
+    @classmethod
+    def build(cls, documents, vectors=True):
+        term_ids = {}
+        postings = [] # (term id, doc, tf)
+        lengths = np.zeros(len(documents), dtype=np.float64)
+        for number, doc in enumerate(documents):
+            terms = tokenize(f"{doc['question']} {doc['keywords']}") * TITLE_BOOST + tokenize(doc["answer"])
+            lengths[number] = len(terms)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings.append((term_ids.setdefault(term, len(term_ids)), number, count))
+
+        postings.sort()
+        terms = np.fromiter((p[0] for p in postings), dtype=np.int64, count=len(postings))
+        posting_docs = np.fromiter((p[1] for p in postings), dtype=np.int32, count=len(postings))
+        tf = np.fromiter((p[2] for p in postings), dtype=np.float64, count=len(postings))
+        document_frequency = np.bincount(terms, minlength=len(term_ids))
+        offsets = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=offsets[1:])
+
+        idf = np.log(1.0 + (len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = lengths.mean() if len(documents) else 1.0
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[posting_docs] / average_length)
+        posting_weights = (idf[terms] * tf * (BM25_K1 + 1.0) / (tf + norm)).astype(np.float32)
+
+        matrix = None
+        if vectors:
+            matrix = np.zeros((len(documents), VECTOR_DIMENSIONS), dtype=np.float32)
+            for number, doc in enumerate(documents):
+                matrix[number] = text_vector(tokenize(f"{doc['question']} {doc['keywords']} {doc['answer']}"))
+        return cls(term_ids, documents, offsets, posting_docs, posting_weights, matrix,
+                   built_at=datetime.datetime.now().isoformat(timespec="seconds"))
+
+    def save(self, directory, keep=2):
+        """
+        Writes a new build under `directory`/<timestamp>/ and then points `directory`/CURRENT at it
+        (atomic rename), so workers never map a half-written index. Older builds beyond `keep` are removed.
+        """
+        build = datetime.datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        build_dir = os.path.join(directory, build)
+        os.makedirs(build_dir)
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            if array is not None:
+                np.save(os.path.join(build_dir, f"{name}.npy"), array)
+        with open(os.path.join(build_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"built_at": self.built_at, "terms": sorted(self.vocabulary, key=self.vocabulary.get),
+                       "documents": self.documents}, f, ensure_ascii=False)
+        pointer = os.path.join(directory, "CURRENT")
+        with open(pointer + ".tmp", "w") as f:
+            f.write(build)
+        os.replace(pointer + ".tmp", pointer)
+
+        builds = sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+        for old in builds[:-keep]:
+            old_dir = os.path.join(directory, old)
+            for name in os.listdir(old_dir):
+                os.unlink(os.path.join(old_dir, name)) # Workers still mapping it keep their open pages
+            os.rmdir(old_dir)
+        return build_dir
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-maps the build `directory`/CURRENT points to."""
+        with open(os.path.join(directory, "CURRENT")) as f:
+            build_dir = os.path.join(directory, f.read().strip())
+        with open(os.path.join(build_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {}
+        for name in cls.ARRAYS:
+            path = os.path.join(build_dir, f"{name}.npy")
+            arrays[name] = np.load(path, mmap_mode="r") if os.path.exists(path) else None
+        vocabulary = {term: term_id for term_id, term in enumerate(meta["terms"])}
+        return cls(vocabulary, meta["documents"], built_at=meta.get("built_at"), **arrays)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def allowed(self, crop=None, location=None):
+        """
+        Documents that apply to a farmer of `crop` in `location` (boolean mask, memoized). An
+        unknown crop or location does not restrict that side.
+        """
+        key = (_key(crop), _key(location))
+        mask = self._allowed.get(key)
+        if mask is None:
+            mask = np.ones(len(self.documents), dtype=bool)
+            if key[0]:
+                mask &= self._general_crops | self._by_crop.get(key[0], False)
+            if key[1]:
+                locations = self._general_locations | self._by_location.get(key[1], False)
+                district = _key(get_market_directory().find_place(location)) # Aliases ('झांसी') -> district name
+                if district:
+                    locations |= self._by_location.get(district, False)
+                mask &= locations
+            if len(self._allowed) >= 1024:
+                self._allowed.clear()
+            self._allowed[key] = mask
+        return mask
+
+    def search(self, terms, crop=None, location=None, top_k=3, dense_weight=0.0):
+        """Up to `top_k` SearchHits for query `terms`, best first, among documents that apply to `crop` and `location`."""
+        terms = set(terms)
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        matched = np.zeros(len(self.documents), dtype=np.float32) # IDF of the distinct query terms found per document
+        total_idf = 0.0
+        for term in terms:
+            term_id = self.vocabulary.get(term)
+            start, end = (self.offsets[term_id], self.offsets[term_id + 1]) if term_id is not None else (0, 0)
+            idf = float(np.log(1.0 + (len(self.documents) - (end - start) + 0.5) / (end - start + 0.5)))
+            total_idf += idf
+            docs = self.posting_docs[start:end]
+            scores[docs] += self.posting_weights[start:end] # Doc ids are unique per term
+            matched[docs] += idf
+            if term in self._crop_terms:
+                # Entries for every crop answer a question naming a crop ('गेहूं का बीज') as well
+                general = self._general_crops.copy()
+                general[docs] = False
+                matched[general] += idf
+
+        allowed = self.allowed(crop, location)
+        count = min(top_k, int(allowed.sum()))
+        if count == 0 or not terms:
+            return []
+        similarity = np.zeros(len(self.documents), dtype=np.float32)
+        if dense_weight > 0 and self.vectors is not None:
+            candidates = np.flatnonzero(allowed)
+            similarity[candidates] = self.vectors[candidates] @ text_vector(terms)
+        best_bm25 = float(scores[allowed].max())
+        combined = (1.0 - dense_weight) * (scores / best_bm25 if best_bm25 > 0 else scores) + dense_weight * similarity
+        combined[~allowed] = -np.inf
+
+        top = np.argpartition(-combined, count - 1)[:count]
+        top = top[np.argsort(-combined[top])]
+        return [SearchHit(self.documents[i], float(scores[i]), float(matched[i]) / total_idf, float(similarity[i]), float(combined[i]))
+                for i in top]
+
+
+class SearchHit:
+    """
+    One ranked document: BM25 score, share of the query terms it contains (weighted by IDF, so a
+    missing common word counts less than a missing rare one; crop names count as contained in
+    entries that apply to all crops), trigram similarity and blended score.
+    """
+    __slots__ = ("document", "score", "coverage", "similarity", "combined")
+
+    def __init__(self, document, score, coverage, similarity, combined):
+        self.document = document
+        self.score = score
+        self.coverage = coverage
+        self.similarity = similarity
+        self.combined = combined
+
+
+class _ReloadingIndex:
+    """
+    Holds the current index; reloads it when `directory`/CURRENT changes (checked at most every few
+    seconds). Until a build exists, indexes the configured knowledge base file in memory.
+    """
+
+    def __init__(self, directory, fallback_paths, check_interval):
+        self.directory = directory
+        self.fallback_paths = fallback_paths
+        self.check_interval = check_interval
+        self._index = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_interval
+                    self._reload_if_changed()
+        return self._index
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(os.path.join(self.directory, "CURRENT")).st_mtime_ns
+        except OSError:
+            if self._index is None:
+                self._build_fallback()
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self._index = QnAIndex.load(self.directory)
+            self._mtime = mtime
+            logger.info(f"Loaded QnA index ({len(self._index)} documents, built {self._index.built_at}) from {self.directory}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Invalid QnA index in {self.directory}, keeping previous version: {e}")
+
+    def _build_fallback(self):
+        try:
+            self._index = QnAIndex.build(load_documents(self.fallback_paths))
+            logger.info(f"No QnA index in {self.directory}; indexed {len(self._index)} documents from {self.fallback_paths}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Could not index knowledge base {self.fallback_paths}: {e}")
+
+
+_indexes = None
+_indexes_lock = threading.Lock()
+
+
+def get_qna_index():
+    """Returns the current QnAIndex (hot-reloaded from config.QNA_INDEX_DIR), or None if unavailable."""
+    global _indexes
+    if np is None:
+        return None
+    if _indexes is None:
+        with _indexes_lock:
+            if _indexes is None:
+                _indexes = _ReloadingIndex(config.QNA_INDEX_DIR, [config.QNA_KNOWLEDGE_BASE_PATH], config.QNA_INDEX_RELOAD_SECONDS)
+    return _indexes.get()
+
+
+@cached_response("qna", ttl_seconds=lambda: config.CACHE_TTL_QNA_SECONDS)
+def _answer_for_terms(query_terms, crop, location):
+    index = get_qna_index()
+    if index is None or not query_terms:
+        return None
+    hits = index.search(query_terms.split(" "), crop, location, top_k=1, dense_weight=config.QNA_DENSE_WEIGHT)
+    if not hits:
+        return None
+    hit = hits[0]
+    lexical_match = hit.score >= config.QNA_MIN_SCORE and hit.coverage >= config.QNA_MIN_TERM_COVERAGE
+    if not lexical_match and hit.similarity < config.QNA_MIN_SIMILARITY:
+        return None
+    return {"answer": hit.document["answer"], "source": hit.document["source"], "id": hit.document["id"],
+            "score": round(hit.score, 3), "similarity": round(hit.similarity, 3)}
+
+
+def answer_question(query_text, crop=None, location=None):
+    """
+    Best knowledge-base answer for a question, or None if nothing matches well enough.
+    Questions with the same terms in any order share one cache entry.
+    """
+    return _answer_for_terms(" ".join(sorted(set(tokenize(query_text)))), crop, location)
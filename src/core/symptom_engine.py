@@ -0,0 +1,209 @@
+# Symptom-based diagnosis: ranks crop diseases by how well a described set of symptoms fits them
+# - The catalog (config.SYMPTOM_CATALOG_PATH) defines symptom features by their phrases in every
+#   language, and per crop x disease a weight for each characteristic symptom
+# - Symptom features are extracted from the description in one pass of the shared Aho-Corasick
+#   automaton (phrases match at word starts, so 'धब्ब' covers 'धब्बे'/'धब्बों'; a phrase inside a
+#   longer matched phrase does not count separately)
+# - The disease x symptom matrix is precomputed with symptom specificity (idf) folded in and each
+#   disease row L2-normalized, and stored by column: scoring a description is the sparse product of
+#   the matrix with its symptom vector, touching only the columns of the few symptoms mentioned.
+#   The resulting cosine (0-1) is the reported confidence
+# - Plain Python on purpose: a query touches a few dozen nonzeros, less than NumPy's per-call overhead
+# - A crop's own entry and a crop-independent one ('crop': null) can describe the same disease
+#   (wheat's "चूर्णिल आसिता (Powdery Mildew)" and the generic "पाउडरी मिल्ड्यू (Powdery Mildew)"):
+#   entries with the same disease key (the catalog's 'disease', else the name in parentheses, else
+#   the name) are ranked once, under the crop's own entry
+# The catalog file is hot-reloaded when it changes.
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from src.config import config
+from src.core.intent_engine import KeywordAutomaton, drop_shadowed, normalize_text
+
+logger = logging.getLogger(__name__)
+
+_FOLD = str.maketrans({"\u093c": None, "\u0901": "\u0902"}) # Nukta dropped, chandrabindu -> anusvara
+
+
+def _normalize(text):
+    return normalize_text(text).translate(_FOLD)
+
+
+def _key(value):
+    return " ".join(str(value).split()).casefold() if value else ""
+
+
+def _starts_word(text, index):
+    # Letters, digits and combining marks (Devanagari matras/virama) continue a word
+    return index == 0 or unicodedata.category(text[index - 1])[0] not in "LMN"
+
+
+_PARENTHESIZED = re.compile(r"\(([^()]+)\)")
+
+
+class Disease:
+    __slots__ = ("id", "crop", "name", "advice", "key")
+
+    def __init__(self, entry):
+        self.id = entry["id"]
+        self.crop = entry.get("crop")
+        self.name = entry["name"]
+        self.advice = entry.get("advice", "")
+        parenthesized = _PARENTHESIZED.search(self.name)
+        self.key = _key(entry.get("disease") or (parenthesized.group(1) if parenthesized else self.name))
+
+
+class SymptomMatch:
+    """A ranked candidate: the disease, its confidence (cosine, 0-1) and the matched symptom ids."""
+    __slots__ = ("disease", "confidence", "symptoms")
+
+    def __init__(self, disease, confidence, symptoms):
+        self.disease = disease
+        self.confidence = confidence
+        self.symptoms = symptoms
+
+
+class SymptomEngine:
+    def __init__(self, catalog):
+        self.automaton = KeywordAutomaton()
+        symptom_ids = {}
+        for symptom in catalog.get("symptoms", []):
+            symptom_id = symptom_ids.setdefault(symptom["id"], len(symptom_ids))
+            for phrase in symptom.get("phrases", []):
+                self.automaton.add(_normalize(phrase), symptom_id)
+        self.automaton.build()
+        self.symptom_names = sorted(symptom_ids, key=symptom_ids.get)
+
+        self.diseases = [Disease(entry) for entry in catalog.get("diseases", [])]
+        rows = []
+        for entry in catalog.get("diseases", []):
+            row = {}
+            for name, weight in entry.get("symptoms", {}).items():
+                if name not in symptom_ids:
+                    raise KeyError(f"Disease {entry['id']} uses undefined symptom '{name}'")
+                row[symptom_ids[name]] = float(weight)
+            rows.append(row)
+
+        # Specificity: a symptom shared by many diseases says less about which one it is
+        document_frequency = [0] * len(symptom_ids)
+        for row in rows:
+            for symptom_id in row:
+                document_frequency[symptom_id] += 1
+        self.idf = [math.log(1.0 + len(rows) / df) if df else 0.0 for df in document_frequency]
+
+        # Column storage of the row-normalized matrix: symptom -> ((disease, weight), ...)
+        columns = [[] for _ in symptom_ids]
+        for disease_id, row in enumerate(rows):
+            norm = math.sqrt(sum((weight * self.idf[s]) ** 2 for s, weight in row.items())) or 1.0
+            for symptom_id, weight in row.items():
+                columns[symptom_id].append((disease_id, weight * self.idf[symptom_id] / norm))
+        self.columns = [tuple(column) for column in columns]
+
+        self._by_crop = {}
+        for disease_id, disease in enumerate(self.diseases):
+            self._by_crop.setdefault(_key(disease.crop), set()).add(disease_id)
+
+    def extract(self, text):
+        """Symptom ids mentioned in `text`, in order of first mention."""
+        normalized = _normalize(text)
+        matches = [m for m in self.automaton.iter_matches(normalized) if _starts_word(normalized, m[0])]
+        return list(dict.fromkeys(symptom_id for _, _, symptom_id in drop_shadowed(matches)))
+
+    def rank(self, text, crop=None, top_k=3):
+        """
+        Candidate diseases for a symptom description, best first. With a crop given only that
+        crop's diseases and crop-independent ones (crop null) are considered.
+        """
+        symptoms = self.extract(text)
+        if not symptoms:
+            return []
+        allowed = None
+        if crop:
+            allowed = self._by_crop.get(_key(crop), set()) | self._by_crop.get("", set())
+
+        query_norm = math.sqrt(sum(self.idf[s] ** 2 for s in symptoms)) or 1.0
+        scores = {}
+        for symptom_id in symptoms:
+            query_weight = self.idf[symptom_id] / query_norm
+            for disease_id, weight in self.columns[symptom_id]:
+                if allowed is None or disease_id in allowed:
+                    scores[disease_id] = scores.get(disease_id, 0.0) + weight * query_weight
+
+        # One candidate per disease key: the crop's own entry, with the best score of the key's entries
+        preference = lambda item: (self.diseases[item[0]].crop is not None, item[1])
+        best = {}
+        for candidate in scores.items():
+            key = self.diseases[candidate[0]].key
+            current = best.get(key)
+            if current is None:
+                best[key] = candidate
+            else:
+                best[key] = (max(current, candidate, key=preference)[0], max(current[1], candidate[1]))
+        # On (near-)equal scores the crop's own disease goes before the crop-independent one
+        ranked = sorted(best.values(), key=lambda item: (-round(item[1], 6), self.diseases[item[0]].crop is None))[:top_k]
+        names = [self.symptom_names[s] for s in symptoms]
+        return [SymptomMatch(self.diseases[disease_id], score, names) for disease_id, score in ranked]
+
+    def __len__(self):
+        return len(self.diseases)
+
+
+def load_symptom_engine(path=None):
+    with open(path or config.SYMPTOM_CATALOG_PATH, encoding="utf-8") as f:
+        return SymptomEngine(json.load(f))
+
+
+class _ReloadingEngine:
+    """Holds the current engine and rebuilds it when the catalog's mtime changes (checked at most every few seconds)."""
+
+    def __init__(self, path, check_interval):
+        self.path = path
+        self.check_interval = check_interval
+        self._engine = SymptomEngine({})
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_interval
+                    self._reload_if_changed()
+        return self._engine
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logger.warning(f"Symptom catalog not available at {self.path}: {e}")
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self._engine = load_symptom_engine(self.path)
+            self._mtime = mtime
+            logger.info(f"Loaded {len(self._engine)} crop diseases from {self.path}")
+        except (ValueError, KeyError, TypeError) as e:
+            # Keep the previous catalog if an edit left the file invalid
+            logger.error(f"Invalid symptom catalog {self.path}, keeping previous version: {e}")
+
+
+_engines = None
+_engines_lock = threading.Lock()
+
+
+def get_symptom_engine():
+    """Returns the current SymptomEngine (hot-reloaded from config.SYMPTOM_CATALOG_PATH)."""
+    global _engines
+    if _engines is None:
+        with _engines_lock:
+            if _engines is None:
+                _engines = _ReloadingEngine(config.SYMPTOM_CATALOG_PATH, config.SYMPTOM_CATALOG_RELOAD_SECONDS)
+    return _engines.get()
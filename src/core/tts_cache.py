@@ -0,0 +1,210 @@
+# TTS asset cache: synthesized speech stored on disk under a content address
+# - Asset name = SHA-256 of (voice version, language, voice gender, normalized text): the same text
+#   is synthesized once and then served as a static file by every worker (or a CDN)
+# - Responses are split into segments before lookup: sentences, and inside a sentence the numeric
+#   fragments (prices, quantities, distances). Fixed parts of templated answers are then cache hits
+#   and only the new fragments are synthesized; the IVR plays the segments in order
+# - scripts/prerender_tts.py synthesizes every fixed prompt and all crop-calendar advice per
+#   supported language at deploy time, so the common answers never wait on the TTS service
+# - Live responses don't wait on it either: render_ready() returns the audio only if every segment
+#   is synthesized, and otherwise queues the missing segments on a small background pool; the
+#   caller hears the IVR provider's own TTS of the text this time and the recorded voice next time
+# - Assets are immutable (written to a temp file and renamed into place); changing
+#   TTS_VOICE_VERSION gives every text a new name instead of overwriting old audio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+ASSET_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.(?:wav|mp3|ogg)$")
+
+_WHITESPACE = re.compile(r"\s+")
+_SENTENCE_END = re.compile(r"(?<=[।?!.])\s+") # '.' only before whitespace, so '2.5' stays intact
+# Numbers with their currency/unit: '~₹2150/क्विंटल', '12 किमी', '85.0%'
+_NUMERIC_FRAGMENT = re.compile(r"~?₹?\d[\d,.]*(?:\s?(?:/क्विंटल|क्विंटल|किमी|दिनों|दिन|%|°C|मिमी))?")
+_STRIP_CHARS = " ,;:-"
+
+
+def normalize_text(text):
+    return _WHITESPACE.sub(" ", str(text)).strip()
+
+
+def segment_text(text):
+    """
+    Splits a response into speakable segments: sentences, with numeric fragments split out of
+    their sentence. Segments without any letter or digit (stray punctuation) are dropped.
+    """
+    segments = []
+    for sentence in _SENTENCE_END.split(normalize_text(text)):
+        position = 0
+        for match in _NUMERIC_FRAGMENT.finditer(sentence):
+            segments.append(sentence[position:match.start()])
+            segments.append(match.group())
+            position = match.end()
+        segments.append(sentence[position:])
+    return [segment.strip(_STRIP_CHARS) for segment in segments if any(ch.isalnum() for ch in segment)]
+
+
+def asset_key(text, language, voice_gender="FEMALE", voice_version=None):
+    voice_version = voice_version or config.TTS_VOICE_VERSION
+    material = f"{voice_version}\x1f{language}\x1f{voice_gender}\x1f{normalize_text(text)}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TTSAssetCache:
+    """
+    Maps text segments to audio files under `directory` (<first 2 hex chars>/<sha256>.<ext>).
+    `render()` returns the asset names for a whole response, synthesizing only missing segments;
+    `render_ready()` returns them only if nothing is missing and synthesizes in the background.
+    """
+
+    def __init__(self, directory, extension="wav", voice_version=None, max_known=200000, background_workers=2):
+        self.directory = directory
+        self.extension = extension
+        self.voice_version = voice_version or config.TTS_VOICE_VERSION
+        self.max_known = max_known
+        self.background_workers = background_workers
+        self._known = set() # Asset names seen on disk by this process (files are never rewritten)
+        self._locks = [threading.Lock() for _ in range(64)] # Striped: one synthesis per segment at a time
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "failures": 0, "deferred": 0}
+        self._queued = set() # Asset names waiting for (or in) background synthesis
+        self._executor = None # Created on first use, in the process that uses it
+        os.makedirs(directory, exist_ok=True)
+
+    def asset_name(self, text, language, voice_gender="FEMALE"):
+        return f"{asset_key(text, language, voice_gender, self.voice_version)}.{self.extension}"
+
+    def path_for(self, name):
+        return os.path.join(self.directory, name[:2], name)
+
+    def _exists(self, name):
+        if name in self._known:
+            return True
+        # Another worker (or the prerender script) may have written it since
+        if os.path.exists(self.path_for(name)):
+            with self._lock:
+                if len(self._known) >= self.max_known:
+                    self._known.clear()
+                self._known.add(name)
+            return True
+        return False
+
+    def lookup(self, text, language, voice_gender="FEMALE"):
+        """Asset name if this segment is already synthesized, else None."""
+        name = self.asset_name(text, language, voice_gender)
+        return name if self._exists(name) else None
+
+    def _write(self, name, audio):
+        path = self.path_for(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._known.add(name)
+
+    def ensure(self, text, language, voice_gender, synthesize):
+        """Returns (asset name, synthesized?) for one segment; `synthesize(text, language, voice_gender)` returns audio bytes."""
+        name = self.asset_name(text, language, voice_gender)
+        if self._exists(name):
+            self._count("hits")
+            return name, False
+        with self._locks[hash(name) % len(self._locks)]:
+            if self._exists(name): # Synthesized by a concurrent request meanwhile
+                self._count("hits")
+                return name, False
+            try:
+                audio = synthesize(text, language, voice_gender)
+                if not audio:
+                    raise ValueError("empty audio")
+                self._write(name, audio)
+            except Exception:
+                self._count("failures")
+                raise
+        self._count("misses")
+        return name, True
+
+    def render(self, text, language, voice_gender, synthesize):
+        """Asset names for every segment of `text`, in speaking order."""
+        return [self.ensure(segment, language, voice_gender, synthesize)[0] for segment in segment_text(text)]
+
+    def render_ready(self, text, language, voice_gender, synthesize):
+        """
+        Asset names for every segment of `text` if all of them are synthesized already, else None
+        after queuing the missing segments for background synthesis (see the module comment).
+        """
+        names, missing = [], []
+        for segment in segment_text(text):
+            name = self.asset_name(segment, language, voice_gender)
+            names.append(name)
+            if not self._exists(name):
+                missing.append((segment, name))
+        if not missing:
+            with self._lock:
+                self._stats["hits"] += len(names)
+            return names
+        with self._lock:
+            missing = [(segment, name) for segment, name in missing if name not in self._queued]
+            self._queued.update(name for _, name in missing)
+            self._stats["deferred"] += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.background_workers, thread_name_prefix="tts-render")
+        for segment, name in missing:
+            self._executor.submit(self._render_queued, segment, name, language, voice_gender, synthesize)
+        return None
+
+    def _render_queued(self, segment, name, language, voice_gender, synthesize):
+        try:
+            self.ensure(segment, language, voice_gender, synthesize)
+        except Exception as e:
+            logger.warning(f"Background TTS failed for '{segment[:40]}' in {language}: {e}")
+        finally:
+            with self._lock:
+                self._queued.discard(name)
+
+    def _count(self, field):
+        with self._lock:
+            self._stats[field] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["known_assets"] = len(self._known)
+            stats["queued"] = len(self._queued)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["voice_version"] = self.voice_version
+        return stats
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache():
+    """Returns this process's TTS asset cache, created from config on first use."""
+    global _cache, _cache_pid
+    if _cache is not None and _cache_pid == os.getpid():
+        return _cache
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = TTSAssetCache(config.TTS_CACHE_DIR, extension=config.TTS_AUDIO_FORMAT,
+                                   background_workers=config.TTS_BACKGROUND_WORKERS)
+            _cache_pid = os.getpid()
+    return _cache
@@ -1,15 +1,50 @@
 import random
 import datetime
 from flask import current_app
-# Optional: Import API calling functions if defined separately
-# from src.integrations.external_apis import get_openweathermap_forecast
+from src.config import config
+from src.core.weather_grid import forecast_for
+from src.utils.cache import cached_response
+from src.utils.tracing import traced
 
+# Forecasts come from the gridded store filled by scripts/ingest_weather.py (src/core/weather_grid.py);
+# requests never call the weather API themselves.
+CONDITION_NAMES = {
+    "Clear": "साफ", "Clouds": "बादल", "Drizzle": "हल्की बारिश", "Thunderstorm": "आंधी-तूफान और बारिश",
+    "Mist": "धुंध", "Haze": "धुंध", "Fog": "कोहरा", "Snow": "बर्फबारी",
+}
+
+
+def _condition_name(day):
+    if day["condition"] == "Rain":
+        rain_mm = day.get("rain_mm") or 0.0
+        return "हल्की बारिश" if rain_mm < 7.5 else "मध्यम बारिश" if rain_mm < 35.5 else "तेज़ बारिश" # IMD daily categories
+    return CONDITION_NAMES.get(day["condition"], "मिला-जुला मौसम")
+
+
+def _format_day(index, day):
+    date = datetime.date.fromisoformat(day["date"])
+    day_str = "आज" if index == 0 else "कल" if index == 1 else f"{date.strftime('%d %b')}"
+    return (f"{day_str}: {day['condition']} (बारिश: {day['precipitation_probability_percent']:.0f}%, "
+            f"तापमान: {day['temp_min_celsius']:.0f}-{day['temp_max_celsius']:.0f}°C)")
+
+
+# Depends only on the location (and days), not on the caller; the grid is re-ingested every few hours,
+# so callers from one district share an answer for up to CACHE_TTL_WEATHER_SECONDS
+@traced()
+@cached_response("weather", ttl_seconds=lambda: config.CACHE_TTL_WEATHER_SECONDS)
 def get_weather_forecast(location, days=3):
     """
-    Placeholder: Gets weather forecast for the next few days.
-    !! REPLACE with actual API call to OpenWeatherMap, IMD, etc. !!
+    Gets the weather forecast for the next few days from the nearest point of the ingested
+    forecast grid. Simulated if there is no current grid or the location is not covered.
     """
     logger = current_app.logger
+    grid_days = forecast_for(location, days)
+    if grid_days:
+        detailed_forecast = [{**day, "condition": _condition_name(day)} for day in grid_days]
+        forecast = "मौसम पूर्वानुमान: " + ". ".join(_format_day(i, day) for i, day in enumerate(detailed_forecast)) + "."
+        logger.debug("Weather forecast for %s from grid: %s", location, detailed_forecast)
+        return {"forecast": forecast, "detailed": detailed_forecast}
+
     logger.info(f"[SIMULATE] Weather: Getting forecast for {location} for {days} days")
 
     forecast = f"{location} के लिए मौसम पूर्वानुमान उपलब्ध नहीं है।"
@@ -31,9 +66,6 @@ def get_weather_forecast(location, days=3):
             day_temp_min = temp_min + random.randint(-2, 2)
             day_temp_max = temp_max + random.randint(-2, 3)
 
-            day_str = "आज" if i == 0 else "कल" if i == 1 else f"{day_date.strftime('%d %b')}"
-            forecast_part = f"{day_str}: {day_condition} (बारिश: {day_precip:.0f}%, तापमान: {day_temp_min}-{day_temp_max}°C)"
-            forecast_parts.append(forecast_part)
             detailed_forecast.append({
                 "date": day_date.isoformat(),
                 "condition": day_condition,
@@ -41,6 +73,7 @@ def get_weather_forecast(location, days=3):
                 "temp_min_celsius": day_temp_min,
                 "temp_max_celsius": day_temp_max,
             })
+            forecast_parts.append(_format_day(i, detailed_forecast[-1]))
 
         forecast = "मौसम पूर्वानुमान: " + ". ".join(forecast_parts) + "."
 
@@ -49,7 +82,7 @@ def get_weather_forecast(location, days=3):
         forecast = "मौसम पूर्वानुमान प्राप्त करने में त्रुटि हुई।"
 
     result = {"forecast": forecast, "detailed": detailed_forecast}
-    logger.info(f"[SIMULATE] Weather Forecast Result: {result}")
+    logger.debug("[SIMULATE] Weather Forecast Result: %s", result)
     return result
 
 # Optional: Add function for specific alerts (heatwave, heavy rain warning)
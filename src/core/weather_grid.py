@@ -0,0 +1,217 @@
+# Gridded weather forecasts served from memory
+# - scripts/ingest_weather.py (cron, every few hours) fetches the daily forecast for every point of a
+#   regular lat/lon grid around the service districts (config.WEATHER_GRID_DEGREES apart), concurrently
+#   over the pooled upstream client, and stores it as one float32 array (point x day x variable)
+#   in config.WEATHER_GRID_PATH (.npz)
+# - Workers load that file (hot-reloaded when it changes) and answer weather.get_weather_forecast
+#   by nearest grid point, so a burst of calls on a rainy morning costs no upstream requests at all
+# - Points whose fetch failed are NaN and skipped by the nearest-point search; a store older than
+#   WEATHER_GRID_MAX_AGE_HOURS is ignored (callers fall back to simulation)
+import datetime
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.config import config
+from src.core.geo_index import KM_PER_DEGREE_LAT, get_market_directory
+
+try:
+    import numpy as np
+except ImportError: # Optional dependency: without it get_weather_forecast falls back to simulation
+    np = None
+
+logger = logging.getLogger(__name__)
+
+VARIABLES = (
+    "temp_min_celsius", "temp_max_celsius", "precipitation_probability_percent", "rain_mm",
+    "humidity_percent", "wind_speed_mps", "condition",
+)
+CONDITIONS = ("", "Clear", "Clouds", "Rain", "Drizzle", "Thunderstorm", "Mist", "Haze", "Fog", "Snow") # 'condition' = index
+_CONDITION_CODES = {name: code for code, name in enumerate(CONDITIONS)}
+
+
+def grid_points(coordinates, spacing, radius_cells=1):
+    """
+    Grid points covering `coordinates` [(lat, lon), ...]: each one's grid cell and the cells up to
+    `radius_cells` around it (a district spans more than one cell), sorted and deduplicated.
+    """
+    points = set()
+    for lat, lon in coordinates:
+        row, col = round(lat / spacing), round(lon / spacing)
+        for d_row in range(-radius_cells, radius_cells + 1):
+            for d_col in range(-radius_cells, radius_cells + 1):
+                points.add((round((row + d_row) * spacing, 4), round((col + d_col) * spacing, 4)))
+    return sorted(points)
+
+
+class WeatherGrid:
+    """Daily forecasts for grid points: values[point, day, variable], day 0 = start_date."""
+
+    def __init__(self, lats, lons, start_date, values, fetched_at):
+        self.lats = lats
+        self.lons = lons
+        self.start_date = start_date
+        self.values = values
+        self.fetched_at = fetched_at # Unix time of the ingestion run
+        self._valid = np.flatnonzero(~np.isnan(values[:, :, 0]).all(axis=1)) # Points with any data
+        self._nearest = {} # location key -> (point, km)
+        self._nearest_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.lats)
+
+    @property
+    def days(self):
+        return self.values.shape[1]
+
+    @property
+    def age_hours(self):
+        return (time.time() - self.fetched_at) / 3600.0
+
+    def nearest_point(self, lat, lon):
+        """(point index, distance in km) of the closest grid point with data, or (None, None)."""
+        if not len(self._valid):
+            return None, None
+        lats, lons = self.lats[self._valid], self.lons[self._valid]
+        # Equirectangular distance: exact enough between neighbouring grid points
+        d_lat = lats - lat
+        d_lon = (lons - lon) * math.cos(math.radians(lat))
+        squared = d_lat * d_lat + d_lon * d_lon
+        best = int(np.argmin(squared))
+        return int(self._valid[best]), math.sqrt(float(squared[best])) * KM_PER_DEGREE_LAT
+
+    def nearest_for(self, key, lat, lon, max_entries=4096):
+        """nearest_point() memoized per location key (cleared with the grid when a new one is loaded)."""
+        cached = self._nearest.get(key)
+        if cached is None:
+            cached = self.nearest_point(lat, lon)
+            with self._nearest_lock:
+                if len(self._nearest) >= max_entries:
+                    self._nearest.clear()
+                self._nearest[key] = cached
+        return cached
+
+    def daily(self, point, first_date, days):
+        """Day dicts for `days` days from `first_date` at `point`; days without data are left out."""
+        offset = (first_date - self.start_date).days
+        rows = []
+        for day in range(max(0, offset), min(self.days, offset + days)):
+            values = self.values[point, day]
+            if np.isnan(values[0]):
+                continue
+            row = {name: float(value) for name, value in zip(VARIABLES, values)}
+            row["condition"] = CONDITIONS[int(row["condition"])] if not math.isnan(row["condition"]) else ""
+            row["date"] = (self.start_date + datetime.timedelta(days=day)).isoformat()
+            rows.append(row)
+        return rows
+
+    def save(self, path):
+        np.savez(path, lats=self.lats, lons=self.lons, values=self.values,
+                 start_ordinal=np.int64(self.start_date.toordinal()), fetched_at=np.float64(self.fetched_at))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["lats"], data["lons"], datetime.date.fromordinal(int(data["start_ordinal"])),
+                       data["values"], float(data["fetched_at"]))
+
+
+def ingest(points, fetch, days=7, workers=8):
+    """
+    Fetches every point with `fetch(lat, lon)` -> [day dict, ...] (external_apis.get_openweathermap_forecast_api)
+    on `workers` threads and returns (WeatherGrid, number of failed points).
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(lambda point: fetch(*point), points))
+
+    dates = [datetime.date.fromisoformat(day["date"]) for result in results if result for day in result]
+    start_date = min(dates) if dates else datetime.date.today()
+    values = np.full((len(points), days, len(VARIABLES)), np.nan, dtype=np.float32)
+    failures = 0
+    for point, result in enumerate(results):
+        if not result:
+            failures += 1
+            continue
+        for day in result:
+            offset = (datetime.date.fromisoformat(day["date"]) - start_date).days
+            if 0 <= offset < days:
+                values[point, offset] = [
+                    _CONDITION_CODES.get(day.get(name), 0) if name == "condition" else day.get(name, np.nan)
+                    for name in VARIABLES
+                ]
+    lats = np.array([lat for lat, _ in points], dtype=np.float64)
+    lons = np.array([lon for _, lon in points], dtype=np.float64)
+    return WeatherGrid(lats, lons, start_date, values, time.time()), failures
+
+
+class _ReloadingGrid:
+    """Holds the current grid and reloads it when the file's mtime changes (checked at most every few seconds)."""
+
+    def __init__(self, path, check_interval):
+        self.path = path
+        self.check_interval = check_interval
+        self._grid = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_interval
+                    self._reload_if_changed()
+        return self._grid
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return # Not ingested yet: callers fall back
+        if mtime == self._mtime:
+            return
+        try:
+            self._grid = WeatherGrid.load(self.path)
+            self._mtime = mtime
+            logger.info(f"Loaded weather grid: {len(self._grid)} points x {self._grid.days} days from {self._grid.start_date} ({self.path})")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Invalid weather grid file {self.path}, keeping previous version: {e}")
+
+
+_grids = None
+_grids_lock = threading.Lock()
+
+
+def get_weather_grid():
+    """Returns the current WeatherGrid (hot-reloaded from config.WEATHER_GRID_PATH), or None if unavailable or stale."""
+    global _grids
+    if np is None:
+        return None
+    if _grids is None:
+        with _grids_lock:
+            if _grids is None:
+                _grids = _ReloadingGrid(config.WEATHER_GRID_PATH, config.WEATHER_GRID_RELOAD_SECONDS)
+    grid = _grids.get()
+    if grid is None or grid.age_hours > config.WEATHER_GRID_MAX_AGE_HOURS:
+        return None
+    return grid
+
+
+def forecast_for(location, days=3, today=None):
+    """
+    Day dicts for `location` from the nearest grid point, starting today; None if there is no
+    current grid, the location can't be resolved or no grid point is within WEATHER_GRID_MAX_DISTANCE_KM.
+    """
+    grid = get_weather_grid()
+    if grid is None:
+        return None
+    coordinates = get_market_directory().resolve(location)
+    if coordinates is None:
+        return None
+    point, distance_km = grid.nearest_for(" ".join(str(location).split()).casefold(), *coordinates)
+    if point is None or distance_km > config.WEATHER_GRID_MAX_DISTANCE_KM:
+        return None
+    return grid.daily(point, today or datetime.date.today(), days) or None
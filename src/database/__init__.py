@@ -0,0 +1 @@
+# This file can be empty or used for package-level initialization if needed.
\ No newline at end of file
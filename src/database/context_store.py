@@ -0,0 +1,450 @@
+# Farmer context store: persistent backend + in-process read-through cache
+# Replaces the old module-level `farmer_context_db` dict in src/api/routes.py.
+import atexit
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from src.config import config
+
+# Background flusher runs outside any Flask app context, so use a module logger.
+logger = logging.getLogger(__name__)
+
+# Fields updated on (almost) every webhook. These are buffered and written in batches
+# instead of hitting the database on each call. Everything else is written through.
+WRITE_BEHIND_FIELDS = frozenset({"last_interaction_time", "last_query"})
+
+# Fields stored as ISO strings in the database and restored as datetime objects
+DATETIME_FIELDS = ("last_interaction_time",)
+
+
+def sqlite_path_from_url(database_url):
+    """Converts a SQLAlchemy-style SQLite URL ('sqlite:///./file.db') to a file path."""
+    prefix = "sqlite:///"
+    if not database_url or not database_url.startswith(prefix):
+        raise ValueError(f"Only sqlite:/// URLs are supported by the context store, got: {database_url}")
+    path = database_url[len(prefix):]
+    return path or ":memory:"
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_context(context):
+    """Serializes a context dict. Keys starting with '_' are per-process caches and are not persisted."""
+    return json.dumps(
+        {k: v for k, v in context.items() if not k.startswith("_")},
+        default=_json_default, ensure_ascii=False,
+    )
+
+
+def decode_context(data):
+    context = json.loads(data)
+    for field in DATETIME_FIELDS:
+        value = context.get(field)
+        if isinstance(value, str):
+            try:
+                context[field] = datetime.datetime.fromisoformat(value)
+            except ValueError:
+                pass
+    return context
+
+
+# --- Backends ---
+
+class SQLiteContextBackend:
+    """Stores one JSON document per caller in a SQLite table. Safe to share between Gunicorn workers."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local() # sqlite3 connections must not cross threads
+        if path != ":memory:":
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS farmer_context ("
+                " caller_id TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None) # Explicit transactions only
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL") # Readers don't block the writer
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self, caller_id):
+        row = self._connection().execute(
+            "SELECT data FROM farmer_context WHERE caller_id = ?", (caller_id,)
+        ).fetchone()
+        return decode_context(row[0]) if row else None
+
+    def insert(self, caller_id, context):
+        """Inserts a new context. Returns the stored context (another worker may have created it first)."""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO farmer_context (caller_id, data, updated_at) VALUES (?, ?, ?)",
+                (caller_id, encode_context(context), time.time()),
+            )
+        return self.load(caller_id)
+
+    def merge_many(self, items):
+        """
+        Applies partial updates [(caller_id, {field: value}), ...] in a single transaction.
+        Read-modify-write per row so concurrent workers updating different fields don't clobber each other.
+        """
+        if not items:
+            return
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for caller_id, updates in items:
+                row = conn.execute(
+                    "SELECT data FROM farmer_context WHERE caller_id = ?", (caller_id,)
+                ).fetchone()
+                if row is None:
+                    continue
+                stored = json.loads(row[0])
+                stored.update(json.loads(encode_context(updates)))
+                conn.execute(
+                    "UPDATE farmer_context SET data = ?, updated_at = ? WHERE caller_id = ?",
+                    (json.dumps(stored, ensure_ascii=False), now, caller_id),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def upsert_many(self, items):
+        """
+        Creates or updates contexts [(caller_id, {field: value}), ...] in a single transaction (bulk
+        imports). Fields are merged into an existing context (SQLite json_patch) without reading it
+        into Python first. None values are not stored.
+        """
+        if not items:
+            return
+        conn = self._connection()
+        now = time.time()
+        rows = [(caller_id, encode_context({k: v for k, v in fields.items() if v is not None}), now)
+                for caller_id, fields in items]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO farmer_context (caller_id, data, updated_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(caller_id) DO UPDATE SET"
+                " data = json_patch(farmer_context.data, excluded.data), updated_at = excluded.updated_at",
+                rows,
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def iter_all(self, batch_size=1000):
+        """Yields (caller_id, context) for every stored farmer, in primary key order."""
+        conn = self._connection()
+        last_id = ""
+        while True:
+            rows = conn.execute(
+                "SELECT caller_id, data FROM farmer_context WHERE caller_id > ? ORDER BY caller_id LIMIT ?",
+                (last_id, batch_size),
+            ).fetchall()
+            if not rows:
+                return
+            for caller_id, data in rows:
+                yield caller_id, decode_context(data)
+            last_id = rows[-1][0]
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM farmer_context").fetchone()[0]
+
+
+class MemoryContextBackend:
+    """In-process backend for development and tests. Not shared between workers, lost on restart."""
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def load(self, caller_id):
+        with self._lock:
+            data = self._rows.get(caller_id)
+        return decode_context(data) if data else None
+
+    def insert(self, caller_id, context):
+        with self._lock:
+            self._rows.setdefault(caller_id, encode_context(context))
+        return self.load(caller_id)
+
+    def merge_many(self, items):
+        with self._lock:
+            for caller_id, updates in items:
+                if caller_id in self._rows:
+                    stored = json.loads(self._rows[caller_id])
+                    stored.update(json.loads(encode_context(updates)))
+                    self._rows[caller_id] = json.dumps(stored, ensure_ascii=False)
+
+    def upsert_many(self, items):
+        with self._lock:
+            for caller_id, fields in items:
+                stored = json.loads(self._rows.get(caller_id, "{}"))
+                stored.update(json.loads(encode_context({k: v for k, v in fields.items() if v is not None})))
+                self._rows[caller_id] = json.dumps(stored, ensure_ascii=False)
+
+    def iter_all(self, batch_size=1000):
+        with self._lock:
+            snapshot = sorted(self._rows.items())
+        for caller_id, data in snapshot:
+            yield caller_id, decode_context(data)
+
+    def count(self):
+        with self._lock:
+            return len(self._rows)
+
+
+# --- Cache ---
+
+class _CacheShard:
+    """One LRU segment of the context cache. Each shard has its own lock to reduce contention."""
+    __slots__ = ("entries", "lock", "capacity")
+
+    def __init__(self, capacity):
+        self.entries = OrderedDict() # caller_id -> (context, loaded_at)
+        self.lock = threading.Lock()
+        self.capacity = max(1, capacity)
+
+
+class ContextStore:
+    """
+    Read-through LRU cache (with TTL) in front of a context backend.
+    - Reads are served from memory; entries older than `ttl_seconds` are reloaded so
+      changes made by other workers become visible.
+    - Updates touching only WRITE_BEHIND_FIELDS are buffered and flushed in batches
+      every `flush_interval` seconds. Other updates are written through immediately.
+    - `lock(caller_id)` serializes concurrent callbacks for the same caller.
+    """
+
+    def __init__(self, backend, cache_size=10000, ttl_seconds=300, flush_interval=2.0,
+                 shards=16, lock_stripes=256, write_behind_fields=WRITE_BEHIND_FIELDS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+        self.write_behind_fields = frozenset(write_behind_fields)
+        self._shards = [_CacheShard(cache_size // shards) for _ in range(shards)]
+        self._caller_locks = [threading.RLock() for _ in range(lock_stripes)]
+        self._pending = {} # caller_id -> buffered field updates
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock() # Orders batched flushes against write-through updates
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    # --- Locking ---
+
+    @contextmanager
+    def lock(self, caller_id):
+        """Per-caller lock (striped, so memory stays bounded regardless of caller count)."""
+        caller_lock = self._caller_locks[hash(caller_id) % len(self._caller_locks)]
+        with caller_lock:
+            yield
+
+    # --- Cache helpers ---
+
+    def _shard(self, caller_id):
+        return self._shards[hash(caller_id) % len(self._shards)]
+
+    def _cache_get(self, caller_id):
+        shard = self._shard(caller_id)
+        with shard.lock:
+            entry = shard.entries.get(caller_id)
+            if entry is None:
+                return None
+            context, loaded_at = entry
+            if time.monotonic() - loaded_at > self.ttl_seconds and not self._has_pending(caller_id):
+                del shard.entries[caller_id]
+                return None
+            shard.entries.move_to_end(caller_id)
+            return context
+
+    def _cache_put(self, caller_id, context):
+        shard = self._shard(caller_id)
+        evicted = []
+        with shard.lock:
+            shard.entries[caller_id] = (context, time.monotonic())
+            shard.entries.move_to_end(caller_id)
+            while len(shard.entries) > shard.capacity:
+                evicted.append(shard.entries.popitem(last=False)[0])
+        if evicted and any(self._has_pending(c) for c in evicted):
+            # Don't lose buffered writes for callers pushed out of the cache
+            self.flush()
+
+    def _has_pending(self, caller_id):
+        with self._pending_lock:
+            return caller_id in self._pending
+
+    # --- Public API ---
+
+    def get(self, caller_id):
+        """Returns the cached context dict for a caller, or None if the caller is unknown."""
+        context = self._cache_get(caller_id)
+        if context is not None:
+            return context
+        with self.lock(caller_id):
+            context = self._cache_get(caller_id) # Another thread may have loaded it meanwhile
+            if context is None:
+                context = self.backend.load(caller_id)
+                if context is not None:
+                    self._cache_put(caller_id, context)
+        return context
+
+    def get_or_create(self, caller_id, factory):
+        """Returns (context, created). `factory(caller_id)` builds the initial context."""
+        context = self.get(caller_id)
+        if context is not None:
+            return context, False
+        with self.lock(caller_id):
+            context = self._cache_get(caller_id) or self.backend.load(caller_id)
+            created = context is None
+            if created:
+                context = self.backend.insert(caller_id, factory(caller_id))
+            self._cache_put(caller_id, context)
+        return context, created
+
+    def update(self, caller_id, updates):
+        """Applies `updates` to a caller's context. Returns False if the caller does not exist."""
+        with self.lock(caller_id):
+            context = self.get(caller_id)
+            if context is None:
+                return False
+            context.update(updates)
+            persisted = {k: v for k, v in updates.items() if not k.startswith("_")}
+            if not persisted:
+                return True
+            if set(persisted) <= self.write_behind_fields:
+                with self._pending_lock:
+                    self._pending.setdefault(caller_id, {}).update(persisted)
+                self._ensure_flusher()
+            else:
+                with self._write_lock:
+                    with self._pending_lock:
+                        persisted = {**self._pending.pop(caller_id, {}), **persisted}
+                    self.backend.merge_many([(caller_id, persisted)])
+        return True
+
+    def flush(self):
+        """Writes all buffered updates to the backend in one batch."""
+        with self._write_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            try:
+                self.backend.merge_many(list(pending.items()))
+            except Exception as e:
+                logger.error(f"Context store flush failed, re-queueing {len(pending)} updates: {e}")
+                with self._pending_lock:
+                    for caller_id, updates in pending.items():
+                        self._pending[caller_id] = {**updates, **self._pending.get(caller_id, {})}
+                return 0
+        return len(pending)
+
+    def upsert_many(self, items):
+        """
+        Bulk create/update [(caller_id, {field: value}), ...] in one backend transaction (roster
+        imports, src/database/farmer_roster.py). Cached copies in this process are dropped; other
+        workers see the changes when their cache entries expire (ttl_seconds).
+        """
+        with self._write_lock:
+            self.backend.upsert_many(items)
+        for caller_id, _ in items:
+            self.invalidate(caller_id)
+
+    def iter_all(self, batch_size=1000):
+        """Iterates over every stored farmer context (flushes buffered updates first)."""
+        self.flush()
+        return self.backend.iter_all(batch_size=batch_size)
+
+    def invalidate(self, caller_id=None):
+        """Drops one caller (or everyone) from the in-process cache."""
+        for shard in ([self._shard(caller_id)] if caller_id else self._shards):
+            with shard.lock:
+                if caller_id:
+                    shard.entries.pop(caller_id, None)
+                else:
+                    shard.entries.clear()
+
+    def cache_size(self):
+        return sum(len(shard.entries) for shard in self._shards)
+
+    # --- Write-behind flusher ---
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._flusher_lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                # Gunicorn forks after import: each worker starts its own flusher on first write
+                self._flusher = threading.Thread(target=self._flush_loop, name="context-flusher", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+
+# --- Store factory ---
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def create_context_store(cfg=config):
+    """Builds a ContextStore from configuration."""
+    if cfg.CONTEXT_STORE_BACKEND == "memory":
+        backend = MemoryContextBackend()
+    else:
+        backend = SQLiteContextBackend(sqlite_path_from_url(cfg.DATABASE_URL))
+    return ContextStore(
+        backend,
+        cache_size=cfg.CONTEXT_CACHE_SIZE,
+        ttl_seconds=cfg.CONTEXT_CACHE_TTL_SECONDS,
+        flush_interval=cfg.CONTEXT_FLUSH_INTERVAL_SECONDS,
+    )
+
+
+def get_context_store():
+    """Returns the process-wide context store, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_context_store()
+                atexit.register(_store.close)
+    return _store
+
+
+def set_context_store(store):
+    """Replaces the process-wide store (e.g., with a memory-backed store for tests)."""
+    global _store
+    with _store_lock:
+        _store = store
@@ -0,0 +1,273 @@
+# Farmer roster import (FPO / government scheme rosters -> farmer context store)
+# - Rosters are streamed: CSV rows and JSON/JSONL records are read one at a time (a JSON array is
+#   decoded incrementally), so memory stays flat for rosters of hundreds of thousands of farmers
+# - Each row is validated and normalized: the mobile number becomes the caller id (+91XXXXXXXXXX, as
+#   sent by the IVR provider), language names/codes map to config.SUPPORTED_LANGUAGES, districts to
+#   the market directory's names, crops to the names used in farmer profiles (market name aliases),
+#   sowing dates to YYYY-MM-DD and land size to acres. Rows without a valid mobile number are
+#   rejected; an invalid optional field is dropped and counted
+# - Normalized rows are written in batches with ContextStore.upsert_many: one transaction per batch,
+#   merged into existing contexts in SQLite, instead of a read-modify-write per farmer
+import csv
+import datetime
+import json
+import re
+import time
+from src.config import config
+
+# Roster column names (after _column()) -> context field
+FIELD_NAMES = {
+    "phone": ("phone", "mobile", "mobile_no", "mobile_number", "phone_number", "contact", "contact_no", "caller_id"),
+    "name": ("name", "farmer_name", "full_name"),
+    "language": ("language", "preferred_language", "lang"),
+    "location": ("district", "district_name", "location"),
+    "village": ("village", "village_name"),
+    "current_crop": ("crop", "current_crop", "main_crop", "primary_crop"),
+    "crop_variety": ("variety", "crop_variety"),
+    "sowing_date": ("sowing_date", "date_of_sowing", "sown_on"),
+    "land_size_acres": ("land_size_acres", "land_acres", "area_acres", "land_size", "landholding_acres"),
+    "land_size_hectares": ("land_size_hectares", "land_hectares", "area_hectares", "area_ha", "landholding_ha"),
+    "fpo": ("fpo", "fpo_name", "organisation", "organization"),
+}
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y", "%d %b %Y", "%d-%b-%Y")
+ACRES_PER_HECTARE = 2.4711
+MAX_LAND_ACRES = 1000.0 # Larger values are unit or typing errors
+# Language names (English / own script) and bare codes -> language code prefix
+LANGUAGE_NAMES = {
+    "hindi": "hi", "हिंदी": "hi", "हिन्दी": "hi", "hi": "hi",
+    "english": "en", "अंग्रेजी": "en", "en": "en",
+    "marathi": "mr", "मराठी": "mr", "mr": "mr",
+}
+
+_DEVANAGARI_DIGITS = str.maketrans("०१२३४५६७८९", "0123456789")
+_NON_DIGITS = re.compile(r"\D+")
+
+
+def _column(name):
+    # 'Mobile No.' / 'Date of Sowing' -> 'mobile_no' / 'date_of_sowing'
+    return re.sub(r"[^0-9a-z]+", "_", str(name).casefold()).strip("_")
+
+
+def normalize_phone(value):
+    """Indian mobile number as '+91XXXXXXXXXX' (the IVR caller id format), or None if invalid."""
+    digits = _NON_DIGITS.sub("", str(value or "").translate(_DEVANAGARI_DIGITS))
+    if len(digits) == 13 and digits.startswith("091"):
+        digits = digits[3:]
+    elif len(digits) == 14 and digits.startswith("0091"):
+        digits = digits[4:]
+    elif len(digits) == 12 and digits.startswith("91"):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith("0"):
+        digits = digits[1:]
+    if len(digits) != 10 or digits[0] not in "6789":
+        return None
+    return "+91" + digits
+
+
+def normalize_language(value, supported=None):
+    """Supported language code ('hi-IN') for a code or language name, or None."""
+    supported = supported or config.SUPPORTED_LANGUAGES
+    text = str(value or "").strip().replace("_", "-")
+    for code in supported:
+        if text.casefold() == code.casefold():
+            return code
+    prefix = LANGUAGE_NAMES.get(text.casefold()) or LANGUAGE_NAMES.get(text.split("-")[0].casefold())
+    return next((code for code in supported if code.split("-")[0] == prefix), None) if prefix else None
+
+
+def normalize_date(value, today=None):
+    """Sowing date as 'YYYY-MM-DD', or None if it can't be parsed or is in the future."""
+    text = str(value or "").strip().translate(_DEVANAGARI_DIGITS)
+    text = text.split("T")[0].split(" 00:00")[0] # Timestamps exported by spreadsheets
+    for date_format in DATE_FORMATS:
+        try:
+            day = datetime.datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+        return day.isoformat() if day <= (today or datetime.date.today()) else None
+    return None
+
+
+def _acres(value, factor=1.0):
+    try:
+        acres = float(str(value).replace(",", "").strip()) * factor
+    except (TypeError, ValueError):
+        return None
+    return round(acres, 2) if 0 < acres <= MAX_LAND_ACRES else None
+
+
+def iter_roster(path, chunk_size=1 << 20):
+    """Yields raw roster rows (dicts) from a .csv, .jsonl or .json file (an array, or an object holding one: {"farmers": [...]})."""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+        return
+    with open(path, encoding="utf-8-sig") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        yield from _iter_json_array(f, chunk_size)
+
+
+def _iter_json_array(f, chunk_size):
+    # Decodes the objects of the first JSON array in the file one by one, reading chunk_size characters at a time
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if not started:
+            start = buffer.find("[", position)
+            if start >= 0:
+                started, position = True, start + 1
+                continue
+        elif position < len(buffer):
+            if buffer[position] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                position = end
+                yield record
+                continue
+        if eof:
+            return
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+class RosterNormalizer:
+    """Turns raw roster rows into (caller_id, context fields) or a rejection reason."""
+
+    def __init__(self, place_name=None, crop_name=None, languages=None, today=None, source=None):
+        self.place_name = place_name # text -> canonical district name or None
+        self.crop_name = crop_name # text -> canonical crop name or None
+        self.languages = languages or config.SUPPORTED_LANGUAGES
+        self.today = today or datetime.date.today()
+        self.source = source
+        self._columns = {} # Raw column name -> field; rosters repeat the same few headers
+        self._places = {} # Memoized per distinct spelling; rosters repeat a few hundred districts
+        self._crops = {}
+        self._languages = {}
+        self._dates = {} # Sowing dates cluster in a few weeks per season
+        self.dropped = {} # field -> count of invalid values dropped
+        self.unmatched = {"location": set(), "current_crop": set()}
+
+    def _fields(self, row):
+        fields = {}
+        for name, value in row.items():
+            field = self._columns.get(name)
+            if field is None:
+                column = _column(name)
+                field = self._columns[name] = next((f for f, names in FIELD_NAMES.items() if column in names), "")
+            if isinstance(value, str):
+                value = value.strip()
+            if field and value not in (None, "") and field not in fields:
+                fields[field] = value
+        return fields
+
+    def _drop(self, field):
+        self.dropped[field] = self.dropped.get(field, 0) + 1
+
+    def _match(self, cache, lookup, field, value):
+        if value not in cache:
+            cache[value] = lookup(value) if lookup else None
+            if cache[value] is None:
+                self.unmatched[field].add(value)
+        return cache[value] or value # Unknown names are kept as given
+
+    def normalize(self, row):
+        """(caller_id, fields, None) for a valid row, (None, None, reason) otherwise."""
+        if not isinstance(row, dict):
+            return None, None, "not_a_record"
+        raw = self._fields(row)
+        if "phone" not in raw:
+            return None, None, "missing_phone"
+        caller_id = normalize_phone(raw["phone"])
+        if caller_id is None:
+            return None, None, "invalid_phone"
+
+        fields = {"id": caller_id}
+        for field in ("name", "village", "crop_variety", "fpo"):
+            if field in raw:
+                fields[field] = str(raw[field])
+        if "language" in raw:
+            language = self._languages.get(raw["language"], "")
+            if language == "":
+                language = self._languages[raw["language"]] = normalize_language(raw["language"], self.languages)
+            fields["language"] = language
+        if "location" in raw:
+            fields["location"] = self._match(self._places, self.place_name, "location", str(raw["location"]))
+        if "current_crop" in raw:
+            fields["current_crop"] = self._match(self._crops, self.crop_name, "current_crop", str(raw["current_crop"]))
+        if "sowing_date" in raw:
+            sowing_date = self._dates.get(raw["sowing_date"], "")
+            if sowing_date == "":
+                sowing_date = self._dates[raw["sowing_date"]] = normalize_date(raw["sowing_date"], self.today)
+            fields["sowing_date"] = sowing_date
+        if "land_size_acres" in raw:
+            fields["land_size_acres"] = _acres(raw["land_size_acres"])
+        elif "land_size_hectares" in raw:
+            fields["land_size_acres"] = _acres(raw["land_size_hectares"], ACRES_PER_HECTARE)
+        for field in [field for field, value in fields.items() if value is None]:
+            del fields[field]
+            self._drop(field)
+        if self.source:
+            fields["roster_source"] = self.source
+        return caller_id, fields, None
+
+
+def import_roster(rows, store, normalizer, batch_size=5000, on_reject=None, on_batch=None):
+    """
+    Normalizes `rows` and upserts them into `store` in batches of `batch_size`. `on_reject(row, reason)`
+    is called for each rejected row, `on_batch(stats)` after each batch. Returns the stats dict.
+    A phone number repeated in the roster is merged (later rows win) and counted as a duplicate;
+    `farmers` counts distinct phone numbers, `written` the rows upserted.
+    """
+    stats = {"rows": 0, "farmers": 0, "written": 0, "duplicates": 0, "rejected": {}, "batches": 0, "seconds": 0.0}
+    seen = set()
+    batch = {}
+    started = time.perf_counter()
+
+    def write():
+        store.upsert_many(list(batch.items()))
+        stats["written"] += len(batch)
+        stats["batches"] += 1
+        stats["seconds"] = time.perf_counter() - started
+        batch.clear()
+        if on_batch:
+            on_batch(stats)
+
+    for row in rows:
+        stats["rows"] += 1
+        caller_id, fields, reason = normalizer.normalize(row)
+        if reason is not None:
+            stats["rejected"][reason] = stats["rejected"].get(reason, 0) + 1
+            if on_reject:
+                on_reject(row, reason)
+            continue
+        if caller_id in seen:
+            stats["duplicates"] += 1
+            if caller_id in batch:
+                batch[caller_id].update(fields)
+                continue
+        else:
+            seen.add(caller_id)
+            stats["farmers"] += 1
+        batch[caller_id] = fields
+        if len(batch) >= batch_size:
+            write()
+    if batch:
+        write()
+    stats["seconds"] = time.perf_counter() - started
+    return stats
@@ -1,14 +1,44 @@
 # Placeholder for External API Integrations (Weather, Market Data, etc.)
+import datetime
 import requests
 import json
 from flask import current_app
 from src.config import config
+from src.integrations.http_client import CircuitOpenError, get_client
+
+IST_OFFSET_SECONDS = 19800 # Used when the response has no timezone_offset
+
+
+def parse_onecall_daily(data):
+    """
+    Daily entries of a One Call response as flat dicts (date in the location's timezone, temperatures
+    in °C, precipitation probability in percent, rain in mm). Entries missing required fields are skipped.
+    """
+    offset = datetime.timedelta(seconds=data.get("timezone_offset", IST_OFFSET_SECONDS))
+    days = []
+    for entry in data.get("daily") or []:
+        try:
+            date = (datetime.datetime.fromtimestamp(entry["dt"], datetime.timezone.utc) + offset).date()
+            days.append({
+                "date": date.isoformat(),
+                "temp_min_celsius": float(entry["temp"]["min"]),
+                "temp_max_celsius": float(entry["temp"]["max"]),
+                "precipitation_probability_percent": float(entry.get("pop", 0.0)) * 100,
+                "rain_mm": float(entry.get("rain", 0.0)),
+                "humidity_percent": float(entry.get("humidity", "nan")),
+                "wind_speed_mps": float(entry.get("wind_speed", "nan")),
+                "condition": (entry.get("weather") or [{}])[0].get("main", ""),
+            })
+        except (KeyError, TypeError, ValueError):
+            continue
+    return days
+
 
 def get_openweathermap_forecast_api(lat, lon):
     """
-    Fetches weather forecast from OpenWeatherMap API.
-    !! REPLACE simulation with actual API call !!
-    Requires 'requests' library: pip install requests
+    Fetches the daily forecast for a point from the OpenWeatherMap One Call API and returns it
+    parsed (see parse_onecall_daily), or None if unavailable. Called by the weather ingestion job
+    (scripts/ingest_weather.py) for every grid point, not per farmer request.
     """
     logger = current_app.logger
     api_key = config.OPENWEATHERMAP_API_KEY
@@ -18,7 +48,7 @@ def get_openweathermap_forecast_api(lat, lon):
 
     # Use One Call API (requires lat/lon) - preferred for detailed forecast
     # Alternatively, use Forecast 5 day / 3 hour data API
-    base_url = "https://api.openweathermap.org/data/2.5/onecall"
+    base_url = f"{config.OPENWEATHERMAP_BASE_URL}/data/2.5/onecall"
     params = {
         "lat": lat,
         "lon": lon,
@@ -28,17 +58,15 @@ def get_openweathermap_forecast_api(lat, lon):
         "lang": "hi" # Request Hindi if available
     }
     try:
-        logger.info(f"Calling OpenWeatherMap API for lat={lat}, lon={lon}")
-        response = requests.get(base_url, params=params, timeout=10) # 10 second timeout
+        logger.debug(f"Calling OpenWeatherMap API for lat={lat}, lon={lon}")
+        # Pooled connection with connect/read timeouts, retries and circuit breaker
+        response = get_client(base_url).get(base_url, params=params)
         response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-        data = response.json()
-        logger.info("OpenWeatherMap API call successful.")
-        # --- !! Add parsing logic here to extract daily forecasts !! ---
-        # Example: Access daily data: data['daily'] list
-        # Extract date, temp (min/max), weather description, precip probability for each day
-        # Return structured data similar to the simulation in core/weather.py
-        return data # Return raw data for now, needs parsing
+        return parse_onecall_daily(response.json())
 
+    except CircuitOpenError as e:
+        logger.warning(f"Skipping OpenWeatherMap API call: {e}")
+        return None # Caller falls back to cached/simulated data
     except requests.exceptions.RequestException as e:
         logger.error(f"Error calling OpenWeatherMap API: {e}")
         return None
@@ -46,37 +74,48 @@ def get_openweathermap_forecast_api(lat, lon):
          logger.error(f"Error processing OpenWeatherMap response: {e}")
          return None
 
-def get_market_data_api(crop, mandi_code=None, date=None):
+def get_market_data_api(date=None, page_size=1000, max_pages=50):
     """
-    Placeholder for fetching market data from Agmarknet or eNAM APIs.
-    !! REPLACE simulation with actual API call !!
-    Finding reliable, free, real-time government market data APIs can be challenging.
+    Fetches one day's mandi arrival/price report records (Agmarknet data via a data.gov.in-style
+    resource: api-key, format, offset, limit, filters[arrival_date]) from config.AGMARKNET_API_ENDPOINT.
+    Returns the raw records for price_store.append_reports, or None if unavailable. Called by the
+    ingestion job (scripts/ingest_market_prices.py), never during a farmer's call.
     """
     logger = current_app.logger
-    logger.warning("[SIMULATE] Market Data API call - No real API integration implemented.")
-    # Example: Check Agmarknet API documentation if available.
-    # It often requires specific state/district/mandi codes.
-    # agmarknet_endpoint = config.AGMARKNET_API_ENDPOINT
-    # agmarknet_key = config.AGMARKNET_API_KEY
-    # if not agmarknet_endpoint:
-    #     return None
-    # params = {'api_key': agmarknet_key, 'crop': crop, 'mandi_code': mandi_code, ...}
-    # try:
-    #     response = requests.get(agmarknet_endpoint, params=params, timeout=15)
-    #     response.raise_for_status()
-    #     data = response.json()
-    #     # --- !! Add parsing logic for Agmarknet response !! ---
-    #     return data
-    # except Exception as e:
-    #      logger.error(f"Error calling Market Data API: {e}")
-    #      return None
+    endpoint = config.AGMARKNET_API_ENDPOINT
+    if not endpoint:
+        logger.warning("Market data API endpoint not configured. Ingest report files instead.")
+        return None
+
+    date = date or datetime.date.today()
+    params = {
+        "api-key": config.AGMARKNET_API_KEY,
+        "format": "json",
+        "limit": page_size,
+        "filters[arrival_date]": date.strftime("%d/%m/%Y"),
+    }
+    records = []
+    try:
+        for page in range(max_pages):
+            params["offset"] = page * page_size
+            response = get_client(endpoint).get(endpoint, params=params)
+            response.raise_for_status()
+            batch = response.json().get("records") or []
+            records.extend(batch)
+            if len(batch) < page_size:
+                break
+        logger.info(f"Fetched {len(records)} market report records for {date}")
+        return records
 
-    # Simulate some data if no real API call
-    simulated_market_data = [
-        {"mandi_name": "Simulated Mandi A", "price_per_quintal": random.randint(1800, 2400)},
-        {"mandi_name": "Simulated Mandi B", "price_per_quintal": random.randint(1900, 2300)},
-    ]
-    return simulated_market_data
+    except CircuitOpenError as e:
+        logger.warning(f"Skipping Market Data API call: {e}")
+        return None
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error calling Market Data API: {e}")
+        return None
+    except Exception as e:
+         logger.error(f"Error processing Market Data API response: {e}")
+         return None
 
 
 # Add functions for Bhashini API calls if interaction is complex
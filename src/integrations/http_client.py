@@ -0,0 +1,224 @@
+# Shared HTTP client for upstream integrations (weather, market data, IVR recordings, media)
+# - One pooled requests.Session per upstream host (keep-alive, no TLS handshake per call)
+# - Separate connect/read timeouts so a hung upstream can't hold a worker
+# - Retries with jittered exponential backoff for idempotent requests
+# - Circuit breaker: after repeated failures, fail fast (callers fall back to cached/simulated data)
+# - Per-upstream latency and error metrics
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = frozenset({429, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without calling the upstream while its circuit is open. Subclasses RequestException
+    so existing `except requests.exceptions.RequestException` fallbacks handle it."""
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures; half-open (one trial call) after `reset_timeout`."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_progress = False
+            if self.state == self.HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True # Let exactly one request probe the upstream
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit opened after {self._failures} consecutive failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class _UpstreamMetrics:
+    """Counters, a fixed-bucket latency histogram and a small reservoir for percentiles."""
+
+    def __init__(self, reservoir_size=512):
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.short_circuited = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1) # Last bucket is +Inf
+        self.latency_sum_ms = 0.0
+        self._recent = deque(maxlen=reservoir_size)
+        self._lock = threading.Lock()
+
+    def observe(self, latency_ms, failed):
+        with self._lock:
+            self.requests += 1
+            self.failures += int(failed)
+            self.latency_sum_ms += latency_ms
+            self._recent.append(latency_ms)
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if latency_ms <= bound:
+                    self.buckets[i] += 1
+                    break
+            else:
+                self.buckets[-1] += 1
+
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            snapshot = {
+                "requests": self.requests, "failures": self.failures, "retries": self.retries,
+                "short_circuited": self.short_circuited,
+                "latency_sum_ms": round(self.latency_sum_ms, 1),
+                "latency_buckets_ms": dict(zip([str(b) for b in LATENCY_BUCKETS_MS] + ["+Inf"], self.buckets)),
+            }
+        for name, q in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            snapshot[name] = round(recent[min(len(recent) - 1, int(q * len(recent)))], 1) if recent else None
+        return snapshot
+
+
+class UpstreamClient:
+    """Pooled, retrying, circuit-broken HTTP client for one upstream host."""
+
+    def __init__(self, name, connect_timeout=None, read_timeout=None, max_retries=None,
+                 backoff_base=None, backoff_max=None, pool_size=None,
+                 failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else config.HTTP_CONNECT_TIMEOUT_SECONDS,
+            read_timeout if read_timeout is not None else config.HTTP_READ_TIMEOUT_SECONDS,
+        )
+        self.max_retries = max_retries if max_retries is not None else config.HTTP_MAX_RETRIES
+        self.backoff_base = backoff_base if backoff_base is not None else config.HTTP_BACKOFF_BASE_SECONDS
+        self.backoff_max = backoff_max if backoff_max is not None else config.HTTP_BACKOFF_MAX_SECONDS
+        self.breaker = CircuitBreaker(
+            failure_threshold if failure_threshold is not None else config.HTTP_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout if reset_timeout is not None else config.HTTP_CIRCUIT_RESET_SECONDS,
+        )
+        self.metrics = _UpstreamMetrics()
+        pool_size = pool_size or config.HTTP_POOL_SIZE
+        self.session = requests.Session()
+        # Retries are handled below (with jitter and breaker accounting), not by urllib3
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _backoff(self, attempt):
+        """Full jitter: uniform(0, min(max, base * 2^attempt))."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, url, retry=None, **kwargs):
+        """
+        Sends a request through the pool. Retries connection errors, timeouts and 429/5xx
+        responses for idempotent methods (or when `retry=True`). Raises CircuitOpenError
+        without calling the upstream while the circuit is open.
+        The caller is responsible for `raise_for_status()` and closing streamed responses.
+        """
+        method = method.upper()
+        retries = self.max_retries if (retry if retry is not None else method in IDEMPOTENT_METHODS) else 0
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.metrics.count("short_circuited")
+                raise CircuitOpenError(f"Circuit open for upstream '{self.name}'")
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record(started, failed=True)
+                if attempt >= retries:
+                    raise
+                logger.info(f"Upstream '{self.name}' {type(e).__name__}, retrying ({attempt + 1}/{retries})")
+            else:
+                failed = response.status_code >= 500 or response.status_code == 429
+                self._record(started, failed=failed)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                    return response
+                response.close()
+                logger.info(f"Upstream '{self.name}' returned {response.status_code}, retrying ({attempt + 1}/{retries})")
+            self.metrics.count("retries")
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def _record(self, started, failed):
+        self.metrics.observe((time.perf_counter() - started) * 1000.0, failed)
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        return {"circuit": self.breaker.state, "timeout": list(self.timeout), **self.metrics.snapshot()}
+
+
+# --- Client registry (one client per upstream host, per process) ---
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def get_client(url_or_host):
+    """Returns the shared client for the host of `url_or_host` (a URL or a bare host name)."""
+    global _clients, _clients_pid
+    host = urlsplit(url_or_host).netloc if "://" in url_or_host else url_or_host
+    pid = os.getpid()
+    with _clients_lock:
+        if _clients_pid != pid:
+            # Connection pools must not be shared across a fork (Gunicorn workers): start fresh
+            _clients, _clients_pid = {}, pid
+        client = _clients.get(host)
+        if client is None:
+            client = _clients[host] = UpstreamClient(host)
+        return client
+
+
+def upstream_stats():
+    """Per-upstream metrics for monitoring."""
+    with _clients_lock:
+        clients = dict(_clients)
+    return {host: client.stats() for host, client in sorted(clients.items())}
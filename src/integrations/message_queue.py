@@ -0,0 +1,403 @@
+# Outbound message queue (SMS / WhatsApp / IVR voice calls)
+# Webhook handlers enqueue messages into a local SQLite spool and return immediately;
+# background workers claim messages in per-provider batches, hand each batch to the provider in
+# one call (src/integrations/telephony.py), retry with backoff and move messages that keep
+# failing to a dead-letter state.
+# - The provider's rate limit is a token bucket per channel in the spool itself, so every worker
+#   process sending from the spool shares one quota instead of each sending at the full rate
+# - While the provider is not configured, sends are simulated: such messages are marked
+#   'simulated' (neither retried nor dead-lettered)
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from src.config import config
+from src.utils.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+PENDING, SENDING, SENT, DEAD, SIMULATED = "pending", "sending", "sent", "dead", "simulated"
+CHANNELS = ("sms", "whatsapp", "ivr") # "ivr": an outbound call speaking the body
+
+
+def make_idempotency_key(channel, recipient, body, scope=None, window_seconds=None):
+    """
+    Key identifying one logical message.
+    - With `scope` (the provider's CallSid/MessageSid, plus a suffix if one event sends several
+      messages) the key ignores the body, so a retried webhook that produces a slightly
+      different text still maps to the same message.
+    - Without it, identical messages within the same time window share a key, which still
+      absorbs most webhook retries.
+    """
+    if scope is not None:
+        raw = f"{channel}|{recipient}|{scope}"
+    else:
+        window = window_seconds or config.OUTBOUND_DEDUP_WINDOW_SECONDS
+        raw = f"{channel}|{recipient}|t{int(time.time() // window)}|{body}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class RateLimiter:
+    """
+    `rate` sends/second on one channel, bursts up to `capacity`, counted in the spool's
+    outbound_rate table and so shared by every process sending from it.
+    """
+
+    def __init__(self, spool, channel, rate, capacity=None):
+        self.spool = spool
+        self.channel = channel
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+
+    def acquire(self, wanted, stop_event=None):
+        """
+        Blocks until at least one of `wanted` sends is allowed and returns how many are (up to
+        `wanted`). Returns 0 if `stop_event` is set while waiting.
+        """
+        while True:
+            granted, wait = self.spool.take_tokens(self.channel, self.rate, self.capacity, wanted)
+            if granted:
+                return granted
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return 0
+            else:
+                time.sleep(wait)
+
+
+class OutboundSpool:
+    """Durable SQLite-backed queue of outbound messages."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(
+            "CREATE TABLE IF NOT EXISTS outbound_messages ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " idempotency_key TEXT NOT NULL UNIQUE,"
+            " channel TEXT NOT NULL,"
+            " recipient TEXT NOT NULL,"
+            " body TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " lease_until REAL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " last_error TEXT);"
+            "CREATE INDEX IF NOT EXISTS idx_outbound_ready ON outbound_messages (status, channel, next_attempt_at);"
+            "CREATE TABLE IF NOT EXISTS outbound_rate (channel TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, channel, recipient, body, idempotency_key):
+        """Returns (message_id, created). A duplicate key returns the existing message id."""
+        now = time.time()
+        conn = self._conn()
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO outbound_messages"
+            " (idempotency_key, channel, recipient, body, status, next_attempt_at, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (idempotency_key, channel, recipient, body, PENDING, now, now, now),
+        )
+        if cursor.rowcount:
+            return cursor.lastrowid, True
+        row = conn.execute("SELECT id FROM outbound_messages WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+        return row[0], False
+
+    def enqueue_many(self, messages):
+        """Inserts [(channel, recipient, body, idempotency_key), ...] in one transaction; returns how many were new."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO outbound_messages"
+                " (idempotency_key, channel, recipient, body, status, next_attempt_at, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(key, channel, recipient, body, PENDING, now, now, now) for channel, recipient, body, key in messages],
+            )
+            created = conn.total_changes - before
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return created
+
+    def claim_batch(self, channel, limit, lease_seconds):
+        """Atomically marks up to `limit` ready messages of one channel as in-flight and returns them."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, recipient, body, attempts FROM outbound_messages"
+                " WHERE channel = ? AND ((status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_until < ?))"
+                " ORDER BY id LIMIT ?",
+                (channel, PENDING, now, SENDING, now, limit), # Expired leases: a worker died mid-send
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE outbound_messages SET status = ?, lease_until = ?, updated_at = ? WHERE id = ?",
+                    [(SENDING, now + lease_seconds, now, row[0]) for row in rows],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def complete(self, results):
+        """Records a batch of outcomes: [(id, status, attempts, next_attempt_at, error), ...]."""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE outbound_messages SET status = ?, attempts = ?, next_attempt_at = ?,"
+                " lease_until = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+                [(status, attempts, next_at, error, now, message_id)
+                 for message_id, status, attempts, next_at, error in results],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def take_tokens(self, channel, rate, capacity, wanted):
+        """
+        Takes up to `wanted` tokens from `channel`'s bucket (refilled at `rate`/second up to
+        `capacity`). Returns (tokens taken, seconds until the next token if none were).
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM outbound_rate WHERE channel = ?", (channel,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            granted = min(wanted, int(tokens))
+            conn.execute(
+                "INSERT INTO outbound_rate (channel, tokens, updated) VALUES (?, ?, ?)"
+                " ON CONFLICT(channel) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (channel, tokens - granted, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return granted, 0.0 if granted else (1.0 - tokens) / rate
+
+    def requeue_dead(self, channel=None):
+        """Moves dead-lettered messages back to pending (e.g., after fixing provider credentials)."""
+        now = time.time()
+        query = "UPDATE outbound_messages SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = ?"
+        params = [PENDING, now, now, DEAD]
+        if channel:
+            query += " AND channel = ?"
+            params.append(channel)
+        return self._conn().execute(query, params).rowcount
+
+    def purge_sent(self, older_than_seconds=7 * 86400):
+        return self._conn().execute(
+            "DELETE FROM outbound_messages WHERE status IN (?, ?) AND updated_at < ?",
+            (SENT, SIMULATED, time.time() - older_than_seconds),
+        ).rowcount
+
+    def counts(self):
+        rows = self._conn().execute(
+            "SELECT channel, status, COUNT(*) FROM outbound_messages GROUP BY channel, status"
+        ).fetchall()
+        counts = {}
+        for channel, status, count in rows:
+            counts.setdefault(channel, {})[status] = count
+        return counts
+
+
+class OutboundDispatcher:
+    """Background worker pool draining the spool. Needs the Flask app to give senders an app context."""
+
+    def __init__(self, app, spool, senders, workers=2, batch_size=20, poll_interval=1.0,
+                 max_attempts=5, lease_seconds=60, rates=None):
+        self.app = app
+        self.spool = spool
+        self.senders = senders # channel -> callable([(recipient, body), ...]) -> [True | False | SIMULATED, ...]
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.limiters = {channel: RateLimiter(spool, channel, rate) for channel, rate in (rates or {}).items() if rate > 0}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"outbound-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def notify(self):
+        """Wakes idle workers after an enqueue so messages don't wait for the next poll."""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent_any = self.drain_once()
+            except Exception as e:
+                logger.exception(f"Outbound worker error: {e}")
+                sent_any = False
+            if not sent_any:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def drain_once(self):
+        """Processes at most one batch per channel. Returns True if any message was claimed."""
+        claimed = False
+        for channel in self.senders:
+            batch = self.spool.claim_batch(channel, self.batch_size, self.lease_seconds)
+            if batch:
+                claimed = True
+                self._send_batch(channel, batch)
+        return claimed
+
+    def _send_batch(self, channel, batch):
+        sender = self.senders[channel]
+        limiter = self.limiters.get(channel)
+        results = []
+        with self.app.app_context():
+            while batch:
+                allowed = limiter.acquire(len(batch), self._stop) if limiter is not None else len(batch)
+                if not allowed:
+                    # Shutting down: hand the unsent remainder back to the queue
+                    results.extend((m[0], PENDING, m[3], time.time(), None) for m in batch)
+                    break
+                chunk, batch = batch[:allowed], batch[allowed:]
+                try:
+                    outcomes = list(sender([(recipient, body) for _, recipient, body, _ in chunk]))
+                except Exception as e:
+                    outcomes = [e] * len(chunk)
+                for (message_id, _, _, attempts), outcome in zip(chunk, outcomes):
+                    results.append(self._result(channel, message_id, attempts, outcome))
+        self.spool.complete(results)
+
+    def _result(self, channel, message_id, attempts, outcome):
+        """The spool update for one message the provider answered `outcome` (True, SIMULATED, False or an exception) for."""
+        if outcome == SIMULATED: # Provider not configured: nothing to retry
+            return message_id, SIMULATED, attempts, time.time(), None
+        attempts += 1
+        if outcome is True:
+            return message_id, SENT, attempts, time.time(), None
+        error = str(outcome) if isinstance(outcome, Exception) else "provider returned failure"
+        if attempts >= self.max_attempts:
+            logger.error(f"Outbound {channel} message {message_id} dead-lettered after {attempts} attempts: {error}")
+            return message_id, DEAD, attempts, time.time(), error
+        retry_at = time.time() + min(300, 2 ** attempts) # 2s, 4s, 8s, ... capped at 5 min
+        return message_id, PENDING, attempts, retry_at, error
+
+
+# --- Process-wide queue ---
+
+_spool = None
+_dispatcher = None
+_pid = None
+_lock = threading.Lock()
+
+
+def get_spool():
+    global _spool
+    if _spool is None:
+        with _lock:
+            if _spool is None:
+                _spool = OutboundSpool(config.OUTBOUND_QUEUE_PATH)
+    return _spool
+
+
+def _default_senders():
+    from src.integrations import telephony
+    return {"sms": telephony.send_sms_batch, "whatsapp": telephony.send_whatsapp_batch, "ivr": telephony.place_voice_call_batch}
+
+
+def start_dispatcher(app, senders=None):
+    """Starts this process's worker pool (once per process; Gunicorn workers each start their own)."""
+    global _dispatcher, _pid
+    with _lock:
+        if _dispatcher is not None and _pid == os.getpid():
+            return _dispatcher
+        if config.OUTBOUND_QUEUE_WORKERS <= 0:
+            return None # Workers disabled: messages stay spooled for an external drainer
+        _dispatcher = OutboundDispatcher(
+            app, get_spool(), senders or _default_senders(),
+            workers=config.OUTBOUND_QUEUE_WORKERS,
+            batch_size=config.OUTBOUND_BATCH_SIZE,
+            poll_interval=config.OUTBOUND_POLL_INTERVAL_SECONDS,
+            max_attempts=config.OUTBOUND_MAX_ATTEMPTS,
+            rates={"sms": config.OUTBOUND_SMS_RATE_PER_SECOND, "whatsapp": config.OUTBOUND_WHATSAPP_RATE_PER_SECOND,
+                   "ivr": config.OUTBOUND_IVR_CALL_RATE_PER_SECOND},
+        )
+        _pid = os.getpid()
+        _dispatcher.start()
+        return _dispatcher
+
+
+@traced()
+def enqueue(channel, recipient, body, idempotency_key=None, app=None):
+    """
+    Queues a message for background delivery and returns (message_id, created).
+    `created` is False when the idempotency key was already queued (e.g., a webhook retry).
+    """
+    if channel not in CHANNELS:
+        raise ValueError(f"Unknown outbound channel: {channel}")
+    key = idempotency_key or make_idempotency_key(channel, recipient, body)
+    message_id, created = get_spool().enqueue(channel, recipient, body, key)
+    if app is None:
+        from flask import current_app
+        app = current_app._get_current_object()
+    dispatcher = start_dispatcher(app)
+    if created and dispatcher is not None:
+        dispatcher.notify()
+    return message_id, created
+
+
+def enqueue_many(messages):
+    """
+    Spools a batch of (channel, recipient, body, idempotency_key) for batch jobs outside the web
+    app; running dispatchers pick them up on their next poll. Returns how many were new.
+    """
+    for channel, _, _, _ in messages:
+        if channel not in CHANNELS:
+            raise ValueError(f"Unknown outbound channel: {channel}")
+    return get_spool().enqueue_many(messages)
+
+
+def enqueue_sms(to_number, message_body, idempotency_key=None):
+    return enqueue("sms", to_number, message_body, idempotency_key)
+
+
+def enqueue_whatsapp(to_number_whatsapp, message_body, idempotency_key=None):
+    return enqueue("whatsapp", to_number_whatsapp, message_body, idempotency_key)
+
+
+def queue_stats():
+    return get_spool().counts()
@@ -1,32 +1,52 @@
 # Placeholder for Telephony Integration (Twilio, Exotel, etc.)
+import logging
+import os
+import threading
 from flask import current_app
 from src.config import config
+from src.integrations.message_queue import SIMULATED
+from src.utils.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 # !! REPLACE with actual library calls !!
 # Example using Twilio (requires 'pip install twilio')
 # from twilio.rest import Client
 
-twilio_client = None
-if config.TWILIO_ACCOUNT_SID and config.TWILIO_AUTH_TOKEN:
-    try:
-        # client = Client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)
-        # twilio_client = client # Assign if initialization is successful
-        # current_app.logger.info("Twilio client initialized successfully.") # Needs app context
-        print("INFO: Twilio client would be initialized here.") # Print at module load time
-        # Note: Proper initialization might need Flask app context if logger is used here.
-        # It's often better to initialize within app context or pass client around.
-    except Exception as e:
-        # current_app.logger.error(f"Failed to initialize Twilio client: {e}") # Needs app context
-        print(f"ERROR: Failed to initialize Twilio client: {e}")
-        twilio_client = None # Ensure it's None if failed
+# The client is created on first use (not at import), so importing this module stays cheap and
+# every forked worker builds its own client (and connection pool)
+_twilio_client = None
+_twilio_client_pid = None
+_twilio_client_lock = threading.Lock()
+
 
+def get_twilio_client():
+    """Returns this process's Twilio client, or None if not configured or initialization failed."""
+    global _twilio_client, _twilio_client_pid
+    if _twilio_client_pid == os.getpid():
+        return _twilio_client
+    with _twilio_client_lock:
+        if _twilio_client_pid != os.getpid():
+            _twilio_client = None
+            if config.TWILIO_ACCOUNT_SID and config.TWILIO_AUTH_TOKEN:
+                try:
+                    # _twilio_client = Client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)
+                    logger.info("Twilio client would be initialized here.")
+                except Exception as e:
+                    logger.error(f"Failed to initialize Twilio client: {e}")
+                    _twilio_client = None # Ensure it's None if failed
+            _twilio_client_pid = os.getpid()
+    return _twilio_client
 
+
+@traced()
 def send_sms(to_number, message_body):
     """
     Sends an SMS message using the configured telephony provider.
     !! REPLACE with actual implementation !!
     """
     logger = current_app.logger # Get logger within function call (has app context)
+    twilio_client = get_twilio_client()
     if not config.TWILIO_PHONE_NUMBER or not twilio_client:
         logger.error(f"[SIMULATE] SMS not sent: Twilio not configured or client init failed.")
         logger.info(f"[SIMULATE] SMS to {to_number}: {message_body}")
@@ -54,6 +74,7 @@ def send_sms(to_number, message_body):
         return False
 
 
+@traced()
 def send_whatsapp_message(to_number_whatsapp, message_body):
     """
     Sends a WhatsApp message using the configured provider (e.g., Twilio WhatsApp API).
@@ -68,6 +89,7 @@ def send_whatsapp_message(to_number_whatsapp, message_body):
     # The 'from_' number needs the 'whatsapp:' prefix too.
     twilio_whatsapp_number = f'whatsapp:{config.TWILIO_PHONE_NUMBER}' if config.TWILIO_PHONE_NUMBER else None
 
+    twilio_client = get_twilio_client()
     if not twilio_whatsapp_number or not twilio_client:
         logger.error(f"[SIMULATE] WhatsApp not sent: Twilio WhatsApp number or client not configured/initialized.")
         logger.info(f"[SIMULATE] WhatsApp to {to_number_whatsapp}: {message_body}")
@@ -94,5 +116,108 @@ def send_whatsapp_message(to_number_whatsapp, message_body):
         logger.error(f"Failed to send WhatsApp message to {to_number_whatsapp}: {e}")
         return False
 
-# Add functions for making outbound calls if needed
-# def make_outbound_call(to_number, twiml_url): ...
\ No newline at end of file
+
+@traced()
+def send_sms_batch(messages):
+    """
+    Sends a batch of [(to_number, message_body), ...] from the outbound queue in one provider
+    request; returns one result per message: True, False, or SIMULATED while the provider is not
+    configured.
+    !! REPLACE with actual implementation !!
+    """
+    logger = current_app.logger
+    twilio_client = get_twilio_client()
+    if not config.TWILIO_PHONE_NUMBER or not twilio_client:
+        logger.info(f"[SIMULATE] {len(messages)} SMS not sent (provider not configured): "
+                    + "; ".join(f"{to_number}: {body}" for to_number, body in messages))
+        return [SIMULATED] * len(messages)
+
+    try:
+        logger.info(f"Sending {len(messages)} SMS")
+        # --- !! Exotel Bulk SMS Example !! ---
+        # One POST to /v1/Accounts/<sid>/Sms/bulksend with From, To[] and Body[] for the whole
+        # batch (Twilio has no bulk endpoint: send per message through one client/connection)
+        # --- End Exotel Example ---
+
+        # --- Simulation ---
+        logger.info(f"[SIMULATE] {len(messages)} SMS actually sent")
+        return [True] * len(messages)
+        # --- End Simulation ---
+
+    except Exception as e:
+        logger.error(f"Failed to send a batch of {len(messages)} SMS: {e}")
+        return [False] * len(messages)
+
+
+@traced()
+def send_whatsapp_batch(messages):
+    """
+    Sends a batch of [(to_number_whatsapp, message_body), ...] from the outbound queue; results
+    as for send_sms_batch.
+    !! REPLACE with actual implementation !!
+    """
+    logger = current_app.logger
+    messages = [(to if to.startswith('whatsapp:') else f'whatsapp:{to}', body) for to, body in messages]
+    twilio_client = get_twilio_client()
+    if not config.TWILIO_PHONE_NUMBER or not twilio_client:
+        logger.info(f"[SIMULATE] {len(messages)} WhatsApp messages not sent (provider not configured): "
+                    + "; ".join(f"{to_number}: {body}" for to_number, body in messages))
+        return [SIMULATED] * len(messages)
+
+    try:
+        logger.info(f"Sending {len(messages)} WhatsApp messages")
+        # --- !! Twilio Implementation Example !! ---
+        # results = []
+        # for to_number, body in messages: # One client, one pooled connection for the batch
+        #     message = twilio_client.messages.create(body=body, from_=f'whatsapp:{config.TWILIO_PHONE_NUMBER}', to=to_number)
+        #     results.append(bool(message.sid))
+        # return results
+        # --- End Twilio Example ---
+
+        # --- Simulation ---
+        logger.info(f"[SIMULATE] {len(messages)} WhatsApp messages actually sent")
+        return [True] * len(messages)
+        # --- End Simulation ---
+
+    except Exception as e:
+        logger.error(f"Failed to send a batch of {len(messages)} WhatsApp messages: {e}")
+        return [False] * len(messages)
+
+
+
+@traced()
+def place_voice_call_batch(messages):
+    """
+    Places an outbound call per [(to_number, message_body), ...] from the outbound queue that
+    speaks the body in the default language (proactive advisories for farmers who prefer a call);
+    results as for send_sms_batch. A call counts as sent once the provider has accepted it.
+    !! REPLACE with actual implementation !!
+    """
+    logger = current_app.logger
+    twilio_client = get_twilio_client()
+    if not config.TWILIO_PHONE_NUMBER or not twilio_client:
+        logger.info(f"[SIMULATE] {len(messages)} voice calls not placed (provider not configured): "
+                    + "; ".join(f"{to_number}: {body}" for to_number, body in messages))
+        return [SIMULATED] * len(messages)
+
+    try:
+        logger.info(f"Placing {len(messages)} voice calls")
+        # --- !! Twilio Implementation Example !! ---
+        # from twilio.twiml.voice_response import VoiceResponse
+        # results = []
+        # for to_number, body in messages:
+        #     response = VoiceResponse()
+        #     response.say(body, language=config.DEFAULT_LANGUAGE)
+        #     call = twilio_client.calls.create(twiml=str(response), from_=config.TWILIO_PHONE_NUMBER, to=to_number)
+        #     results.append(bool(call.sid))
+        # return results
+        # --- End Twilio Example ---
+
+        # --- Simulation ---
+        logger.info(f"[SIMULATE] {len(messages)} voice calls actually placed")
+        return [True] * len(messages)
+        # --- End Simulation ---
+
+    except Exception as e:
+        logger.error(f"Failed to place a batch of {len(messages)} voice calls: {e}")
+        return [False] * len(messages)
\ No newline at end of file
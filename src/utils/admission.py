@@ -0,0 +1,200 @@
+# Admission control for the API webhooks
+# - Token buckets per caller and per district (the farmer's location): one caller redialling in a
+#   loop or a district-wide callback storm is throttled before it starves every worker
+# - Buckets live in a small SQLite table shared by the workers on a host (one UPSERT per bucket,
+#   O(1)); idle buckets are full anyway and are purged, so the table stays bounded. Without a
+#   table each worker keeps its own LRU-bounded buckets
+# - Load shedding: a request is turned away when this worker already has ADMISSION_MAX_IN_FLIGHT
+#   requests in progress, or when it waited in the proxy's queue longer than ADMISSION_MAX_QUEUE_MS
+#   (from the X-Request-Start header, e.g. nginx `proxy_set_header X-Request-Start "t=${msec}";`)
+# - Turned-away IVR calls get a cheap SPEAK_AND_HANGUP "please call back later" response (see
+#   src/api/routes.py); other endpoints get 429/503 with Retry-After
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+REASONS = ("caller_rate", "district_rate", "in_flight", "queue_time")
+RETRY_AFTER_SECONDS = {"caller_rate": 60, "district_rate": 30, "in_flight": 5, "queue_time": 5}
+PURGE_INTERVAL_SECONDS = 60
+
+
+class _LocalBuckets:
+    """Per-worker token buckets, at most `max_keys` of them (least recently used are dropped)."""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict() # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, capacity, now):
+        """Takes a token from bucket `key`; False if it is empty."""
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            admitted = tokens >= 1.0
+            self._buckets[key] = (tokens - 1.0 if admitted else tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return admitted
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class _SharedBuckets:
+    """Token buckets in a SQLite table shared by the workers on a host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._purged = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            " key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, admitted INTEGER NOT NULL,"
+            " idle_after REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF") # Losing bucket levels in a crash is harmless
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, capacity, now):
+        # Refill, take a token if there is one and report whether it did, in one statement
+        conn = self._conn()
+        refilled = "min(?2, rate_buckets.tokens + (?3 - rate_buckets.updated) * ?1)"
+        row = conn.execute(
+            "INSERT INTO rate_buckets (key, tokens, updated, admitted, idle_after) VALUES (?4, ?2 - 1, ?3, 1, ?3 + 1 / ?1)"
+            " ON CONFLICT(key) DO UPDATE SET"
+            f" admitted = {refilled} >= 1,"
+            f" tokens = CASE WHEN {refilled} >= 1 THEN {refilled} - 1 ELSE {refilled} END,"
+            f" idle_after = ?3 + (?2 - ({refilled} - ({refilled} >= 1))) / ?1,"
+            " updated = ?3"
+            " RETURNING admitted",
+            (rate, capacity, now, key),
+        ).fetchone()
+        if now - self._purged > PURGE_INTERVAL_SECONDS:
+            self._purged = now
+            conn.execute("DELETE FROM rate_buckets WHERE idle_after < ?", (now,)) # Refilled to capacity
+        return bool(row[0])
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM rate_buckets").fetchone()[0]
+
+
+def queue_seconds(request_start_header, now=None):
+    """Time since the proxy received the request, from X-Request-Start ("t=<seconds|ms|µs>"), or None."""
+    if not request_start_header:
+        return None
+    try:
+        started = float(request_start_header.strip().removeprefix("t="))
+    except ValueError:
+        return None
+    while started > 1e11: # Milliseconds or microseconds since the epoch
+        started /= 1000.0
+    return max(0.0, (now or time.time()) - started)
+
+
+class AdmissionController:
+    """Decides whether a request is served now; see the module comment."""
+
+    def __init__(self, caller_rate, caller_burst, district_rate, district_burst, max_in_flight,
+                 max_queue_seconds=None, shared_path=None, max_keys=100000):
+        self.caller_rate = caller_rate
+        self.caller_burst = caller_burst
+        self.district_rate = district_rate
+        self.district_burst = district_burst
+        self.max_in_flight = max_in_flight
+        self.max_queue_seconds = max_queue_seconds
+        self._local_buckets = _LocalBuckets(max_keys)
+        self._buckets = self._local_buckets
+        if shared_path:
+            try:
+                self._buckets = _SharedBuckets(shared_path)
+            except sqlite3.Error as e:
+                logger.error(f"Shared rate limit table unavailable at {shared_path}, limiting per worker: {e}")
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._shed = dict.fromkeys(REASONS, 0)
+
+    def _take(self, key, rate, capacity, now):
+        try:
+            return self._buckets.take(key, rate, capacity, now)
+        except sqlite3.Error as e: # e.g. locked for longer than the timeout: don't fail the request over it
+            logger.warning(f"Shared rate limit table failed, using this worker's buckets: {e}")
+            return self._local_buckets.take(key, rate, capacity, now)
+
+    def admit(self, caller_id=None, district=None, waited_seconds=None):
+        """
+        None if the request may proceed (call release() when it is done), otherwise the reason it
+        is turned away (one of REASONS). Cheap checks come first.
+        """
+        reason = None
+        if waited_seconds is not None and self.max_queue_seconds and waited_seconds > self.max_queue_seconds:
+            reason = "queue_time"
+        else:
+            with self._lock:
+                if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                    reason = "in_flight"
+                else:
+                    self._in_flight += 1
+        if reason is None:
+            now = time.time()
+            if caller_id and self.caller_rate and not self._take(f"caller:{caller_id}", self.caller_rate, self.caller_burst, now):
+                reason = "caller_rate"
+            elif district and self.district_rate and not self._take(f"district:{district.lower()}", self.district_rate, self.district_burst, now):
+                reason = "district_rate"
+            if reason is not None:
+                self.release()
+        with self._lock:
+            if reason is None:
+                self._admitted += 1
+            else:
+                self._shed[reason] += 1
+        return reason
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            stats = {"admitted": self._admitted, "shed": dict(self._shed), "in_flight": self._in_flight,
+                     "max_in_flight": self.max_in_flight}
+        stats["shared"] = self._buckets is not self._local_buckets
+        return stats
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Returns the process-wide admission controller, creating it from config on first use."""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    caller_rate=config.ADMISSION_CALLER_RATE_PER_MINUTE / 60.0,
+                    caller_burst=config.ADMISSION_CALLER_BURST,
+                    district_rate=config.ADMISSION_DISTRICT_RATE_PER_SECOND,
+                    district_burst=config.ADMISSION_DISTRICT_BURST,
+                    max_in_flight=config.ADMISSION_MAX_IN_FLIGHT,
+                    max_queue_seconds=config.ADMISSION_MAX_QUEUE_MS / 1000.0,
+                    shared_path=config.ADMISSION_DB_PATH or None,
+                    max_keys=config.ADMISSION_MAX_KEYS,
+                )
+    return _controller
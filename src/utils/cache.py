@@ -0,0 +1,262 @@
+# Shared response cache for location-keyed lookups (weather, market prices, insurance info)
+# - In-process LRU with per-source TTLs, optional SQLite tier shared by all workers on a host
+# - Single-flight: concurrent misses for the same key wait for one computation instead of
+#   each calling the upstream (e.g., a burst of morning calls from one district)
+# - Hit/miss counters per source, exposed via /api/cache/stats
+import datetime
+import functools
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+STAT_FIELDS = ("hits", "disk_hits", "misses", "coalesced", "errors")
+
+
+def normalize_key_part(value):
+    """Case/whitespace-insensitive key parts so 'Jhansi ' and 'jhansi' share an entry."""
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+
+def make_cache_key(function_name, args, language=None, day=None):
+    """Key = (function, normalized args..., language, day) serialized as a string."""
+    parts = [function_name] + [normalize_key_part(a) for a in args]
+    parts.append(language or config.DEFAULT_LANGUAGE)
+    parts.append((day or datetime.date.today()).isoformat())
+    return json.dumps(parts, ensure_ascii=False, default=str)
+
+
+class _Flight:
+    """An in-progress computation other threads can wait on."""
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _SQLiteTier:
+    """Optional second tier on disk; survives restarts and is shared between worker processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY, source TEXT NOT NULL, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, now):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] <= now:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def set(self, source, key, value, expires_at):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO response_cache (key, source, expires_at, value) VALUES (?, ?, ?, ?)",
+            (key, source, expires_at, json.dumps(value, ensure_ascii=False)),
+        )
+
+    def purge_expired(self, now):
+        self._conn().execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+
+
+class ResponseCache:
+    """LRU + TTL cache with single-flight request coalescing."""
+
+    def __init__(self, max_entries=5000, disk_path=None, coalesce_timeout=10.0):
+        self.max_entries = max_entries
+        self.coalesce_timeout = coalesce_timeout
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._inflight = {} # key -> _Flight
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._disk = None
+        if disk_path:
+            try:
+                self._disk = _SQLiteTier(disk_path)
+            except sqlite3.Error as e:
+                logger.error(f"Response cache disk tier unavailable at {disk_path}: {e}")
+
+    def _count(self, source, field):
+        # Called with self._lock held
+        stats = self._stats.get(source)
+        if stats is None:
+            stats = self._stats[source] = dict.fromkeys(STAT_FIELDS, 0)
+        stats[field] += 1
+
+    def _memory_get(self, key, now):
+        # Called with self._lock held
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _memory_set(self, key, value, expires_at):
+        # Called with self._lock held
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, source, key, ttl_seconds, compute):
+        """
+        Returns the cached value for `key`, or calls `compute()` once (even under concurrent
+        misses) and caches its result for `ttl_seconds`. Values must be JSON-serializable if
+        the disk tier is enabled. Cached values are shared: callers must not mutate them.
+        """
+        now = time.time()
+        with self._lock:
+            found, value = self._memory_get(key, now)
+            if found:
+                self._count(source, "hits")
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self._count(source, "coalesced")
+
+        if not leader:
+            if flight.done.wait(self.coalesce_timeout):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.value
+            logger.warning(f"Timed out waiting for in-flight {source} lookup, computing directly")
+            return compute()
+
+        try:
+            value, expires_at = self._disk_get(key, now)
+            if expires_at is not None:
+                with self._lock:
+                    self._count(source, "disk_hits")
+                    self._memory_set(key, value, expires_at)
+            else:
+                value = compute()
+                expires_at = time.time() + ttl_seconds
+                with self._lock:
+                    self._count(source, "misses")
+                    self._memory_set(key, value, expires_at)
+                self._disk_set(source, key, value, expires_at)
+            flight.value = value
+            return value
+        except Exception as e:
+            with self._lock:
+                self._count(source, "errors")
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _disk_get(self, key, now):
+        if self._disk is None:
+            return None, None
+        try:
+            return self._disk.get(key, now)
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Response cache disk read failed: {e}")
+            return None, None
+
+    def _disk_set(self, source, key, value, expires_at):
+        if self._disk is None:
+            return
+        try:
+            self._disk.set(source, key, value, expires_at)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Response cache disk write failed: {e}")
+
+    def invalidate(self, source_prefix=None):
+        """Clears the in-process tier (all entries, or keys whose function name starts with a prefix)."""
+        with self._lock:
+            if source_prefix is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if json.loads(k)[0].startswith(source_prefix)]:
+                    del self._entries[key]
+
+    def stats(self):
+        """Per-source counters plus current size, for monitoring."""
+        with self._lock:
+            sources = {source: dict(counts) for source, counts in self._stats.items()}
+            size = len(self._entries)
+        for counts in sources.values():
+            lookups = counts["hits"] + counts["disk_hits"] + counts["misses"] + counts["coalesced"]
+            counts["hit_ratio"] = round((lookups - counts["misses"]) / lookups, 3) if lookups else 0.0
+        return {"entries": size, "max_entries": self.max_entries,
+                "disk_tier": self._disk is not None, "sources": sources}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Returns the process-wide response cache, creating it from config on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    max_entries=config.CACHE_MAX_ENTRIES,
+                    disk_path=config.CACHE_DISK_PATH or None,
+                    coalesce_timeout=config.CACHE_COALESCE_TIMEOUT_SECONDS,
+                )
+    return _cache
+
+
+def cached_response(source, ttl_seconds):
+    """
+    Decorator for lookups whose answer depends only on their arguments (crop, location, ...)
+    and the day. `ttl_seconds` may be a number or a callable returning one (read at call time,
+    so config overrides apply). A 'language' argument, if the function has one, is part of the key.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        function_name = f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not config.CACHE_ENABLED:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            language = arguments.pop("language", None)
+            key = make_cache_key(function_name, list(arguments.values()), language=language)
+            ttl = ttl_seconds() if callable(ttl_seconds) else ttl_seconds
+            return get_response_cache().get_or_compute(source, key, ttl, lambda: func(*args, **kwargs))
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,125 @@
+# Concurrent fan-out of independent lookups with per-call deadlines
+# - Route handlers submit independent core/integration calls (prices, forecast, weather, ...)
+#   to a shared thread pool instead of running them one after another
+# - Every call has a deadline bounded by the request's overall budget (the IVR's webhook
+#   timeout): calls that miss it are reported as timed out and their fallback is used, so the
+#   handler can still answer with whatever did arrive
+# - Calls run inside the caller's Flask app context (core modules log via current_app) and
+#   contextvars (tracing spans join the request's trace)
+# - Late calls are not interrupted; they finish in the background (cached lookups still warm the cache)
+# - `prefetch()` starts a call without waiting for it at all (speculative cache warming)
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from flask import current_app, has_app_context
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class FanOutResult:
+    """Values by call name; `timed_out` and `failed` name the calls that fell back."""
+
+    def __init__(self, values, timed_out, failed, elapsed):
+        self.values = values
+        self.timed_out = timed_out
+        self.failed = failed
+        self.elapsed = elapsed
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+    @property
+    def complete(self):
+        return not self.timed_out and not self.failed
+
+
+class FanOut:
+    """
+    Usage:
+        fan_out = FanOut(budget_seconds=3.0)
+        fan_out.add("prices", market.get_market_prices, crop, location, fallback={})
+        fan_out.add("forecast", market.get_price_forecast, crop, location, timeout=1.5)
+        result = fan_out.run()
+    """
+
+    def __init__(self, budget_seconds=None):
+        self.budget_seconds = budget_seconds if budget_seconds is not None else config.FANOUT_BUDGET_SECONDS
+        self._calls = []
+
+    def add(self, name, func, *args, timeout=None, fallback=None, **kwargs):
+        self._calls.append((name, func, args, kwargs, timeout, fallback))
+        return self
+
+    def run(self):
+        started = time.monotonic()
+        budget_deadline = started + self.budget_seconds
+        app = current_app._get_current_object() if has_app_context() else None
+        executor = _get_executor()
+
+        pending = []
+        for name, func, args, kwargs, timeout, fallback in self._calls:
+            deadline = min(budget_deadline, started + timeout) if timeout is not None else budget_deadline
+            # Each call gets a copy of the caller's contextvars (request trace spans land in the same trace)
+            future = executor.submit(contextvars.copy_context().run, _call_in_context, app, func, args, kwargs)
+            pending.append((deadline, name, future, fallback))
+
+        values, timed_out, failed = {}, [], []
+        for deadline, name, future, fallback in sorted(pending, key=lambda item: item[0]):
+            try:
+                values[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                logger.warning(f"Fan-out call '{name}' missed its deadline ({deadline - started:.2f}s), using fallback")
+                timed_out.append(name)
+                values[name] = fallback
+            except Exception as e:
+                logger.error(f"Fan-out call '{name}' failed: {e}")
+                failed.append(name)
+                values[name] = fallback
+        return FanOutResult(values, timed_out, failed, time.monotonic() - started)
+
+
+def prefetch(func, *args, **kwargs):
+    """
+    Starts `func` on the shared pool without waiting for it, e.g. to warm a cached lookup a request
+    will probably need. Returns the future; failures are logged, never raised.
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+    future = _get_executor().submit(contextvars.copy_context().run, _call_in_context, app, func, args, kwargs)
+    future.add_done_callback(_log_prefetch_failure)
+    return future
+
+
+def _log_prefetch_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Prefetch failed: {future.exception()}")
+
+
+def _call_in_context(app, func, args, kwargs):
+    if app is None:
+        return func(*args, **kwargs)
+    with app.app_context():
+        return func(*args, **kwargs)
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """One pool per process (a pool's threads don't survive a fork into Gunicorn workers)."""
+    global _executor, _executor_pid
+    if _executor is not None and _executor_pid == os.getpid():
+        return _executor
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=config.FANOUT_MAX_WORKERS, thread_name_prefix="fanout")
+            _executor_pid = os.getpid()
+    return _executor
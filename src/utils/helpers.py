@@ -1,20 +1,102 @@
 # Optional: Add common utility functions here
+import queue
+import threading
 import requests
 from flask import current_app
+from src.config import config
+from src.integrations.http_client import get_client
+
+_STREAM_END = object()
+
+
+def _provider_auth(url):
+    if config.TWILIO_ACCOUNT_SID and config.TWILIO_AUTH_TOKEN and "twilio.com" in url:
+        return (config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN) # Twilio media/recording URLs require account auth
+    return None
+
+def stream_audio(url, chunk_size=None, max_bytes=None, buffer_chunks=None):
+    """
+    Streams a recording in chunks (a generator of bytes). A reader thread downloads ahead of the
+    consumer into a bounded buffer (at most `buffer_chunks` chunks), so download and STT overlap
+    while memory per call stays bounded; the reader blocks when the consumer falls behind.
+    Raises requests.exceptions.RequestException on failure or if the recording exceeds `max_bytes`.
+    """
+    chunk_size = chunk_size or config.STT_STREAM_CHUNK_BYTES
+    max_bytes = max_bytes or config.STT_MAX_RECORDING_BYTES
+    buffer = queue.Queue(maxsize=buffer_chunks or config.STT_STREAM_BUFFER_CHUNKS)
+    stopped = threading.Event()
+    # Pooled per-host session with connect/read timeouts, retries and circuit breaker
+    response = get_client(url).get(url, stream=True, auth=_provider_auth(url))
+
+    def read():
+        try:
+            with response:
+                response.raise_for_status()
+                received = 0
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    received += len(chunk)
+                    if received > max_bytes:
+                        raise requests.exceptions.ContentDecodingError(f"Recording larger than {max_bytes} bytes: {url}")
+                    while not stopped.is_set():
+                        try:
+                            buffer.put(chunk, timeout=0.5)
+                            break
+                        except queue.Full:
+                            continue
+                    if stopped.is_set():
+                        return # Consumer went away: stop downloading
+            item = _STREAM_END
+        except Exception as e:
+            item = e
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    threading.Thread(target=read, name="audio-reader", daemon=True).start()
+    try:
+        while True:
+            try:
+                item = buffer.get(timeout=config.HTTP_READ_TIMEOUT_SECONDS)
+            except queue.Empty:
+                raise requests.exceptions.ReadTimeout(f"No audio received from {url} for {config.HTTP_READ_TIMEOUT_SECONDS}s")
+            if item is _STREAM_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
 
 def download_audio(url):
-    """Downloads audio content from a URL. Add authentication if needed."""
+    """Downloads audio content from a URL (whole recording; prefer stream_audio for STT)."""
     logger = current_app.logger
     try:
-        # Add authentication headers/params if required by your IVR provider
-        # e.g., auth=(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN) for Twilio
-        response = requests.get(url, stream=True, timeout=15) # 15 second timeout
-        response.raise_for_status()
+        audio = b"".join(stream_audio(url))
         logger.info(f"Successfully downloaded audio from {url}")
-        return response.content # Return audio bytes
+        return audio # Return audio bytes
     except requests.exceptions.RequestException as e:
         logger.error(f"Failed to download audio from {url}: {e}")
         return None
 
+def download_media(url, max_bytes=10 * 1024 * 1024):
+    """
+    Downloads a media file (e.g., a WhatsApp image) and returns its bytes.
+    Raises requests.exceptions.RequestException on failure or if the file exceeds `max_bytes`.
+    """
+    response = get_client(url).get(url, stream=True, auth=_provider_auth(url))
+    with response:
+        response.raise_for_status()
+        chunks = []
+        received = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            received += len(chunk)
+            if received > max_bytes:
+                raise requests.exceptions.ContentDecodingError(f"Media larger than {max_bytes} bytes: {url}")
+            chunks.append(chunk)
+    return b"".join(chunks)
+
 # Add other helpers like location to lat/lon conversion, etc.
 # def get_lat_lon_for_location(location_name): ...
\ No newline at end of file
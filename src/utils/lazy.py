@@ -0,0 +1,40 @@
+# Deferred module imports
+# - lazy_module("src.core.market") returns a stand-in that imports the module on first attribute
+#   access, so importing src.api.routes (and create_app) does not pull in NumPy and the modules of
+#   the models and knowledge indexes until a request needs them
+# - Thread-safe: the import goes through importlib's per-module import locks; once imported, an
+#   attribute access costs one extra getattr
+# - src.app.warm_up() imports and loads everything ahead of time (Gunicorn pre-fork, gunicorn.conf.py)
+import importlib
+import sys
+
+
+class LazyModule:
+    """Stands in for module `name` and imports it on first attribute access."""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = sys.modules.get(name)
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = self.__dict__["_module"] = importlib.import_module(self._name)
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value): # e.g. monkeypatching in tests
+        setattr(self._load(), attribute, value)
+
+    @property
+    def loaded(self):
+        return self.__dict__["_module"] is not None
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'{'' if self.loaded else ' (not imported yet)'}>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
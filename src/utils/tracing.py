@@ -0,0 +1,209 @@
+# Request tracing and metrics
+# - Each API request gets a Trace (held in a contextvar, so it follows fan-out threads); `span()` and
+#   the `@traced()` decorator time pipeline stages (STT, NLU, core lookups, outbound messages)
+# - Every span feeds a per-stage latency histogram; every request feeds per-endpoint/per-intent
+#   histograms and counters
+# - /api/metrics renders all of it in Prometheus text format, plus gauges/counters collected
+#   at scrape time from other subsystems (cache, upstream clients, outbound queue)
+# - A one-line trace summary is logged for a sample of requests and for every slow one, instead
+#   of formatting log lines at each step of every request
+# Metrics are per process: with several Gunicorn workers, scrape each worker or aggregate in Prometheus.
+import bisect
+import contextvars
+import functools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in values:
+            lines.append(f"{self.name}{format_labels(zip(self.label_names, key))} {value}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram per label set (cumulative buckets are computed at render time)."""
+
+    def __init__(self, name, help_text, label_names=(), buckets=DURATION_BUCKETS_SECONDS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {} # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value) # First bucket with bound >= value
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, values in series:
+            labels = list(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(labels + [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {values[-1]:.6f}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("krishi_request_duration_seconds", "API request latency by endpoint and intent.", ("endpoint", "intent"))
+REQUESTS = Counter("krishi_requests_total", "API requests by endpoint, intent and HTTP status.", ("endpoint", "intent", "status"))
+STAGE_SECONDS = Histogram("krishi_stage_duration_seconds", "Latency of pipeline stages (STT, NLU, core lookups, messaging).", ("stage",))
+STAGE_ERRORS = Counter("krishi_stage_errors_total", "Pipeline stages that raised an exception.", ("stage",))
+
+_metrics = [REQUEST_SECONDS, REQUESTS, STAGE_SECONDS, STAGE_ERRORS]
+_collectors = []
+
+
+def register_collector(collect):
+    """
+    `collect()` is called at scrape time and returns (name, type, help, samples) tuples, where
+    samples is a list of (labels dict, value). Used for state owned by other subsystems.
+    """
+    _collectors.append(collect)
+
+
+def render_metrics():
+    """All metrics in Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        try:
+            families = list(collect())
+        except Exception as e:
+            logger.warning(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+            continue
+        for name, metric_type, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(sorted(labels.items()))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Traces ---
+
+class Trace:
+    __slots__ = ("endpoint", "started", "attributes", "spans")
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.attributes = {}
+        self.spans = [] # (stage, offset_seconds, duration_seconds, failed); appended from fan-out threads too
+
+    def summary(self, total, status):
+        stages = " ".join(f"{stage}={duration * 1000:.1f}ms{'!' if failed else ''}" for stage, _, duration, failed in self.spans)
+        attributes = " ".join(f"{name}={value}" for name, value in self.attributes.items())
+        return f"trace endpoint={self.endpoint} status={status} total={total * 1000:.1f}ms {attributes} | {stages}"
+
+
+_current_trace = contextvars.ContextVar("krishi_trace", default=None)
+
+
+def start_trace(endpoint):
+    trace = Trace(endpoint)
+    _current_trace.set(trace)
+    return trace
+
+
+def annotate(**attributes):
+    """Attaches attributes (e.g., intent=...) to the current request's trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def finish_trace(status):
+    """Records the current request's metrics; logs its summary if sampled or slow."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    _current_trace.set(None)
+    total = time.perf_counter() - trace.started
+    intent = trace.attributes.get("intent", "")
+    REQUEST_SECONDS.observe(total, endpoint=trace.endpoint, intent=intent)
+    REQUESTS.inc(endpoint=trace.endpoint, intent=intent, status=status)
+    if total >= config.TRACE_SLOW_SECONDS:
+        logger.warning(trace.summary(total, status))
+    elif config.TRACE_SAMPLE_RATE > 0 and random.random() < config.TRACE_SAMPLE_RATE:
+        logger.info(trace.summary(total, status))
+
+
+@contextmanager
+def span(stage):
+    """Times a block as `stage`: always into the stage histogram, and into the trace if there is one."""
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_SECONDS.observe(duration, stage=stage)
+        if failed:
+            STAGE_ERRORS.inc(stage=stage)
+        if trace is not None:
+            trace.spans.append((stage, started - trace.started, duration, failed))
+
+
+def traced(stage=None):
+    """Decorator: runs the function inside `span(stage)`; default stage is '<module>.<function>'."""
+    def decorator(func):
+        name = stage or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,312 @@
+# Webhook deduplication for IVR and WhatsApp callbacks
+# - Providers retry a webhook when our answer is slow or lost; each retry used to run the whole
+#   pipeline again (STT, NLU, lookups, outbound messages) — exactly when we were already slowest
+# - Requests are keyed by the provider's ids: the Twilio idempotency token if sent, otherwise the
+#   CallSid (welcome: once per call) plus, for the speech callbacks of a call, the turn number we
+#   put into each callback URL (src/api/routes.py) — a caller giving the same answer in two turns
+#   ("पता नहीं") makes two distinct requests, a provider retry of one turn reuses its URL — or the
+#   WhatsApp MessageSid. Requests without such ids are processed normally
+# - The first request computes; duplicates arriving while it runs wait for it (coalesced) and
+#   retries within WEBHOOK_DEDUP_WINDOW_SECONDS get its stored response replayed. 5xx responses
+#   are not stored, so the provider's retry is processed again
+# - Bounded LRU per worker plus an optional SQLite table shared by the workers on a host, where
+#   a worker also claims the requests it is processing: a retry routed to another worker waits
+#   for the original instead of recomputing it
+import functools
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request
+from src.config import config
+from src.utils import tracing
+
+logger = logging.getLogger(__name__)
+
+OUTCOMES = ("computed", "replayed", "coalesced")
+SPEECH_FIELDS = ("SpeechResult", "spoken_text", "RecordingUrl", "audio_url", "Digits")
+PURGE_EVERY_FINISHES = 500 # Expired rows are deleted from the shared table this often
+
+
+def _request_fields():
+    return (request.get_json(silent=True) or {}) if request.is_json else request.form
+
+
+def _call_sid():
+    fields = _request_fields()
+    return fields.get("CallSid") or fields.get("call_sid") or None
+
+
+def ivr_call_key():
+    """Dedup key of the IVR welcome callback (one per call), or None if the provider sent no call id."""
+    return request.headers.get("I-Twilio-Idempotency-Token") or _call_sid() # Token: same on every retry of one webhook
+
+
+def ivr_request_key():
+    """
+    Dedup key of an IVR speech callback, or None: the idempotency token, else CallSid + turn (the
+    `turn` query argument of the callback URL we handed out) + a hash of the speech input.
+    """
+    token = request.headers.get("I-Twilio-Idempotency-Token")
+    if token:
+        return token
+    call_sid = _call_sid()
+    turn = request.args.get("turn")
+    if not call_sid or not turn:
+        return None # A repeated answer can't be told apart from a retry
+    fields = _request_fields()
+    speech = "\x1f".join(str(fields.get(name) or "") for name in SPEECH_FIELDS)
+    return f"{call_sid}:{turn}:{hashlib.sha256(speech.encode('utf-8')).hexdigest()[:32]}"
+
+
+def whatsapp_request_key():
+    """Dedup key of a WhatsApp webhook (the provider's message id), or None."""
+    fields = _request_fields()
+    return fields.get("MessageSid") or fields.get("message_sid") or None
+
+
+class _Flight:
+    """An in-progress request other threads can wait on."""
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _SharedTable:
+    """SQLite table shared by the workers on a host: claims of in-progress requests and finished responses."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS webhook_responses ("
+            " key TEXT PRIMARY KEY, state TEXT NOT NULL, started_at REAL NOT NULL, expires_at REAL NOT NULL,"
+            " status INTEGER, mimetype TEXT, body TEXT)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def claim(self, key, now, stale_before):
+        """True if this worker may process `key` (no finished response and no live claim by another worker)."""
+        conn = self._conn()
+        conn.execute(
+            "DELETE FROM webhook_responses WHERE key = ? AND"
+            " ((state = 'pending' AND started_at < ?) OR (state = 'done' AND expires_at <= ?))",
+            (key, stale_before, now),
+        )
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO webhook_responses (key, state, started_at, expires_at) VALUES (?, 'pending', ?, 0)",
+            (key, now),
+        )
+        return cursor.rowcount == 1
+
+    def finished(self, key, now):
+        """The stored (status, body, mimetype) for `key`, or None if it is not finished."""
+        row = self._conn().execute(
+            "SELECT status, body, mimetype FROM webhook_responses WHERE key = ? AND state = 'done' AND expires_at > ?",
+            (key, now),
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def finish(self, key, stored, expires_at):
+        status, body, mimetype = stored
+        self._conn().execute(
+            "UPDATE webhook_responses SET state = 'done', expires_at = ?, status = ?, body = ?, mimetype = ? WHERE key = ?",
+            (expires_at, status, body, mimetype, key),
+        )
+
+    def release(self, key):
+        self._conn().execute("DELETE FROM webhook_responses WHERE key = ? AND state = 'pending'", (key,))
+
+    def purge(self, now, stale_before):
+        self._conn().execute(
+            "DELETE FROM webhook_responses WHERE (state = 'done' AND expires_at <= ?) OR (state = 'pending' AND started_at < ?)",
+            (now, stale_before),
+        )
+
+
+class WebhookDeduplicator:
+    """Runs each keyed request once per window; duplicates get the same response."""
+
+    def __init__(self, window_seconds=600, max_entries=20000, shared_path=None, wait_seconds=20.0, poll_seconds=0.05):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.wait_seconds = wait_seconds
+        self.poll_seconds = poll_seconds
+        self._entries = OrderedDict() # key -> (expires_at, (status, body, mimetype))
+        self._inflight = {} # key -> _Flight
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._finishes = 0
+        self._shared = None
+        if shared_path:
+            try:
+                self._shared = _SharedTable(shared_path)
+            except sqlite3.Error as e:
+                logger.error(f"Webhook dedup table unavailable at {shared_path}: {e}")
+
+    def _count(self, name, outcome):
+        # Called with self._lock held
+        counts = self._stats.get(name)
+        if counts is None:
+            counts = self._stats[name] = dict.fromkeys(OUTCOMES, 0)
+        counts[outcome] += 1
+
+    def run(self, name, key, compute):
+        """
+        Returns (stored response, outcome) for the request `key` of webhook `name`. `compute()`
+        processes the request and returns (status, body, mimetype); it runs at most once per key
+        within the window unless its response was a 5xx.
+        """
+        key = f"{name}:{key}"
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._count(name, "replayed")
+                return entry[1], "replayed"
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self._count(name, "coalesced")
+
+        if not leader:
+            if flight.done.wait(self.wait_seconds):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.value, "coalesced"
+            logger.warning(f"Timed out waiting for the in-flight {name} webhook, processing the duplicate")
+            return compute(), "computed"
+
+        claimed = False
+        try:
+            stored, claimed = self._wait_for_other_worker(key)
+            outcome = "replayed" if stored is not None else "computed"
+            if stored is None:
+                stored = compute()
+            if stored[0] < 500:
+                expires_at = time.time() + self.window_seconds
+                with self._lock:
+                    self._entries[key] = (expires_at, stored)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                if claimed:
+                    self._shared_call("finish", key, stored, expires_at)
+                    claimed = False
+            with self._lock:
+                self._count(name, outcome)
+            flight.value = stored
+            return stored, outcome
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            if claimed: # Not stored (5xx or exception): let a retry process it again
+                self._shared_call("release", key)
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _wait_for_other_worker(self, key):
+        """(stored response, False) if another worker finished `key`; (None, claimed) otherwise."""
+        if self._shared is None:
+            return None, False
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            now = time.time()
+            if self._shared_call("claim", key, now, now - self.wait_seconds):
+                return None, True
+            stored = self._shared_call("finished", key, now)
+            if stored is not None:
+                return stored, False
+            if time.monotonic() >= deadline:
+                logger.warning(f"Timed out waiting for another worker's {key} webhook, processing the duplicate")
+                return None, False
+            time.sleep(self.poll_seconds)
+
+    def _shared_call(self, method, *args):
+        try:
+            result = getattr(self._shared, method)(*args)
+            if method == "finish":
+                self._finishes += 1
+                if self._finishes % PURGE_EVERY_FINISHES == 0:
+                    now = time.time()
+                    self._shared.purge(now, now - self.wait_seconds)
+            return result
+        except sqlite3.Error as e:
+            logger.warning(f"Webhook dedup table {method} failed: {e}")
+            return True if method == "claim" else None # Unavailable table: process the request
+
+    def stats(self):
+        with self._lock:
+            webhooks = {name: dict(counts) for name, counts in self._stats.items()}
+            size = len(self._entries)
+        return {"entries": size, "max_entries": self.max_entries, "shared": self._shared is not None, "webhooks": webhooks}
+
+
+_deduplicator = None
+_deduplicator_lock = threading.Lock()
+
+
+def get_webhook_deduplicator():
+    """Returns the process-wide deduplicator, creating it from config on first use."""
+    global _deduplicator
+    if _deduplicator is None:
+        with _deduplicator_lock:
+            if _deduplicator is None:
+                _deduplicator = WebhookDeduplicator(
+                    window_seconds=config.WEBHOOK_DEDUP_WINDOW_SECONDS,
+                    max_entries=config.WEBHOOK_DEDUP_MAX_ENTRIES,
+                    shared_path=config.WEBHOOK_DEDUP_DB_PATH or None,
+                    wait_seconds=config.WEBHOOK_DEDUP_WAIT_SECONDS,
+                )
+    return _deduplicator
+
+
+def deduplicated_webhook(name, request_key):
+    """
+    View decorator: requests for which `request_key()` returns a key are processed once per key
+    (see WebhookDeduplicator); duplicates get the first response, marked X-Webhook-Duplicate.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request_key() if config.WEBHOOK_DEDUP_ENABLED else None
+            if not key:
+                return view(*args, **kwargs)
+            original = []
+
+            def compute():
+                response = current_app.make_response(view(*args, **kwargs))
+                original.append(response)
+                return response.status_code, response.get_data(as_text=True), response.mimetype
+
+            stored, outcome = get_webhook_deduplicator().run(name, key, compute)
+            if original:
+                return original[0]
+            tracing.annotate(intent="DUPLICATE")
+            current_app.logger.info(f"Duplicate {name} webhook {key}: {outcome} response")
+            status, body, mimetype = stored
+            response = current_app.response_class(body, status=status, mimetype=mimetype)
+            response.headers["X-Webhook-Duplicate"] = outcome
+            return response
+
+        return wrapper
+    return decorator
@@ -0,0 +1,44 @@
+import os
+import tempfile
+
+import pytest
+
+# src.config reads the environment at import time: point every on-disk store at a throwaway
+# directory (and away from built artifacts under src/models) before anything imports it
+_WORKDIR = tempfile.mkdtemp(prefix="krishi-tests-")
+for _name, _value in {
+    "DATABASE_URL": f"sqlite:///{os.path.join(_WORKDIR, 'contexts.db')}",
+    "OUTBOUND_QUEUE_PATH": os.path.join(_WORKDIR, "outbound_queue.db"),
+    "OUTBOUND_QUEUE_WORKERS": "0",
+    "DISEASE_IMAGE_CACHE_PATH": "",
+    "CACHE_DISK_PATH": "",
+    "WEBHOOK_DEDUP_DB_PATH": os.path.join(_WORKDIR, "webhook_dedup.db"),
+    "ADMISSION_DB_PATH": os.path.join(_WORKDIR, "admission.db"),
+    "DIALOG_SESSION_DB_PATH": os.path.join(_WORKDIR, "dialog_sessions.db"),
+    "TTS_CACHE_DIR": os.path.join(_WORKDIR, "tts_cache"),
+    "QNA_INDEX_DIR": os.path.join(_WORKDIR, "qna_index"),
+    "PRICE_STORE_DIR": os.path.join(_WORKDIR, "price_store"),
+    "PRICE_MODEL_PATH": os.path.join(_WORKDIR, "price_forecasts.npz"),
+    "WEATHER_GRID_PATH": os.path.join(_WORKDIR, "weather_grid.npz"),
+    "ADVISORY_TABLE_PATH": os.path.join(_WORKDIR, "daily_advisory.json"),
+    "TRACE_SAMPLE_RATE": "0",
+}.items():
+    os.environ[_name] = _value
+
+
+@pytest.fixture(scope="session")
+def app():
+    from src.app import create_app
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def workdir():
+    return _WORKDIR
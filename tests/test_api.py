@@ -0,0 +1,210 @@
+import datetime
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from src.core.prompts import get_prompt
+
+
+def _call_sid():
+    return f"CA{uuid.uuid4().hex}"
+
+
+def _caller():
+    return f"+9197{uuid.uuid4().int % 10**8:08d}"
+
+
+def _answer(client, caller_id, call_sid, text, url="/api/ivr/handle-query", headers=None):
+    return client.post(url, json={"caller_id": caller_id, "call_sid": call_sid, "spoken_text": text}, headers=headers)
+
+
+def _next_url(response):
+    """Path and query of the callback URL the previous response handed to the IVR."""
+    url = urlsplit(response.get_json()["payload"]["callback_url"])
+    return f"{url.path}?{url.query}"
+
+
+# --- Webhook deduplication ---
+
+def test_welcome_retry_is_replayed(client):
+    caller_id, call_sid = _caller(), _call_sid()
+    first = client.post("/api/ivr/welcome", json={"caller_id": caller_id, "call_sid": call_sid})
+    retry = client.post("/api/ivr/welcome", json={"caller_id": caller_id, "call_sid": call_sid})
+    assert first.status_code == retry.status_code == 200
+    assert "X-Webhook-Duplicate" not in first.headers
+    assert retry.headers["X-Webhook-Duplicate"] == "replayed"
+    assert retry.get_json() == first.get_json()
+
+
+def test_callback_urls_number_the_turns(client):
+    caller_id, call_sid = _caller(), _call_sid()
+    welcome = client.post("/api/ivr/welcome", json={"caller_id": caller_id, "call_sid": call_sid})
+    assert welcome.get_json()["payload"]["callback_url"].endswith("/api/ivr/handle-query?turn=1")
+    asked = _answer(client, caller_id, call_sid, "गेहूं में पानी कब देना चाहिए?", url=_next_url(welcome))
+    assert asked.get_json()["payload"]["callback_url"].endswith("?turn=2")
+
+
+def test_retry_of_a_turn_is_replayed(client):
+    caller_id, call_sid = _caller(), _call_sid()
+    first = _answer(client, caller_id, call_sid, "गेहूं में पानी कब देना चाहिए?", url="/api/ivr/handle-query?turn=1")
+    retry = _answer(client, caller_id, call_sid, "गेहूं में पानी कब देना चाहिए?", url="/api/ivr/handle-query?turn=1")
+    assert retry.headers["X-Webhook-Duplicate"] == "replayed"
+    assert retry.get_json() == first.get_json()
+
+
+def test_same_answer_in_later_turns_is_processed_again(client):
+    # "पता नहीं" in turns 2-4 are three answers, not retries of one: the dialog re-asks for the
+    # district DIALOG_MAX_ATTEMPTS times, then falls back to the default and asks the next slot
+    caller_id, call_sid = _caller(), _call_sid()
+    response = _answer(client, caller_id, call_sid, "गेहूं में पानी कब देना चाहिए?", url="/api/ivr/handle-query?turn=1")
+    asked = [response.get_json()["payload"]["text_to_speak"]]
+    for _ in range(3):
+        response = _answer(client, caller_id, call_sid, "पता नहीं", url=_next_url(response))
+        assert "X-Webhook-Duplicate" not in response.headers
+        asked.append(response.get_json()["payload"]["text_to_speak"])
+    assert asked[1] == asked[2] == f"{get_prompt('reprompt', 'hi-IN')} {asked[0]}"
+    assert asked[3] == get_prompt("ask_sowing_date", "hi-IN")
+
+
+def test_callback_without_turn_is_not_deduplicated(client):
+    caller_id, call_sid = _caller(), _call_sid()
+    _answer(client, caller_id, call_sid, "गेहूं में पानी कब देना चाहिए?")
+    again = _answer(client, caller_id, call_sid, "पता नहीं")
+    assert "X-Webhook-Duplicate" not in again.headers
+    assert again.get_json()["payload"]["text_to_speak"].startswith(get_prompt("reprompt", "hi-IN"))
+
+
+def test_whatsapp_retry_is_replayed(client):
+    message = {"sender_id": f"whatsapp:{_caller()}", "message_sid": f"SM{uuid.uuid4().hex}", "message_body": "नमस्ते"}
+    first = client.post("/api/whatsapp/message", json=message)
+    retry = client.post("/api/whatsapp/message", json=message)
+    assert first.status_code == 200
+    assert retry.headers["X-Webhook-Duplicate"] == "replayed"
+
+
+# --- Admission control ---
+
+def test_caller_over_the_rate_limit_is_asked_to_call_back(client):
+    from src.config import config
+
+    caller_id = _caller()
+    responses = [client.post("/api/ivr/welcome", json={"caller_id": caller_id, "call_sid": _call_sid()})
+                 for _ in range(int(config.ADMISSION_CALLER_BURST) + 1)]
+    assert [r.get_json()["action"] for r in responses[:-1]] == ["SPEAK_AND_LISTEN"] * (len(responses) - 1)
+    assert responses[-1].get_json()["action"] == "SPEAK_AND_HANGUP"
+    assert responses[-1].get_json()["payload"]["text_to_speak"] == get_prompt("call_back_later", "hi-IN")
+
+
+def test_call_back_later_audio_is_served_once_rendered(client, monkeypatch):
+    from src.api import routes
+
+    rendered = iter([None, ["prompt.wav"]]) # Not rendered when the first call is shed, then ready
+    monkeypatch.setattr(routes.get_admission_controller(), "admit", lambda *args: "in_flight")
+    monkeypatch.setattr(routes.language, "text_to_speech", lambda text, language_code, wait: next(rendered))
+    first, second = (client.post("/api/ivr/welcome", json={"caller_id": _caller(), "call_sid": _call_sid()})
+                     for _ in range(2))
+    assert "audio_urls" not in first.get_json()["payload"]
+    assert second.get_json()["payload"]["audio_urls"][0].endswith("/prompt.wav")
+
+
+def test_request_that_waited_too_long_in_the_proxy_is_shed(client):
+    waited = {"X-Request-Start": f"t={time.time() - 10:.3f}"}
+    message = {"sender_id": f"whatsapp:{_caller()}", "message_sid": f"SM{uuid.uuid4().hex}", "message_body": "नमस्ते"}
+    response = client.post("/api/whatsapp/message", json=message, headers=waited)
+    assert response.status_code == 503
+    assert response.get_json() == {"status": "busy", "reason": "queue_time"}
+    assert response.headers["Retry-After"] == "5"
+
+
+def test_whatsapp_sender_over_the_rate_limit_gets_429(client, monkeypatch):
+    from src.api import routes
+
+    monkeypatch.setattr(routes.get_admission_controller(), "admit", lambda *args: "caller_rate")
+    response = client.post("/api/whatsapp/message", json={"sender_id": f"whatsapp:{_caller()}", "message_body": "नमस्ते"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "60"
+
+
+def test_whatsapp_sender_is_admitted_with_their_district(client, monkeypatch):
+    from src.api import routes
+    from src.database.context_store import get_context_store
+
+    caller_id = _caller()
+    get_context_store().get_or_create(caller_id, lambda cid: {"id": cid, "language": "hi-IN", "location": "Banda"})
+    admitted = []
+    controller = routes.get_admission_controller()
+    monkeypatch.setattr(controller, "admit", lambda caller_id, district, waited: admitted.append((caller_id, district)))
+    monkeypatch.setattr(controller, "release", lambda: None)
+    client.post("/api/whatsapp/message", json={"sender_id": f"whatsapp:{caller_id}", "message_body": "नमस्ते"})
+    assert admitted == [(caller_id, "Banda")]
+
+
+# --- Multi-turn dialog ---
+
+def test_dialog_asks_for_missing_details_then_advises(client):
+    from src.database.context_store import get_context_store
+
+    caller_id, call_sid = _caller(), _call_sid()
+    response = _answer(client, caller_id, call_sid, "गेहूं में पानी कब देना चाहिए?", url="/api/ivr/handle-query?turn=1")
+    assert response.get_json()["payload"]["text_to_speak"] == get_prompt("ask_location", "hi-IN")
+    response = _answer(client, caller_id, call_sid, "झांसी", url=_next_url(response))
+    assert response.get_json()["payload"]["text_to_speak"] == get_prompt("ask_sowing_date", "hi-IN")
+    response = _answer(client, caller_id, call_sid, "बीस दिन पहले", url=_next_url(response))
+    assert response.get_json()["action"] == "SPEAK_AND_HANGUP"
+    assert response.get_json()["payload"]["text_to_speak"].startswith("(गेहूं - अवस्था: tillering)")
+
+    context = get_context_store().get(caller_id)
+    assert context["location"] == "Jhansi"
+    assert context["sowing_date"] == (datetime.date.today() - datetime.timedelta(days=20)).isoformat()
+
+
+def test_known_farmer_is_advised_without_follow_up_questions(client):
+    from src.database.context_store import get_context_store
+
+    caller_id = _caller()
+    sown = (datetime.date.today() - datetime.timedelta(days=20)).isoformat()
+    get_context_store().upsert_many([(caller_id, {"location": "Jhansi", "current_crop": "गेहूं", "sowing_date": sown})])
+    response = _answer(client, caller_id, _call_sid(), "गेहूं में पानी कब देना चाहिए?")
+    assert response.get_json()["action"] == "SPEAK_AND_HANGUP"
+    assert response.get_json()["payload"]["text_to_speak"].startswith("(गेहूं - अवस्था: tillering)")
+
+
+# --- Caller ids ---
+
+def _import_roster_farmer(**fields):
+    from src.database.context_store import get_context_store
+
+    caller_id = _caller()
+    get_context_store().upsert_many([(caller_id, fields)])
+    return caller_id
+
+
+def test_exotel_caller_gets_the_roster_context(client):
+    caller_id = _import_roster_farmer(language="mr-IN", location="Banda")
+    # Exotel sends the caller as a 0-prefixed national number
+    welcome = client.post("/api/ivr/welcome", data={"From": "0" + caller_id[3:], "CallSid": _call_sid()})
+    assert welcome.get_json()["payload"]["language"] == "mr-IN"
+    assert welcome.get_json()["payload"]["text_to_speak"] == get_prompt("welcome", "mr-IN")
+
+
+def test_whatsapp_sender_gets_the_roster_context(client):
+    from src.database.context_store import get_context_store
+
+    caller_id = _import_roster_farmer(location="Banda", current_crop="चना")
+    client.post("/api/whatsapp/message", json={"sender_id": f"whatsapp:{caller_id}", "message_sid": f"SM{uuid.uuid4().hex}",
+                                                "message_body": "चने का भाव क्या है?"})
+    assert get_context_store().get(caller_id)["last_query"] == "चने का भाव क्या है?"
+    assert get_context_store().get(f"whatsapp:{caller_id}") is None # No second context for the same farmer
+
+
+def test_context_stored_under_the_raw_caller_id_is_kept(client):
+    from src.database.context_store import get_context_store
+
+    caller_id = _caller()
+    exotel_id = "0" + caller_id[3:]
+    # Stored before caller ids were normalized
+    get_context_store().upsert_many([(exotel_id, {"id": exotel_id, "language": "hi-IN", "location": "Banda",
+                                                  "current_crop": "चना"})])
+    client.post("/api/ivr/welcome", data={"From": exotel_id, "CallSid": _call_sid()})
+    context = get_context_store().get(caller_id)
+    assert (context["id"], context["location"], context["current_crop"]) == (caller_id, "Banda", "चना")
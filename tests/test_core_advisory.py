@@ -0,0 +1,70 @@
+import datetime
+
+import pytest
+
+from src.core import advisory, qna
+from src.core.crop_calendar import get_crop_calendars
+
+
+def _forecast(*chances):
+    return {"detailed": [{"precipitation_probability_percent": chance} for chance in chances]}
+
+
+def _farmer(days_since_sowing):
+    return {"sowing_date": (datetime.date.today() - datetime.timedelta(days=days_since_sowing)).isoformat()}
+
+
+@pytest.mark.parametrize("chances, bucket", [((10, 60, 20), "rain_soon"), ((0, 5, 10), "dry_spell"),
+                                             ((20, 30), "normal"), ((), "normal")])
+def test_weather_bucket(monkeypatch, chances, bucket):
+    monkeypatch.setattr(advisory.weather, "get_weather_forecast", lambda location: _forecast(*chances))
+    assert advisory.weather_bucket("Jhansi") == bucket
+
+
+def test_advice_for_the_current_stage_with_weather_note(app, monkeypatch):
+    monkeypatch.setattr(advisory, "get_advisory_table", lambda: None)
+    monkeypatch.setattr(advisory, "weather_bucket", lambda location: "rain_soon")
+    with app.app_context():
+        result = advisory.get_crop_advice("गेहूं", "Jhansi", _farmer(20))
+    assert result["stage"] == "tillering"
+    assert result["advice"].startswith("(गेहूं - अवस्था: tillering)")
+    assert result["advice"].endswith(advisory.WEATHER_ADVICE_RAIN_SOON) # The stage's advice mentions सिंचाई
+
+
+def test_weather_note_only_for_irrigation_advice():
+    calendar = get_crop_calendars().lookup("धान")
+    stage_name, text = advisory.compose_advice(calendar, 0, "dry_spell") # Nursery: no सिंचाई
+    assert stage_name == "nursery"
+    assert advisory.WEATHER_ADVICE_DRY_SPELL not in text
+
+
+def test_precomputed_advice_is_served_from_the_morning_table(app, monkeypatch):
+    calendar = get_crop_calendars().lookup("गेहूं", None, "Jhansi")
+    table = advisory.AdvisoryTable(datetime.date.today().isoformat(), {"Jhansi": "dry_spell"},
+                                   {advisory.AdvisoryTable.group_key(calendar, 1, "dry_spell"): ["tillering", "सुबह की सलाह"]})
+    monkeypatch.setattr(advisory, "get_advisory_table", lambda: table)
+    monkeypatch.setattr(advisory, "weather_bucket", lambda location: pytest.fail("forecast fetched for a precomputed group"))
+    with app.app_context():
+        assert advisory.get_crop_advice("गेहूं", "Jhansi", _farmer(20)) == {"advice": "सुबह की सलाह", "stage": "tillering"}
+
+
+def test_table_of_another_day_is_not_current():
+    table = advisory.AdvisoryTable((datetime.date.today() - datetime.timedelta(days=1)).isoformat(), {}, {"k": ["s", "t"]})
+    assert not table.is_current()
+
+
+@pytest.mark.parametrize("crop, farmer", [("कपास", _farmer(20)), ("गेहूं", _farmer(-5))])
+def test_default_advice_without_calendar_or_before_sowing(app, crop, farmer):
+    with app.app_context():
+        result = advisory.get_crop_advice(crop, "Jhansi", farmer)
+    assert result == {"advice": f"{crop} के लिए अभी कोई विशेष सलाह उपलब्ध नहीं है।", "stage": "Unknown"}
+
+
+@pytest.mark.skipif(qna.np is None, reason="QnA index needs NumPy")
+def test_general_question_is_answered_from_the_knowledge_base(app):
+    with app.app_context():
+        answered = advisory.get_general_qna_answer("गेहूं का कौन सा बीज अच्छा है?", crop="गेहूं", location="Jhansi")
+        unanswered = advisory.get_general_qna_answer("मोबाइल रिचार्ज कैसे करें?")
+    assert answered["source"]
+    assert "source" not in unanswered
+    assert unanswered["answer"].startswith("इस प्रश्न का उत्तर देने के लिए")
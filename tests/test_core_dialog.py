@@ -0,0 +1,78 @@
+import datetime
+import os
+import time
+
+import pytest
+
+from src.core import dialog
+from src.core.prompts import get_prompt
+
+
+def _session():
+    session = dialog.DialogSession("CROP_ADVISORY_WATER", {"crop": "गेहूं"}, 0.0)
+    session.values["location"] = "Jhansi"
+    session.answered = ("location",)
+    session.pending = "sowing_date"
+    session.attempts = 1
+    return session
+
+
+def test_sessions_are_shared_between_workers(workdir):
+    path = os.path.join(workdir, "dialog_shared.db")
+    # Two stores on one table stand for two gunicorn workers
+    first, second = dialog.SessionStore(600, shared_path=path), dialog.SessionStore(600, shared_path=path)
+    first.put("CA-shared", _session())
+    resumed = second.get("CA-shared")
+    assert (resumed.intent, resumed.entities, resumed.values) == ("CROP_ADVISORY_WATER", {"crop": "गेहूं"}, {"location": "Jhansi"})
+    assert (resumed.answered, resumed.pending, resumed.attempts) == (("location",), "sowing_date", 1)
+    second.discard("CA-shared")
+    assert first.get("CA-shared") is None
+
+
+def test_sessions_expire(workdir):
+    for store in (dialog.SessionStore(0.05, shared_path=os.path.join(workdir, "dialog_ttl.db")), dialog.SessionStore(0.05)):
+        store.put("CA-ttl", _session())
+        assert store.get("CA-ttl") is not None
+        time.sleep(0.1)
+        assert store.get("CA-ttl") is None
+        assert len(store) == 0
+
+
+def test_answer_on_another_worker_resumes_the_flow(app, workdir):
+    path = os.path.join(workdir, "dialog_resume.db")
+    asking = dialog.DialogManager(sessions=dialog.SessionStore(600, shared_path=path))
+    answering = dialog.DialogManager(sessions=dialog.SessionStore(600, shared_path=path))
+    question = {"intent": "WEATHER_QUERY", "entities": {}}
+    with app.app_context():
+        step = asking.advance("CA-resume", "मौसम कैसा रहेगा?", question, {"location": "Unknown"}, "hi-IN")
+        assert step.prompt == get_prompt("ask_location", "hi-IN")
+        step = answering.advance("CA-resume", "झांसी", {"intent": "UNKNOWN", "entities": {}}, {"location": "Unknown"}, "hi-IN")
+    assert step.prompt is None
+    assert step.intent == "WEATHER_QUERY"
+    assert step.values["location"] == "Jhansi"
+
+
+@pytest.mark.parametrize("text, quintals", [
+    ("20 क्विंटल", 20.0), ("२० क्विंटल", 20.0), ("पचास", 50.0), ("दो टन", 20.0), ("500 किलो", 5.0),
+    ("twenty quintals", 20.0), ("दोन टन", 20.0),
+])
+def test_parse_quantity(text, quintals):
+    assert dialog.parse_quantity(text) == quintals
+
+
+@pytest.mark.parametrize("text", ["दोबारा बोलिए", "मुझे सौदा करना है", "ask someone else", "often", "पता नहीं"])
+def test_number_words_inside_other_words_are_not_quantities(text):
+    assert dialog.parse_quantity(text) is None
+
+
+@pytest.mark.parametrize("text, sown", [
+    ("बीस दिन पहले", "2026-02-18"), ("3 weeks ago", "2026-02-17"), ("दो महीने पहले", "2026-01-09"),
+    ("दस दिवसांपूर्वी", "2026-02-28"), ("1/3", "2026-03-01"), ("15/11", "2025-11-15"), ("15.11.2025", "2025-11-15"),
+])
+def test_parse_sowing_date(text, sown):
+    assert dialog.parse_sowing_date(text, today=datetime.date(2026, 3, 10)) == sown
+
+
+@pytest.mark.parametrize("text", ["दोबारा बोलिए", "32/01", "15/11/2026", "पता नहीं"])
+def test_unparseable_or_future_sowing_dates(text):
+    assert dialog.parse_sowing_date(text, today=datetime.date(2026, 3, 10)) is None
@@ -0,0 +1,112 @@
+import io
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from src.core import disease_inference
+from src.core.disease_inference import ImageDecodeError, MicroBatcher
+
+
+def _done(results):
+    future = Future()
+    future.set_result(results)
+    return future
+
+
+def test_requests_are_grouped_up_to_the_batch_size():
+    sizes = []
+
+    def run_batch(items):
+        sizes.append(len(items))
+        return _done([item * 2 for item in items])
+
+    batcher = MicroBatcher(run_batch, max_batch=4, max_wait=0.2)
+    futures = [batcher.submit(i) for i in range(5)]
+    assert [future.result(timeout=2) for future in futures] == [0, 2, 4, 6, 8]
+    assert sizes == [4, 1]
+
+
+def test_partial_batch_is_dispatched_after_max_wait():
+    batcher = MicroBatcher(lambda items: _done(items), max_batch=16, max_wait=0.05)
+    started = time.monotonic()
+    assert batcher.submit("leaf").result(timeout=2) == "leaf"
+    assert 0.04 <= time.monotonic() - started < 1.0
+
+
+def test_next_batch_waits_for_a_free_inference_process():
+    pending = []
+
+    def run_batch(items):
+        pending.append(Future())
+        return pending[-1]
+
+    batcher = MicroBatcher(run_batch, max_batch=1, max_wait=0.0, max_in_flight=1)
+    first, second = batcher.submit("a"), batcher.submit("b")
+    time.sleep(0.1)
+    assert len(pending) == 1 # The second batch is held back while the first runs
+    pending[0].set_result(["A"])
+    assert first.result(timeout=2) == "A"
+    deadline = time.monotonic() + 2
+    while len(pending) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pending[1].set_result(["B"])
+    assert second.result(timeout=2) == "B"
+
+
+@pytest.mark.parametrize("fail_on_submit", [True, False])
+def test_batch_errors_reach_every_request(fail_on_submit):
+    def run_batch(items):
+        if fail_on_submit:
+            raise RuntimeError("pool broken")
+        future = Future()
+        future.set_exception(RuntimeError("pool broken"))
+        return future
+
+    batcher = MicroBatcher(run_batch, max_batch=2, max_wait=0.2)
+    futures = [batcher.submit(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="pool broken"):
+            future.result(timeout=2)
+    # The failed batch gave its slot back
+    assert batcher.submit(3).exception(timeout=2) is not None
+
+
+needs_pillow = pytest.mark.skipif(disease_inference.Image is None, reason="Preprocessing needs NumPy and Pillow")
+
+
+def _image_bytes(size, image_format):
+    image = disease_inference.Image.new("RGB", size, (40, 140, 60))
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+@needs_pillow
+def test_jpeg_is_decoded_at_reduced_scale(monkeypatch):
+    decoded_sizes = []
+    resize = disease_inference.Image.Image.resize
+
+    def recording_resize(image, *args, **kwargs):
+        decoded_sizes.append(image.size)
+        return resize(image, *args, **kwargs)
+
+    monkeypatch.setattr(disease_inference.Image.Image, "resize", recording_resize)
+    array = disease_inference.decode_and_resize(_image_bytes((2048, 1536), "JPEG"), 224)
+    assert array.shape == (224, 224, 3)
+    assert array.dtype == disease_inference.np.uint8
+    # libjpeg decoded at 1/4 scale: the full 2048x1536 image was never built
+    assert decoded_sizes == [(512, 384)]
+
+
+@needs_pillow
+def test_other_formats_are_decoded_in_full():
+    array = disease_inference.decode_and_resize(_image_bytes((300, 200), "PNG"), 224)
+    assert array.shape == (224, 224, 3)
+    assert tuple(array[100, 100]) == (40, 140, 60)
+
+
+@needs_pillow
+def test_undecodable_bytes_raise_image_decode_error():
+    with pytest.raises(ImageDecodeError):
+        disease_inference.decode_and_resize(b"not an image", 224)
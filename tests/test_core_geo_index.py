@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+from src.core.geo_index import GridIndex, haversine_km, load_market_directory
+
+
+def _brute_force(items, lat, lon, k, max_km=None, predicate=None):
+    found = sorted((haversine_km(lat, lon, item["lat"], item["lon"]), item["id"]) for item in items
+                   if predicate is None or predicate(item))
+    return [item_id for distance, item_id in found if max_km is None or distance <= max_km][:k]
+
+
+@pytest.mark.parametrize("cell_degrees", [0.1, 0.5, 2.0])
+def test_ring_search_matches_brute_force(cell_degrees):
+    rng = random.Random(11)
+    items = [{"id": i, "lat": rng.uniform(20.0, 28.0), "lon": rng.uniform(74.0, 84.0), "crop": rng.choice("ab")}
+             for i in range(400)]
+    index = GridIndex(items, cell_degrees)
+    queries = [(rng.uniform(19.0, 29.0), rng.uniform(73.0, 85.0)) for _ in range(80)]
+    # On and just beside cell edges, where the nearest point often sits in the neighbouring cell
+    queries += [(round(lat / cell_degrees) * cell_degrees + offset, round(lon / cell_degrees) * cell_degrees - offset)
+                for lat, lon in queries[:30] for offset in (0.0, 1e-9, -1e-9)]
+    for lat, lon in queries:
+        for k, max_km, predicate in ((1, None, None), (5, None, None), (3, 60.0, None), (3, None, lambda i: i["crop"] == "a")):
+            found = [item["id"] for _, item in index.nearest(lat, lon, k, max_km, predicate)]
+            assert found == _brute_force(items, lat, lon, k, max_km, predicate), (lat, lon, k, max_km)
+
+
+def test_query_far_outside_the_indexed_area():
+    items = [{"id": 1, "lat": 25.0, "lon": 78.0}, {"id": 2, "lat": 26.0, "lon": 80.0}]
+    index = GridIndex(items, 0.5)
+    assert [item["id"] for _, item in index.nearest(8.5, 77.0, k=2)] == [1, 2]
+    assert index.nearest(8.5, 77.0, k=2, max_km=100) == []
+    assert GridIndex([], 0.5).nearest(25.0, 78.0) == []
+
+
+@pytest.fixture(scope="module")
+def directory():
+    return load_market_directory()
+
+
+@pytest.mark.parametrize("name", ["Jhansi", "jhansi ", "झांसी", "झाँसी"])
+def test_district_names_and_hindi_aliases_resolve_alike(directory, name):
+    assert directory.resolve(name) == directory.resolve("Jhansi") is not None
+
+
+def test_coordinates_and_unknown_places(directory):
+    assert directory.resolve("25.45, 78.57") == (25.45, 78.57)
+    assert directory.resolve((25.45, 78.57)) == (25.45, 78.57)
+    assert directory.resolve("Atlantis") is None
+    assert directory.nearest_mandis("Atlantis") == []
+
+
+@pytest.mark.parametrize("text, place", [
+    ("मैं झांसी से बोल रहा हूँ", "Jhansi"), ("झाँसी", "Jhansi"), ("बांदा जिला", "Banda"),
+    ("उरई के पास गाँव है", "Jalaun"), ("I am from Kanpur Nagar", "Kanpur"), ("पता नहीं", None),
+])
+def test_find_place_in_an_answer(directory, text, place):
+    assert directory.find_place(text) == place
+
+
+def test_place_inside_a_longer_word_is_not_found(directory):
+    assert directory.find_place("उरईवाला") is None
+
+
+def test_nearest_mandis_trade_the_crop(directory):
+    mandis = directory.nearest_mandis("झांसी", crop="चना", k=3)
+    assert mandis and mandis[0][1]["district"] == "Jhansi"
+    assert all("चना" in mandi["crops"] for _, mandi in mandis)
+    assert [distance for distance, _ in mandis] == sorted(distance for distance, _ in mandis)
@@ -0,0 +1,78 @@
+import io
+import os
+import random
+import uuid
+
+import pytest
+
+from scripts.stub_upstream_server import leaf_photo_jpeg
+from src.core import image_cache
+from src.core.image_cache import ImageDiagnosisCache, _BandIndex
+
+pytestmark = pytest.mark.skipif(image_cache.Image is None, reason="Perceptual hashing needs Pillow")
+
+RESULT = {"diagnosis": "पत्ती धब्बा रोग (85.0% संभावना)", "advice": "दवा का छिड़काव करें।"}
+
+
+def _recompressed(image_bytes, scale=0.5, quality=40):
+    # What a WhatsApp forward does to a photo
+    image = image_cache.Image.open(io.BytesIO(image_bytes))
+    image = image.resize((int(image.width * scale), int(image.height * scale)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _cache(**kwargs):
+    return ImageDiagnosisCache(**{"version": "model-a", **kwargs})
+
+
+def test_exact_copy_hits():
+    cache, photo = _cache(), leaf_photo_jpeg("exact")
+    cache.store(cache.fingerprint(photo), RESULT)
+    assert cache.lookup(cache.fingerprint(bytes(photo))) == RESULT
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_recompressed_copy_hits_within_the_distance():
+    cache, photo = _cache(max_distance=4), leaf_photo_jpeg("forwarded")
+    copy = _recompressed(photo)
+    distance = (image_cache.difference_hash(photo) ^ image_cache.difference_hash(copy)).bit_count()
+    assert distance <= 4
+    cache.store(cache.fingerprint(photo), RESULT)
+    assert cache.lookup(cache.fingerprint(copy)) == RESULT
+    assert cache.stats()["near_hits"] == 1
+
+
+def test_distinct_image_misses():
+    cache = _cache()
+    cache.store(cache.fingerprint(leaf_photo_jpeg("first field")), RESULT)
+    assert cache.lookup(cache.fingerprint(leaf_photo_jpeg("second field"))) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_new_model_version_drops_stored_diagnoses(workdir):
+    path = os.path.join(workdir, f"image-cache-{uuid.uuid4().hex}.db")
+    photo = leaf_photo_jpeg("persisted")
+    first = _cache(path=path)
+    first.store(first.fingerprint(photo), RESULT)
+
+    restarted = _cache(path=path) # Same model: loaded from disk
+    assert restarted.lookup(restarted.fingerprint(photo)) == RESULT
+    replaced = _cache(path=path, version="model-b")
+    assert replaced.stats()["entries"] == 0
+    assert replaced.lookup(replaced.fingerprint(photo)) is None
+    assert _cache(path=path).stats()["entries"] == 0 # Deleted from disk, not only skipped
+
+
+def test_band_index_finds_every_hash_within_the_distance():
+    rng = random.Random(3)
+    for max_distance in (1, 4, 7):
+        index = _BandIndex(max_distance)
+        stored = rng.getrandbits(64)
+        index.add(stored, "stored")
+        for _ in range(200):
+            flipped = stored
+            for bit in rng.sample(range(64), max_distance):
+                flipped ^= 1 << bit
+            assert "stored" in index.candidates(flipped)
@@ -0,0 +1,56 @@
+import pytest
+
+from src.core.intent_engine import IntentEngine, get_intent_engine
+
+
+def test_rate_inside_accurate_is_not_a_price_query():
+    result = get_intent_engine().analyze("Is the weather forecast accurate?", "en-IN")
+    assert [i["intent"] for i in result["intents"]] == ["WEATHER_QUERY"]
+
+
+def test_price_of_rice_names_the_crop_once():
+    result = get_intent_engine().analyze("What is the price of rice?", "en-IN")
+    assert result["intent"] == "MARKET_PRICE_QUERY"
+    assert result["entities"]["crop"] == "धान"
+
+
+def test_insurance_keyword_does_not_match_inside_disease():
+    result = get_intent_engine().analyze("गेहूं में बीमारी लगी है", "hi-IN")
+    assert [i["intent"] for i in result["intents"]] == ["DISEASE_QUERY_SYMPTOMS"]
+
+
+@pytest.mark.parametrize("text, language_code, intent", [
+    ("When should I start irrigation?", "en-IN", "CROP_ADVISORY_WATER"),
+    ("पत्तियों पर धब्बों के साथ कीड़े हैं", "hi-IN", "DISEASE_QUERY_SYMPTOMS"),
+])
+def test_stems_match_inflected_words(text, language_code, intent):
+    assert get_intent_engine().analyze(text, language_code)["intent"] == intent
+
+
+def test_only_the_callers_language_is_used():
+    lexicon = {"intents": [{"name": "LOAN", "keywords": {"hi-IN": ["कर्ज"]}},
+                           {"name": "FERTILIZER", "keywords": {"mr-IN": ["खत"]}}]}
+    engine = IntentEngine(lexicon, languages=["hi-IN", "mr-IN"])
+    assert engine.analyze("खत चाहिए", "hi-IN")["intent"] == "UNKNOWN"
+    assert engine.analyze("खत हवे", "mr-IN")["intent"] == "FERTILIZER"
+    # Unknown language: every table is used
+    assert engine.analyze("खत", None)["intent"] == engine.analyze("खत", "ta-IN")["intent"] == "FERTILIZER"
+
+
+@pytest.mark.parametrize("text, intent", [
+    ("मुझे loan चाहिए", "FINANCE_LOAN_REQUEST"),
+    ("mandi rate kya hai", "MARKET_PRICE_QUERY"),
+    ("I need a loan", "FINANCE_LOAN_REQUEST"),
+    ("गेहूं का price क्या है", "MARKET_PRICE_QUERY"),
+    ("wheat में कब पानी दें", "CROP_ADVISORY_WATER"),
+])
+def test_english_words_are_understood_in_hindi_calls(text, intent):
+    assert get_intent_engine().analyze(text, "hi-IN")["intent"] == intent
+
+
+def test_caller_language_outweighs_cross_language_keywords():
+    lexicon = {"intents": [{"name": "PRICE", "keywords": {"en-IN": ["rate"]}},
+                           {"name": "LOAN", "keywords": {"hi-IN": ["कर्ज"]}}]}
+    result = IntentEngine(lexicon, languages=["hi-IN", "en-IN"]).analyze("rate और कर्ज", "hi-IN")
+    assert result["intent"] == "LOAN" # Although PRICE comes first in the lexicon
+    assert result["intents"] == [{"intent": "LOAN", "score": 0.667}, {"intent": "PRICE", "score": 0.333}]
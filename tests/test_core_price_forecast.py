@@ -0,0 +1,50 @@
+import argparse
+import datetime
+
+import pytest
+
+from src.config import config
+from src.core import price_forecast
+from src.core.price_store import PriceStore, append_reports, read_reports
+
+pytestmark = pytest.mark.skipif(price_forecast.np is None, reason="Price forecasts need NumPy")
+np = price_forecast.np
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    append_reports(read_reports(config.PRICE_HISTORY_PATH), directory=str(tmp_path))
+    return str(tmp_path)
+
+
+def _by_series(history):
+    return {series[:2]: row for series, row in zip(history.series, history.values)}
+
+
+def test_store_history_matches_the_ingested_reports(store_dir):
+    from_csv = price_forecast.load_price_history(config.PRICE_HISTORY_PATH)
+    from_store = price_forecast.load_store_history(PriceStore.load(store_dir))
+    assert (from_store.start_date, from_store.end_date) == (from_csv.start_date, from_csv.end_date)
+    assert len(from_store.series) == len(from_csv.series)
+    # Names are normalized on ingestion: compare the price rows, not the labels
+    csv_rows = sorted(map(tuple, np.nan_to_num(from_csv.values, nan=-1).round(0)))
+    store_rows = sorted(map(tuple, np.nan_to_num(from_store.values, nan=-1).round(0)))
+    assert csv_rows == store_rows
+
+
+def test_store_history_since(store_dir):
+    full = price_forecast.load_store_history(PriceStore.load(store_dir))
+    since = full.end_date - datetime.timedelta(days=10)
+    recent = price_forecast.load_store_history(PriceStore.load(store_dir), since)
+    assert (recent.start_date, recent.end_date) == (since, full.end_date)
+    assert np.array_equal(recent.values, full.values[:, -11:], equal_nan=True)
+
+
+def test_fit_reads_the_store_and_falls_back_to_the_csv(store_dir, tmp_path_factory):
+    from scripts.fit_price_forecasts import load_history
+    args = argparse.Namespace(store=store_dir, days=100000, history=None)
+    assert load_history(args)[1] == f"price store {store_dir}"
+    args.store = str(tmp_path_factory.mktemp("empty_store"))
+    history, source = load_history(args)
+    assert source == config.PRICE_HISTORY_PATH
+    assert len(history.series) > 0
@@ -0,0 +1,100 @@
+import datetime
+import os
+
+import pytest
+
+from src.core import price_store
+from src.core.price_store import NameNormalizer, PriceStore, append_reports, name_key, normalize_record
+
+pytestmark = pytest.mark.skipif(price_store.np is None, reason="The price store needs numpy")
+
+ALIASES = {
+    "crops": {"गेहूं": ["Wheat", "Gehun", "गेहूँ"], "चना": ["Bengal Gram(Gram)(Whole)", "Gram"]},
+    "mandis": {"झाँसी मंडी": ["Jhansi", "Jhansi (Grain)"], "मऊरानीपुर मंडी": ["Mauranipur APMC"]},
+}
+MANDIS = [{"id": "jhansi", "name": "झाँसी मंडी", "district": "झाँसी"},
+          {"id": "mauranipur", "name": "मऊरानीपुर मंडी", "district": "झाँसी"}]
+
+
+@pytest.fixture
+def names():
+    return NameNormalizer(ALIASES, MANDIS)
+
+
+def _report(crop, mandi, date, modal, **fields):
+    return {"Commodity": crop, "Market": mandi, "Arrival_Date": date, "Modal_x0020_Price": modal, **fields}
+
+
+def test_names_normalize_to_the_directory_spellings(names):
+    assert names.crop("WHEAT") == names.crop(" gehun ") == names.crop("गेहूँ") == "गेहूं"
+    assert names.crop("Gram (Desi)") == "चना" # Qualifier dropped
+    assert names.crop("Mustard") is None
+    assert names.mandi("Jhansi (Grain)") == names.mandi("jhansi") == ("झाँसी मंडी", "झाँसी")
+    assert names.mandi("झांसी मंडी") == ("झाँसी मंडी", "झाँसी") # Chandrabindu folded
+    assert names.mandi("Mauranipur") == ("मऊरानीपुर मंडी", "झाँसी") # 'APMC' suffix dropped
+    assert name_key("  Jhansi   Grain ") == name_key("jhansi grain")
+
+
+def test_normalize_record_fields_and_units(names):
+    row = normalize_record({"commodity_name": "Wheat", "apmc_name": "Mauranipur APMC", "created_at": "2024-03-05T10:20:00",
+                            "min_price": "2,150", "max_price": "2,000", "modal_price": "2,240",
+                            "commodity_arrivals": "120", "Commodity_Uom": "Qui"}, names)
+    assert row["crop"] == "गेहूं" and row["mandi"] == "मऊरानीपुर मंडी" and row["matched"]
+    assert row["date"] == datetime.date(2024, 3, 5)
+    assert (row["min_price"], row["max_price"], row["modal_price"]) == (2150.0, 2240.0, 2240.0) # Max below modal
+    assert row["arrivals_tonnes"] == 12.0
+    unmatched = normalize_record(_report("Mustard", "Lalitpur", "05/03/2024", "5100"), names)
+    assert not unmatched["matched"] and unmatched["crop"] == "Mustard"
+    assert normalize_record(_report("Wheat", "Jhansi", "not a date", "2240"), names) is None
+    assert normalize_record(_report("Wheat", "Jhansi", "05/03/2024", "0"), names) is None
+
+
+def test_duplicates_in_a_batch_keep_the_later_report(tmp_path, names):
+    stats = append_reports([
+        _report("Wheat", "Jhansi", "05/03/2024", "2200"),
+        _report("गेहूं", "झांसी मंडी", "2024-03-05", "2250"), # Same crop, mandi and day, other spellings
+        _report("Wheat", "Jhansi", "06/03/2024", "2260"),
+    ], str(tmp_path), names)
+    assert (stats["added"], stats["duplicates"], stats["new_series"]) == (2, 1, 1)
+    store = PriceStore.load(str(tmp_path))
+    assert store.history("wheat", "jhansi") == [] # History is keyed by the canonical names
+    assert store.history("गेहूं", "झाँसी मंडी") == [(datetime.date(2024, 3, 5), 2250.0), (datetime.date(2024, 3, 6), 2260.0)]
+
+
+def test_repeated_reports_leave_stored_months_alone(tmp_path, names):
+    directory = str(tmp_path)
+    append_reports([_report("Wheat", "Jhansi", "2024-03-05", "2200"), _report("Wheat", "Jhansi", "2024-04-01", "2300")],
+                   directory, names)
+    before = sorted(os.listdir(directory))
+    stats = append_reports([_report("Wheat", "Jhansi", "2024-03-05", "2150")], directory, names)
+    assert (stats["added"], stats["duplicates"], stats["months"]) == (0, 1, [])
+    assert sorted(os.listdir(directory)) == before
+    # Only the month that gets a new row is rewritten; the stored day keeps its report
+    stats = append_reports([_report("Wheat", "Jhansi", "2024-03-05", "2150"), _report("Wheat", "Jhansi", "2024-03-07", "2210")],
+                           directory, names)
+    assert (stats["added"], stats["duplicates"], stats["months"]) == (1, 1, ["2024-03"])
+    store = PriceStore.load(directory)
+    assert store.history("गेहूं", "झाँसी मंडी", since=datetime.date(2024, 3, 1)) == [
+        (datetime.date(2024, 3, 5), 2200.0), (datetime.date(2024, 3, 7), 2210.0), (datetime.date(2024, 4, 1), 2300.0)]
+    assert store.latest("गेहूं", "झाँसी मंडी")["date"] == datetime.date(2024, 4, 1) # An older new row doesn't move the latest
+
+
+def test_latest_row_per_crop_and_mandi(tmp_path, names):
+    directory = str(tmp_path)
+    append_reports([
+        _report("Wheat", "Jhansi", "2024-03-05", "2200", Arrivals="40"),
+        _report("Wheat", "Mauranipur APMC", "2024-03-04", "2180"),
+        _report("Gram", "Jhansi", "2024-03-05", "5400"),
+    ], directory, names)
+    append_reports([_report("Wheat", "Jhansi", "2024-03-08", "2275"), _report("Wheat", "Jhansi", "2024-03-06", "2230")],
+                   directory, names)
+    store = PriceStore.load(directory)
+    assert len(store) == 3
+    latest = store.latest("गेहूं", "झाँसी मंडी")
+    assert (latest["date"], latest["modal_price"], latest["arrivals_tonnes"]) == (datetime.date(2024, 3, 8), 2275.0, None)
+    assert latest["district"] == "झाँसी"
+    assert store.latest(" गेहूं ", "झाँसी मंडी") == latest
+    assert store.latest("चना", "मऊरानीपुर मंडी") is None
+    assert [(row["mandi"], row["modal_price"]) for row in store.latest_for_crop("गेहूं")] == [
+        ("झाँसी मंडी", 2275.0), ("मऊरानीपुर मंडी", 2180.0)]
+    assert [row["modal_price"] for row in store.latest_for_crop("गेहूं", k=1)] == [2275.0]
@@ -0,0 +1,79 @@
+import datetime
+import os
+import random
+import uuid
+
+import pytest
+
+from src.core import proactive_advisory
+from src.core.advisory import compose_advice
+from src.core.crop_calendar import HARVEST_STAGE, CompiledCalendar, get_crop_calendars
+from src.database.context_store import ContextStore, MemoryContextBackend
+from src.integrations.message_queue import OutboundSpool
+
+TODAY = datetime.date(2026, 1, 15)
+
+
+def _calendar(*durations):
+    return CompiledCalendar({"crop": "test", "stages": [{"name": f"s{i}", "duration_days": d} for i, d in enumerate(durations)]})
+
+
+def _store(*farmers):
+    store = ContextStore(MemoryContextBackend())
+    store.upsert_many([(f"+9197{i:08d}", fields) for i, fields in enumerate(farmers)])
+    return store
+
+
+def _farmer(days_since_sowing, **fields):
+    return {"current_crop": "गेहूं", "location": "Jhansi",
+            "sowing_date": (TODAY - datetime.timedelta(days=days_since_sowing)).isoformat(), **fields}
+
+
+@pytest.mark.skipif(proactive_advisory.np is None, reason="Vectorized stage lookup needs NumPy")
+def test_stage_indices_match_the_per_calendar_lookup():
+    # The sample calendars plus ones of other lengths, so segments of different sizes sit side by side
+    calendars = list(get_crop_calendars()) + [_calendar(1), _calendar(10, 1, 200), _calendar(3, 3)]
+    rng = random.Random(7)
+    calendar_ids = [rng.randrange(len(calendars)) for _ in range(5000)]
+    days = [rng.randint(0, calendars[i].total_days + 60) for i in calendar_ids]
+    for i, calendar in enumerate(calendars): # Every stage boundary, its neighbours, and past the last stage
+        for end in calendar.stage_ends:
+            calendar_ids += [i] * 3
+            days += [end - 1, end, end + 1]
+    stages = proactive_advisory.stage_indices(calendars, calendar_ids, days)
+    assert stages.tolist() == [calendars[i].stage_index(d) for i, d in zip(calendar_ids, days)]
+
+
+def test_groups_are_the_same_without_numpy(monkeypatch):
+    farmers = [_farmer(days) for days in range(0, 400, 7)] + [_farmer(days, current_crop="धान") for days in range(0, 200, 9)]
+    columns = proactive_advisory.collect_farmers(_store(*farmers), TODAY)
+    location_buckets = [1] * len(columns.locations)
+    groups, inverse = proactive_advisory.build_groups(columns, location_buckets)
+    monkeypatch.setattr(proactive_advisory, "np", None)
+    plain_groups, plain_inverse = proactive_advisory.build_groups(columns, location_buckets)
+    assert [groups[g] for g in inverse] == [plain_groups[g] for g in plain_inverse]
+
+
+def test_farmers_past_the_last_stage_get_harvest_advice(monkeypatch):
+    monkeypatch.setattr(proactive_advisory, "weather_bucket", lambda location: "normal")
+    calendar = get_crop_calendars().lookup("गेहूं", None, "Jhansi")
+    table, stats = proactive_advisory.run_batch(_store(_farmer(calendar.total_days + 1), _farmer(400)), TODAY)
+    assert (stats["farmers"], stats["groups"]) == (2, 1)
+    stage_index = len(calendar.stage_names)
+    assert table.lookup(calendar, stage_index, "normal") == compose_advice(calendar, stage_index, "normal")
+    assert table.lookup(calendar, stage_index, "normal")[0] == HARVEST_STAGE
+
+
+def test_second_run_on_the_same_day_queues_nothing(workdir, monkeypatch):
+    monkeypatch.setattr(proactive_advisory, "weather_bucket", lambda location: "rain_soon")
+    spool = OutboundSpool(os.path.join(workdir, f"advisory-{uuid.uuid4().hex}.db"))
+    store = _store(_farmer(5), _farmer(40, advisory_channel="whatsapp"), _farmer(60, advisory_channel="ivr"),
+                   _farmer(5, proactive_advisory=False), _farmer(-3))
+    _, first = proactive_advisory.run_batch(store, TODAY, enqueue=spool.enqueue_many)
+    _, second = proactive_advisory.run_batch(store, TODAY, enqueue=spool.enqueue_many)
+    assert (first["queued"], second["queued"]) == (3, 0)
+    assert first["skipped"]["opted_out"] == first["skipped"]["not_sown_yet"] == 1
+    assert spool.counts() == {"sms": {"pending": 1}, "whatsapp": {"pending": 1}, "ivr": {"pending": 1}}
+    # The next day is a new push
+    _, next_day = proactive_advisory.run_batch(store, TODAY + datetime.timedelta(days=1), enqueue=spool.enqueue_many)
+    assert next_day["queued"] == 3
@@ -0,0 +1,24 @@
+import pytest
+
+from src.core import qna
+
+pytestmark = pytest.mark.skipif(qna.np is None, reason="QnA index needs NumPy")
+
+
+def test_filler_words_are_not_query_terms():
+    assert qna.tokenize("गेहूं का कौन सा बीज अच्छा है?") == ["गेहूं", "बीज"]
+    assert qna.tokenize("Which is the best seed?") == ["seed"]
+
+
+def test_seed_question_gets_knowledge_base_answer(app):
+    # The simulated transcript of language.speech_to_text; regressed to the default answer when
+    # 'सा'/'अच्छा' counted as query terms and kept the coverage at 0.5
+    with app.app_context():
+        result = qna.answer_question("गेहूं का कौन सा बीज अच्छा है?", crop="गेहूं", location="Jhansi")
+    assert result is not None
+    assert result["id"] == "seed-general"
+
+
+def test_unrelated_question_has_no_answer(app):
+    with app.app_context():
+        assert qna.answer_question("मोबाइल रिचार्ज कैसे करें?") is None
@@ -0,0 +1,56 @@
+import pytest
+
+from src.core import disease_detection
+from src.core.symptom_engine import SymptomEngine, load_symptom_engine
+
+CATALOG = {
+    "symptoms": [
+        {"id": "white_powder", "phrases": ["सफेद पाउडर", "white powder"]},
+        {"id": "white_spots", "phrases": ["सफेद धब्ब"]},
+    ],
+    "diseases": [
+        {"id": "generic_mildew", "crop": None, "name": "पाउडरी मिल्ड्यू (Powdery Mildew)", "symptoms": {"white_powder": 1}},
+        {"id": "wheat_mildew", "crop": "गेहूं", "name": "गेहूं का चूर्णिल आसिता (Powdery Mildew)",
+         "symptoms": {"white_powder": 1, "white_spots": 0.5}},
+        {"id": "wheat_spot", "crop": "गेहूं", "name": "सफेद धब्बा", "disease": "white spot", "symptoms": {"white_spots": 1}},
+    ],
+}
+
+
+def test_crop_entry_replaces_generic_entry_of_same_disease():
+    engine = SymptomEngine(CATALOG)
+    # The generic entry fits "white powder" alone better, but the crop's own entry is reported, with that score
+    ranked = engine.rank("white powder", crop="गेहूं")
+    assert [m.disease.id for m in ranked] == ["wheat_mildew"]
+    assert ranked[0].confidence == pytest.approx(1.0)
+    # Other crops only have the generic entry
+    assert [m.disease.id for m in engine.rank("white powder", crop="चना")] == ["generic_mildew"]
+
+
+def test_different_diseases_are_still_ranked_separately():
+    ranked = SymptomEngine(CATALOG).rank("सफेद पाउडर और सफेद धब्बे", crop="गेहूं")
+    assert [m.disease.id for m in ranked] == ["wheat_mildew", "wheat_spot"]
+
+
+def test_sample_catalog_names_each_disease_once():
+    engine = load_symptom_engine()
+    for crop in ("गेहूं", "धान", "चना", "टमाटर"):
+        for text in ("पत्तियों पर सफेद पाउडर", "रतुआ लगा है", "पत्तियां पीली पड़ रही हैं"):
+            keys = [m.disease.key for m in engine.rank(text, crop)]
+            assert len(keys) == len(set(keys)), (crop, text)
+
+
+def test_powdery_mildew_is_not_offered_twice(app):
+    with app.app_context():
+        result = disease_detection.diagnose_from_symptoms("पत्तियों पर सफेद पाउडर", "गेहूं", "Jhansi")
+    assert result["diagnosis"].startswith("संभावित गेहूं का चूर्णिल आसिता (Powdery Mildew)")
+    assert " या " not in result["diagnosis"]
+
+
+@pytest.mark.parametrize("crop", ["चना", "धान"])
+@pytest.mark.parametrize("text", ["पत्तियों पर रतुआ लगा है", "नारंगी पाउडर दिख रहा है", "rust on the leaves"])
+def test_rust_is_diagnosed_on_crops_without_a_rust_entry(app, crop, text):
+    with app.app_context():
+        result = disease_detection.diagnose_from_symptoms(text, crop, "Jhansi")
+    assert result["diagnosis"].startswith("संभावित रतुआ रोग (Rust)")
+    assert result["candidates"][0]["id"] == "rust"
@@ -0,0 +1,72 @@
+import threading
+
+from src.core import language
+from src.core.tts_cache import TTSAssetCache
+
+
+def _wait_for_queue(cache):
+    cache._executor.shutdown(wait=True)
+    cache._executor = None
+
+
+def test_missing_segments_are_synthesized_in_the_background(tmp_path):
+    cache = TTSAssetCache(str(tmp_path))
+    release = threading.Event()
+    calls = []
+
+    def synthesize(text, language_code, voice_gender):
+        release.wait(5)
+        calls.append(text)
+        return b"RIFF"
+
+    text = "गेहूं का भाव ₹2150/क्विंटल है।"
+    assert cache.render_ready(text, "hi-IN", "FEMALE", synthesize) is None # Returns without waiting
+    assert cache.render_ready(text, "hi-IN", "FEMALE", synthesize) is None # Still queued, not queued twice
+    release.set()
+    _wait_for_queue(cache)
+    assert len(calls) == len(set(calls)) # Each segment synthesized once
+
+    names = cache.render_ready(text, "hi-IN", "FEMALE", synthesize)
+    assert names == cache.render(text, "hi-IN", "FEMALE", synthesize)
+    assert len(calls) == len(names)
+    assert cache.stats()["deferred"] == 2
+    assert cache.stats()["queued"] == 0
+
+
+def test_failed_background_synthesis_is_retried_by_the_next_response(tmp_path):
+    cache = TTSAssetCache(str(tmp_path))
+    outcomes = iter([None, b"RIFF"])
+
+    def synthesize(text, language_code, voice_gender):
+        return next(outcomes)
+
+    assert cache.render_ready("नमस्ते", "hi-IN", "FEMALE", synthesize) is None
+    _wait_for_queue(cache)
+    assert cache.stats()["failures"] == 1
+    assert cache.render_ready("नमस्ते", "hi-IN", "FEMALE", synthesize) is None
+    _wait_for_queue(cache)
+    assert cache.render_ready("नमस्ते", "hi-IN", "FEMALE", synthesize) is not None
+
+
+def test_live_speech_does_not_wait_for_synthesis(app, monkeypatch, tmp_path):
+    cache = TTSAssetCache(str(tmp_path))
+    monkeypatch.setattr(language, "get_tts_cache", lambda: cache)
+    with app.app_context():
+        assert language.text_to_speech("आपकी फसल कौन सी है?", language_code="hi-IN", wait=False) is None
+        _wait_for_queue(cache)
+        assert language.text_to_speech("आपकी फसल कौन सी है?", language_code="hi-IN", wait=False)
+        # Blocking mode (prerender script) synthesizes on the spot
+        assert language.text_to_speech("आपका ज़िला कौन सा है?", language_code="hi-IN")
+
+
+def test_prerender_synthesizes_each_language_only_in_its_own_text(monkeypatch):
+    from scripts.prerender_tts import static_texts
+    from src.core import prompts
+
+    hindi = static_texts("hi-IN")
+    assert prompts.get_prompt("welcome", "hi-IN") in hindi
+    assert len(hindi) > len(prompts.PROMPTS) # Plus the crop-calendar advice
+    assert static_texts("en-IN") == [] # Falls back to Hindi: not rendered with the English voice
+    monkeypatch.setitem(prompts.PROMPTS, "welcome", {**prompts.PROMPTS["welcome"], "en-IN": "Welcome to Krishi Saathi."})
+    assert static_texts("en-IN") == ["Welcome to Krishi Saathi."]
+    assert prompts.get_prompt("cannot_help", "en-IN") == prompts.get_prompt("cannot_help", "hi-IN")
@@ -0,0 +1,107 @@
+import datetime
+import math
+import os
+import time
+
+import pytest
+
+from src.config import config
+from src.core import weather_grid
+from src.core.weather_grid import WeatherGrid, _ReloadingGrid, grid_points, ingest
+
+pytestmark = pytest.mark.skipif(weather_grid.np is None, reason="The weather grid needs numpy")
+
+START = datetime.date(2024, 7, 1)
+
+
+def _forecast(lat, lon, days=3):
+    return [{"date": (START + datetime.timedelta(days=day)).isoformat(), "temp_min_celsius": 24.0 + day,
+             "temp_max_celsius": 33.0 + day, "precipitation_probability_percent": 60.0, "rain_mm": 4.5,
+             "humidity_percent": 80.0, "wind_speed_mps": 3.0, "condition": "Rain"} for day in range(days)]
+
+
+def test_grid_points_cover_the_neighbouring_cells():
+    points = grid_points([(25.45, 78.57), (25.5, 78.6)], 0.25)
+    assert len(points) == len(set(points)) == 9
+    assert (25.5, 78.5) in points and (25.25, 78.25) in points and (25.75, 78.75) in points
+
+
+def test_ingest_marks_failed_points_as_missing():
+    points = [(25.0, 78.0), (25.25, 78.0), (25.5, 78.0)]
+    failed = {(25.25, 78.0)}
+    grid, failures = ingest(points, lambda lat, lon: None if (lat, lon) in failed else _forecast(lat, lon), days=5)
+    assert failures == 1
+    assert grid.start_date == START and grid.values.shape == (3, 5, len(weather_grid.VARIABLES))
+    assert weather_grid.np.isnan(grid.values[1]).all()
+    assert grid.daily(1, START, 3) == []
+    # Days the upstream didn't forecast stay empty too
+    rows = grid.daily(0, START, 5)
+    assert [row["date"] for row in rows] == ["2024-07-01", "2024-07-02", "2024-07-03"]
+    assert rows[1]["temp_max_celsius"] == 34.0 and rows[1]["condition"] == "Rain"
+
+
+def test_nearest_point_skips_points_without_data():
+    points = [(25.0, 78.0), (25.25, 78.0), (25.5, 78.0)]
+    grid, _ = ingest(points, lambda lat, lon: None if lat == 25.25 else _forecast(lat, lon))
+    point, km = grid.nearest_point(25.24, 78.0) # Closest to the failed point
+    assert point == 0 # 25.0 (0.24 degrees away) beats 25.5 (0.26)
+    assert km == pytest.approx(0.24 * weather_grid.KM_PER_DEGREE_LAT, rel=1e-6)
+    assert grid.nearest_point(25.49, 78.01)[0] == 2
+
+
+def test_nearest_point_on_a_grid_without_any_data():
+    grid, failures = ingest([(25.0, 78.0), (25.25, 78.0)], lambda lat, lon: [])
+    assert failures == 2
+    assert grid.nearest_point(25.0, 78.0) == (None, None)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    grid, _ = ingest([(25.0, 78.0), (25.25, 78.0)], lambda lat, lon: None if lat == 25.0 else _forecast(lat, lon))
+    path = str(tmp_path / "grid.npz")
+    grid.save(path)
+    loaded = WeatherGrid.load(path)
+    assert loaded.start_date == grid.start_date and loaded.fetched_at == grid.fetched_at
+    assert loaded.daily(1, START, 3) == grid.daily(1, START, 3)
+    assert loaded.nearest_point(25.0, 78.0)[0] == 1
+
+
+@pytest.fixture
+def grid_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "weather_grid.npz")
+    monkeypatch.setattr(config, "WEATHER_GRID_PATH", path)
+    monkeypatch.setattr(config, "WEATHER_GRID_RELOAD_SECONDS", 0.0)
+    monkeypatch.setattr(weather_grid, "_grids", None)
+    return path
+
+
+def _store(path, fetched_at):
+    grid, _ = ingest(grid_points([(25.4484, 78.5685)], 0.25), lambda lat, lon: _forecast(lat, lon))
+    grid.fetched_at = fetched_at
+    grid.save(path)
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000)) # New mtime even within the clock's resolution
+
+
+def test_current_grid_answers_forecasts(grid_path):
+    _store(grid_path, time.time())
+    rows = weather_grid.forecast_for("Jhansi", days=2, today=START)
+    assert [row["date"] for row in rows] == ["2024-07-01", "2024-07-02"]
+    assert weather_grid.forecast_for("Jhansi", today=START + datetime.timedelta(days=10)) is None
+
+
+def test_stale_grid_is_ignored(grid_path):
+    _store(grid_path, time.time() - (config.WEATHER_GRID_MAX_AGE_HOURS + 1) * 3600)
+    assert weather_grid.get_weather_grid() is None
+    assert weather_grid.forecast_for("Jhansi", today=START) is None
+    # A fresh ingestion is picked up again
+    _store(grid_path, time.time())
+    assert weather_grid.get_weather_grid() is not None
+
+
+def test_unreadable_grid_keeps_the_previous_one(grid_path):
+    _store(grid_path, time.time())
+    holder = _ReloadingGrid(grid_path, 0.0)
+    previous = holder.get()
+    with open(grid_path, "wb") as f:
+        f.write(b"not a grid")
+    assert holder.get() is previous
+    assert not math.isnan(previous.values[0, 0, 0])
@@ -0,0 +1,151 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+from src.database.context_store import (ContextStore, MemoryContextBackend, SQLiteContextBackend,
+                                        sqlite_path_from_url)
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteContextBackend(str(tmp_path / "contexts.db"))
+    return MemoryContextBackend()
+
+
+def _store(backend, **options):
+    options.setdefault("flush_interval", 60)
+    return ContextStore(backend, cache_size=64, shards=4, **options)
+
+
+def test_sqlite_url():
+    assert sqlite_path_from_url("sqlite:///./contexts.db") == "./contexts.db"
+    assert sqlite_path_from_url("sqlite:///") == ":memory:"
+    with pytest.raises(ValueError):
+        sqlite_path_from_url("postgresql://db/krishi")
+
+
+def test_get_or_create_persists_once(backend):
+    store = _store(backend)
+    context, created = store.get_or_create("+919800000001", lambda caller_id: {"id": caller_id, "location": "झाँसी"})
+    assert created and context["location"] == "झाँसी"
+    again, created = store.get_or_create("+919800000001", lambda caller_id: {"id": caller_id, "location": "other"})
+    assert not created and again is context
+    assert backend.load("+919800000001") == {"id": "+919800000001", "location": "झाँसी"}
+    assert store.get("+919800000002") is None
+
+
+def test_write_behind_fields_are_buffered_until_flushed(backend):
+    store = _store(backend)
+    store.get_or_create("+919800000001", lambda caller_id: {"id": caller_id})
+    called_at = datetime.datetime(2025, 11, 15, 9, 30)
+    assert store.update("+919800000001", {"last_query": "गेहूं का भाव", "last_interaction_time": called_at, "_audio": b"x"})
+    assert store.get("+919800000001")["last_query"] == "गेहूं का भाव" # Visible in this process at once
+    assert "last_query" not in backend.load("+919800000001")
+    assert store.flush() == 1
+    assert store.flush() == 0
+    stored = backend.load("+919800000001")
+    assert stored["last_query"] == "गेहूं का भाव"
+    assert stored["last_interaction_time"] == called_at # Restored as a datetime
+    assert "_audio" not in stored # Per-process cache fields are not persisted
+    assert not store.update("+919800000009", {"last_query": "unknown caller"})
+
+
+def test_write_through_update_carries_buffered_fields(backend):
+    store = _store(backend)
+    store.get_or_create("+919800000001", lambda caller_id: {"id": caller_id})
+    store.update("+919800000001", {"last_query": "मौसम"})
+    store.update("+919800000001", {"location": "बांदा"})
+    assert backend.load("+919800000001") == {"id": "+919800000001", "last_query": "मौसम", "location": "बांदा"}
+    assert store.flush() == 0
+
+
+def test_background_flusher_writes_buffered_updates(backend):
+    store = _store(backend, flush_interval=0.02)
+    store.get_or_create("+919800000001", lambda caller_id: {"id": caller_id})
+    store.update("+919800000001", {"last_query": "धान"})
+    try:
+        deadline = time.monotonic() + 2
+        while backend.load("+919800000001").get("last_query") != "धान" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert backend.load("+919800000001")["last_query"] == "धान"
+    finally:
+        store.close()
+
+
+def test_failed_flush_is_requeued_without_overwriting_newer_updates(backend, monkeypatch):
+    store = _store(backend)
+    store.get_or_create("+919800000001", lambda caller_id: {"id": caller_id})
+    store.update("+919800000001", {"last_query": "first"})
+    real_merge = backend.merge_many
+    failing = threading.Event()
+    failing.set()
+
+    def merge_many(items):
+        if failing.is_set():
+            failing.clear()
+            store.update("+919800000001", {"last_query": "second"}) # Arrives while the flush is failing
+            raise OSError("disk full")
+        real_merge(items)
+
+    monkeypatch.setattr(backend, "merge_many", merge_many)
+    assert store.flush() == 0
+    assert store.flush() == 1
+    assert backend.load("+919800000001")["last_query"] == "second"
+
+
+def test_entries_expire_after_the_ttl(backend):
+    store = _store(backend, ttl_seconds=0.05)
+    store.get_or_create("+919800000001", lambda caller_id: {"id": caller_id, "location": "झाँसी"})
+    backend.merge_many([("+919800000001", {"location": "बांदा"})]) # Written by another worker
+    assert store.get("+919800000001")["location"] == "झाँसी"
+    time.sleep(0.1)
+    assert store.get("+919800000001")["location"] == "बांदा"
+
+
+def test_entries_with_buffered_updates_do_not_expire(backend):
+    store = _store(backend, ttl_seconds=0.05)
+    store.get_or_create("+919800000001", lambda caller_id: {"id": caller_id})
+    store.update("+919800000001", {"last_query": "buffered"})
+    time.sleep(0.1)
+    assert store.get("+919800000001")["last_query"] == "buffered" # Not reloaded without it
+    assert store.cache_size() == 1
+
+
+def test_merge_many_updates_only_the_given_fields_of_existing_contexts(backend):
+    backend.insert("+919800000001", {"id": "+919800000001", "location": "झाँसी", "crops": ["गेहूं"]})
+    backend.merge_many([
+        ("+919800000001", {"last_query": "भाव"}),
+        ("+919800000001", {"crops": ["चना"]}),
+        ("+919800000002", {"last_query": "not stored"}), # Unknown callers are skipped
+    ])
+    assert backend.load("+919800000001") == {"id": "+919800000001", "location": "झाँसी", "crops": ["चना"], "last_query": "भाव"}
+    assert backend.load("+919800000002") is None
+    backend.merge_many([])
+
+
+def test_upsert_many_creates_and_merges(backend):
+    store = _store(backend)
+    store.get_or_create("+919800000001", lambda caller_id: {"id": caller_id, "location": "झाँसी", "last_query": "keep"})
+    store.upsert_many([
+        ("+919800000001", {"location": "बांदा", "current_crop": "चना", "sowing_date": None}),
+        ("+919800000002", {"id": "+919800000002", "location": "महोबा", "sowing_date": None}),
+    ])
+    assert backend.load("+919800000001") == {"id": "+919800000001", "location": "बांदा", "last_query": "keep", "current_crop": "चना"}
+    assert backend.load("+919800000002") == {"id": "+919800000002", "location": "महोबा"} # None values are not stored
+    assert store.get("+919800000001")["location"] == "बांदा" # Cached copy dropped
+    assert backend.count() == 2
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 10, 1000])
+def test_iter_all_returns_every_context_once_in_order(backend, batch_size):
+    store = _store(backend)
+    ids = [f"+9198000000{i:02d}" for i in range(10)]
+    store.upsert_many([(caller_id, {"id": caller_id}) for caller_id in reversed(ids)])
+    store.get("+919800000003")
+    store.update("+919800000003", {"last_query": "pending"})
+    contexts = list(store.iter_all(batch_size=batch_size))
+    assert [caller_id for caller_id, _ in contexts] == ids
+    assert dict(contexts)["+919800000003"]["last_query"] == "pending" # Buffered updates flushed first
@@ -0,0 +1,52 @@
+import datetime
+import io
+import json
+
+import pytest
+
+from src.database.farmer_roster import _iter_json_array, normalize_date, normalize_phone
+
+
+@pytest.mark.parametrize("value", [
+    "+919876543210", "09876543210", "whatsapp:+919876543210", "+91 98765 43210", "919876543210",
+    "00919876543210", "9876543210", "९८७६५४३२१०", 9876543210,
+])
+def test_normalize_phone(value):
+    assert normalize_phone(value) == "+919876543210"
+
+
+@pytest.mark.parametrize("value", ["5876543210", "12345", "", None, "+1 555 123 4567", "+44 7911 123456"])
+def test_invalid_or_foreign_numbers_are_not_normalized(value):
+    assert normalize_phone(value) is None
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2025-11-15", "2025-11-15"), ("15/11/2025", "2025-11-15"), ("15-11-2025", "2025-11-15"),
+    ("15.11.2025", "2025-11-15"), ("15/11/25", "2025-11-15"), ("15 Nov 2025", "2025-11-15"),
+    ("2025-11-15T00:00:00", "2025-11-15"), ("2025-11-15 00:00:00", "2025-11-15"), ("१५/११/२०२५", "2025-11-15"),
+    ("2026-02-01", None), ("31/02/2025", None), ("next week", None), ("", None),
+])
+def test_normalize_date(value, expected):
+    assert normalize_date(value, today=datetime.date(2026, 1, 15)) == expected
+
+
+RECORDS = [{"phone": "९८७६५४३२१०", "name": f"किसान [{i}]", "crops": ["गेहूं", {"note": "]}, ["}]} for i in range(5)]
+
+
+@pytest.mark.parametrize("document", [
+    json.dumps(RECORDS, ensure_ascii=False),
+    json.dumps({"source": "FPO", "farmers": RECORDS}, ensure_ascii=False, indent=2),
+])
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_json_array_is_decoded_across_chunk_boundaries(document, chunk_size):
+    assert list(_iter_json_array(io.StringIO(document), chunk_size)) == RECORDS
+
+
+@pytest.mark.parametrize("document", ["[]", " [\n] ", "{}"])
+def test_empty_json_roster(document):
+    assert list(_iter_json_array(io.StringIO(document), 7)) == []
+
+
+def test_truncated_json_roster_raises():
+    with pytest.raises(ValueError):
+        list(_iter_json_array(io.StringIO(json.dumps(RECORDS)[:-20]), 7))
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+import requests
+
+from scripts.stub_upstream_server import serve
+from src.integrations.http_client import CircuitBreaker, CircuitOpenError, UpstreamClient
+
+
+def _start(**options):
+    server = serve(port=0, **options)
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+@pytest.fixture(scope="module")
+def healthy():
+    server, url = _start()
+    yield url
+    server.shutdown()
+
+
+@pytest.fixture(scope="module")
+def failing():
+    server, url = _start(fail_rate=1.0)
+    yield url
+    server.shutdown()
+
+
+def _stub_requests(url):
+    # The stub's counters are per process, so tests compare differences
+    return requests.get(f"{url}/stats", timeout=5).json()["requests"]
+
+
+def _client(**kwargs):
+    options = {"connect_timeout": 1.0, "read_timeout": 2.0, "max_retries": 2, "backoff_base": 0.01,
+               "backoff_max": 0.02, "pool_size": 4, "failure_threshold": 100, "reset_timeout": 30.0}
+    return UpstreamClient("stub", **{**options, **kwargs})
+
+
+def test_5xx_is_retried_for_idempotent_requests(failing):
+    client = _client()
+    before = _stub_requests(failing)
+    response = client.get(f"{failing}/data/2.5/onecall")
+    assert response.status_code == 503
+    assert _stub_requests(failing) - before == 3 # First attempt and max_retries=2 retries
+    assert client.stats()["retries"] == 2
+    assert client.stats()["failures"] == 3
+
+
+def test_read_timeout_is_raised_after_retries():
+    server, url = _start(hang_rate=1.0, hang_seconds=1.0)
+    try:
+        client = _client(read_timeout=0.2, max_retries=1)
+        started = time.monotonic()
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            client.get(f"{url}/data/2.5/onecall")
+        assert time.monotonic() - started < 1.0 # Did not wait for the hung upstream
+        assert client.stats()["retries"] == 1
+        assert client.stats()["failures"] == 2
+    finally:
+        server.shutdown()
+
+
+def test_circuit_opens_then_half_opens_and_closes(failing, healthy):
+    client = _client(max_retries=0, failure_threshold=2, reset_timeout=0.2)
+    for _ in range(2):
+        client.get(f"{failing}/data/2.5/onecall")
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    before = _stub_requests(healthy)
+    with pytest.raises(CircuitOpenError):
+        client.get(f"{healthy}/data/2.5/onecall")
+    assert _stub_requests(healthy) == before # Failed fast, the upstream was not called
+    assert client.stats()["short_circuited"] == 1
+
+    time.sleep(0.25)
+    assert client.breaker.allow() # The one trial call of the half-open circuit...
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    assert not client.breaker.allow() # ...and no other request meanwhile
+    client.breaker.record_failure()
+    assert client.breaker.state == CircuitBreaker.OPEN # A failed trial opens it again
+
+    time.sleep(0.25)
+    assert client.get(f"{healthy}/data/2.5/onecall").status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_connections_are_reused(healthy):
+    client = _client()
+    for _ in range(5):
+        response = client.get(f"{healthy}/data/2.5/onecall")
+        assert response.status_code == 200
+        response.close()
+    pools = client.session.get_adapter(healthy).poolmanager.pools
+    assert len(pools) == 1 # One pool for the host...
+    (key,) = pools.keys()
+    pool = pools[key]
+    assert pool.num_connections == 1 # ...and one keep-alive connection for all requests
+    assert pool.num_requests == 5
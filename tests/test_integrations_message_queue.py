@@ -0,0 +1,74 @@
+import os
+import uuid
+
+import pytest
+
+from src.integrations import message_queue
+from src.integrations.message_queue import OutboundDispatcher, OutboundSpool, RateLimiter
+
+
+@pytest.fixture
+def spool(workdir):
+    return OutboundSpool(os.path.join(workdir, f"outbound-{uuid.uuid4().hex}.db"))
+
+
+def _enqueue(spool, channel, count):
+    for i in range(count):
+        spool.enqueue(channel, f"+91980000{i:04d}", f"message {i}", f"{channel}-{uuid.uuid4().hex}")
+
+
+def test_rate_limit_is_shared_by_processes_on_one_spool(spool):
+    # A second OutboundSpool on the same file stands for another gunicorn worker
+    other = OutboundSpool(spool.path)
+    assert RateLimiter(spool, "sms", rate=0.5, capacity=5).acquire(10) == 5
+    granted, wait = other.take_tokens("sms", 0.5, 5, 10)
+    assert granted == 0
+    assert 0 < wait <= 2.0
+    assert other.take_tokens("whatsapp", 0.5, 5, 1) == (1, 0.0) # Per channel
+
+
+def test_sends_are_batched_per_provider(app, spool):
+    calls = []
+
+    def sender(channel):
+        def send(messages):
+            calls.append((channel, len(messages)))
+            return [True] * len(messages)
+        return send
+
+    _enqueue(spool, "sms", 7)
+    _enqueue(spool, "whatsapp", 3)
+    dispatcher = OutboundDispatcher(app, spool, {"sms": sender("sms"), "whatsapp": sender("whatsapp")},
+                                    batch_size=20, rates={"sms": 1000, "whatsapp": 1000})
+    assert dispatcher.drain_once()
+    assert calls == [("sms", 7), ("whatsapp", 3)]
+    assert spool.counts() == {"sms": {"sent": 7}, "whatsapp": {"sent": 3}}
+
+
+def test_batch_is_split_by_the_rate_limit(app, spool):
+    sizes = []
+    _enqueue(spool, "sms", 5)
+    dispatcher = OutboundDispatcher(app, spool, {"sms": lambda messages: sizes.append(len(messages)) or [True] * len(messages)},
+                                    rates={"sms": 50})
+    dispatcher.limiters["sms"].capacity = 2.0
+    dispatcher.drain_once()
+    assert sum(sizes) == 5
+    assert max(sizes) <= 2
+
+
+def test_failed_sends_are_retried_then_dead_lettered(app, spool):
+    _enqueue(spool, "sms", 1)
+    dispatcher = OutboundDispatcher(app, spool, {"sms": lambda messages: [False] * len(messages)}, max_attempts=1)
+    dispatcher.drain_once()
+    assert spool.counts() == {"sms": {"dead": 1}}
+
+
+def test_simulated_sends_are_not_dead_lettered(app, spool):
+    # No provider credentials in the tests: the real senders simulate
+    _enqueue(spool, "sms", 2)
+    _enqueue(spool, "whatsapp", 2)
+    _enqueue(spool, "ivr", 1)
+    dispatcher = OutboundDispatcher(app, spool, message_queue._default_senders(), max_attempts=1)
+    assert dispatcher.drain_once()
+    assert spool.counts() == {"sms": {"simulated": 2}, "whatsapp": {"simulated": 2}, "ivr": {"simulated": 1}}
+    assert not dispatcher.drain_once() # Nothing left to retry
@@ -0,0 +1,20 @@
+import os
+
+from src.config import config
+from src.utils.admission import AdmissionController
+
+
+def test_in_flight_limit_applies_below_the_handler_threads():
+    # At or above the thread count the limit could never be reached: the extra requests queue in gunicorn
+    if "ADMISSION_MAX_IN_FLIGHT" not in os.environ:
+        assert 0 < config.ADMISSION_MAX_IN_FLIGHT < int(os.environ.get("GUNICORN_THREADS", 8))
+
+
+def test_requests_beyond_the_in_flight_limit_are_shed():
+    controller = AdmissionController(0, 0, 0, 0, max_in_flight=2)
+    assert controller.admit() is None
+    assert controller.admit() is None
+    assert controller.admit() == "in_flight"
+    controller.release()
+    assert controller.admit() is None
+    assert controller.stats()["shed"]["in_flight"] == 1
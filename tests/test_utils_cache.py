@@ -0,0 +1,87 @@
+import threading
+import time
+
+from src.utils.cache import ResponseCache, cached_response, get_response_cache
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResponseCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"forecast": "साफ"}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("weather", "jhansi", 60, compute)))
+               for _ in range(8)]
+    threads[0].start()
+    started.wait(5) # The first miss is computing...
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.1) # ...while the others miss too
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{"forecast": "साफ"}] * 8
+    stats = cache.stats()["sources"]["weather"]
+    assert (stats["misses"], stats["coalesced"]) == (1, 7)
+
+
+def test_waiters_get_the_error_of_the_computation():
+    cache = ResponseCache()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    def lookup():
+        try:
+            cache.get_or_compute("weather", "banda", 60, compute)
+        except ValueError as e:
+            errors.append(str(e))
+
+    leader, waiter = threading.Thread(target=lookup), threading.Thread(target=lookup)
+    leader.start()
+    started.wait(5)
+    waiter.start()
+    time.sleep(0.1)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    assert errors == ["upstream down"] * 2
+    # Errors are not cached: the next lookup computes again
+    assert cache.get_or_compute("weather", "banda", 60, lambda: "ok") == "ok"
+
+
+def test_entries_expire_after_their_ttl():
+    cache = ResponseCache()
+    values = iter(["first", "second"])
+    assert cache.get_or_compute("market_prices", "key", 0.05, lambda: next(values)) == "first"
+    assert cache.get_or_compute("market_prices", "key", 0.05, lambda: next(values)) == "first"
+    time.sleep(0.1)
+    assert cache.get_or_compute("market_prices", "key", 0.05, lambda: next(values)) == "second"
+    stats = cache.stats()["sources"]["market_prices"]
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_decorated_lookup_is_keyed_by_normalized_arguments():
+    calls = []
+
+    @cached_response("test_lookup", ttl_seconds=lambda: 60)
+    def lookup(crop, location):
+        calls.append((crop, location))
+        return f"{crop}@{location}"
+
+    get_response_cache().invalidate(f"{__name__}.")
+    assert lookup("गेहूं", "Jhansi") == lookup("गेहूं", " jhansi ") == "गेहूं@Jhansi"
+    assert lookup("चना", "Jhansi") == "चना@Jhansi"
+    assert calls == [("गेहूं", "Jhansi"), ("चना", "Jhansi")]
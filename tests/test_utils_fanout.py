@@ -0,0 +1,61 @@
+import threading
+import time
+
+from src.utils.fanout import FanOut
+
+
+def test_all_calls_arrive():
+    result = FanOut(budget_seconds=2.0).add("a", lambda: 1).add("b", lambda x, y=0: x + y, 2, y=3).run()
+    assert result.values == {"a": 1, "b": 5}
+    assert result.complete and result.timed_out == [] and result.failed == []
+
+
+def test_call_missing_its_deadline_falls_back():
+    release = threading.Event()
+    fan_out = FanOut(budget_seconds=2.0)
+    fan_out.add("slow", release.wait, 5, timeout=0.1, fallback={"prices": []})
+    fan_out.add("fast", lambda: "ok")
+    try:
+        result = fan_out.run()
+    finally:
+        release.set()
+    assert result["slow"] == {"prices": []}
+    assert result["fast"] == "ok"
+    assert result.timed_out == ["slow"] and result.failed == []
+    assert not result.complete
+    assert result.elapsed < 1.0
+
+
+def test_overall_budget_bounds_every_call():
+    release = threading.Event()
+    fan_out = FanOut(budget_seconds=0.1)
+    fan_out.add("one", release.wait, 5, timeout=10)
+    fan_out.add("two", release.wait, 5)
+    try:
+        started = time.monotonic()
+        result = fan_out.run()
+        elapsed = time.monotonic() - started
+    finally:
+        release.set()
+    assert sorted(result.timed_out) == ["one", "two"]
+    assert result.values == {"one": None, "two": None}
+    assert elapsed < 1.0
+
+
+def test_failing_call_falls_back():
+    def boom():
+        raise RuntimeError("upstream down")
+
+    result = FanOut(budget_seconds=2.0).add("weather", boom, fallback="n/a").add("prices", lambda: [1]).run()
+    assert result["weather"] == "n/a"
+    assert result.get("prices") == [1]
+    assert result.failed == ["weather"] and result.timed_out == []
+    assert not result.complete
+
+
+def test_calls_run_inside_the_callers_app_context(app):
+    from flask import current_app
+
+    with app.app_context():
+        result = FanOut(budget_seconds=2.0).add("name", lambda: current_app.name).run()
+    assert result["name"] == app.name
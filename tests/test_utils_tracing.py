@@ -0,0 +1,69 @@
+import re
+
+from src.utils import tracing
+from src.utils.tracing import Counter, Histogram
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    histogram = Histogram("demo_seconds", "Demo latency.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, stage="stt")
+    histogram.observe(0.2, stage='say "hi"')
+    assert histogram.render() == [
+        "# HELP demo_seconds Demo latency.",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{stage="say \\"hi\\"",le="0.1"} 0',
+        'demo_seconds_bucket{stage="say \\"hi\\"",le="1.0"} 1',
+        'demo_seconds_bucket{stage="say \\"hi\\"",le="+Inf"} 1',
+        'demo_seconds_sum{stage="say \\"hi\\""} 0.200000',
+        'demo_seconds_count{stage="say \\"hi\\""} 1',
+        'demo_seconds_bucket{stage="stt",le="0.1"} 2', # Bounds are inclusive (le)
+        'demo_seconds_bucket{stage="stt",le="1.0"} 3',
+        'demo_seconds_bucket{stage="stt",le="+Inf"} 4',
+        'demo_seconds_sum{stage="stt"} 3.650000',
+        'demo_seconds_count{stage="stt"} 4',
+    ]
+
+
+def test_counter_renders_each_label_set():
+    counter = Counter("demo_total", "Demo events.", ("status",))
+    counter.inc(status=200)
+    counter.inc(2, status=200)
+    counter.inc(status=500)
+    assert counter.render()[2:] == ['demo_total{status="200"} 3', 'demo_total{status="500"} 1']
+
+
+def _sample(body, name, **labels):
+    for line in body.splitlines():
+        match = re.fullmatch(rf"{name}(?:\{{(.*)\}})? (\S+)", line)
+        if match and all(f'{key}="{value}"' in (match.group(1) or "") for key, value in labels.items()):
+            return float(match.group(2))
+    return None
+
+
+def test_metrics_endpoint_scrape(client):
+    with tracing.span("test.stage"):
+        pass
+    client.post("/api/ivr/welcome", json={"caller_id": "+919800000123", "call_sid": "CA-tracing-test"})
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert body.endswith("\n")
+    for line in body.splitlines():
+        assert line.startswith("# ") or re.fullmatch(r"[a-z_]+(\{.*\})? \S+", line), line
+
+    for metric in ("krishi_request_duration_seconds", "krishi_stage_duration_seconds"):
+        assert f"# TYPE {metric} histogram" in body
+    assert _sample(body, "krishi_stage_duration_seconds_bucket", stage="test.stage", le="+Inf") >= 1
+    assert _sample(body, "krishi_stage_duration_seconds_count", stage="test.stage") >= 1
+    assert _sample(body, "krishi_stage_duration_seconds_sum", stage="test.stage") >= 0
+    count = _sample(body, "krishi_request_duration_seconds_count", endpoint="api.ivr_welcome")
+    assert count >= 1
+    assert _sample(body, "krishi_request_duration_seconds_bucket", endpoint="api.ivr_welcome", le="+Inf") == count
+    assert _sample(body, "krishi_requests_total", endpoint="api.ivr_welcome", status="200") >= 1
+    # Scrape-time collectors
+    assert "# TYPE krishi_context_cache_entries gauge" in body
+    assert "# TYPE krishi_outbound_messages gauge" in body
+    # The scrape itself is not traced
+    assert 'endpoint="api.metrics"' not in body